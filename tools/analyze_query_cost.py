@@ -0,0 +1,308 @@
+import os
+import sys
+import json
+import argparse
+import unicodedata
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# 告警规则与仪表盘 PromQL 静态代价分析
+# 输入: alert/instance/*.yaml（告警规则）、grafana/*.json（仪表盘）
+# 输出: 排名后的代价报告（JSON，默认 out/query_cost_report.json）+ 终端表格
+#
+# 代价单位为“样本读取量”的相对估计（未知序列基数按 1 组序列计）：
+#   - 瞬时选择器：每步 1；每个正则匹配器 +25%（倒排索引正则扫描）
+#   - 区间选择器 [r]：每步 r / scrape_interval
+#   - 子查询 [r:s]：内部表达式代价 × (r / s) 步
+#   - 查询代价 = 表达式代价 × 查询步数（range 查询按 from / step 计算，instant 为 1）
+#   - 告警每分钟代价 = Σ 查询代价 × (60 / 组 interval)
+
+try:
+    from tools import promql
+    from tools.convert_yaml_to_grafana_json import INSTANCE_DIR, OUT_DIR, load_named_yaml_files, normalize_groups
+    from tools.import_rules_to_grafana import _parse_duration_seconds
+except Exception:
+    # 兼容从工具目录直接执行
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    from tools import promql  # type: ignore
+    from tools.convert_yaml_to_grafana_json import INSTANCE_DIR, OUT_DIR, load_named_yaml_files, normalize_groups  # type: ignore
+    from tools.import_rules_to_grafana import _parse_duration_seconds  # type: ignore
+
+DASHBOARD_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'grafana'))
+REPORT_PATH = os.path.join(OUT_DIR, 'query_cost_report.json')
+EXPR_DATASOURCE = '__expr__'
+
+DEFAULT_SCRAPE_SECONDS = 15
+DEFAULT_EVAL_SECONDS = 60
+# Grafana 面板未设置 maxDataPoints 时按面板宽度估算，取常见值
+DEFAULT_PANEL_MAX_DATA_POINTS = 1000
+REGEX_PENALTY = 0.25
+
+# 问题阈值
+LONG_SUBQUERY_STEPS = 20
+FINE_RANGE_STEPS = 300
+HIGH_MAX_DATA_POINTS = 10000
+WIDE_FANOUT_LABELS = 5
+
+
+def _grafana_time_seconds(value: Optional[str]) -> Optional[float]:
+    # 'now-6h' -> 21600
+    if not value or not str(value).startswith('now-'):
+        return None
+    return promql.duration_seconds(str(value)[4:])
+
+
+def estimate_expr_cost(node: Any, scrape_seconds: float = DEFAULT_SCRAPE_SECONDS, eval_seconds: float = DEFAULT_EVAL_SECONDS,
+                       variables: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    # 返回单步评估的代价估计与结构特征
+    stats = {
+        'cost': 0.0,
+        'selectors': 0,
+        'regex_matchers': 0,
+        'noop_matchers': 0,
+        'subquery_steps': 0,
+        'max_range_seconds': 0.0,
+        'fanout_labels': 0,
+        'unknown_durations': 0,
+    }
+
+    def dur(text: Optional[str], default: float) -> float:
+        v = promql.duration_seconds(text, variables) if text else None
+        if v is None:
+            if text:
+                stats['unknown_durations'] += 1
+            return default
+        return v
+
+    def selector_cost(vs: promql.VectorSelector) -> float:
+        stats['selectors'] += 1
+        regex = [m for m in vs.matchers if m.op in ('=~', '!~')]
+        stats['regex_matchers'] += len(regex)
+        stats['noop_matchers'] += sum(1 for m in regex if promql.is_noop_matcher(m))
+        return 1.0 + REGEX_PENALTY * len(regex)
+
+    def cost(n: Any) -> float:
+        if isinstance(n, promql.VectorSelector):
+            return selector_cost(n)
+        if isinstance(n, promql.MatrixSelector):
+            rng = dur(n.range, eval_seconds)
+            stats['max_range_seconds'] = max(stats['max_range_seconds'], rng)
+            return selector_cost(n.vector) * max(1.0, rng / scrape_seconds)
+        if isinstance(n, promql.SubqueryExpr):
+            rng = dur(n.range, eval_seconds)
+            step = dur(n.step, eval_seconds) if n.step else eval_seconds
+            steps = max(1, int(rng // max(step, 1)))
+            stats['subquery_steps'] += steps
+            stats['max_range_seconds'] = max(stats['max_range_seconds'], rng)
+            return cost(n.expr) * steps
+        if isinstance(n, promql.AggregateExpr):
+            if n.has_grouping and not n.without:
+                stats['fanout_labels'] = max(stats['fanout_labels'], len(n.grouping))
+        return sum(cost(c) for c in promql.children(n))
+
+    stats['cost'] = round(cost(node), 2)
+    return stats
+
+
+def query_steps(model: Dict[str, Any], range_seconds: float, default_max_points: int) -> Tuple[int, float]:
+    # Grafana 范围查询的步长：max(intervalMs, 区间 / maxDataPoints)，instant 查询只有 1 步
+    if model.get('instant') and not model.get('range'):
+        return 1, 0.0
+    if model.get('range') is False:
+        return 1, 0.0
+    interval_ms = model.get('intervalMs') or 0
+    interval = promql.duration_seconds(model.get('interval')) if model.get('interval') else None
+    max_points = model.get('maxDataPoints') or default_max_points
+    step = max(interval_ms / 1000.0, interval or 0, range_seconds / max_points if max_points else 0, 1.0)
+    return int(range_seconds // step) + 1, step
+
+
+def _issues(stats: Dict[str, Any], steps: int, model: Dict[str, Any]) -> List[str]:
+    issues = []
+    if stats['noop_matchers']:
+        issues.append(f"noop_matchers={stats['noop_matchers']}")
+    if stats['subquery_steps'] >= LONG_SUBQUERY_STEPS:
+        issues.append(f"subquery_steps={stats['subquery_steps']}")
+    if steps >= FINE_RANGE_STEPS:
+        issues.append(f"range_steps={steps}")
+    if (model.get('maxDataPoints') or 0) >= HIGH_MAX_DATA_POINTS:
+        issues.append(f"maxDataPoints={model.get('maxDataPoints')}")
+    if stats['fanout_labels'] >= WIDE_FANOUT_LABELS:
+        issues.append(f"fanout_labels={stats['fanout_labels']}")
+    return issues
+
+
+def _analyze_query(expr: str, model: Dict[str, Any], range_seconds: float, default_max_points: int,
+                   scrape_seconds: float, eval_seconds: float, variables: Dict[str, str]) -> Dict[str, Any]:
+    try:
+        node = promql.parse(expr)
+    except promql.PromQLError as e:
+        return {'error': str(e), 'cost': 0.0, 'issues': ['parse_error']}
+    stats = estimate_expr_cost(node, scrape_seconds, eval_seconds, variables)
+    steps, step = query_steps(model, range_seconds, default_max_points)
+    stats['steps'] = steps
+    stats['step_seconds'] = step
+    stats['issues'] = _issues(stats, steps, model)
+    stats['step_cost'] = stats['cost']
+    stats['cost'] = round(stats['cost'] * steps, 2)
+    return stats
+
+
+def analyze_rule_queries(rule: Dict[str, Any], interval: float = DEFAULT_EVAL_SECONDS,
+                         scrape_seconds: float = DEFAULT_SCRAPE_SECONDS) -> List[Dict[str, Any]]:
+    # 单条规则每次评估发往数据源的查询代价（__expr__ 节点不计）
+    queries = []
+    for q in rule.get('data') or []:
+        model = q.get('model') or {}
+        expr = model.get('expr')
+        if q.get('datasourceUid') == EXPR_DATASOURCE or not isinstance(expr, str):
+            continue
+        rtr = q.get('relativeTimeRange') or {}
+        range_seconds = float((rtr.get('from') or 0) - (rtr.get('to') or 0))
+        variables = {'__interval': f"{int(model.get('intervalMs') or 1000) // 1000 or 1}s"}
+        stats = _analyze_query(expr, model, range_seconds, DEFAULT_PANEL_MAX_DATA_POINTS, scrape_seconds, interval, variables)
+        stats['refId'] = q.get('refId')
+        queries.append(stats)
+    return queries
+
+
+def analyze_rules(instance_dir: str, scrape_seconds: float = DEFAULT_SCRAPE_SECONDS) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    rules_out: List[Dict[str, Any]] = []
+    groups_out: List[Dict[str, Any]] = []
+    for fname, doc in load_named_yaml_files(instance_dir):
+        for g in normalize_groups(doc):
+            interval = _parse_duration_seconds(g.get('interval') or '1m') or DEFAULT_EVAL_SECONDS
+            group_entry = {'file': fname, 'folder': g.get('folder'), 'group': g.get('name'), 'interval_seconds': interval,
+                           'rules': 0, 'queries': 0, 'cost_per_eval': 0.0, 'cost_per_minute': 0.0}
+            for r in g.get('rules') or []:
+                queries = analyze_rule_queries(r, interval, scrape_seconds)
+                cost_eval = round(sum(q['cost'] for q in queries), 2)
+                entry = {
+                    'file': fname,
+                    'folder': g.get('folder'),
+                    'group': g.get('name'),
+                    'uid': r.get('uid'),
+                    'title': r.get('title'),
+                    'queries': queries,
+                    'cost_per_eval': cost_eval,
+                    'cost_per_minute': round(cost_eval * 60.0 / interval, 2),
+                    'issues': sorted({i.split('=')[0] for q in queries for i in q['issues']}),
+                }
+                rules_out.append(entry)
+                group_entry['rules'] += 1
+                group_entry['queries'] += len(queries)
+                group_entry['cost_per_eval'] = round(group_entry['cost_per_eval'] + cost_eval, 2)
+                group_entry['cost_per_minute'] = round(group_entry['cost_per_minute'] + entry['cost_per_minute'], 2)
+            groups_out.append(group_entry)
+    rules_out.sort(key=lambda e: (-e['cost_per_minute'], e['uid'] or ''))
+    groups_out.sort(key=lambda e: (-e['cost_per_minute'], e['group'] or ''))
+    return rules_out, groups_out
+
+
+def iter_panels(dashboard: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    # 含折叠 row 内嵌的 panels
+    for p in dashboard.get('panels') or []:
+        yield p
+        for sub in p.get('panels') or []:
+            yield sub
+
+
+def analyze_dashboard(fname: str, dash: Dict[str, Any], scrape_seconds: float = DEFAULT_SCRAPE_SECONDS) -> List[Dict[str, Any]]:
+    panels_out: List[Dict[str, Any]] = []
+    range_seconds = _grafana_time_seconds((dash.get('time') or {}).get('from')) or 3600
+    for p in iter_panels(dash):
+        targets = [t for t in p.get('targets') or [] if isinstance(t.get('expr'), str) and t.get('expr').strip()]
+        if not targets:
+            continue
+        queries = []
+        for t in targets:
+            model = dict(t)
+            model.setdefault('maxDataPoints', p.get('maxDataPoints'))
+            if not model.get('interval') and p.get('interval'):
+                model['interval'] = p.get('interval')
+            if not model.get('instant'):
+                model.setdefault('range', True)
+            steps, step = query_steps(model, range_seconds, DEFAULT_PANEL_MAX_DATA_POINTS)
+            # $__rate_interval ≈ max(4 × scrape, step + scrape)
+            variables = {
+                '__rate_interval': promql.format_duration(max(4 * scrape_seconds, step + scrape_seconds)),
+                '__interval': promql.format_duration(max(step, 1)),
+                '__range': promql.format_duration(range_seconds),
+            }
+            stats = _analyze_query(t['expr'], model, range_seconds, DEFAULT_PANEL_MAX_DATA_POINTS, scrape_seconds, step or DEFAULT_EVAL_SECONDS, variables)
+            stats['refId'] = t.get('refId')
+            queries.append(stats)
+        panels_out.append({
+            'dashboard': fname,
+            'panel_id': p.get('id'),
+            'title': p.get('title'),
+            'range_seconds': range_seconds,
+            'queries': queries,
+            'cost_per_load': round(sum(q['cost'] for q in queries), 2),
+            'issues': sorted({i.split('=')[0] for q in queries for i in q['issues']}),
+        })
+    return panels_out
+
+
+def analyze_dashboards(dashboard_dir: str, scrape_seconds: float = DEFAULT_SCRAPE_SECONDS) -> List[Dict[str, Any]]:
+    panels_out: List[Dict[str, Any]] = []
+    for fname in sorted(os.listdir(dashboard_dir)):
+        if not fname.endswith('.json'):
+            continue
+        with open(os.path.join(dashboard_dir, fname), 'r', encoding='utf-8') as f:
+            dash = json.load(f)
+        panels_out.extend(analyze_dashboard(fname, dash, scrape_seconds))
+    panels_out.sort(key=lambda e: (-e['cost_per_load'], e['dashboard'], e['panel_id'] or 0))
+    return panels_out
+
+
+def _display_width(s: str) -> int:
+    # 中文等全角字符在终端占两列
+    return sum(2 if unicodedata.east_asian_width(ch) in ('W', 'F') else 1 for ch in s)
+
+
+def _cell(v: Any, width: int) -> str:
+    s = str(v if v is not None else '')
+    if _display_width(s) > width:
+        while _display_width(s) > width - 1:
+            s = s[:-1]
+        s += '…'
+    return s + ' ' * (width - _display_width(s))
+
+
+def print_table(title: str, columns: List[Tuple[str, int]], rows: List[List[Any]]) -> None:
+    print(f"\n== {title} ==")
+    print('  '.join(_cell(name, width) for name, width in columns))
+    print('  '.join('-' * width for _, width in columns))
+    for row in rows:
+        print('  '.join(_cell(v, width) for v, (_, width) in zip(row, columns)).rstrip())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Estimate PromQL evaluation cost for alert rules and dashboards.')
+    parser.add_argument('--instance-dir', default=INSTANCE_DIR, help='Directory of instance YAML files (default: alert/instance)')
+    parser.add_argument('--dashboard-dir', default=DASHBOARD_DIR, help='Directory of dashboard JSON files (default: grafana)')
+    parser.add_argument('--json', dest='json_path', default=REPORT_PATH, help='Machine-readable report output (default: out/query_cost_report.json)')
+    parser.add_argument('--top', type=int, default=20, help='Rows per table in the console report (default: 20)')
+    parser.add_argument('--scrape-interval', default='15s', help='Assumed Prometheus scrape interval (default: 15s)')
+    args = parser.parse_args()
+
+    scrape_seconds = promql.duration_seconds(args.scrape_interval) or DEFAULT_SCRAPE_SECONDS
+    rules, groups = analyze_rules(args.instance_dir, scrape_seconds) if os.path.isdir(args.instance_dir) else ([], [])
+    panels = analyze_dashboards(args.dashboard_dir, scrape_seconds) if os.path.isdir(args.dashboard_dir) else []
+
+    report = {'scrape_interval_seconds': scrape_seconds, 'rule_groups': groups, 'rules': rules, 'panels': panels}
+    os.makedirs(os.path.dirname(os.path.abspath(args.json_path)), exist_ok=True)
+    with open(args.json_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print_table('Rule groups by cost/min', [('cost/min', 12), ('rules', 5), ('queries', 7), ('interval', 8), ('group', 40), ('file', 50)],
+                [[g['cost_per_minute'], g['rules'], g['queries'], f"{g['interval_seconds']}s", g['group'], g['file']] for g in groups[:args.top]])
+    print_table('Rules by cost/min', [('cost/min', 12), ('queries', 7), ('uid', 42), ('issues', 60)],
+                [[r['cost_per_minute'], len(r['queries']), r['uid'], ','.join(r['issues'])] for r in rules[:args.top]])
+    print_table('Dashboard panels by cost/load', [('cost/load', 12), ('queries', 7), ('dashboard', 22), ('panel', 36), ('issues', 50)],
+                [[p['cost_per_load'], len(p['queries']), p['dashboard'], p['title'], ','.join(p['issues'])] for p in panels[:args.top]])
+    print(f"\nWrote report to: {args.json_path}")
+
+
+if __name__ == '__main__':
+    main()
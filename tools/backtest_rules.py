@@ -0,0 +1,1142 @@
+import os
+import re
+import sys
+import json
+import time
+import copy
+import fnmatch
+import argparse
+import itertools
+import warnings
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+except ImportError:
+    # numpy 只有本工具需要，未安装时在 main 中提示
+    np = None
+
+# 告警规则离线回测（向量化）
+# 输入: 录制的时间序列（Prometheus query_range JSON / NDJSON / 本工具保存的 .npz）+ alert/instance/*.yaml
+# 输出: 每条规则（及参数变体）在历史数据上的触发情况：告警次数、触发实例数、触发时长、首末次触发时间（终端表格 + JSON）
+#
+# 所有序列对齐到统一时间网格（步长 --step，默认按数据推断），每个 PromQL 节点求值为 [序列, 时间] 矩阵，
+# 一次算出全部评估时刻；区间函数用滑动窗口视图，rate/increase 按 Prometheus 的外推规则计算。
+# Grafana 表达式（reduce/math/threshold/classic_conditions）在组评估时刻上求值，再按 for 计算 Pending → Firing。
+# PromQL 子树按规范化表达式缓存，参数扫描（--sweep）的各变体共享上游计算，只重算改动的节点。
+
+try:
+    from tools import promql
+    from tools.convert_yaml_to_grafana_json import INSTANCE_DIR, OUT_DIR, load_named_yaml_files, normalize_groups
+    from tools.analyze_query_cost import EXPR_DATASOURCE, DEFAULT_EVAL_SECONDS, print_table
+    from tools.import_rules_to_grafana import _parse_duration_seconds
+except Exception:
+    # 兼容从工具目录直接执行
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    from tools import promql  # type: ignore
+    from tools.convert_yaml_to_grafana_json import INSTANCE_DIR, OUT_DIR, load_named_yaml_files, normalize_groups  # type: ignore
+    from tools.analyze_query_cost import EXPR_DATASOURCE, DEFAULT_EVAL_SECONDS, print_table  # type: ignore
+    from tools.import_rules_to_grafana import _parse_duration_seconds  # type: ignore
+
+REPORT_PATH = os.path.join(OUT_DIR, 'backtest_report.json')
+
+LabelSet = Tuple[Tuple[str, str], ...]
+NAME = '__name__'
+LOOKBACK_SECONDS = 300  # Prometheus 默认 lookback delta
+DEFAULT_RELATIVE_FROM = 600
+MAX_EVENTS = 20
+
+_SIMPLE_FUNCS = {
+    'abs': 'abs', 'ceil': 'ceil', 'floor': 'floor', 'exp': 'exp', 'sqrt': 'sqrt',
+    'ln': 'log', 'log2': 'log2', 'log10': 'log10',
+}
+_OVER_TIME = {'avg_over_time', 'sum_over_time', 'count_over_time', 'max_over_time', 'min_over_time',
+              'stddev_over_time', 'stdvar_over_time', 'last_over_time', 'present_over_time'}
+_AGGREGATES = {'sum', 'avg', 'count', 'max', 'min', 'stddev', 'stdvar', 'group'}
+
+
+class BacktestError(ValueError):
+    pass
+
+
+# ==================== 数据 ====================
+
+class Grid:
+    def __init__(self, start: float, step: float, size: int):
+        self.start = start
+        self.step = step
+        self.size = size
+
+    def times(self):
+        return self.start + self.step * np.arange(self.size)
+
+    def steps(self, seconds: float) -> int:
+        # 时长换算为网格步数（至少 1）
+        return max(1, int(round(seconds / self.step)))
+
+
+class Frame:
+    # 瞬时向量在全部网格时刻上的取值：labels[i] 对应 values[i, :]，缺失为 NaN
+    def __init__(self, labels: List[LabelSet], values):
+        self.labels = labels
+        self.values = values
+
+
+class Scalar:
+    def __init__(self, values):
+        self.values = values
+
+
+class RangeFrame:
+    # 区间向量：每个时刻取最近 window 个网格点（子查询按 stride 抽样）
+    def __init__(self, labels: List[LabelSet], values, window: int, stride: int = 1):
+        self.labels = labels
+        self.values = values
+        self.window = window
+        self.stride = stride
+
+
+class SeriesStore:
+    # 按指标名存放对齐到网格的序列矩阵
+    def __init__(self, grid: Grid, metrics: Dict[str, Tuple[List[LabelSet], Any]]):
+        self.grid = grid
+        self.metrics = metrics
+
+    def __len__(self) -> int:
+        return sum(len(labels) for labels, _ in self.metrics.values())
+
+    def select(self, sel: promql.VectorSelector) -> Frame:
+        if sel.at:
+            raise BacktestError('@ modifier is not supported')
+        names = [sel.name] if sel.name else None
+        checks = []
+        for m in sel.matchers:
+            if m.name == NAME and m.op == '=' and names is None:
+                names = [m.value]
+                continue
+            checks.append((m.name, _matcher_fn(m)))
+        if names is None:
+            names = list(self.metrics)
+        labels_out: List[LabelSet] = []
+        rows = []
+        for name in names:
+            if name not in self.metrics:
+                continue
+            labels, values = self.metrics[name]
+            idx = [i for i, ls in enumerate(labels) if all(fn(dict(ls).get(label, '')) for label, fn in checks)]
+            labels_out.extend(labels[i] for i in idx)
+            rows.append(values[idx])
+        values = np.concatenate(rows) if rows else np.empty((0, self.grid.size))
+        if sel.offset:
+            values = _shift(values, self.grid.steps(promql.duration_seconds(sel.offset) or 0))
+        return Frame(labels_out, values)
+
+    def save(self, path: str) -> None:
+        arrays = {'__grid__': np.array([self.grid.start, self.grid.step, self.grid.size])}
+        meta = {}
+        for i, (name, (labels, values)) in enumerate(sorted(self.metrics.items())):
+            arrays[f'm{i}'] = values
+            meta[f'm{i}'] = [name, [list(map(list, ls)) for ls in labels]]
+        arrays['__meta__'] = np.array(json.dumps(meta, ensure_ascii=False))
+        np.savez_compressed(path, **arrays)
+
+
+def _matcher_fn(m: promql.Matcher):
+    if m.op in ('=~', '!~'):
+        rx = re.compile(f'^(?:{m.value})$')
+        return (lambda v: rx.match(v) is not None) if m.op == '=~' else (lambda v: rx.match(v) is None)
+    return (lambda v: v == m.value) if m.op == '=' else (lambda v: v != m.value)
+
+
+def _iter_recorded(path: str) -> Iterable[Dict[str, Any]]:
+    # query_range 响应 {"data": {"result": [...]}}、结果数组，或每行一个 {"metric": {...}, "values": [[ts, v], ...]}
+    with open(path, 'r', encoding='utf-8') as f:
+        head = f.read(1)
+        f.seek(0)
+        if path.endswith('.json') or head == '[':
+            data = json.load(f)
+            if isinstance(data, dict):
+                data = (data.get('data') or {}).get('result', [])
+            yield from data
+            return
+        for lineno, line in enumerate(f, 1):
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise BacktestError(f'{path}:{lineno}: invalid JSON: {e}')
+
+
+def load_store(paths: Sequence[str], step: Optional[float] = None) -> SeriesStore:
+    if len(paths) == 1 and paths[0].endswith('.npz'):
+        return _load_npz(paths[0])
+    series = []
+    for path in paths:
+        for item in _iter_recorded(path):
+            metric = {str(k): str(v) for k, v in (item.get('metric') or item.get('labels') or {}).items()}
+            points = np.asarray(item.get('values') or [], dtype=float).reshape(-1, 2)
+            if len(points):
+                series.append((tuple(sorted(metric.items())), points))
+    if not series:
+        raise BacktestError('no series found in recorded data')
+    start = min(p[0, 0] for _, p in series)
+    end = max(p[-1, 0] for _, p in series)
+    if step is None:
+        # 取最常见的相邻时间差作为步长
+        deltas = np.concatenate([np.diff(p[:, 0]) for _, p in series if len(p) > 1] or [np.array([60.0])])
+        values, counts = np.unique(np.round(deltas, 3), return_counts=True)
+        step = float(values[np.argmax(counts)])
+    grid = Grid(start, step, int(round((end - start) / step)) + 1)
+    grouped: Dict[str, List[Tuple[LabelSet, Any]]] = {}
+    for labels, points in series:
+        grouped.setdefault(dict(labels).get(NAME, ''), []).append((labels, points))
+    metrics = {}
+    for name, items in grouped.items():
+        values = np.full((len(items), grid.size), np.nan)
+        for i, (_, points) in enumerate(items):
+            cols = np.round((points[:, 0] - start) / step).astype(int)
+            values[i, cols] = points[:, 1]
+        metrics[name] = ([labels for labels, _ in items], values)
+    return SeriesStore(grid, metrics)
+
+
+def _load_npz(path: str) -> SeriesStore:
+    with np.load(path) as data:
+        start, step, size = data['__grid__']
+        meta = json.loads(str(data['__meta__']))
+        metrics = {}
+        for key, (name, labels) in meta.items():
+            metrics[name] = ([tuple(tuple(kv) for kv in ls) for ls in labels], data[key])
+    return SeriesStore(Grid(float(start), float(step), int(size)), metrics)
+
+
+# ==================== 矩阵工具 ====================
+
+def _shift(values, k: int):
+    # 向后平移 k 个网格点（offset）
+    if k <= 0:
+        return values
+    out = np.full_like(values, np.nan)
+    out[:, k:] = values[:, :-k]
+    return out
+
+
+def _last_valid_index(valid):
+    idx = np.where(valid, np.arange(valid.shape[1]), -1)
+    return np.maximum.accumulate(idx, axis=1)
+
+
+def _next_valid_index(valid):
+    size = valid.shape[1]
+    idx = np.where(valid, np.arange(size), size)
+    return np.minimum.accumulate(idx[:, ::-1], axis=1)[:, ::-1]
+
+
+def _lookback(values, limit: int):
+    # 瞬时选择器：取 lookback 内最近的样本
+    valid = ~np.isnan(values)
+    last = _last_valid_index(valid)
+    ok = (last >= 0) & (np.arange(values.shape[1]) - last <= limit)
+    out = np.take_along_axis(values, np.clip(last, 0, None), axis=1)
+    out[~ok] = np.nan
+    return out
+
+
+def _windows(values, window: int, stride: int = 1, fill: float = float('nan')):
+    # [n, T, w'] 滑动窗口视图（左侧用 fill 补齐），子查询按 stride 抽取以当前时刻为终点的样本
+    padded = np.concatenate([np.full((values.shape[0], window - 1), fill, dtype=values.dtype), values], axis=1)
+    view = sliding_window_view(padded, window, axis=1)
+    return view[..., (window - 1) % stride::stride] if stride > 1 else view
+
+
+def _window_count(valid, window: int):
+    csum = np.concatenate([np.zeros((valid.shape[0], 1), dtype=np.int64), np.cumsum(valid, axis=1)], axis=1)
+    end = np.arange(1, valid.shape[1] + 1)
+    return csum[:, end] - csum[:, np.clip(end - window, 0, None)]
+
+
+def _over_time(func: str, rf: RangeFrame):
+    values = rf.values
+    valid = ~np.isnan(values)
+    if rf.stride == 1:
+        count = _window_count(valid, rf.window)
+    else:
+        count = np.add.reduce(_windows(valid.astype(np.int64), rf.window, rf.stride, 0), axis=-1)
+    empty = count == 0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if func == 'count_over_time':
+            out = count.astype(float)
+        elif func == 'present_over_time':
+            out = np.ones(values.shape)
+        elif func == 'max_over_time':
+            out = np.fmax.reduce(_windows(values, rf.window, rf.stride), axis=-1)
+        elif func == 'min_over_time':
+            out = np.fmin.reduce(_windows(values, rf.window, rf.stride), axis=-1)
+        elif func == 'last_over_time':
+            last = _last_valid_index(valid)
+            out = np.take_along_axis(values, np.clip(last, 0, None), axis=1)
+        else:
+            zeroed = np.where(valid, values, 0.0)
+            total = np.add.reduce(_windows(zeroed, rf.window, rf.stride, 0.0), axis=-1)
+            if func == 'sum_over_time':
+                out = total
+            elif func == 'avg_over_time':
+                out = total / count
+            else:
+                mean = total / count
+                sq = np.add.reduce(_windows(zeroed * zeroed, rf.window, rf.stride, 0.0), axis=-1)
+                var = np.maximum(sq / count - mean * mean, 0.0)
+                out = np.sqrt(var) if func == 'stddev_over_time' else var
+    out = np.array(out, dtype=float)
+    out[empty] = np.nan
+    return out
+
+
+def _extrapolated(rf: RangeFrame, step: float, counter: bool, rate: bool):
+    # Prometheus extrapolatedRate：窗口内首末样本差（计数器按重置修正），向窗口边界外推
+    if rf.stride != 1:
+        raise BacktestError('rate/increase/delta over a subquery is not supported')
+    values = rf.values
+    size = values.shape[1]
+    w = rf.window
+    valid = ~np.isnan(values)
+    cols = np.arange(size)
+    last = _last_valid_index(valid)
+    start_col = cols - w + 1
+    first = _next_valid_index(valid)[:, np.clip(start_col, 0, None)]
+    count = _window_count(valid, w)
+    ok = (last >= start_col) & (first <= cols) & (count >= 2)
+
+    if counter:
+        filled = np.take_along_axis(values, np.clip(last, 0, None), axis=1)
+        prev = np.concatenate([filled[:, :1], filled[:, :-1]], axis=1)
+        drops = np.where(valid & (filled < prev), prev, 0.0)
+        corrected = filled + np.cumsum(drops, axis=1)
+    else:
+        corrected = values
+    fi, li = np.clip(first, 0, size - 1), np.clip(last, 0, None)
+    first_value = np.take_along_axis(values, fi, axis=1)
+    result = np.take_along_axis(corrected, li, axis=1) - np.take_along_axis(corrected, fi, axis=1)
+
+    sampled = (last - first) * step
+    with np.errstate(invalid='ignore', divide='ignore'):
+        avg = sampled / (count - 1)
+        to_start = (first - (cols - w)) * step
+        to_end = (cols - last) * step
+        if counter:
+            to_zero = np.where((result > 0) & (first_value >= 0), sampled * (first_value / result), np.inf)
+            to_start = np.minimum(to_start, to_zero)
+        threshold = avg * 1.1
+        extended = sampled + np.where(to_start < threshold, to_start, avg / 2) + np.where(to_end < threshold, to_end, avg / 2)
+        out = result * (extended / sampled)
+        if rate:
+            out = out / (w * step)
+    out[~ok] = np.nan
+    return out
+
+
+def _histogram_quantile(q: float, frame: Frame):
+    groups: Dict[LabelSet, List[Tuple[float, int]]] = {}
+    for i, ls in enumerate(frame.labels):
+        le = dict(ls).get('le')
+        if le is None:
+            continue
+        key = tuple((k, v) for k, v in ls if k not in (NAME, 'le'))
+        groups.setdefault(key, []).append((float(le), i))
+    labels, rows = [], []
+    for key, buckets in groups.items():
+        buckets.sort()
+        bounds = np.array([b for b, _ in buckets])
+        counts = frame.values[[i for _, i in buckets]]  # [k, T] 累积计数
+        if not np.isinf(bounds[-1]):
+            rows.append(np.full(frame.values.shape[1], np.nan))
+            labels.append(key)
+            continue
+        counts = np.fmax.accumulate(counts, axis=0)  # 保证单调
+        total = counts[-1]
+        rank = q * total
+        b = np.argmax(counts >= rank, axis=0)
+        b = np.clip(b, 0, len(bounds) - 1)
+        cols = np.arange(counts.shape[1])
+        upper = bounds[b]
+        lower = np.where(b > 0, bounds[np.clip(b - 1, 0, None)], np.where(bounds[0] > 0, 0.0, bounds[0]))
+        below = np.where(b > 0, counts[np.clip(b - 1, 0, None), cols], 0.0)
+        in_bucket = counts[b, cols] - below
+        with np.errstate(invalid='ignore', divide='ignore'):
+            value = lower + (upper - lower) * ((rank - below) / in_bucket)
+        value = np.where(np.isinf(upper), bounds[-2] if len(bounds) > 1 else np.nan, value)
+        value = np.where((b == 0) & (bounds[0] <= 0), bounds[0], value)
+        value[~(total > 0)] = np.nan
+        if q < 0:
+            value[:] = -np.inf
+        elif q > 1:
+            value[:] = np.inf
+        labels.append(key)
+        rows.append(value)
+    return Frame(labels, np.array(rows) if rows else np.empty((0, frame.values.shape[1])))
+
+
+# ==================== PromQL 求值 ====================
+
+def _drop(ls: LabelSet, names: Iterable[str]) -> LabelSet:
+    names = set(names)
+    return tuple((k, v) for k, v in ls if k not in names)
+
+
+def _keep(ls: LabelSet, names: Iterable[str]) -> LabelSet:
+    names = set(names)
+    return tuple((k, v) for k, v in ls if k in names)
+
+
+def _match_key(ls: LabelSet, matching: Optional[promql.VectorMatching]) -> LabelSet:
+    if matching is None:
+        return _drop(ls, [NAME])
+    return _keep(ls, matching.labels) if matching.on else _drop(ls, list(matching.labels) + [NAME])
+
+
+def _arith(op: str, a, b):
+    with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+        if op == '+':
+            return a + b
+        if op == '-':
+            return a - b
+        if op == '*':
+            return a * b
+        if op == '/':
+            return a / b
+        if op == '%':
+            return np.fmod(a, b)
+        if op == '^':
+            return np.power(a, b)
+        if op == 'atan2':
+            return np.arctan2(a, b)
+        if op == '==':
+            return a == b
+        if op == '!=':
+            return a != b
+        if op == '>':
+            return a > b
+        if op == '<':
+            return a < b
+        if op == '>=':
+            return a >= b
+        if op == '<=':
+            return a <= b
+    raise BacktestError(f'unsupported operator {op}')
+
+
+class Evaluator:
+    # 在网格上求值 PromQL；按规范化表达式缓存结果，供多条规则和参数变体共享
+    def __init__(self, store: SeriesStore):
+        self.store = store
+        self.grid = store.grid
+        self.cache: Dict[str, Any] = {}
+        self.nodes: Dict[str, Any] = {}
+        self.parsed: Dict[str, Any] = {}
+
+    def parse(self, expr: str) -> Any:
+        tree = self.parsed.get(expr)
+        if tree is None:
+            try:
+                tree = self.parsed[expr] = promql.parse(expr)
+            except promql.PromQLError as e:
+                raise BacktestError(str(e))
+        return tree
+
+    def eval(self, node: Any) -> Any:
+        key = promql.canonical_key(node)
+        hit = self.cache.get(key)
+        if hit is None:
+            hit = self._eval(node)
+            self.cache[key] = hit
+        return hit
+
+    def _eval(self, node: Any) -> Any:
+        size = self.grid.size
+        if isinstance(node, promql.NumberLiteral):
+            return Scalar(np.full(size, node.value))
+        if isinstance(node, promql.VectorSelector):
+            frame = self.store.select(node)
+            return Frame(frame.labels, _lookback(frame.values, self.grid.steps(LOOKBACK_SECONDS)))
+        if isinstance(node, promql.MatrixSelector):
+            frame = self.store.select(node.vector)
+            return RangeFrame(frame.labels, frame.values, self.grid.steps(promql.duration_seconds(node.range) or 0))
+        if isinstance(node, promql.SubqueryExpr):
+            inner = self.eval(node.expr)
+            if isinstance(inner, Scalar):
+                raise BacktestError('subquery over a scalar')
+            values = inner.values
+            if node.offset:
+                values = _shift(values, self.grid.steps(promql.duration_seconds(node.offset) or 0))
+            step = promql.duration_seconds(node.step) if node.step else 60.0
+            return RangeFrame(inner.labels, values, self.grid.steps(promql.duration_seconds(node.range) or 0), self.grid.steps(step))
+        if isinstance(node, promql.UnaryExpr):
+            inner = self.eval(node.expr)
+            if node.op == '+':
+                return inner
+            if isinstance(inner, Scalar):
+                return Scalar(-inner.values)
+            return Frame([_drop(ls, [NAME]) for ls in inner.labels], -inner.values)
+        if isinstance(node, promql.Call):
+            return self._call(node)
+        if isinstance(node, promql.AggregateExpr):
+            return self._aggregate(node)
+        if isinstance(node, promql.BinaryExpr):
+            return self._binary(node)
+        raise BacktestError(f'unsupported expression: {type(node).__name__}')
+
+    def _call(self, node: promql.Call) -> Any:
+        func, size = node.func, self.grid.size
+        if func in ('rate', 'increase', 'delta'):
+            rf = self.eval(node.args[0])
+            values = _extrapolated(rf, self.grid.step, counter=func != 'delta', rate=func == 'rate')
+            return Frame([_drop(ls, [NAME]) for ls in rf.labels], values)
+        if func in _OVER_TIME:
+            rf = self.eval(node.args[0])
+            labels = rf.labels if func == 'last_over_time' else [_drop(ls, [NAME]) for ls in rf.labels]
+            return Frame(labels, _over_time(func, rf))
+        if func in _SIMPLE_FUNCS:
+            inner = self.eval(node.args[0])
+            with np.errstate(invalid='ignore', divide='ignore'):
+                return Frame([_drop(ls, [NAME]) for ls in inner.labels], getattr(np, _SIMPLE_FUNCS[func])(inner.values))
+        if func in ('clamp_min', 'clamp_max', 'clamp'):
+            inner = self.eval(node.args[0])
+            bounds = [self.eval(a).values for a in node.args[1:]]
+            values = inner.values
+            if func == 'clamp_min':
+                values = np.fmax(values, bounds[0])
+            elif func == 'clamp_max':
+                values = np.fmin(values, bounds[0])
+            else:
+                values = np.fmin(np.fmax(values, bounds[0]), bounds[1])
+            values = np.where(np.isnan(inner.values), np.nan, values)
+            return Frame([_drop(ls, [NAME]) for ls in inner.labels], values)
+        if func == 'histogram_quantile':
+            q = self.eval(node.args[0])
+            if not isinstance(node.args[0], promql.NumberLiteral):
+                raise BacktestError('histogram_quantile with a non-literal quantile is not supported')
+            return _histogram_quantile(float(q.values[0]), self.eval(node.args[1]))
+        if func == 'vector':
+            return Frame([()], self.eval(node.args[0]).values[None, :].copy())
+        if func == 'scalar':
+            inner = self.eval(node.args[0])
+            return Scalar(inner.values[0].copy() if len(inner.labels) == 1 else np.full(size, np.nan))
+        if func == 'time':
+            return Scalar(self.grid.times())
+        raise BacktestError(f'function {func}() is not supported')
+
+    def _aggregate(self, node: promql.AggregateExpr) -> Frame:
+        if node.op not in _AGGREGATES:
+            raise BacktestError(f'aggregation {node.op} is not supported')
+        inner = self.eval(node.expr)
+        if isinstance(inner, Scalar):
+            raise BacktestError(f'{node.op} over a scalar')
+        keys = [_drop(ls, list(node.grouping) + [NAME]) if node.without else _keep(ls, node.grouping) for ls in inner.labels]
+        order: Dict[LabelSet, int] = {}
+        group_ids = np.array([order.setdefault(k, len(order)) for k in keys], dtype=np.int64)
+        size = inner.values.shape[1]
+        if not order:
+            return Frame([], np.empty((0, size)))
+        # 按组排序后用 reduceat 一次归约所有组
+        rows = np.argsort(group_ids, kind='stable')
+        starts = np.searchsorted(group_ids[rows], np.arange(len(order)))
+        values = inner.values[rows]
+        valid = ~np.isnan(values)
+        zeroed = np.where(valid, values, 0.0)
+        sums = np.add.reduceat(zeroed, starts, axis=0)
+        counts = np.add.reduceat(valid.astype(float), starts, axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if node.op == 'sum':
+                out = sums
+            elif node.op == 'avg':
+                out = sums / counts
+            elif node.op == 'count':
+                out = counts.copy()
+            elif node.op == 'group':
+                out = np.ones_like(sums)
+            elif node.op in ('max', 'min'):
+                out = (np.fmax if node.op == 'max' else np.fmin).reduceat(values, starts, axis=0)
+            else:
+                squares = np.add.reduceat(zeroed * zeroed, starts, axis=0)
+                mean = sums / counts
+                var = np.maximum(squares / counts - mean * mean, 0.0)
+                out = np.sqrt(var) if node.op == 'stddev' else var
+        out = np.array(out, dtype=float)
+        out[counts == 0] = np.nan
+        return Frame(list(order), out)
+
+    def _binary(self, node: promql.BinaryExpr) -> Any:
+        lhs, rhs = self.eval(node.lhs), self.eval(node.rhs)
+        op, matching = node.op, node.matching
+        comparison = op in promql.COMPARISON_OPS
+        keep_name = comparison and not node.bool
+
+        if isinstance(lhs, Scalar) and isinstance(rhs, Scalar):
+            result = _arith(op, lhs.values, rhs.values)
+            return Scalar(result.astype(float) if comparison else result)
+        if isinstance(lhs, Scalar) or isinstance(rhs, Scalar):
+            vector, scalar_left = (rhs, True) if isinstance(lhs, Scalar) else (lhs, False)
+            a = lhs.values[None, :] if scalar_left else lhs.values
+            b = rhs.values if scalar_left else rhs.values[None, :]
+            result = _arith(op, a, b)
+            labels = vector.labels if keep_name else [_drop(ls, [NAME]) for ls in vector.labels]
+            if comparison:
+                result = self._compare(result, vector.values, a, b, node.bool)
+            return Frame(labels, np.array(result, dtype=float))
+
+        if op in promql.SET_OPS:
+            return self._set_op(op, lhs, rhs, matching)
+
+        card = matching.card if matching else ''
+        one, many = (lhs, rhs) if card == 'group_right' else (rhs, lhs)
+        by_key: Dict[LabelSet, int] = {}
+        for j, ls in enumerate(one.labels):
+            by_key.setdefault(_match_key(ls, matching), j)
+        pairs = [(i, by_key[k]) for i, k in ((i, _match_key(ls, matching)) for i, ls in enumerate(many.labels)) if k in by_key]
+        size = self.grid.size
+        if not pairs:
+            return Frame([], np.empty((0, size)))
+        mi = np.array([i for i, _ in pairs])
+        oj = np.array([j for _, j in pairs])
+        many_values, one_values = many.values[mi], one.values[oj]
+        a, b = (one_values, many_values) if card == 'group_right' else (many_values, one_values)
+        result = _arith(op, a, b)
+        if comparison:
+            result = self._compare(result, a, a, b, node.bool)
+        labels = []
+        for i, j in pairs:
+            ls = many.labels[i] if keep_name else _drop(many.labels[i], [NAME])
+            if card:
+                d = dict(ls)
+                partner = dict(one.labels[j])
+                for label in matching.include:
+                    if partner.get(label):
+                        d[label] = partner[label]
+                    else:
+                        d.pop(label, None)
+                ls = tuple(sorted(d.items()))
+            elif matching is not None:
+                ls = _keep(ls, matching.labels) if matching.on else _drop(ls, matching.labels)
+            labels.append(ls)
+        return Frame(labels, np.array(result, dtype=float))
+
+    @staticmethod
+    def _compare(cond, kept, a, b, is_bool: bool):
+        missing = np.isnan(a) | np.isnan(b)
+        if is_bool:
+            out = cond.astype(float)
+        else:
+            out = np.where(cond, kept, np.nan)
+        return np.where(missing, np.nan, out)
+
+    def _set_op(self, op: str, lhs: Frame, rhs: Frame, matching: Optional[promql.VectorMatching]) -> Frame:
+        size = self.grid.size
+
+        def presence(frame: Frame) -> Dict[LabelSet, Any]:
+            out: Dict[LabelSet, Any] = {}
+            for ls, row in zip(frame.labels, frame.values):
+                key = _match_key(ls, matching)
+                present = ~np.isnan(row)
+                out[key] = out[key] | present if key in out else present
+            return out
+
+        if op in ('and', 'unless'):
+            rp = presence(rhs)
+            absent = np.zeros(size, dtype=bool)
+            rows = []
+            for ls, row in zip(lhs.labels, lhs.values):
+                present = rp.get(_match_key(ls, matching), absent)
+                rows.append(np.where(present if op == 'and' else ~present, row, np.nan))
+            return Frame(list(lhs.labels), np.array(rows) if rows else np.empty((0, size)))
+        lp = presence(lhs)
+        absent = np.zeros(size, dtype=bool)
+        labels, rows = list(lhs.labels), list(lhs.values)
+        for ls, row in zip(rhs.labels, rhs.values):
+            labels.append(ls)
+            rows.append(np.where(lp.get(_match_key(ls, matching), absent), np.nan, row))
+        return Frame(labels, np.array(rows) if rows else np.empty((0, size)))
+
+
+# ==================== Grafana 表达式 ====================
+
+_SSE_TOKEN_RE = re.compile(r'\s*(?:(\$\{[^}]+\}|\$[A-Za-z0-9_]+)|(\d+(?:\.\d*)?(?:[eE][-+]?\d+)?|\.\d+)|(\*\*|&&|\|\||==|!=|>=|<=|[-+*/%<>!()])|([A-Za-z_][A-Za-z0-9_]*))')
+_SSE_BINARY = {'||': 1, '&&': 2, '==': 3, '!=': 3, '>': 3, '<': 3, '>=': 3, '<=': 3, '+': 4, '-': 4, '*': 5, '/': 5, '%': 5, '**': 6}
+_SSE_FUNCS = {'abs': 'abs', 'log': 'log', 'ceil': 'ceil', 'floor': 'floor', 'round': 'round'}
+
+
+class SSEFrame:
+    # 表达式节点在评估时刻上的结果：labels[i] 对应 values[i, :]
+    def __init__(self, labels: List[LabelSet], values):
+        self.labels = labels
+        self.values = values
+
+
+def _sse_combine(a: Any, b: Any, fn) -> Any:
+    # 服务端表达式的序列合并：标签集互为子集的两项配对，结果取较大的标签集；两侧各一项时总是配对
+    if not isinstance(a, SSEFrame) and not isinstance(b, SSEFrame):
+        return fn(a, b)
+    if not isinstance(a, SSEFrame):
+        return SSEFrame(b.labels, fn(a, b.values))
+    if not isinstance(b, SSEFrame):
+        return SSEFrame(a.labels, fn(a.values, b))
+    if len(a.labels) == 1 and len(b.labels) == 1:
+        la, lb = a.labels[0], b.labels[0]
+        return SSEFrame([la if len(la) >= len(lb) else lb], fn(a.values, b.values))
+    labels, ia, ib = [], [], []
+    for i, la in enumerate(a.labels):
+        sa = set(la)
+        for j, lb in enumerate(b.labels):
+            sb = set(lb)
+            if sa <= sb or sb <= sa:
+                labels.append(lb if len(lb) > len(la) else la)
+                ia.append(i)
+                ib.append(j)
+    if not labels:
+        return SSEFrame([], np.empty((0, a.values.shape[1])))
+    return SSEFrame(labels, fn(a.values[ia], b.values[ib]))
+
+
+def _sse_apply(op: str, a, b):
+    with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+        missing = np.isnan(a) | np.isnan(b)
+        if op == '&&':
+            out = ((a != 0) & (b != 0)).astype(float)
+        elif op == '||':
+            out = ((a != 0) | (b != 0)).astype(float)
+        elif op == '**':
+            out = np.power(a, b)
+        elif op in promql.COMPARISON_OPS:
+            out = _arith(op, a, b).astype(float)
+        else:
+            out = _arith(op, a, b)
+        return np.where(missing, np.nan, out)
+
+
+def eval_math(expression: str, refs: Dict[str, SSEFrame]) -> Any:
+    tokens = []
+    pos = 0
+    text = expression.strip()
+    while pos < len(text):
+        hit = _SSE_TOKEN_RE.match(text, pos)
+        if not hit or hit.end() == pos:
+            raise BacktestError(f'cannot parse math expression: {expression}')
+        tokens.append(hit.groups())
+        pos = hit.end()
+    tokens.append((None, None, None, None))
+    state = {'i': 0}
+
+    def peek():
+        return tokens[state['i']]
+
+    def take():
+        tok = tokens[state['i']]
+        state['i'] += 1
+        return tok
+
+    def primary():
+        ref, num, op, ident = take()
+        if ref:
+            name = ref.strip('${}')
+            if name not in refs:
+                raise BacktestError(f'math references unknown node {name}')
+            return refs[name]
+        if num:
+            return float(num)
+        if op == '(':
+            value = binary(0)
+            if take()[2] != ')':
+                raise BacktestError(f'missing ) in {expression}')
+            return value
+        if op in ('-', '!'):
+            value = primary()
+            fn = (lambda x: -x) if op == '-' else (lambda x: np.where(np.isnan(x), np.nan, (x == 0).astype(float)))
+            return SSEFrame(value.labels, fn(value.values)) if isinstance(value, SSEFrame) else fn(np.float64(value))
+        if ident and ident in _SSE_FUNCS:
+            if take()[2] != '(':
+                raise BacktestError(f'expected ( after {ident}')
+            value = binary(0)
+            take()
+            fn = getattr(np, _SSE_FUNCS[ident])
+            return SSEFrame(value.labels, fn(value.values)) if isinstance(value, SSEFrame) else fn(value)
+        raise BacktestError(f'unsupported token in math expression: {expression}')
+
+    def binary(min_prec: int):
+        lhs = primary()
+        while True:
+            op = peek()[2]
+            prec = _SSE_BINARY.get(op or '')
+            if not prec or prec < min_prec:
+                return lhs
+            take()
+            rhs = binary(prec if op == '**' else prec + 1)
+            lhs = _sse_combine(lhs, rhs, lambda a, b, op=op: _sse_apply(op, np.asarray(a, dtype=float), np.asarray(b, dtype=float)))
+
+    return binary(0)
+
+
+def _reduce(reducer: str, windows, mode: str, replace_with: float):
+    # windows: [n, Te, w]
+    if mode == 'replaceNN':
+        windows = np.where(np.isnan(windows), replace_with, windows)
+    valid = ~np.isnan(windows)
+    with np.errstate(invalid='ignore', divide='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        if reducer == 'last':
+            idx = np.where(valid, np.arange(windows.shape[-1]), -1).max(axis=-1)
+            out = np.take_along_axis(windows, np.clip(idx, 0, None)[..., None], axis=-1)[..., 0]
+            out[idx < 0] = np.nan
+            return out
+        if reducer == 'count':
+            return valid.sum(axis=-1).astype(float)
+        if reducer == 'sum':
+            return np.where(valid.any(axis=-1), np.nansum(windows, axis=-1), np.nan)
+        if reducer == 'mean':
+            return np.nanmean(windows, axis=-1)
+        if reducer == 'max':
+            return np.nanmax(windows, axis=-1)
+        if reducer == 'min':
+            return np.nanmin(windows, axis=-1)
+    raise BacktestError(f'reducer {reducer} is not supported')
+
+
+def _threshold(evaluator: Dict[str, Any], values):
+    kind = evaluator.get('type')
+    params = [float(p) for p in evaluator.get('params') or [0]]
+    with np.errstate(invalid='ignore'):
+        if kind == 'gt':
+            out = values > params[0]
+        elif kind == 'lt':
+            out = values < params[0]
+        elif kind == 'ge':
+            out = values >= params[0]
+        elif kind == 'le':
+            out = values <= params[0]
+        elif kind == 'eq':
+            out = values == params[0]
+        elif kind == 'ne':
+            out = values != params[0]
+        elif kind == 'within_range':
+            out = (values > min(params[:2])) & (values < max(params[:2]))
+        elif kind == 'outside_range':
+            out = (values < min(params[:2])) | (values > max(params[:2]))
+        else:
+            raise BacktestError(f'threshold type {kind} is not supported')
+    return np.where(np.isnan(values), np.nan, out.astype(float))
+
+
+def eval_rule(rule: Dict[str, Any], evaluator: Evaluator, interval: float) -> Tuple[SSEFrame, Any]:
+    # 返回 (条件节点在评估时刻上的结果, 评估时刻)
+    grid = evaluator.grid
+    stride = grid.steps(interval)
+    offset = int(round(((-grid.start) % interval) / grid.step)) % stride
+    eval_cols = np.arange(offset, grid.size, stride)
+    queries: Dict[str, Tuple[Dict[str, Any], Frame]] = {}
+    nodes: Dict[str, SSEFrame] = {}
+    keys: Dict[str, str] = {}
+    pending = []
+    for q in rule.get('data') or []:
+        model = q.get('model') or {}
+        ref = q.get('refId') or model.get('refId')
+        if q.get('datasourceUid') == EXPR_DATASOURCE:
+            pending.append((ref, model))
+            continue
+        expr = model.get('expr')
+        if not isinstance(expr, str):
+            raise BacktestError(f'query {ref} has no PromQL expr')
+        tree = evaluator.parse(expr)
+        window = {'range': model.get('range'), 'instant': model.get('instant'), 'rtr': q.get('relativeTimeRange')}
+        keys[ref] = f'{promql.canonical_key(tree)}|{interval}|{json.dumps(window, sort_keys=True)}'
+        result = evaluator.eval(tree)
+        if isinstance(result, Scalar):
+            result = Frame([()], result.values[None, :])
+        if isinstance(result, RangeFrame):
+            raise BacktestError(f'query {ref} returns a range vector')
+        frame = Frame([_drop(ls, [NAME]) for ls in result.labels], result.values)
+        queries[ref] = (q, frame)
+        # 未经 reduce 直接引用查询时取评估时刻的值
+        hit = evaluator.nodes.get(keys[ref])
+        if hit is None:
+            hit = evaluator.nodes[keys[ref]] = SSEFrame(frame.labels, frame.values[:, eval_cols])
+        nodes[ref] = hit
+
+    while pending:
+        progressed = False
+        for item in list(pending):
+            ref, model = item
+            kind = model.get('type')
+            deps = _expression_deps(model)
+            if any(d not in nodes for d in deps):
+                continue
+            # 表达式节点按（模型 + 上游节点）缓存，参数变体只重算改动的节点
+            body = {k: v for k, v in model.items() if k not in ('refId', 'datasource', 'intervalMs', 'maxDataPoints', 'hide')}
+            key = json.dumps(body, sort_keys=True, ensure_ascii=False) + '|' + '|'.join(keys[d] for d in deps)
+            hit = evaluator.nodes.get(key)
+            if hit is None:
+                if kind == 'reduce':
+                    hit = _reduce_node(model, deps[0], queries, nodes, eval_cols, grid)
+                elif kind == 'math':
+                    result = eval_math(model.get('expression') or '', nodes)
+                    hit = result if isinstance(result, SSEFrame) else SSEFrame([()], np.full((1, len(eval_cols)), result))
+                elif kind == 'threshold':
+                    conditions = model.get('conditions') or [{}]
+                    hit = SSEFrame(nodes[deps[0]].labels, _threshold(conditions[0].get('evaluator') or {}, nodes[deps[0]].values))
+                elif kind == 'classic_conditions':
+                    hit = _classic(model, nodes, len(eval_cols))
+                elif kind == 'resample':
+                    hit = nodes[deps[0]]
+                else:
+                    raise BacktestError(f'expression type {kind!r} is not supported')
+                evaluator.nodes[key] = hit
+            nodes[ref] = hit
+            keys[ref] = key
+            pending.remove(item)
+            progressed = True
+        if not progressed:
+            raise BacktestError(f"unresolved expression references: {', '.join(r for r, _ in pending)}")
+
+    condition = rule.get('condition')
+    if condition not in nodes:
+        raise BacktestError(f'condition {condition!r} not found')
+    return nodes[condition], grid.times()[eval_cols]
+
+
+def _expression_deps(model: Dict[str, Any]) -> List[str]:
+    if model.get('type') == 'math':
+        return list(dict.fromkeys(re.findall(r'\$\{?([A-Za-z0-9_]+)\}?', model.get('expression') or '')))
+    if model.get('type') == 'classic_conditions':
+        return [((c.get('query') or {}).get('params') or [''])[0] for c in model.get('conditions') or []]
+    return [str(model.get('expression') or '').lstrip('$')]
+
+
+def _reduce_node(model: Dict[str, Any], src: str, queries, nodes, eval_cols, grid: Grid) -> SSEFrame:
+    settings = model.get('settings') or {}
+    mode = settings.get('mode') or ''
+    reducer = model.get('reducer') or 'last'
+    if src in queries:
+        q, frame = queries[src]
+        qm = q.get('model') or {}
+        if qm.get('range') is False or qm.get('instant') is True:
+            window = 1
+        else:
+            rtr = q.get('relativeTimeRange') or {}
+            window = grid.steps(float((rtr.get('from') or DEFAULT_RELATIVE_FROM) - (rtr.get('to') or 0)))
+        view = _windows(frame.values, window)[:, eval_cols, :]
+        values = _reduce(reducer, view, mode, float(settings.get('replaceWithValue') or 0))
+        return SSEFrame(frame.labels, values)
+    inner = nodes[src]
+    return SSEFrame(inner.labels, _reduce(reducer, inner.values[..., None], mode, float(settings.get('replaceWithValue') or 0)))
+
+
+def _classic(model: Dict[str, Any], nodes: Dict[str, SSEFrame], size: int) -> SSEFrame:
+    # 经典条件：每个条件对引用节点的全部序列求值，任一序列满足即满足；条件间按 and/or 顺序合并，只产生一个实例
+    result = None
+    for cond in model.get('conditions') or []:
+        src = ((cond.get('query') or {}).get('params') or [''])[0]
+        frame = nodes[src]
+        hit = _threshold(cond.get('evaluator') or {}, frame.values)
+        value = np.nan_to_num(hit, nan=0.0).max(axis=0) if len(frame.labels) else np.zeros(size)
+        if result is None:
+            result = value
+        elif ((cond.get('operator') or {}).get('type') or 'and') == 'or':
+            result = np.maximum(result, value)
+        else:
+            result = np.minimum(result, value)
+    return SSEFrame([()], (result if result is not None else np.zeros(size))[None, :])
+
+
+def firing_mask(condition, interval: float, for_seconds: float):
+    # 条件连续为真的评估次数 r 满足 (r - 1) * interval >= for 时处于 Firing；NaN（无数据）视为不满足
+    true = np.abs(condition) > 0
+    need = int(np.ceil(for_seconds / interval)) + 1 if for_seconds > 0 else 1
+    if need == 1:
+        return true
+    cols = np.arange(true.shape[1], dtype=np.int32)
+    last_false = np.maximum.accumulate(np.where(true, np.int32(-1), cols), axis=1)
+    return (cols - last_false) >= need
+
+
+def summarize(labels: List[LabelSet], firing, times, interval: float, max_events: int) -> Dict[str, Any]:
+    prev = np.concatenate([np.zeros((firing.shape[0], 1), dtype=bool), firing[:, :-1]], axis=1)
+    starts = firing & ~prev
+    rows, cols = np.nonzero(starts)
+    events = []
+    for r, c in list(zip(rows, cols))[:max_events]:
+        end = np.nonzero(~firing[r, c:])[0]
+        events.append({'labels': dict(labels[r]), 'start': _iso(times[c]),
+                       'end': _iso(times[c + end[0]]) if len(end) else None})
+    fired_cols = np.nonzero(firing.any(axis=0))[0]
+    return {
+        'instances': len(labels),
+        'instances_fired': int(firing.any(axis=1).sum()),
+        'alerts': int(starts.sum()),
+        'firing_minutes': round(float(firing.sum()) * interval / 60.0, 1),
+        'first_fired': _iso(times[fired_cols[0]]) if len(fired_cols) else None,
+        'last_fired': _iso(times[fired_cols[-1]]) if len(fired_cols) else None,
+        'events': events,
+    }
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(float(ts), tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+# ==================== 参数扫描 ====================
+
+def parse_sweep(spec: str) -> Tuple[str, List[str]]:
+    # for=1m,3m | C=10:100:10 | C.1=... | A.100=50,150（替换查询 A 中的数字 100）
+    target, sep, values = spec.partition('=')
+    if not sep or not target or not values:
+        raise BacktestError(f'invalid --sweep (expect TARGET=v1,v2 or TARGET=start:stop:step): {spec}')
+    if ':' in values and target != 'for':
+        try:
+            start, stop, step = (float(v) for v in values.split(':'))
+        except ValueError:
+            raise BacktestError(f'invalid --sweep range (expect start:stop:step): {spec}')
+        if step <= 0:
+            raise BacktestError(f'invalid --sweep step: {spec}')
+        items = [f'{v:g}' for v in np.arange(start, stop + step / 2, step)]
+    else:
+        items = [v for v in values.split(',') if v]
+    return target, items
+
+
+def apply_variant(rule: Dict[str, Any], variant: Dict[str, str]) -> Dict[str, Any]:
+    rule = copy.deepcopy(rule)
+    for target, value in variant.items():
+        if target == 'for':
+            rule['for'] = value
+            continue
+        ref, _, param = target.partition('.')
+        q = next((d for d in rule.get('data') or [] if d.get('refId') == ref), None)
+        model = q.get('model') or {}
+        if q.get('datasourceUid') == EXPR_DATASOURCE:
+            index = int(param or 0)
+            evaluator = (model.get('conditions') or [{}])[0].setdefault('evaluator', {'type': 'gt', 'params': [0]})
+            params = list(evaluator.get('params') or [0])
+            while len(params) <= index:
+                params.append(0)
+            params[index] = float(value)
+            evaluator['params'] = params
+        else:
+            old = float(param)
+            tree = promql.transform(promql.parse(model['expr']),
+                                    lambda n: promql.NumberLiteral(float(value), value) if isinstance(n, promql.NumberLiteral) and n.value == old else None)
+            model['expr'] = promql.format_expr(tree)
+    return rule
+
+
+def _applicable(rule: Dict[str, Any], target: str) -> bool:
+    if target == 'for':
+        return True
+    ref, _, param = target.partition('.')
+    q = next((d for d in rule.get('data') or [] if d.get('refId') == ref), None)
+    if q is None:
+        return False
+    model = q.get('model') or {}
+    if q.get('datasourceUid') == EXPR_DATASOURCE:
+        return model.get('type') == 'threshold'
+    try:
+        old = float(param)
+    except ValueError:
+        return False
+    return any(isinstance(n, promql.NumberLiteral) and n.value == old for n in promql.walk(promql.parse(model.get('expr') or '')))
+
+
+def rule_variants(rule: Dict[str, Any], sweeps: Sequence[Tuple[str, List[str]]]) -> List[Dict[str, str]]:
+    usable = [(t, values) for t, values in sweeps if _applicable(rule, t)]
+    if not usable:
+        return [{}]
+    return [dict(zip([t for t, _ in usable], combo)) for combo in itertools.product(*(values for _, values in usable))]
+
+
+# ==================== 主流程 ====================
+
+def backtest(instance_dir: str, store: SeriesStore, patterns: Sequence[str], sweeps: Sequence[Tuple[str, List[str]]],
+             max_events: int = MAX_EVENTS) -> List[Dict[str, Any]]:
+    evaluator = Evaluator(store)
+    results = []
+    for fname, doc in load_named_yaml_files(instance_dir):
+        for g in normalize_groups(doc):
+            interval = _parse_duration_seconds(g.get('interval') or '1m') or DEFAULT_EVAL_SECONDS
+            for r in g.get('rules') or []:
+                uid = r.get('uid') or ''
+                if patterns and not any(fnmatch.fnmatch(uid, p) for p in patterns):
+                    continue
+                base = {'file': fname, 'group': g.get('name'), 'uid': uid, 'title': r.get('title'), 'interval_seconds': interval}
+                for variant in rule_variants(r, sweeps):
+                    entry = dict(base, variant=variant, **{'for': variant.get('for', r.get('for') or '0m')})
+                    try:
+                        rule = apply_variant(r, variant) if variant else r
+                        condition, times = eval_rule(rule, evaluator, interval)
+                        for_seconds = promql.duration_seconds(entry['for']) or 0
+                        firing = firing_mask(condition.values, interval, for_seconds)
+                        entry.update(summarize(condition.labels, firing, times, interval, max_events))
+                        entry['evaluations'] = int(len(times))
+                    except (BacktestError, promql.PromQLError, KeyError, IndexError) as e:
+                        entry['error'] = str(e)
+                    results.append(entry)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backtest alert rules against recorded time series (NumPy-vectorized).')
+    parser.add_argument('--data', nargs='+', required=True, help='Recorded series: query_range JSON, NDJSON ({"metric","values"} per line) or a saved .npz')
+    parser.add_argument('--step', help='Grid step, e.g. 15s or 1m (default: most common sample spacing)')
+    parser.add_argument('--instance-dir', default=INSTANCE_DIR, help='Directory of instance YAML files (default: alert/instance)')
+    parser.add_argument('--rule', action='append', default=[], help='Rule uid or glob to backtest (repeatable, default: all)')
+    parser.add_argument('--sweep', action='append', default=[], help='Parameter sweep: for=1m,3m | C=10:100:10 | C.1=... | A.100=50,150 (repeatable, cartesian product)')
+    parser.add_argument('--save-npz', help='Save the aligned series to .npz for fast reloading')
+    parser.add_argument('--events', type=int, default=MAX_EVENTS, help=f'Firing events kept per rule/variant in the JSON report (default: {MAX_EVENTS})')
+    parser.add_argument('--json', dest='json_path', default=REPORT_PATH, help='Machine-readable report output (default: out/backtest_report.json)')
+    parser.add_argument('--top', type=int, default=30, help='Rows in the console report (default: 30)')
+    args = parser.parse_args()
+
+    if np is None:
+        print('Error: numpy is required for backtesting (pip install numpy)', file=sys.stderr)
+        sys.exit(2)
+    try:
+        step = promql.duration_seconds(args.step) if args.step else None
+        sweeps = [parse_sweep(s) for s in args.sweep]
+        started = time.perf_counter()
+        store = load_store(args.data, step)
+        loaded = time.perf_counter() - started
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(2)
+    if args.save_npz:
+        store.save(args.save_npz)
+        print(f"Saved aligned series to: {args.save_npz}")
+
+    started = time.perf_counter()
+    results = backtest(args.instance_dir, store, args.rule, sweeps, args.events)
+    elapsed = time.perf_counter() - started
+    grid = store.grid
+    report = {
+        'series': len(store),
+        'grid': {'start': _iso(grid.start), 'step_seconds': grid.step, 'points': grid.size,
+                 'end': _iso(grid.start + grid.step * (grid.size - 1))},
+        'load_seconds': round(loaded, 3),
+        'evaluate_seconds': round(elapsed, 3),
+        'results': results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.json_path)), exist_ok=True)
+    with open(args.json_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    ok = [r for r in results if 'error' not in r]
+    ok.sort(key=lambda r: (-r['alerts'], r['uid'], json.dumps(r['variant'])))
+    print_table('Backtest results by alerts', [('alerts', 6), ('fired', 5), ('inst', 5), ('firing_min', 10), ('for', 4), ('uid', 40), ('variant', 28), ('first_fired', 20)],
+                [[r['alerts'], r['instances_fired'], r['instances'], r['firing_minutes'], r['for'], r['uid'],
+                  ','.join(f'{k}={v}' for k, v in r['variant'].items()), r['first_fired']] for r in ok[:args.top]])
+    for r in results:
+        if 'error' in r:
+            print(f"Warning: {r['uid']}: not evaluated ({r['error']})", file=sys.stderr)
+    print(f"\n{len(store)} series x {grid.size} points (step {grid.step:g}s), {len(results)} rule variants "
+          f"({len(results) - len(ok)} unsupported) evaluated in {elapsed:.2f}s (load {loaded:.2f}s)")
+    print(f"Wrote report to: {args.json_path}")
+
+
+if __name__ == '__main__':
+    main()
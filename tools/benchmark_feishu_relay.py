@@ -0,0 +1,177 @@
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Tuple
+
+import requests
+
+# 飞书转发网关端到端测试：进程内启动本地飞书 webhook 替身（按飞书限频）与 feishu_relay，
+# 按联系点中的 webhook 接收器模拟告警风暴，分别测量 直连（每条通知直接发 webhook）与 经网关 两种方式：
+# 送达的告警数、因限频丢失的告警数、消息数、每个 webhook 每秒最大消息数、告警从通知到送达的延迟。
+# 经网关仍有告警丢失时退出码为 1。
+
+try:
+    from tools.feishu_relay import Relay, load_routes, start_relay, print_totals, DEFAULT_RATE, DEFAULT_BURST, DEFAULT_MAX_ALERTS
+    from tools.mock_feishu_webhook import start_mock_webhook, parse_limits
+    from tools.benchmark_import import percentile
+except Exception:
+    # 兼容从工具目录直接执行
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    from tools.feishu_relay import Relay, load_routes, start_relay, print_totals, DEFAULT_RATE, DEFAULT_BURST, DEFAULT_MAX_ALERTS  # type: ignore
+    from tools.mock_feishu_webhook import start_mock_webhook, parse_limits  # type: ignore
+    from tools.benchmark_import import percentile  # type: ignore
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DEFAULT_CONTACT_POINTS = os.path.join(BASE_DIR, 'alert', 'setting', 'pa')
+DEFAULT_REPORT_PATH = os.path.join(BASE_DIR, 'out', 'benchmark_feishu_relay.json')
+
+
+def synthetic_notification(uid: str, name: str, i: int, alerts_per: int, distinct: int) -> Dict[str, Any]:
+    # Grafana webhook 通知：每条含 alerts_per 条告警，告警 fingerprint 在 distinct 个取值内循环（风暴中同一告警反复通知）
+    now = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f') + '123Z'
+    alerts = []
+    for j in range(alerts_per):
+        n = (i * alerts_per + j) % distinct
+        alerts.append({
+            'status': 'firing',
+            'labels': {'alertname': f'{name} storm', 'instance': f'node-{n:04d}'},
+            'annotations': {'summary': f'{name} storm alert {n}', 'description': f'synthetic alert {n} for {uid}'},
+            'startsAt': now,
+            'endsAt': '0001-01-01T00:00:00Z',
+            'fingerprint': f'{uid}-{n:06d}',
+        })
+    return {'receiver': name, 'status': 'firing', 'groupLabels': {'alertname': f'{name} storm'},
+            'title': f'[FIRING:{len(alerts)}] {name} storm', 'message': f'{len(alerts)} alert(s)', 'alerts': alerts}
+
+
+def run_storm(mode: str, routes: Dict[str, Dict[str, str]], target: str, notifications: int, duration: float,
+              alerts_per: int, distinct: int, workers: int, retry_seconds: float) -> Tuple[Dict[str, float], float]:
+    # 通知按 duration 均匀发出，接收器轮流；返回 (告警键 -> 首次发出时间, 发送耗时)
+    uids = sorted(routes)
+    sess = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=workers)
+    sess.mount('http://', adapter)
+    sent_at: Dict[str, float] = {}
+    start = time.time()
+
+    def send(i: int) -> None:
+        uid = uids[i % len(uids)]
+        payload = synthetic_notification(uid, routes[uid]['name'], i, alerts_per, distinct)
+        delay = start + i * duration / notifications - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        for a in payload['alerts']:
+            sent_at.setdefault(a['fingerprint'], time.time())
+        url = routes[uid]['url'] if mode == 'direct' else f"{target}/hook/{uid}"
+        give_up = time.time() + retry_seconds
+        while True:
+            resp = sess.post(url, json=payload, timeout=10)
+            # 与 Grafana 相同：网关返回 429/503 时按 Retry-After 稍后重试；直连时飞书限频返回 200 + code，Grafana 视为成功，消息丢失
+            if resp.status_code not in (429, 503) or time.time() > give_up:
+                return
+            time.sleep(float(resp.headers.get('Retry-After') or 1))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(send, range(notifications)))
+    return sent_at, time.time() - start
+
+
+def delivered(messages: List[Dict[str, Any]]) -> Dict[str, float]:
+    # 告警键 -> 首次送达时间（流程 webhook 请求体中带 alerts 列表）
+    out: Dict[str, float] = {}
+    for m in messages:
+        for a in (m.get('body') or {}).get('alerts') or []:
+            if a.get('fingerprint'):
+                out.setdefault(a['fingerprint'], m['at'])
+    return out
+
+
+def scenario(mode: str, args: argparse.Namespace, limits) -> Dict[str, Any]:
+    mock = start_mock_webhook(limits=limits)
+    routes = load_routes(args.contact_points, redirect=mock.base_url)
+    if args.receivers:
+        routes = dict(sorted(routes.items())[:args.receivers])
+    relay = server = None
+    if mode == 'relay':
+        relay = Relay(routes, window=args.window, rate=args.rate, burst=args.burst, max_alerts=args.max_alerts, max_queue=args.max_queue)
+        server = start_relay(relay)
+    sent_at, send_seconds = run_storm(mode, routes, server.base_url if server else '', args.notifications, args.duration,
+                                      args.alerts_per, args.distinct, args.workers, args.drain_timeout)
+    left = relay.close(args.drain_timeout) if relay else 0
+    elapsed = time.time() - min(sent_at.values())
+    got = delivered(requests.get(f"{mock.base_url}/_mock/messages", timeout=10).json())
+    stats = requests.get(f"{mock.base_url}/_mock/stats", timeout=10).json()
+    if server:
+        print_totals(relay.totals())
+        server.shutdown()
+        server.server_close()
+    mock.shutdown()
+    mock.server_close()
+    delays = sorted(max(0.0, got[k] - sent_at[k]) for k in got if k in sent_at)
+    return {
+        'mode': mode,
+        'receivers': len(routes),
+        'notifications': args.notifications,
+        'alerts': len(sent_at),
+        'delivered': len(set(got) & set(sent_at)),
+        'lost': len(set(sent_at) - set(got)),
+        'left_in_queue': left,
+        'messages': sum(s['accepted'] for s in stats.values()),
+        'rate_limited': sum(s['limited'] for s in stats.values()),
+        'max_messages_per_second': max((s['max_per_second'] for s in stats.values()), default=0),
+        'send_seconds': round(send_seconds, 3),
+        'total_seconds': round(elapsed, 3),
+        'delay_p50_s': round(percentile(delays, 50), 3) if delays else None,
+        'delay_p95_s': round(percentile(delays, 95), 3) if delays else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end test of feishu_relay.py against a local Feishu webhook stand-in.')
+    parser.add_argument('--contact-points', nargs='+', default=[DEFAULT_CONTACT_POINTS], help='Contact points providing the receivers (default: alert/setting/pa)')
+    parser.add_argument('--receivers', type=int, default=0, help='Use only the first N receivers (default: all)')
+    parser.add_argument('--notifications', type=int, default=600, help='Notifications in the storm (default: 600)')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds over which the notifications are sent (default: 10)')
+    parser.add_argument('--alerts-per', type=int, default=3, help='Alerts per notification (default: 3)')
+    parser.add_argument('--distinct', type=int, default=500, help='Distinct alerts per receiver; repeats exercise coalescing (default: 500)')
+    parser.add_argument('--workers', type=int, default=16, help='Concurrent senders (default: 16)')
+    parser.add_argument('--window', type=float, default=1.0, help='Relay coalescing window in seconds (default: 1)')
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help=f'Relay messages per second per webhook (default: {DEFAULT_RATE})')
+    parser.add_argument('--burst', type=int, default=DEFAULT_BURST, help=f'Relay burst per webhook (default: {DEFAULT_BURST})')
+    parser.add_argument('--max-alerts', type=int, default=DEFAULT_MAX_ALERTS, help=f'Alerts per digest message (default: {DEFAULT_MAX_ALERTS})')
+    parser.add_argument('--max-queue', type=int, default=1000, help='Relay queue size per receiver (default: 1000)')
+    parser.add_argument('--drain-timeout', type=float, default=120.0, help='Seconds to wait for the relay to drain (default: 120)')
+    parser.add_argument('--limit', action='append', metavar='COUNT/SECONDS', help='Stand-in webhook rate limits (default: 5/1 and 100/60)')
+    parser.add_argument('--skip-direct', action='store_true', help='Only run the relay scenario')
+    parser.add_argument('--report', default=DEFAULT_REPORT_PATH, help='JSON report path (default: out/benchmark_feishu_relay.json)')
+    args = parser.parse_args()
+
+    try:
+        limits = parse_limits(args.limit)
+    except argparse.ArgumentTypeError as e:
+        print(str(e), file=sys.stderr)
+        sys.exit(1)
+
+    results = []
+    for mode in (('relay',) if args.skip_direct else ('direct', 'relay')):
+        r = scenario(mode, args, limits)
+        results.append(r)
+        print(f"{mode:<6} receivers={r['receivers']} notifications={r['notifications']} alerts={r['alerts']} "
+              f"delivered={r['delivered']} lost={r['lost']} messages={r['messages']} rate_limited={r['rate_limited']} "
+              f"max_msgs/s={r['max_messages_per_second']} total={r['total_seconds']}s "
+              f"delay p50={r['delay_p50_s']}s p95={r['delay_p95_s']}s")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.report)), exist_ok=True)
+    with open(args.report, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"Wrote report to: {args.report}")
+    if results[-1]['lost']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
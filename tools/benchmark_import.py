@@ -0,0 +1,254 @@
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import tempfile
+import contextlib
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import unquote, urlparse
+
+import yaml
+
+# 导入脚本基准测试：在本地 mock Grafana 上以 100/1k/10k 条合成数据运行
+# import_rules / upsert_rule_groups / import_contact_points / import_notification_policies，
+# 报告请求数、总耗时、吞吐与每次调用的 p50/p99（客户端测量），可与基线 JSON 对比发现性能回退。
+
+try:
+    from tools.import_rules_to_grafana import get_auth_session, import_rules, upsert_rule_groups
+    from tools.import_alert_settings import import_contact_points, import_notification_policies
+    from tools.mock_grafana import MockConfig, match_route, parse_inject, start_mock_server
+except Exception:
+    # 兼容从工具目录直接执行
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    from tools.import_rules_to_grafana import get_auth_session, import_rules, upsert_rule_groups  # type: ignore
+    from tools.import_alert_settings import import_contact_points, import_notification_policies  # type: ignore
+    from tools.mock_grafana import MockConfig, match_route, parse_inject, start_mock_server  # type: ignore
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DEFAULT_REPORT_PATH = os.path.join(BASE_DIR, 'out', 'benchmark_import.json')
+DEFAULT_SIZES = (100, 1000, 10000)
+RULES_PER_GROUP = 20
+GROUPS_PER_FOLDER = 10
+
+
+def synthetic_rules(n: int) -> List[Dict[str, Any]]:
+    # 与转换产物结构一致的 API 规则：Prometheus 查询 + reduce + threshold，每组 20 条、每个文件夹 10 组
+    rules = []
+    for i in range(n):
+        g = i // RULES_PER_GROUP
+        rules.append({
+            'title': f'bench rule {i:05d}',
+            'ruleGroup': f'bench-group-{g:04d}',
+            'folder': f'bench-folder-{g // GROUPS_PER_FOLDER:03d}',
+            'groupInterval': '1m',
+            'noDataState': 'OK',
+            'execErrState': 'Error',
+            'for': '1m',
+            'orgId': 1,
+            'uid': f'bench_rule_{i:05d}',
+            'condition': 'C',
+            'annotations': {'summary': f'bench rule {i}'},
+            'labels': {'severity': 'warning', 'bench': 'true'},
+            'data': [
+                {'refId': 'A', 'relativeTimeRange': {'from': 600, 'to': 0}, 'datasourceUid': 'prometheus',
+                 'model': {'expr': f'sum by(name)(rate(bench_total{{shard="{i % 16}"}}[1m]))', 'intervalMs': 1000,
+                           'maxDataPoints': 43200, 'refId': 'A'}},
+                {'refId': 'B', 'relativeTimeRange': {'to': 0}, 'datasourceUid': '__expr__',
+                 'model': {'expression': 'A', 'reducer': 'last', 'type': 'reduce', 'refId': 'B'}},
+                {'refId': 'C', 'relativeTimeRange': {'to': 0}, 'datasourceUid': '__expr__',
+                 'model': {'expression': 'B', 'type': 'threshold', 'refId': 'C',
+                           'conditions': [{'evaluator': {'params': [10], 'type': 'gt'}}]}},
+            ],
+        })
+    return rules
+
+
+def synthetic_contact_points(n: int) -> Dict[str, Any]:
+    return {'apiVersion': 1, 'contactPoints': [
+        {'orgId': 1, 'name': f'bench-cp-{i:05d}', 'receivers': [
+            {'uid': f'bench_cp_{i:05d}', 'type': 'webhook', 'settings': {'url': f'http://127.0.0.1/hook/{i}'},
+             'disableResolveMessage': False}]}
+        for i in range(n)]}
+
+
+def synthetic_policies(n: int) -> Dict[str, Any]:
+    routes = [{'receiver': f'bench-cp-{i:05d}', 'object_matchers': [['bench_route', '=', str(i)]], 'continue': False}
+              for i in range(n)]
+    return {'apiVersion': 1, 'policies': [{'orgId': 1, 'receiver': 'bench-cp-00000', 'group_by': ['alertname'], 'routes': routes}]}
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    # 最近秩法（与 http_metrics 的分位数一致）：不小于 p% 样本的最小值
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(p / 100.0 * len(sorted_values)) - 1)]
+
+
+class CallRecorder:
+    # 通过 requests 响应钩子记录每次调用的耗时（发送请求到解析完响应头），按 METHOD route 分类
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[int, int] = defaultdict(int)
+
+    def hook(self, resp, *args, **kwargs):
+        route, _ = match_route(unquote(urlparse(resp.request.url).path))
+        self.samples[f"{resp.request.method} {route}"].append(resp.elapsed.total_seconds())
+        self.statuses[resp.status_code] += 1
+        return resp
+
+    def summary(self) -> Dict[str, Any]:
+        all_values = sorted(v for values in self.samples.values() for v in values)
+        per_call = {}
+        for key, values in sorted(self.samples.items()):
+            values = sorted(values)
+            per_call[key] = {'count': len(values), 'p50_ms': round(percentile(values, 50) * 1000, 3),
+                             'p99_ms': round(percentile(values, 99) * 1000, 3)}
+        return {'requests': len(all_values), 'p50_ms': round(percentile(all_values, 50) * 1000, 3),
+                'p99_ms': round(percentile(all_values, 99) * 1000, 3), 'per_call': per_call,
+                'statuses': {str(k): v for k, v in sorted(self.statuses.items())}}
+
+
+def run_scenario(name: str, size: int, server, fn: Callable[[Any, str], None], reset: bool = True) -> Dict[str, Any]:
+    # 每个场景使用新的 Session（连接池与钩子独立）；reset=False 用于在已有数据上重跑（更新路径）
+    if reset:
+        with server.state.lock:
+            server.state.reset()
+    recorder = CallRecorder()
+    session = get_auth_session(server.base_url, 'admin', 'admin', pool_size=32)
+    session.hooks['response'].append(recorder.hook)
+    server_before = len(server.state.calls)
+    started = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        fn(session, server.base_url)
+    wall = time.perf_counter() - started
+    session.close()
+    result = {'scenario': name, 'size': size, 'wall_s': round(wall, 3)}
+    result.update(recorder.summary())
+    # 客户端只看到重试后的最终响应；服务端计数包含 429 等被 urllib3 自动重试的请求
+    result['server_requests'] = len(server.state.calls) - server_before
+    result['req_per_s'] = round(result['requests'] / wall, 1) if wall else 0.0
+    return result
+
+
+def run_benchmarks(sizes: List[int], config: MockConfig, workers: int = 1,
+                   scenarios: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    server = start_mock_server(config)
+    results: List[Dict[str, Any]] = []
+    selected = set(scenarios or ['import_rules', 'import_rules_rerun', 'upsert_rule_groups',
+                                 'import_contact_points', 'import_notification_policies'])
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for n in sizes:
+                rules = synthetic_rules(n)
+                cp_path = os.path.join(tmp, f'contact-points-{n}.yaml')
+                np_path = os.path.join(tmp, f'policies-{n}.yaml')
+                with open(cp_path, 'w', encoding='utf-8') as f:
+                    yaml.safe_dump(synthetic_contact_points(n), f, sort_keys=False)
+                with open(np_path, 'w', encoding='utf-8') as f:
+                    yaml.safe_dump(synthetic_policies(n), f, sort_keys=False)
+
+                if 'import_rules' in selected or 'import_rules_rerun' in selected:
+                    results.append(run_scenario('import_rules', n, server,
+                                                lambda s, u: import_rules(s, u, rules, workers=workers)))
+                    if 'import_rules_rerun' in selected:
+                        # 所有 uid 已存在：POST 409 后转 PUT，衡量更新路径
+                        results.append(run_scenario('import_rules_rerun', n, server,
+                                                    lambda s, u: import_rules(s, u, rules, workers=workers), reset=False))
+                if 'upsert_rule_groups' in selected:
+                    results.append(run_scenario('upsert_rule_groups', n, server,
+                                                lambda s, u: upsert_rule_groups(s, u, rules, workers=workers)))
+                if 'import_contact_points' in selected:
+                    results.append(run_scenario('import_contact_points', n, server,
+                                                lambda s, u: import_contact_points(s, u, cp_path)))
+                if 'import_notification_policies' in selected:
+                    results.append(run_scenario('import_notification_policies', n, server,
+                                                lambda s, u: import_notification_policies(s, u, np_path)))
+                print(f"Finished size {n}", file=sys.stderr)
+    finally:
+        server.shutdown()
+        server.server_close()
+    return results
+
+
+def print_report(results: List[Dict[str, Any]], verbose: bool = False) -> None:
+    header = (f"{'scenario':<30} {'size':>6} {'requests':>9} {'server':>9} {'wall_s':>9} {'req/s':>9} "
+              f"{'p50_ms':>9} {'p99_ms':>9}")
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        print(f"{r['scenario']:<30} {r['size']:>6} {r['requests']:>9} {r['server_requests']:>9} {r['wall_s']:>9.3f} "
+              f"{r['req_per_s']:>9.1f} {r['p50_ms']:>9.3f} {r['p99_ms']:>9.3f}")
+        if verbose:
+            for key, c in r['per_call'].items():
+                print(f"    {key:<34} {c['count']:>9} {'':>9} {'':>9} {'':>9} {c['p50_ms']:>9.3f} {c['p99_ms']:>9.3f}")
+
+
+def compare_baseline(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], tolerance: float) -> List[str]:
+    # 总耗时超过基线 (1 + tolerance) 倍，或请求数增加，视为回退
+    base = {(b['scenario'], b['size']): b for b in baseline}
+    problems = []
+    for r in results:
+        b = base.get((r['scenario'], r['size']))
+        if not b:
+            continue
+        if r['requests'] > b['requests']:
+            problems.append(f"{r['scenario']} size={r['size']}: requests {b['requests']} -> {r['requests']}")
+        if b['wall_s'] and r['wall_s'] > b['wall_s'] * (1 + tolerance):
+            problems.append(f"{r['scenario']} size={r['size']}: wall {b['wall_s']:.3f}s -> {r['wall_s']:.3f}s "
+                            f"(+{(r['wall_s'] / b['wall_s'] - 1) * 100:.0f}%)")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the import tools against a local mock Grafana.')
+    parser.add_argument('--sizes', default=','.join(str(s) for s in DEFAULT_SIZES), help='Comma-separated rule counts (default: 100,1000,10000)')
+    parser.add_argument('--scenarios', help='Comma-separated subset: import_rules,import_rules_rerun,upsert_rule_groups,'
+                                            'import_contact_points,import_notification_policies')
+    parser.add_argument('--workers', type=int, default=1, help='Workers passed to import_rules/upsert_rule_groups (default: 1)')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Mock server latency per request')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='Mock server latency jitter per request')
+    parser.add_argument('--inject', action='append', default=[], metavar='STATUS=RATE', help='Mock fault injection, e.g. 429=0.01 (repeatable)')
+    parser.add_argument('--visibility-delay', type=float, default=0.0, help='Mock eventual-visibility delay for new rules (seconds)')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed for jitter and fault injection (default: 1)')
+    parser.add_argument('--out', default=DEFAULT_REPORT_PATH, help='JSON report path (default: out/benchmark_import.json)')
+    parser.add_argument('--baseline', help='Previous JSON report; exit 1 if any scenario regressed')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed wall-time increase over baseline (default: 0.25)')
+    parser.add_argument('--verbose', action='store_true', help='Print per-call p50/p99 for every endpoint')
+    args = parser.parse_args()
+
+    try:
+        sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+        inject = parse_inject(args.inject)
+    except (ValueError, argparse.ArgumentTypeError) as e:
+        print(f"Invalid arguments: {e}", file=sys.stderr)
+        sys.exit(1)
+    scenarios = [s.strip() for s in args.scenarios.split(',')] if args.scenarios else None
+
+    config = MockConfig(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, inject=inject,
+                        visibility_delay=args.visibility_delay, seed=args.seed)
+    results = run_benchmarks(sizes, config, workers=max(1, args.workers), scenarios=scenarios)
+    print_report(results, verbose=args.verbose)
+
+    report = {'config': {'sizes': sizes, 'workers': args.workers, 'latency_ms': args.latency_ms, 'jitter_ms': args.jitter_ms,
+                         'inject': {str(k): v for k, v in inject.items()}, 'visibility_delay': args.visibility_delay},
+              'results': results}
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Wrote benchmark report to: {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            problems = compare_baseline(results, json.load(f).get('results', []), args.tolerance)
+        for p in problems:
+            print(f"Regression: {p}", file=sys.stderr)
+        if problems:
+            sys.exit(1)
+        print('No regressions against baseline')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,16 @@
 import os
 import sys
 import json
+import argparse
 import yaml
-from typing import Any, Dict, List
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    from tools.yaml_loader import DEFAULT_CACHE_DIR, load_yaml_file, load_yaml_paths
+except Exception:
+    # 兼容从工具目录直接执行
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    from tools.yaml_loader import DEFAULT_CACHE_DIR, load_yaml_file, load_yaml_paths  # type: ignore
 
 # 输入目录: c:\work\project\grafana\alert\instance
 # 输出文件: c:\work\project\grafana\out\provisioning_rules.json (file provisioning 格式)
@@ -21,19 +29,21 @@ def ensure_out_dir():
     os.makedirs(OUT_DIR, exist_ok=True)
 
 
-def load_yaml_files(directory: str) -> List[Dict[str, Any]]:
-    docs = []
-    for fname in sorted(os.listdir(directory)):
-        if not fname.endswith('.yaml') and not fname.endswith('.yml'):
-            continue
-        path = os.path.join(directory, fname)
-        with open(path, 'r', encoding='utf-8') as f:
-            try:
-                docs.append(yaml.safe_load(f))
-            except Exception as e:
-                print(f"YAML parse error in {fname}: {e}", file=sys.stderr)
-                raise
-    return docs
+def load_named_yaml_files(directory: str, cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+                          workers: Optional[int] = None) -> List[Tuple[str, Dict[str, Any]]]:
+    # 返回 (文件名, 文档)，按文件名排序；解析走 C 加速 + 并行 + 磁盘缓存（见 yaml_loader.py）
+    names = [f for f in sorted(os.listdir(directory)) if f.endswith('.yaml') or f.endswith('.yml')]
+    try:
+        docs = load_yaml_paths([os.path.join(directory, f) for f in names], cache_dir=cache_dir, workers=workers)
+    except yaml.YAMLError as e:
+        print(f"YAML parse error in {e}", file=sys.stderr)
+        raise
+    return list(zip(names, docs))
+
+
+def load_yaml_files(directory: str, cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+                    workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    return [doc for _, doc in load_named_yaml_files(directory, cache_dir=cache_dir, workers=workers)]
 
 
 def normalize_groups(doc: Dict[str, Any]) -> List[Dict[str, Any]]:
@@ -69,9 +79,8 @@ def to_file_provisioning(groups: List[Dict[str, Any]]) -> Dict[str, Any]:
     return { 'apiVersion': 1, 'groups': result_groups }
 
 
-def to_api_rules(groups: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def iter_api_rules(groups: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
     # 将 provisioning 组展开为 API 可用的逐条规则（POST /api/v1/provisioning/alert-rules）
-    api_rules: List[Dict[str, Any]] = []
     for g in groups:
         if not g:
             continue
@@ -80,7 +89,7 @@ def to_api_rules(groups: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         group_interval = g.get('interval') or '60s'
         rules = g.get('rules') or []
         for r in rules:
-            api_rules.append({
+            yield {
                 'title': r.get('title') or r.get('uid') or 'Unnamed',
                 'ruleGroup': rule_group,
                 'folder': folder,  # 临时字段，后续脚本会把 folder 名称映射成 folderUID
@@ -94,17 +103,127 @@ def to_api_rules(groups: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
                 'annotations': r.get('annotations', {}),
                 'labels': r.get('labels', {}),
                 'data': r.get('data', []),
-            })
-    return api_rules
+            }
+
+
+def to_api_rules(groups: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return list(iter_api_rules(groups))
+
+
+def iter_instance_groups(directory: str, cache_dir: Optional[str] = DEFAULT_CACHE_DIR) -> Iterator[Dict[str, Any]]:
+    # 逐个文件加载并产出组，任一时刻只持有一个文件的文档
+    for fname in sorted(os.listdir(directory)):
+        if not fname.endswith('.yaml') and not fname.endswith('.yml'):
+            continue
+        try:
+            doc = load_yaml_file(os.path.join(directory, fname), cache_dir=cache_dir)
+        except yaml.YAMLError as e:
+            print(f"YAML parse error in {fname}: {e}", file=sys.stderr)
+            raise
+        for g in normalize_groups(doc):
+            yield g
+
+
+def write_ndjson(rules: Iterable[Dict[str, Any]], out: IO[str]) -> int:
+    # 每条规则一行紧凑 JSON；每个组写完后 flush，使管道下游（导入脚本）可以立即开始上传
+    count = 0
+    group = None
+    for r in rules:
+        key = (r['folder'], r['ruleGroup'])
+        if group is not None and key != group:
+            out.flush()
+        group = key
+        out.write(json.dumps(r, ensure_ascii=False, separators=(',', ':')) + '\n')
+        count += 1
+    out.flush()
+    return count
 
 
 def main():
+    parser = argparse.ArgumentParser(description='Convert alert instance YAML into Grafana provisioning / API rule JSON.')
+    parser.add_argument('--instance-dir', default=INSTANCE_DIR, help='Directory of instance YAML files (default: alert/instance)')
+    parser.add_argument('--dedup-queries', action='store_true',
+                        help='Hoist PromQL sub-expressions shared within a rule into one query and rebuild derived values with math expressions')
+    parser.add_argument('--rebalance-groups', nargs='?', const='auto', metavar='BUDGET',
+                        help='Split rule groups whose estimated cost per evaluation exceeds BUDGET (default: the most expensive single rule)')
+    parser.add_argument('--increase-intervals', action='store_true',
+                        help="With --rebalance-groups, lengthen split groups' intervals by 10s steps where every rule's 'for' allows it")
+    parser.add_argument('--no-cache', action='store_true', help='Parse every file without reading or writing the YAML parse cache')
+    parser.add_argument('--workers', type=int, default=None, help='Parser processes for changed files (default: CPU count)')
+    parser.add_argument('--ndjson', metavar='PATH',
+                        help="Stream API rules as NDJSON to PATH ('-' for stdout) instead of writing the two JSON files")
+    args = parser.parse_args()
+    cache_dir = None if args.no_cache else DEFAULT_CACHE_DIR
+
+    if args.dedup_queries:
+        # 仅应用通过等价性校验的改写，其余规则保持原样
+        try:
+            from tools.dedup_rule_queries import dedup_groups, summarize
+        except Exception:
+            sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+            from tools.dedup_rule_queries import dedup_groups, summarize  # type: ignore
+
+    if args.rebalance_groups:
+        # 拆分超出代价预算的规则组（见 rebalance_rule_groups.py）
+        try:
+            from tools.rebalance_rule_groups import rebalance_groups, summarize as summarize_rebalance
+        except Exception:
+            sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+            from tools.rebalance_rule_groups import rebalance_groups, summarize as summarize_rebalance  # type: ignore
+        try:
+            budget = None if args.rebalance_groups == 'auto' else float(args.rebalance_groups)
+        except ValueError:
+            parser.error(f"--rebalance-groups: invalid budget {args.rebalance_groups!r}")
+        if budget is None and args.ndjson:
+            # 流式模式下无法预先得到全部规则的最大代价
+            parser.error('--rebalance-groups with --ndjson requires an explicit BUDGET')
+
+    if args.ndjson:
+        # 流式模式：逐文件、逐组转换并立即输出，内存占用与规则总数无关；
+        # 输出到 stdout 时提示信息写 stderr，避免混入数据流
+        reports: List[Dict[str, Any]] = []
+        rebalance_reports: List[Dict[str, Any]] = []
+
+        def groups_iter() -> Iterator[Dict[str, Any]]:
+            for g in iter_instance_groups(args.instance_dir, cache_dir=cache_dir):
+                if args.dedup_queries:
+                    deduped, group_reports = dedup_groups([g])
+                    reports.extend(group_reports)
+                    g = deduped[0]
+                if args.rebalance_groups:
+                    parts, group_reports = rebalance_groups([g], budget, increase_intervals=args.increase_intervals)
+                    rebalance_reports.extend(group_reports)
+                    yield from parts
+                    continue
+                yield g
+
+        if args.ndjson == '-':
+            count = write_ndjson(iter_api_rules(groups_iter()), sys.stdout)
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(args.ndjson)), exist_ok=True)
+            with open(args.ndjson, 'w', encoding='utf-8') as f:
+                count = write_ndjson(iter_api_rules(groups_iter()), f)
+        if args.dedup_queries:
+            print(summarize(reports), file=sys.stderr)
+        if args.rebalance_groups:
+            print(summarize_rebalance(rebalance_reports), file=sys.stderr)
+        print(f"Streamed {count} API rules to: {'stdout' if args.ndjson == '-' else args.ndjson}", file=sys.stderr)
+        return
+
     ensure_out_dir()
-    docs = load_yaml_files(INSTANCE_DIR)
+    docs = load_yaml_files(args.instance_dir, cache_dir=cache_dir, workers=args.workers)
     all_groups: List[Dict[str, Any]] = []
     for d in docs:
         all_groups.extend(normalize_groups(d))
 
+    if args.dedup_queries:
+        all_groups, reports = dedup_groups(all_groups)
+        print(summarize(reports))
+
+    if args.rebalance_groups:
+        all_groups, rebalance_reports = rebalance_groups(all_groups, budget, increase_intervals=args.increase_intervals)
+        print(summarize_rebalance(rebalance_reports))
+
     # 生成 file provisioning JSON
     file_prov = to_file_provisioning(all_groups)
     with open(FILE_PROVISION_PATH, 'w', encoding='utf-8') as f:
@@ -0,0 +1,337 @@
+import os
+import sys
+import copy
+import json
+import argparse
+from collections import defaultdict
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple, Union
+
+# 规则内查询去重：把同一条规则 data 中重复的 PromQL 子表达式提升为一个 Prometheus 查询，
+# 派生值改由 Grafana __expr__ math 节点计算，减少每次评估发往数据源的查询数。
+#
+# 只做可证明等价的改写：
+#   - 查询顶层“外壳”只能由 + - * /、一元负号、abs/ceil/floor/ln 以及数字常量构成；
+#   - 向量间运算两侧必须有相同的标签集合（同一 by() 分组的聚合，或与常量运算），
+#     此时 PromQL 一对一匹配与 SSE math 按标签连接的结果相同；
+#   - and/or/unless、比较运算（过滤语义）、on()/ignoring()、bool 等无法在 math 中等价表达，保持原样；
+#   - 引用的查询必须与原查询评估设置（数据源、relativeTimeRange、步长等）完全一致。
+# 等价性校验：把 math 表达式中的 $ref 代回对应 PromQL 后，与原表达式规范化文本逐字相等。
+
+try:
+    from tools import promql
+    from tools.convert_yaml_to_grafana_json import INSTANCE_DIR, load_named_yaml_files, normalize_groups
+except Exception:
+    # 兼容从工具目录直接执行
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    from tools import promql  # type: ignore
+    from tools.convert_yaml_to_grafana_json import INSTANCE_DIR, load_named_yaml_files, normalize_groups  # type: ignore
+
+EXPR_DATASOURCE = '__expr__'
+MATH_OPS = {'+', '-', '*', '/'}
+# PromQL 函数 -> SSE math 函数
+MATH_FUNCS = {'abs': 'abs', 'ceil': 'ceil', 'floor': 'floor', 'ln': 'log'}
+# 输出标签集合与（首个向量）参数相同的函数（仅去掉 __name__）
+_LABEL_PRESERVING_FUNCS = (promql.RANGE_FUNCTIONS - {'absent_over_time'}) | {
+    'abs', 'ceil', 'floor', 'round', 'ln', 'log2', 'log10', 'exp', 'sqrt', 'clamp', 'clamp_min', 'clamp_max',
+}
+# 输出标签集合不等于 by() 标签的聚合
+_NON_GROUPING_AGGS = {'topk', 'bottomk', 'count_values', 'limitk', 'limit_ratio'}
+# 查询评估设置中与结果无关的字段
+_SETTINGS_IGNORED = {'expr', 'refId', 'legendFormat', 'hide', 'editorMode'}
+
+Signature = Union[str, FrozenSet[str], None]
+
+
+def label_signature(node: Any) -> Signature:
+    # 能静态确定的输出标签集合：'scalar' / frozenset(labels) / None（未知）
+    if isinstance(node, promql.NumberLiteral):
+        return 'scalar'
+    if isinstance(node, promql.AggregateExpr):
+        if node.op in _NON_GROUPING_AGGS or node.without:
+            return None
+        return frozenset(node.grouping)
+    if isinstance(node, promql.UnaryExpr):
+        return label_signature(node.expr)
+    if isinstance(node, promql.Call) and node.func in _LABEL_PRESERVING_FUNCS and node.args:
+        arg = node.args[0]
+        if isinstance(arg, promql.SubqueryExpr):
+            arg = arg.expr
+        sig = label_signature(arg)
+        return sig if sig != 'scalar' else None
+    if isinstance(node, promql.BinaryExpr) and _is_math_binary(node):
+        lhs, rhs = label_signature(node.lhs), label_signature(node.rhs)
+        if lhs is None or rhs is None:
+            return None
+        if lhs == 'scalar':
+            return rhs
+        if rhs == 'scalar' or lhs == rhs:
+            return lhs
+    return None
+
+
+def _is_math_binary(node: promql.BinaryExpr) -> bool:
+    return node.op in MATH_OPS and not node.bool and node.matching is None
+
+
+def is_translatable(node: Any) -> bool:
+    # 该节点本身可以由 SSE math 等价计算（子节点可为任意已知标签集合的查询）
+    if isinstance(node, promql.BinaryExpr):
+        return _is_math_binary(node) and label_signature(node) is not None
+    if isinstance(node, promql.UnaryExpr):
+        return node.op == '-' and label_signature(node) is not None
+    if isinstance(node, promql.Call):
+        return node.func in MATH_FUNCS and len(node.args) == 1 and label_signature(node) is not None
+    return False
+
+
+def shell_leaves(node: Any) -> List[Any]:
+    # 可翻译外壳下的叶子（需要由 Prometheus 计算的子表达式），数字常量不算叶子
+    if isinstance(node, promql.NumberLiteral):
+        return []
+    if is_translatable(node):
+        out: List[Any] = []
+        for c in promql.children(node):
+            out.extend(shell_leaves(c))
+        return out
+    return [node]
+
+
+def to_math(node: Any, refs: Dict[str, str]) -> Any:
+    # 叶子替换为 $ref 占位，函数名映射为 SSE math 名称
+    def fn(n: Any) -> Optional[Any]:
+        if isinstance(n, promql.NumberLiteral):
+            return n
+        key = promql.canonical_key(n)
+        if key in refs and not is_translatable(n):
+            return promql.VectorSelector('$' + refs[key])
+        return None
+    out = promql.transform(node, fn)
+
+    def rename(n: Any) -> Optional[Any]:
+        if isinstance(n, promql.Call) and n.func in MATH_FUNCS:
+            return promql.Call(MATH_FUNCS[n.func], tuple(promql.transform(a, rename) for a in n.args))
+        return None
+    return promql.transform(out, rename)
+
+
+def substitute_back(math_node: Any, ref_exprs: Dict[str, Any]) -> Any:
+    reverse = {v: k for k, v in MATH_FUNCS.items()}
+
+    def fn(n: Any) -> Optional[Any]:
+        if isinstance(n, promql.VectorSelector) and n.name and n.name.startswith('$'):
+            return ref_exprs[n.name[1:]]
+        if isinstance(n, promql.Call) and n.func in reverse:
+            return promql.Call(reverse[n.func], tuple(promql.transform(a, fn) for a in n.args))
+        return None
+    return promql.transform(math_node, fn)
+
+
+def _settings_key(q: Dict[str, Any]) -> str:
+    model = {k: v for k, v in (q.get('model') or {}).items() if k not in _SETTINGS_IGNORED}
+    return json.dumps({'datasourceUid': q.get('datasourceUid'), 'relativeTimeRange': q.get('relativeTimeRange'),
+                       'queryType': q.get('queryType'), 'model': model}, sort_keys=True, ensure_ascii=False)
+
+
+def _new_ref_id(used: set) -> str:
+    i = 1
+    while f"H{i}" in used:
+        i += 1
+    used.add(f"H{i}")
+    return f"H{i}"
+
+
+def _describe(node: Any) -> str:
+    if isinstance(node, promql.BinaryExpr):
+        mod = ' bool' if node.bool else (' on/ignoring' if node.matching is not None else '')
+        return f"`{node.op}{mod}`"
+    if isinstance(node, promql.Call):
+        return f"`{node.func}()`"
+    if isinstance(node, promql.AggregateExpr):
+        return f"`{node.op}` aggregation"
+    return type(node).__name__
+
+
+def _skip_reason(parsed: Dict[str, Tuple[Dict[str, Any], Any, str]]) -> str:
+    # 存在重复子表达式但被不可翻译的运算符挡住时，指出阻断位置，便于作者调整写法
+    seen: Dict[Tuple[str, str], int] = defaultdict(int)
+    for q, node, settings in parsed.values():
+        for n in promql.walk(node):
+            if isinstance(n, promql.AggregateExpr):
+                seen[(settings, promql.canonical_key(n))] += 1
+    if not any(c >= 2 for c in seen.values()):
+        return 'no shared sub-expressions'
+    blockers = sorted({_describe(node) for q, node, settings in parsed.values() if not is_translatable(node)})
+    return 'shared sub-expressions are not under a math-translatable shell (blocked by ' + ', '.join(blockers) + ')'
+
+
+def dedup_rule(rule: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    # 返回 (改写后的规则, 报告)；无法改写或无收益时返回原规则
+    data = rule.get('data') or []
+    report = {'uid': rule.get('uid'), 'rewritten': [], 'hoisted': [], 'reused': [],
+              'queries_before': 0, 'queries_after': 0, 'equivalent': True, 'reason': ''}
+    parsed: Dict[str, Tuple[Dict[str, Any], Any, str]] = {}
+    for q in data:
+        model = q.get('model') or {}
+        if q.get('datasourceUid') == EXPR_DATASOURCE or not isinstance(model.get('expr'), str):
+            continue
+        report['queries_before'] += 1
+        if promql.has_variables(model['expr']):
+            continue
+        try:
+            parsed[q['refId']] = (q, promql.parse(model['expr']), _settings_key(q))
+        except promql.PromQLError:
+            continue
+    report['queries_after'] = report['queries_before']
+
+    # 已有查询可作为子表达式提供者：（设置, 规范化表达式）-> refId
+    providers: Dict[Tuple[str, str], str] = {}
+    for ref, (q, node, settings) in parsed.items():
+        if not is_translatable(node):
+            providers.setdefault((settings, promql.canonical_key(node)), ref)
+
+    leaf_count: Dict[Tuple[str, str], int] = defaultdict(int)
+    candidates: Dict[str, List[Tuple[str, Any]]] = {}
+    for ref, (q, node, settings) in parsed.items():
+        if not is_translatable(node):
+            continue
+        leaves = [(promql.canonical_key(l), l) for l in shell_leaves(node)]
+        if not leaves:
+            continue
+        candidates[ref] = leaves
+        for key, _ in leaves:
+            leaf_count[(settings, key)] += 1
+
+    # 只改写存在共享叶子（重复出现或已有查询提供）的查询
+    rewrite = {ref: leaves for ref, leaves in candidates.items()
+               if any(leaf_count[(parsed[ref][2], k)] + (1 if (parsed[ref][2], k) in providers else 0) >= 2 for k, _ in leaves)}
+    if not rewrite:
+        report['reason'] = _skip_reason(parsed)
+        return rule, report
+
+    used_refs = {q.get('refId') for q in data}
+    hoisted: Dict[Tuple[str, str], str] = {}
+    new_queries: List[Dict[str, Any]] = []
+    for ref, leaves in rewrite.items():
+        q, _, settings = parsed[ref]
+        for key, leaf in leaves:
+            if (settings, key) in providers or (settings, key) in hoisted:
+                continue
+            new_ref = _new_ref_id(used_refs)
+            hoisted[(settings, key)] = new_ref
+            hq = copy.deepcopy(q)
+            hq['refId'] = new_ref
+            hq['model']['refId'] = new_ref
+            hq['model']['expr'] = promql.format_expr(leaf)
+            hq['model'].pop('legendFormat', None)
+            new_queries.append(hq)
+
+    # 收益判断：数据源查询数不增加，且 Prometheus 侧计算的子表达式次数减少
+    queries_after = report['queries_before'] - len(rewrite) + len(new_queries)
+    evaluations = sum(len(leaves) for leaves in rewrite.values())
+    if queries_after > report['queries_before'] or len(new_queries) >= evaluations:
+        report['reason'] = f'no reduction ({report["queries_before"]} -> {queries_after} datasource queries)'
+        return rule, report
+
+    # 构造 math 节点并逐条校验等价性
+    ref_exprs: Dict[str, Any] = {}
+    for (settings, key), r in list(providers.items()) + list(hoisted.items()):
+        ref_exprs[r] = promql.parse(key)
+    math_nodes: Dict[str, Dict[str, Any]] = {}
+    for ref in rewrite:
+        q, node, settings = parsed[ref]
+        refs = {key: providers.get((settings, key)) or hoisted[(settings, key)] for key, _ in rewrite[ref]}
+        math = to_math(node, refs)
+        used = list(refs.values())
+        same_settings = all(_settings_key(parsed[r][0]) == settings if r in parsed else True for r in used)
+        back = substitute_back(math, ref_exprs)
+        if not same_settings or promql.canonical_key(back) != promql.canonical_key(node):
+            report['equivalent'] = False
+            report['reason'] = f'equivalence check failed for {ref}'
+            return rule, report
+        expr_q = {
+            'refId': ref,
+            'relativeTimeRange': {'to': 0},
+            'datasourceUid': EXPR_DATASOURCE,
+            'model': {
+                'datasource': {'type': EXPR_DATASOURCE, 'uid': EXPR_DATASOURCE},
+                'expression': promql.format_expr(math),
+                'intervalMs': q['model'].get('intervalMs', 1000),
+                'maxDataPoints': q['model'].get('maxDataPoints', 43200),
+                'refId': ref,
+                'type': 'math',
+            },
+        }
+        math_nodes[ref] = expr_q
+        report['rewritten'].append({'refId': ref, 'expression': expr_q['model']['expression']})
+        report['reused'].extend(r for r in used if r in parsed)
+
+    # 新查询放在第一个被改写查询之前，其余节点保持原顺序
+    new_data: List[Dict[str, Any]] = []
+    inserted = False
+    for q in data:
+        if q.get('refId') in math_nodes:
+            if not inserted:
+                new_data.extend(new_queries)
+                inserted = True
+            new_data.append(math_nodes[q['refId']])
+        else:
+            new_data.append(q)
+    new_rule = dict(rule)
+    new_rule['data'] = new_data
+    report['hoisted'] = [{'refId': hq['refId'], 'expr': hq['model']['expr']} for hq in new_queries]
+    report['queries_after'] = queries_after
+    report['reused'] = sorted(set(report['reused']))
+    return new_rule, report
+
+
+def dedup_groups(groups: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    # 对 provisioning 组内所有规则执行去重，返回新组列表与逐规则报告
+    out_groups: List[Dict[str, Any]] = []
+    reports: List[Dict[str, Any]] = []
+    for g in groups:
+        if not g:
+            out_groups.append(g)
+            continue
+        new_rules = []
+        for r in g.get('rules') or []:
+            nr, rep = dedup_rule(r)
+            new_rules.append(nr)
+            reports.append(rep)
+        ng = dict(g)
+        ng['rules'] = new_rules
+        out_groups.append(ng)
+    return out_groups, reports
+
+
+def summarize(reports: List[Dict[str, Any]]) -> str:
+    rewritten = [r for r in reports if r['rewritten']]
+    before = sum(r['queries_before'] for r in reports)
+    after = sum(r['queries_after'] for r in reports)
+    failed = sum(1 for r in reports if not r['equivalent'])
+    return f"Dedup result: rules={len(reports)}, rewritten={len(rewritten)}, datasource queries {before} -> {after}, equivalence failures={failed}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report in-rule PromQL deduplication opportunities (dry run).')
+    parser.add_argument('--instance-dir', default=INSTANCE_DIR, help='Directory of instance YAML files (default: alert/instance)')
+    parser.add_argument('--verbose', action='store_true', help='Print skipped rules and reasons')
+    args = parser.parse_args()
+
+    groups: List[Dict[str, Any]] = []
+    for _, doc in load_named_yaml_files(args.instance_dir):
+        groups.extend(normalize_groups(doc))
+    _, reports = dedup_groups(groups)
+    for rep in reports:
+        if rep['rewritten']:
+            print(f"Rewrite {rep['uid']}: queries {rep['queries_before']} -> {rep['queries_after']}")
+            for h in rep['hoisted']:
+                print(f"  hoist ${h['refId']}: {h['expr']}")
+            for m in rep['rewritten']:
+                print(f"  math  ${m['refId']}: {m['expression']}")
+        elif args.verbose:
+            print(f"Skip {rep['uid']}: {rep['reason']}")
+    print(summarize(reports))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,299 @@
+import io
+import os
+import sys
+import json
+import time
+import fnmatch
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import yaml
+import requests
+
+# 多目标部署：按目标清单（YAML）把规则、联系点、通知策略同时推送到多个 Grafana（租户 pa/ponts、各环境）
+# 每个目标独立的会话（连接池 + 限速 + 凭据），目标之间并发，目标内部沿用各导入脚本的分桶并发；
+# 各目标的输出缓存后整块打印，最后输出按目标汇总的结果表，写入 out/deploy_report.json
+
+try:
+    from tools.import_rules_to_grafana import get_auth_session, sync_rules, upsert_rule_groups, import_rules, API_RULES_PATH
+    from tools.import_alert_settings import expand_setting_paths, sync_contact_points, import_notification_policies
+    from tools.convert_yaml_to_grafana_json import OUT_DIR
+    from tools.analyze_query_cost import print_table
+    from tools import http_metrics
+except Exception:
+    # 兼容从工具目录直接执行
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    from tools.import_rules_to_grafana import get_auth_session, sync_rules, upsert_rule_groups, import_rules, API_RULES_PATH  # type: ignore
+    from tools.import_alert_settings import expand_setting_paths, sync_contact_points, import_notification_policies  # type: ignore
+    from tools.convert_yaml_to_grafana_json import OUT_DIR  # type: ignore
+    from tools.analyze_query_cost import print_table  # type: ignore
+    from tools import http_metrics  # type: ignore
+
+REPORT_PATH = os.path.join(OUT_DIR, 'deploy_report.json')
+PARTS = ('rules', 'contact-points', 'policies')
+RULE_MODES = ('sync', 'upsert', 'import')
+# 各规则写入方式返回的计数字段（sync 跳过的未变化组不计入 unchanged）
+RULE_FIELDS = {
+    'sync': ('created', 'updated', 'deleted', 'unchanged', 'failed'),
+    'upsert': ('rules', 'failed'),
+    'import': ('imported', 'updated', 'failed'),
+}
+# 目标清单中可在 defaults 下统一设置的字段
+TARGET_FIELDS = ('url', 'user', 'password', 'password_env', 'token', 'token_env', 'verify', 'settings', 'policies',
+                 'rules', 'rules_mode', 'state_file', 'prune', 'workers', 'rate_limit')
+
+
+class ManifestError(ValueError):
+    pass
+
+
+def load_manifest(path: str) -> List[Dict[str, Any]]:
+    # 清单格式：
+    #   defaults: {rules: out/api_rules.json, workers: 8, rate_limit: 20}
+    #   targets:
+    #     - name: pa-test
+    #       url: https://grafana-pa-test/
+    #       user: admin
+    #       password_env: GRAFANA_PA_TEST_PASSWORD
+    #       settings: alert/setting/pa
+    #       policies: alert/setting/supplier-notification-policies.yaml
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = yaml.safe_load(f) or {}
+    except (OSError, yaml.YAMLError) as e:
+        raise ManifestError(f"cannot read manifest {path}: {e}")
+    defaults = data.get('defaults') or {}
+    targets: List[Dict[str, Any]] = []
+    names = set()
+    # 目标并发执行，共用同步状态文件时一个目标保存的哈希会让另一个目标跳过仍需写入的规则
+    state_files: Dict[str, str] = {}
+    for i, raw in enumerate(data.get('targets') or []):
+        t = {k: v for k, v in defaults.items() if k in TARGET_FIELDS}
+        t.update(raw or {})
+        name = t.get('name')
+        if not name or not t.get('url'):
+            raise ManifestError(f"target #{i + 1}: name and url are required")
+        if name in names:
+            raise ManifestError(f"duplicate target name: {name}")
+        unknown = set(t) - set(TARGET_FIELDS) - {'name'}
+        if unknown:
+            raise ManifestError(f"target {name}: unknown fields {', '.join(sorted(unknown))}")
+        t.setdefault('rules_mode', 'sync')
+        if t['rules_mode'] not in RULE_MODES:
+            raise ManifestError(f"target {name}: rules_mode must be one of {', '.join(RULE_MODES)}")
+        if t.get('state_file'):
+            state_path = os.path.normcase(os.path.abspath(t['state_file']))
+            if state_path in state_files:
+                raise ManifestError(f"targets {state_files[state_path]} and {name} share state_file {t['state_file']}; "
+                                    f"each target needs its own")
+            state_files[state_path] = name
+        names.add(name)
+        targets.append(t)
+    if not targets:
+        raise ManifestError(f"no targets in manifest {path}")
+    return targets
+
+
+def _secret(t: Dict[str, Any], key: str) -> Optional[str]:
+    # 凭据优先从 <key>_env 指定的环境变量读取，避免明文写入清单
+    env = t.get(f'{key}_env')
+    if env:
+        value = os.environ.get(env)
+        if value is None:
+            raise ManifestError(f"target {t['name']}: environment variable {env} is not set")
+        return value
+    return t.get(key)
+
+
+class _TargetOutput(io.TextIOBase):
+    # sys.stdout 替身：部署线程的输出写入各自目标的缓冲，其它线程照常输出
+    def __init__(self, stream: Any):
+        self._stream = stream
+        self._local = threading.local()
+
+    def capture(self, buf: Optional[io.StringIO]) -> None:
+        self._local.buf = buf
+
+    def write(self, s: str) -> int:
+        buf = getattr(self._local, 'buf', None)
+        return (buf if buf is not None else self._stream).write(s)
+
+    def flush(self) -> None:
+        self._stream.flush()
+
+
+def _load_rules(path: str, cache: Dict[str, Any], lock: threading.Lock) -> List[Dict[str, Any]]:
+    # 多个目标共用同一规则文件时只读取一次（各导入函数不修改输入规则）
+    with lock:
+        if path not in cache:
+            with open(path, 'r', encoding='utf-8') as f:
+                cache[path] = json.load(f)
+        return cache[path]
+
+
+def _sum_counts(results: List[Tuple[Tuple[str, str], Dict[str, int]]]) -> Dict[str, int]:
+    totals: Dict[str, int] = {}
+    for _, counts in results:
+        for k, v in counts.items():
+            totals[k] = totals.get(k, 0) + v
+    return totals
+
+
+def deploy_target(t: Dict[str, Any], parts: Tuple[str, ...], rules_cache: Dict[str, Any], rules_lock: threading.Lock) -> Dict[str, Any]:
+    result: Dict[str, Any] = {'target': t['name'], 'url': t['url'], 'status': 'ok', 'rules': None, 'contact_points': None, 'policies': None}
+    workers = max(1, int(t.get('workers') or 1))
+    sess = get_auth_session(t['url'], t.get('user'), _secret(t, 'password'), pool_size=max(10, workers),
+                            rate_limit=float(t.get('rate_limit') or 0), api_token=_secret(t, 'token'), verify=t.get('verify'))
+
+    if 'rules' in parts and t.get('rules') is not False:
+        rules = _load_rules(t.get('rules') or API_RULES_PATH, rules_cache, rules_lock)
+        if t['rules_mode'] == 'sync':
+            results = sync_rules(sess, t['url'], rules, state_path=t.get('state_file'), prune=bool(t.get('prune')), workers=workers)
+        elif t['rules_mode'] == 'upsert':
+            results = upsert_rule_groups(sess, t['url'], rules, workers=workers)
+        else:
+            results = import_rules(sess, t['url'], rules, workers=workers)
+        result['rules'] = {k: 0 for k in RULE_FIELDS[t['rules_mode']]}
+        result['rules'].update(_sum_counts(results))
+
+    if 'contact-points' in parts and t.get('settings'):
+        paths = expand_setting_paths([t['settings']] if isinstance(t['settings'], str) else list(t['settings']))
+        result['contact_points'] = sync_contact_points(sess, t['url'], paths, workers=workers)
+
+    if 'policies' in parts and t.get('policies'):
+        result['policies'] = 'updated' if import_notification_policies(sess, t['url'], t['policies']) else 'failed'
+
+    failed = (result['rules'] or {}).get('failed', 0) + (result['contact_points'] or {}).get('failed', 0) \
+        + (result['contact_points'] or {}).get('conflicts', 0)
+    if failed or result['policies'] == 'failed':
+        result['status'] = 'failed'
+    return result
+
+
+def validate_targets(targets: List[Dict[str, Any]], parts: Tuple[str, ...]) -> List[Any]:
+    # 部署前校验全部目标的输入（规则 JSON 按路径只校验一次；联系点与策略按目标校验，策略接收器需在该目标的联系点中定义）
+    from tools.validate_config import Issue, validate_api_rules, validate_paths
+    issues: List[Any] = []
+    checked = set()
+    for t in targets:
+        if 'rules' in parts and t.get('rules') is not False:
+            path = t.get('rules') or API_RULES_PATH
+            if path not in checked:
+                checked.add(path)
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        issues.extend(validate_api_rules(json.load(f), path))
+                except (OSError, ValueError) as e:
+                    issues.append(Issue('error', path, '', f"cannot read: {e}"))
+        inputs: List[str] = []
+        if 'contact-points' in parts and t.get('settings'):
+            inputs.extend(expand_setting_paths([t['settings']] if isinstance(t['settings'], str) else list(t['settings'])))
+        if 'policies' in parts and t.get('policies'):
+            inputs.append(os.path.abspath(t['policies']))
+        if inputs:
+            issues.extend(validate_paths(inputs))
+    seen = set()
+    return [i for i in issues if not (i in seen or seen.add(i))]
+
+
+def deploy(targets: List[Dict[str, Any]], parts: Tuple[str, ...], parallel: int = 0) -> List[Dict[str, Any]]:
+    # 目标之间并发（默认全部同时进行），每个目标的输出在其完成后整块打印
+    out = _TargetOutput(sys.stdout)
+    rules_cache: Dict[str, Any] = {}
+    rules_lock = threading.Lock()
+
+    def run(t: Dict[str, Any]) -> Tuple[Dict[str, Any], str]:
+        buf = io.StringIO()
+        out.capture(buf)
+        start = time.monotonic()
+        try:
+            result = deploy_target(t, parts, rules_cache, rules_lock)
+        except (requests.RequestException, OSError, ValueError) as e:
+            result = {'target': t['name'], 'url': t['url'], 'status': 'error', 'error': str(e),
+                      'rules': None, 'contact_points': None, 'policies': None}
+            print(f"Error: {e}")
+        finally:
+            out.capture(None)
+        result['seconds'] = round(time.monotonic() - start, 2)
+        return result, buf.getvalue()
+
+    results: List[Dict[str, Any]] = []
+    sys.stdout = out
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, parallel or len(targets))) as pool:
+            futures = [pool.submit(run, t) for t in targets]
+            for fut in futures:
+                result, log = fut.result()
+                out.write(f"==== {result['target']} ({result['url']}) {result['status']} in {result['seconds']}s ====\n{log}")
+                results.append(result)
+    finally:
+        sys.stdout = out._stream
+    return results
+
+
+def _fmt_counts(counts: Optional[Dict[str, int]], fields: Tuple[str, ...]) -> str:
+    if counts is None:
+        return '-'
+    return '/'.join(str(counts.get(k, 0)) for k in fields)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Deploy alert rules, contact points and notification policies to every target in a manifest concurrently.')
+    parser.add_argument('--manifest', required=True, help='Targets manifest (YAML)')
+    parser.add_argument('--target', action='append', default=[], help='Only deploy targets whose name matches (glob, repeatable)')
+    parser.add_argument('--only', default=','.join(PARTS), help=f'Comma-separated parts to deploy (default: {",".join(PARTS)})')
+    parser.add_argument('--parallel', type=int, default=0, help='Number of targets deployed at once (default: all)')
+    parser.add_argument('--json', default=REPORT_PATH, help='JSON report path (default: out/deploy_report.json)')
+    parser.add_argument('--metrics', metavar='PREFIX', help='Write HTTP timing metrics (per target host) to PREFIX.json and PREFIX.prom')
+    parser.add_argument('--skip-validation', action='store_true', help='Do not validate every target\'s inputs before deploying')
+    args = parser.parse_args()
+
+    parts = tuple(p.strip() for p in args.only.split(',') if p.strip())
+    bad = [p for p in parts if p not in PARTS]
+    if bad:
+        print(f"Error: unknown part(s) in --only: {', '.join(bad)}", file=sys.stderr)
+        sys.exit(2)
+    try:
+        targets = load_manifest(args.manifest)
+    except ManifestError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(2)
+    if args.target:
+        targets = [t for t in targets if any(fnmatch.fnmatchcase(t['name'], p) for p in args.target)]
+        if not targets:
+            print(f"Error: no target matches {', '.join(args.target)}", file=sys.stderr)
+            sys.exit(2)
+
+    if not args.skip_validation:
+        # 任一目标输入有错误时不部署任何目标，避免部分目标已更新
+        from tools.validate_config import preflight
+        preflight(validate_targets(targets, parts), 'deploy inputs')
+
+    if args.metrics:
+        http_metrics.enable(args.metrics, job='deploy_targets')
+    start = time.monotonic()
+    results = deploy(targets, parts, args.parallel)
+    elapsed = time.monotonic() - start
+
+    rows = []
+    for r in results:
+        rows.append([r['target'], r['status'], _fmt_counts(r['rules'], tuple(r['rules'] or ())),
+                     _fmt_counts(r['contact_points'], ('created', 'updated', 'unchanged', 'failed')),
+                     r['policies'] or '-', r['seconds'], r.get('error', '')])
+    print_table(f'Deploy result ({len(results)} targets, {elapsed:.1f}s wall)',
+                [('target', 20), ('status', 6), ('rules', 18), ('contact points', 14), ('policies', 8), ('seconds', 7), ('error', 40)], rows)
+    print("rules: created/updated/deleted/unchanged/failed (sync), rules/failed (upsert), imported/updated/failed (import); "
+          "contact points: created/updated/unchanged/failed")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+    with open(args.json, 'w', encoding='utf-8') as f:
+        json.dump({'seconds': round(elapsed, 2), 'targets': results}, f, ensure_ascii=False, indent=2)
+    print(f"Wrote report to: {args.json}")
+    if any(r['status'] != 'ok' for r in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
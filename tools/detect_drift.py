@@ -0,0 +1,398 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import yaml
+import requests
+
+# 配置漂移检测：线上 Grafana 与仓库中的 alert/instance、alert/setting 是否一致
+# 并发批量拉取（文件夹、全部规则、联系点、策略各一次 GET，受管规则组的 interval 并发 GET），
+# 双方规范化为同一形式（规则沿用增量同步的 canonical_rule，联系点沿用 canonical_receiver）后按 uid 做结构化比较；
+# 可选把线上状态反向导出为 instance YAML（及联系点/策略 YAML），用于把界面上的修改回收进仓库。
+# 输出: 终端摘要 + out/drift_report.json；存在漂移时退出码为 1，可直接用于定时检查。
+
+try:
+    from tools.import_rules_to_grafana import (get_auth_session, canonical_rule, _url, _normalize_interval, _group_interval,
+                                               FOLDERS_API, PROVISION_ALERT_RULES_API, GET_RULE_GROUP_API,
+                                               DEFAULT_BASE_URL, DEFAULT_USER, DEFAULT_PASSWORD, REQ_TIMEOUT)
+    from tools.import_alert_settings import (expand_setting_paths, collect_receivers, canonical_receiver,
+                                             CONTACT_POINTS_API, NOTIFICATION_POLICIES_API)
+    from tools.convert_yaml_to_grafana_json import INSTANCE_DIR, OUT_DIR, load_yaml_files, normalize_groups, to_api_rules
+    from tools.notification_policy import load_policy, parse_matchers
+    from tools import promql, http_metrics
+except Exception:
+    # 兼容从工具目录直接执行
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    from tools.import_rules_to_grafana import (get_auth_session, canonical_rule, _url, _normalize_interval, _group_interval,  # type: ignore
+                                               FOLDERS_API, PROVISION_ALERT_RULES_API, GET_RULE_GROUP_API,
+                                               DEFAULT_BASE_URL, DEFAULT_USER, DEFAULT_PASSWORD, REQ_TIMEOUT)
+    from tools.import_alert_settings import (expand_setting_paths, collect_receivers, canonical_receiver,  # type: ignore
+                                             CONTACT_POINTS_API, NOTIFICATION_POLICIES_API)
+    from tools.convert_yaml_to_grafana_json import INSTANCE_DIR, OUT_DIR, load_yaml_files, normalize_groups, to_api_rules  # type: ignore
+    from tools.notification_policy import load_policy, parse_matchers  # type: ignore
+    from tools import promql, http_metrics  # type: ignore
+
+from urllib.parse import quote
+
+REPORT_PATH = os.path.join(OUT_DIR, 'drift_report.json')
+DEFAULT_POLICIES_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'alert', 'setting', 'supplier-notification-policies.yaml'))
+# 反向导出时规则与查询的字段顺序（与仓库中 instance YAML 的写法一致）
+EXPORT_RULE_FIELDS = ('uid', 'title', 'condition', 'data', 'noDataState', 'execErrState', 'for', 'annotations', 'labels', 'isPaused')
+EXPORT_QUERY_FIELDS = ('refId', 'queryType', 'relativeTimeRange', 'datasourceUid', 'model')
+# 策略树参与比较的字段（matchers 另行规范化）
+POLICY_FIELDS = ('receiver', 'group_by', 'group_wait', 'group_interval', 'repeat_interval', 'continue',
+                 'mute_time_intervals', 'active_time_intervals')
+MAX_PATHS = 20
+
+
+# ==================== 结构化比较 ====================
+
+def _keyed(items: List[Any]) -> Optional[Dict[str, Any]]:
+    # 查询列表按 refId 对齐，顺序不同不算差异
+    if items and all(isinstance(i, dict) and i.get('refId') for i in items):
+        keys = [i['refId'] for i in items]
+        if len(set(keys)) == len(keys):
+            return {k: i for k, i in zip(keys, items)}
+    return None
+
+
+def diff_values(local: Any, remote: Any, path: str = '') -> List[Tuple[str, Any, Any]]:
+    # 返回 [(路径, 本地值, 线上值)]；缺失一侧为 None
+    if isinstance(local, dict) and isinstance(remote, dict):
+        out = []
+        for k in sorted(set(local) | set(remote), key=str):
+            out.extend(diff_values(local.get(k), remote.get(k), f'{path}.{k}' if path else str(k)))
+        return out
+    if isinstance(local, list) and isinstance(remote, list):
+        lk, rk = _keyed(local), _keyed(remote)
+        if lk is not None and rk is not None:
+            out = []
+            for k in sorted(set(lk) | set(rk)):
+                out.extend(diff_values(lk.get(k), rk.get(k), f'{path}[{k}]'))
+            return out
+        if len(local) == len(remote):
+            out = []
+            for i, (a, b) in enumerate(zip(local, remote)):
+                out.extend(diff_values(a, b, f'{path}[{i}]'))
+            return out
+    return [] if local == remote else [(path, local, remote)]
+
+
+def _entry(kind: str, key: str, status: str, diffs: Optional[List[Tuple[str, Any, Any]]] = None, **extra: Any) -> Dict[str, Any]:
+    e = {'kind': kind, 'key': key, 'status': status}
+    e.update(extra)
+    if diffs:
+        e['diffs'] = [{'path': p, 'local': a, 'remote': b} for p, a, b in diffs]
+    return e
+
+
+# ==================== 拉取线上状态 ====================
+
+def _get_json(session: requests.Session, base_url: str, path: str) -> Any:
+    r = session.get(_url(base_url, path), timeout=REQ_TIMEOUT)
+    if r.status_code == 404:
+        return None
+    r.raise_for_status()
+    return r.json()
+
+
+def fetch_live(session: requests.Session, base_url: str, parts: Tuple[str, ...], workers: int = 8) -> Dict[str, Any]:
+    # 四个列表端点并发拉取；规则组 interval 不在规则列表中，按组并发 GET
+    endpoints = {'folders': FOLDERS_API}
+    if 'rules' in parts:
+        endpoints['rules'] = PROVISION_ALERT_RULES_API
+    if 'contact-points' in parts:
+        endpoints['contact_points'] = CONTACT_POINTS_API
+    if 'policies' in parts:
+        endpoints['policies'] = NOTIFICATION_POLICIES_API
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(endpoints)))) as pool:
+        futures = {k: pool.submit(_get_json, session, base_url, p) for k, p in endpoints.items()}
+        live = {k: f.result() for k, f in futures.items()}
+    live['folder_titles'] = {f.get('uid'): f.get('title') for f in live.pop('folders') or []}
+    live['intervals'] = {}
+    if 'rules' in parts:
+        groups = sorted({(r.get('folderUID'), r.get('ruleGroup')) for r in live.get('rules') or []})
+
+        def interval(key: Tuple[str, str]) -> Optional[int]:
+            g = _get_json(session, base_url, GET_RULE_GROUP_API.format(folderUid=key[0], group=quote(key[1] or '', safe='')))
+            return (g or {}).get('interval')
+        if groups:
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+                live['intervals'] = dict(zip(groups, pool.map(interval, groups)))
+    return live
+
+
+# ==================== 比较 ====================
+
+def diff_rules(local_rules: List[Dict[str, Any]], live: Dict[str, Any], include_unmanaged: bool = False) -> List[Dict[str, Any]]:
+    titles = live['folder_titles']
+    local_by_uid = {r['uid']: r for r in local_rules if r.get('uid')}
+    remote_by_uid = {r.get('uid'): r for r in live.get('rules') or []}
+    managed_folders = {r.get('folder') for r in local_rules}
+    out: List[Dict[str, Any]] = []
+    for uid, r in local_by_uid.items():
+        rr = remote_by_uid.get(uid)
+        if rr is None:
+            out.append(_entry('rule', uid, 'missing', title=r.get('title'), folder=r.get('folder'), group=r.get('ruleGroup')))
+            continue
+        diffs = diff_values(canonical_rule(r, r.get('folder')), canonical_rule(rr, titles.get(rr.get('folderUID'))))
+        if diffs:
+            out.append(_entry('rule', uid, 'changed', diffs, title=r.get('title'), folder=r.get('folder'), group=r.get('ruleGroup')))
+    for uid, rr in remote_by_uid.items():
+        if uid in local_by_uid:
+            continue
+        folder = titles.get(rr.get('folderUID'))
+        if folder in managed_folders or include_unmanaged:
+            out.append(_entry('rule', uid, 'extra' if folder in managed_folders else 'unmanaged',
+                              title=rr.get('title'), folder=folder, group=rr.get('ruleGroup')))
+
+    # 组 interval：本地按导入时的规范化（对齐调度步长）比较
+    uids_by_title = {t: u for u, t in titles.items()}
+    groups: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+    for r in local_rules:
+        groups.setdefault((r.get('folder'), r.get('ruleGroup')), []).append(r)
+    for (folder, group), rules in groups.items():
+        key = (uids_by_title.get(folder), group)
+        if key not in live['intervals']:
+            continue
+        want = _normalize_interval(_group_interval(rules))[1]
+        have = live['intervals'][key]
+        if have != want:
+            out.append(_entry('group', f'{folder}/{group}', 'changed', [('interval', want, have)]))
+    return out
+
+
+def _receiver_key(body: Dict[str, Any]) -> str:
+    return body.get('uid') or f"{body.get('name')}/{body.get('type')}"
+
+
+def diff_contact_points(receivers: List[Tuple[str, Dict[str, Any]]], live: Dict[str, Any]) -> List[Dict[str, Any]]:
+    # 匹配方式与 plan_contact_points 一致：优先 uid，其次 (name, type)
+    existing = live.get('contact_points') or []
+    by_uid = {cp.get('uid'): cp for cp in existing if cp.get('uid')}
+    by_key = {(cp.get('name'), cp.get('type')): cp for cp in existing}
+    matched = set()
+    out: List[Dict[str, Any]] = []
+    for _, body in receivers:
+        remote = by_uid.get(body.get('uid')) if body.get('uid') else None
+        remote = remote or by_key.get((body.get('name'), body.get('type')))
+        if remote is None:
+            out.append(_entry('contact-point', _receiver_key(body), 'missing', name=body.get('name')))
+            continue
+        matched.add(id(remote))
+        diffs = diff_values(json.loads(canonical_receiver(body, remote)), json.loads(canonical_receiver(remote)))
+        if diffs:
+            out.append(_entry('contact-point', _receiver_key(body), 'changed', diffs, name=body.get('name')))
+    for cp in existing:
+        if id(cp) not in matched:
+            out.append(_entry('contact-point', _receiver_key(cp), 'extra', name=cp.get('name')))
+    return out
+
+
+def canonical_policy(raw: Dict[str, Any], root: bool = True) -> Dict[str, Any]:
+    # 只保留影响路由的字段；空值视为未设置；matchers 的三种写法统一为排序后的 [label, op, value]
+    out: Dict[str, Any] = {}
+    for k in POLICY_FIELDS:
+        v = raw.get(k)
+        if v in (None, '', []) or (k == 'continue' and not v):
+            continue
+        out[k] = list(v) if isinstance(v, (list, tuple)) else v
+    if not root:
+        matchers = sorted([m.label, m.op, m.value] for m in parse_matchers(raw))
+        if matchers:
+            out['matchers'] = matchers
+    if raw.get('routes'):
+        out['routes'] = [canonical_policy(r, root=False) for r in raw['routes']]
+    return out
+
+
+def diff_policies(local: Dict[str, Any], live: Dict[str, Any]) -> List[Dict[str, Any]]:
+    remote = live.get('policies')
+    if not remote:
+        return [_entry('policies', 'root', 'missing')]
+    diffs = diff_values(canonical_policy(local), canonical_policy(remote))
+    return [_entry('policies', 'root', 'changed', diffs)] if diffs else []
+
+
+# ==================== 反向导出 ====================
+
+class _ExportDumper(yaml.SafeDumper):
+    pass
+
+
+def _str_representer(dumper: yaml.SafeDumper, value: str):
+    # 多行字符串（PromQL、描述）写成块标量，与手写的 instance YAML 一致
+    if '\n' in value:
+        return dumper.represent_scalar('tag:yaml.org,2002:str', value, style='|')
+    return dumper.represent_scalar('tag:yaml.org,2002:str', value)
+
+
+_ExportDumper.add_representer(str, _str_representer)
+
+
+def _slug(text: str) -> str:
+    return re.sub(r'[\\/:*?"<>|\s]+', '-', text or 'General').strip('-') or 'General'
+
+
+def _export_rule(rr: Dict[str, Any]) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for k in EXPORT_RULE_FIELDS:
+        if k == 'data':
+            out['data'] = [{qk: q[qk] for qk in EXPORT_QUERY_FIELDS if q.get(qk) not in (None, '')} for q in rr.get('data') or []]
+        elif k == 'isPaused':
+            if rr.get('isPaused'):
+                out[k] = True
+        elif rr.get(k) is not None:
+            out[k] = rr[k]
+    return out
+
+
+def _dump(path: str, header: str, doc: Dict[str, Any]) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(header)
+        yaml.dump(doc, f, Dumper=_ExportDumper, allow_unicode=True, sort_keys=False, width=4096)
+
+
+def export_live(live: Dict[str, Any], out_dir: str, base_url: str) -> List[str]:
+    # 规则按文件夹各写一个 instance YAML（结构同 alert/instance），联系点与策略各写一个文件
+    os.makedirs(out_dir, exist_ok=True)
+    header = f'# Exported from {base_url} by tools/detect_drift.py\n'
+    written: List[str] = []
+    titles = live['folder_titles']
+    folders: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+    uids: Dict[str, str] = {}
+    for rr in live.get('rules') or []:
+        title = titles.get(rr.get('folderUID')) or rr.get('folderUID') or 'General'
+        uids[title] = rr.get('folderUID')
+        folders.setdefault(title, {}).setdefault(rr.get('ruleGroup') or 'default', []).append(rr)
+    for title in sorted(folders):
+        groups = []
+        for group in sorted(folders[title]):
+            seconds = live['intervals'].get((uids[title], group))
+            groups.append({'orgId': 1, 'name': group, 'folder': title,
+                           'interval': promql.format_duration(seconds) if seconds else '1m',
+                           'rules': [_export_rule(rr) for rr in folders[title][group]]})
+        path = os.path.join(out_dir, f'{_slug(title)}-instance.yaml')
+        _dump(path, header, {'apiVersion': 1, 'groups': groups})
+        written.append(path)
+
+    if live.get('contact_points') is not None:
+        points: Dict[str, List[Dict[str, Any]]] = {}
+        for cp in live['contact_points']:
+            rc = {'uid': cp.get('uid'), 'type': cp.get('type'), 'settings': cp.get('settings') or {},
+                  'disableResolveMessage': bool(cp.get('disableResolveMessage', False))}
+            points.setdefault(cp.get('name'), []).append({k: v for k, v in rc.items() if v is not None})
+        path = os.path.join(out_dir, 'contact-points.yaml')
+        _dump(path, header, {'apiVersion': 1, 'contactPoints': [{'orgId': 1, 'name': n, 'receivers': r} for n, r in points.items()]})
+        written.append(path)
+    if live.get('policies'):
+        path = os.path.join(out_dir, 'notification-policies.yaml')
+        _dump(path, header, {'apiVersion': 1, 'policies': [{'orgId': 1, **live['policies']}]})
+        written.append(path)
+    return written
+
+
+# ==================== 入口 ====================
+
+def _short(v: Any, width: int = 60) -> str:
+    s = json.dumps(v, ensure_ascii=False) if not isinstance(v, str) else repr(v)
+    return s if len(s) <= width else s[:width - 1] + '…'
+
+
+def print_drift(entries: List[Dict[str, Any]], max_paths: int) -> None:
+    for e in entries:
+        label = f" {e['title']}" if e.get('title') else (f" {e['name']}" if e.get('name') else '')
+        print(f"{e['status']:<9} {e['kind']:<13} {e['key']}{label}")
+        for d in (e.get('diffs') or [])[:max_paths]:
+            print(f"    {d['path']}: local={_short(d['local'])} live={_short(d['remote'])}")
+        if len(e.get('diffs') or []) > max_paths:
+            print(f"    ... {len(e['diffs']) - max_paths} more")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Detect drift between live Grafana alerting config and the repository YAML.')
+    parser.add_argument('--instance-dir', default=INSTANCE_DIR, help='Directory of instance YAML files (default: alert/instance)')
+    parser.add_argument('--contact-points', dest='cp_paths', nargs='+', metavar='PATH',
+                        help='Contact-points YAML files or directories to compare (e.g. alert/setting/pa); skipped if omitted')
+    parser.add_argument('--notification-policies', dest='np_path', default=DEFAULT_POLICIES_PATH,
+                        help='Notification-policies YAML to compare ("" to skip)')
+    parser.add_argument('--include-unmanaged', action='store_true', help='Also list live rules in folders that have no local rules')
+    parser.add_argument('--export', metavar='DIR', help='Write the live state as instance / contact-point / policy YAML into DIR')
+    parser.add_argument('--workers', type=int, default=8, help='Concurrent GETs (default: 8)')
+    parser.add_argument('--max-paths', type=int, default=MAX_PATHS, help=f'Differing paths printed per object (default: {MAX_PATHS})')
+    parser.add_argument('--json', default=REPORT_PATH, help='JSON report path (default: out/drift_report.json)')
+    parser.add_argument('--metrics', metavar='PREFIX', help='Write HTTP timing metrics to PREFIX.json and PREFIX.prom')
+    args = parser.parse_args()
+
+    parts = ['rules']
+    if args.cp_paths:
+        parts.append('contact-points')
+    if args.np_path:
+        parts.append('policies')
+    if args.export:
+        # 反向导出需要全部线上配置
+        parts = ['rules', 'contact-points', 'policies']
+
+    started = time.monotonic()
+    try:
+        local_rules = to_api_rules([g for d in load_yaml_files(args.instance_dir) for g in normalize_groups(d)])
+        receivers, conflicts = collect_receivers(expand_setting_paths(args.cp_paths)) if args.cp_paths else ([], [])
+        local_policy = load_policy(args.np_path) if args.np_path else None
+    except (OSError, ValueError, yaml.YAMLError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(2)
+    for c in conflicts:
+        print(f"Warning: conflicting ContactPoint receiver definitions for {c}; not compared", file=sys.stderr)
+
+    base_url = os.environ.get('GRAFANA_URL', DEFAULT_BASE_URL)
+    user = os.environ.get('GRAFANA_USER', DEFAULT_USER)
+    password = os.environ.get('GRAFANA_PASSWORD', DEFAULT_PASSWORD)
+    if args.metrics:
+        http_metrics.enable(args.metrics, job='detect_drift')
+    workers = max(1, args.workers)
+    sess = get_auth_session(base_url, user, password, pool_size=max(10, workers))
+    try:
+        live = fetch_live(sess, base_url, tuple(parts), workers=workers)
+    except requests.RequestException as e:
+        print(f"HTTP error: {e}", file=sys.stderr)
+        sys.exit(2)
+    fetched = time.monotonic()
+
+    entries = diff_rules(local_rules, live, include_unmanaged=args.include_unmanaged)
+    if args.cp_paths:
+        entries += diff_contact_points(receivers, live)
+    if local_policy is not None:
+        try:
+            entries += diff_policies(local_policy, live)
+        except ValueError as e:
+            print(f"Error: cannot compare notification policies: {e}", file=sys.stderr)
+            sys.exit(2)
+
+    print_drift(entries, args.max_paths)
+    counts: Dict[str, int] = {}
+    for e in entries:
+        if e['status'] != 'unmanaged':
+            counts[f"{e['kind']} {e['status']}"] = counts.get(f"{e['kind']} {e['status']}", 0) + 1
+    print(f"Compared {len(local_rules)} rules, {len(receivers)} receivers, {'1' if local_policy else '0'} policy tree "
+          f"against {base_url} in {time.monotonic() - started:.2f}s (fetch {fetched - started:.2f}s)")
+    print('Drift: ' + (', '.join(f'{k}={v}' for k, v in sorted(counts.items())) if counts else 'none'))
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+    with open(args.json, 'w', encoding='utf-8') as f:
+        json.dump({'base_url': base_url, 'summary': counts, 'entries': entries}, f, ensure_ascii=False, indent=2)
+    print(f"Wrote report to: {args.json}")
+
+    if args.export:
+        for path in export_live(live, args.export, base_url):
+            print(f"Exported: {path}")
+    if counts:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,464 @@
+import os
+import re
+import sys
+import json
+import argparse
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+# 告警实例基数估算
+# 输入: 序列标签导出（Prometheus 文本暴露格式 / 序列列表）+ alert/instance/*.yaml + 通知策略
+# 输出: 每条规则、每个规则组会产生的告警实例数，以及按当前通知策略形成的通知分组数（终端表格 + JSON）
+#
+# 只在标签层面求值 PromQL：选择器按导出中的序列匹配，聚合按 by/without 投影，向量匹配按 on/ignoring 连接；
+# 比较运算、and 右侧等依赖样本值的过滤一律视为“可能通过”，因此结果是随时间可能出现的实例数上界。
+# 查询结果再按 Grafana 服务端表达式（reduce/math/threshold/classic_conditions）合并，
+# 条件节点输出的每个标签集加上规则标签、alertname、grafana_folder 即为一个告警实例。
+
+try:
+    from tools import promql
+    from tools.convert_yaml_to_grafana_json import INSTANCE_DIR, OUT_DIR, DEFAULT_FOLDER, load_named_yaml_files, normalize_groups
+    from tools.analyze_query_cost import EXPR_DATASOURCE, DEFAULT_EVAL_SECONDS, print_table
+    from tools.import_rules_to_grafana import _parse_duration_seconds
+    from tools.notification_policy import Router
+    from tools.simulate_notification_routing import POLICY_PATH
+except Exception:
+    # 兼容从工具目录直接执行
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    from tools import promql  # type: ignore
+    from tools.convert_yaml_to_grafana_json import INSTANCE_DIR, OUT_DIR, DEFAULT_FOLDER, load_named_yaml_files, normalize_groups  # type: ignore
+    from tools.analyze_query_cost import EXPR_DATASOURCE, DEFAULT_EVAL_SECONDS, print_table  # type: ignore
+    from tools.import_rules_to_grafana import _parse_duration_seconds  # type: ignore
+    from tools.notification_policy import Router  # type: ignore
+    from tools.simulate_notification_routing import POLICY_PATH  # type: ignore
+
+REPORT_PATH = os.path.join(OUT_DIR, 'alert_cardinality.json')
+
+LabelSet = Tuple[Tuple[str, str], ...]
+SCALAR = 'scalar'
+NAME = '__name__'
+
+# 其余函数（区间函数、逐元素函数）保留第一个向量参数的标签并去掉指标名；以下函数保留指标名
+_SCALAR_FUNCS = {'time', 'pi', 'scalar'}
+_KEEP_NAME_FUNCS = {'sort', 'sort_desc', 'last_over_time', 'label_replace', 'label_join'}
+_FILTER_AGGS = {'topk', 'bottomk', 'limitk', 'limit_ratio'}
+
+_SERIES_RE = re.compile(r'^\s*([A-Za-z_:][A-Za-z0-9_:]*)?\s*(?:\{(.*)\})?\s*(.*)$')
+_LABEL_PAIR_RE = re.compile(r'\s*([A-Za-z_][A-Za-z0-9_]*)\s*=\s*"((?:[^"\\]|\\.)*)"\s*,?')
+_SSE_REF_RE = re.compile(r'\$\{?([A-Za-z0-9_]+)\}?')
+
+
+class EstimateError(ValueError):
+    pass
+
+
+# ==================== 序列导出 ====================
+
+def _unescape(value: str) -> str:
+    return value.replace('\\n', '\n').replace('\\"', '"').replace('\\\\', '\\')
+
+
+def parse_series_line(line: str) -> Optional[Dict[str, str]]:
+    # 'metric{a="b"} 1 1700000000' 或 '{__name__="metric",a="b"}'；注释与空行返回 None
+    line = line.strip()
+    if not line or line.startswith('#'):
+        return None
+    hit = _SERIES_RE.match(line)
+    if not hit or (hit.group(1) is None and hit.group(2) is None):
+        raise EstimateError(f"cannot parse series line: {line[:120]}")
+    labels: Dict[str, str] = {}
+    body = hit.group(2) or ''
+    pos = 0
+    while pos < len(body):
+        pair = _LABEL_PAIR_RE.match(body, pos)
+        if not pair:
+            if body[pos:].strip(' ,'):
+                raise EstimateError(f"cannot parse labels: {body[:120]}")
+            break
+        labels[pair.group(1)] = _unescape(pair.group(2))
+        pos = pair.end()
+    if hit.group(1):
+        labels[NAME] = hit.group(1)
+    return labels
+
+
+class SeriesIndex:
+    # 按指标名索引的序列标签集合（去重）
+    def __init__(self):
+        self.by_name: Dict[str, Set[LabelSet]] = defaultdict(set)
+
+    def add(self, labels: Dict[str, str]) -> None:
+        name = labels.get(NAME, '')
+        self.by_name[name].add(tuple(sorted(labels.items())))
+
+    def __len__(self) -> int:
+        return sum(len(v) for v in self.by_name.values())
+
+    def select(self, sel: promql.VectorSelector) -> Set[LabelSet]:
+        matchers = list(sel.matchers)
+        if sel.name:
+            candidates: Iterable[Set[LabelSet]] = [self.by_name.get(sel.name, set())]
+        else:
+            name_eq = next((m.value for m in matchers if m.name == NAME and m.op == '='), None)
+            candidates = [self.by_name.get(name_eq, set())] if name_eq is not None else list(self.by_name.values())
+        checks = [(m.name, _matcher_fn(m)) for m in matchers]
+        out = set()
+        for series in candidates:
+            for ls in series:
+                d = dict(ls)
+                if all(fn(d.get(label, '')) for label, fn in checks):
+                    out.add(ls)
+        return out
+
+
+def _matcher_fn(m: promql.Matcher):
+    if m.op in ('=~', '!~'):
+        rx = re.compile(f'^(?:{m.value})$')
+        return (lambda v: rx.match(v) is not None) if m.op == '=~' else (lambda v: rx.match(v) is None)
+    return (lambda v: v == m.value) if m.op == '=' else (lambda v: v != m.value)
+
+
+def load_series(paths: Sequence[str]) -> SeriesIndex:
+    # .json: /api/v1/series 响应（{"data": [...]}) 或标签字典数组；其他：逐行文本（暴露格式、序列列表或 NDJSON）
+    index = SeriesIndex()
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            if path.endswith('.json'):
+                data = json.load(f)
+                items = data.get('data', []) if isinstance(data, dict) else data
+                for item in items:
+                    index.add({str(k): str(v) for k, v in item.items()})
+                continue
+            for lineno, line in enumerate(f, 1):
+                try:
+                    if line.lstrip().startswith('{"'):
+                        index.add({str(k): str(v) for k, v in json.loads(line).items()})
+                        continue
+                    labels = parse_series_line(line)
+                except (EstimateError, json.JSONDecodeError) as e:
+                    raise EstimateError(f"{path}:{lineno}: {e}")
+                if labels is not None:
+                    index.add(labels)
+    return index
+
+
+# ==================== 标签层面求值 ====================
+
+def _drop(ls: LabelSet, names: Iterable[str]) -> LabelSet:
+    names = set(names)
+    return tuple((k, v) for k, v in ls if k not in names)
+
+
+def _keep(ls: LabelSet, names: Iterable[str]) -> LabelSet:
+    names = set(names)
+    return tuple((k, v) for k, v in ls if k in names)
+
+
+def _match_key(ls: LabelSet, matching: Optional[promql.VectorMatching]) -> LabelSet:
+    if matching is None:
+        return _drop(ls, [NAME])
+    return _keep(ls, matching.labels) if matching.on else _drop(ls, list(matching.labels) + [NAME])
+
+
+def eval_labels(node: Any, index: SeriesIndex) -> Any:
+    # 返回 SCALAR 或输出标签集合；无法静态确定时抛出 EstimateError
+    if isinstance(node, (promql.NumberLiteral, promql.StringLiteral)):
+        return SCALAR
+    if isinstance(node, promql.VectorSelector):
+        return index.select(node)
+    if isinstance(node, promql.MatrixSelector):
+        return eval_labels(node.vector, index)
+    if isinstance(node, promql.SubqueryExpr):
+        return eval_labels(node.expr, index)
+    if isinstance(node, promql.UnaryExpr):
+        inner = eval_labels(node.expr, index)
+        return inner if inner == SCALAR else {_drop(ls, [NAME]) for ls in inner}
+    if isinstance(node, promql.Call):
+        return _eval_call(node, index)
+    if isinstance(node, promql.AggregateExpr):
+        return _eval_aggregate(node, index)
+    if isinstance(node, promql.BinaryExpr):
+        return _eval_binary(node, index)
+    raise EstimateError(f"unsupported node {type(node).__name__}")
+
+
+def _eval_call(node: promql.Call, index: SeriesIndex) -> Any:
+    func = node.func
+    if func in _SCALAR_FUNCS:
+        return SCALAR
+    if func == 'vector' or not node.args:
+        # vector(s)、无参数的 hour() 等返回一个无标签序列
+        return {()}
+    if func in ('absent', 'absent_over_time'):
+        # 只在输入为空时产生一个序列，标签取自选择器中的等值匹配器
+        arg = node.args[0]
+        sel = arg.vector if isinstance(arg, promql.MatrixSelector) else arg
+        if isinstance(sel, promql.VectorSelector):
+            return {tuple(sorted((m.name, m.value) for m in sel.matchers if m.op == '=' and m.name != NAME))}
+        return {()}
+    args = [eval_labels(a, index) for a in node.args]
+    if func == 'histogram_quantile':
+        return {_drop(ls, [NAME, 'le']) for ls in args[1]}
+    if func == 'label_replace':
+        dst, repl, src, regex = (a.value for a in node.args[1:5])
+        rx = re.compile(f'^(?:{regex})$')
+        out = set()
+        for ls in args[0]:
+            d = dict(ls)
+            hit = rx.match(d.get(src, ''))
+            if hit:
+                value = hit.expand(re.sub(r'\$\{?(\w+)\}?', r'\\g<\1>', repl))
+                if value:
+                    d[dst] = value
+                else:
+                    d.pop(dst, None)
+            out.add(tuple(sorted(d.items())))
+        return out
+    if func == 'label_join':
+        dst, sep, srcs = node.args[1].value, node.args[2].value, [a.value for a in node.args[3:]]
+        out = set()
+        for ls in args[0]:
+            d = dict(ls)
+            d[dst] = sep.join(d.get(s, '') for s in srcs)
+            out.add(tuple(sorted((k, v) for k, v in d.items() if v)))
+        return out
+    vector = next((a for a in args if a != SCALAR), None)
+    if vector is None:
+        return SCALAR
+    return set(vector) if func in _KEEP_NAME_FUNCS else {_drop(ls, [NAME]) for ls in vector}
+
+
+def _eval_aggregate(node: promql.AggregateExpr, index: SeriesIndex) -> Any:
+    inner = eval_labels(node.expr, index)
+    if inner == SCALAR:
+        raise EstimateError(f"{node.op} over a scalar")
+    if node.op in _FILTER_AGGS:
+        # topk 等按样本值挑选序列，随时间任一输入序列都可能出现
+        return set(inner)
+    if node.op == 'count_values':
+        raise EstimateError('count_values output labels depend on sample values')
+    if node.without:
+        return {_drop(ls, list(node.grouping) + [NAME]) for ls in inner}
+    return {_keep(ls, node.grouping) for ls in inner}
+
+
+def _eval_binary(node: promql.BinaryExpr, index: SeriesIndex) -> Any:
+    lhs, rhs = eval_labels(node.lhs, index), eval_labels(node.rhs, index)
+    op, matching = node.op, node.matching
+    keep_name = op in promql.COMPARISON_OPS and not node.bool
+    if lhs == SCALAR and rhs == SCALAR:
+        return SCALAR
+    if lhs == SCALAR or rhs == SCALAR:
+        vector = rhs if lhs == SCALAR else lhs
+        return set(vector) if keep_name else {_drop(ls, [NAME]) for ls in vector}
+    if op in promql.SET_OPS:
+        rkeys = {_match_key(ls, matching) for ls in rhs}
+        if op == 'and':
+            return {ls for ls in lhs if _match_key(ls, matching) in rkeys}
+        if op == 'unless':
+            # 右侧是否存在随时间变化，上界取左侧全部
+            return set(lhs)
+        lkeys = {_match_key(ls, matching) for ls in lhs}
+        return set(lhs) | {ls for ls in rhs if _match_key(ls, matching) not in lkeys}
+
+    card = matching.card if matching else ''
+    one, many = (lhs, rhs) if card == 'group_right' else (rhs, lhs)
+    by_key: Dict[LabelSet, List[LabelSet]] = defaultdict(list)
+    for ls in one:
+        by_key[_match_key(ls, matching)].append(ls)
+    out = set()
+    for ls in many:
+        partners = by_key.get(_match_key(ls, matching))
+        if not partners:
+            continue
+        if card:
+            for partner in partners:
+                d = dict(ls if keep_name else _drop(ls, [NAME]))
+                pd = dict(partner)
+                for label in matching.include:
+                    if pd.get(label):
+                        d[label] = pd[label]
+                    else:
+                        d.pop(label, None)
+                out.add(tuple(sorted(d.items())))
+        else:
+            result = ls if keep_name else _drop(ls, [NAME])
+            if matching is not None:
+                result = _keep(result, matching.labels) if matching.on else _drop(result, matching.labels)
+            out.add(result)
+    return out
+
+
+def _sse_union(left: Set[LabelSet], right: Set[LabelSet]) -> Set[LabelSet]:
+    # Grafana 服务端表达式的序列合并：标签集互为子集的两项合并，结果取较大的标签集；两侧各一项时总是合并
+    if len(left) == 1 and len(right) == 1:
+        a, b = next(iter(left)), next(iter(right))
+        return {a if len(a) >= len(b) else b}
+    out = set()
+    for a in left:
+        sa = set(a)
+        for b in right:
+            sb = set(b)
+            if sa <= sb:
+                out.add(b)
+            elif sb <= sa:
+                out.add(a)
+    return out
+
+
+def rule_instances(rule: Dict[str, Any], index: SeriesIndex) -> Tuple[Set[LabelSet], int]:
+    # 返回 (条件节点输出的标签集合, 查询选中的原始序列数)
+    nodes: Dict[str, Set[LabelSet]] = {}
+    selected = 0
+    pending = []
+    for q in rule.get('data') or []:
+        model = q.get('model') or {}
+        ref = q.get('refId') or model.get('refId')
+        if q.get('datasourceUid') == EXPR_DATASOURCE:
+            pending.append((ref, model))
+            continue
+        expr = model.get('expr')
+        if not isinstance(expr, str):
+            raise EstimateError(f'query {ref} has no PromQL expr')
+        try:
+            tree = promql.parse(expr)
+        except promql.PromQLError as e:
+            raise EstimateError(f'query {ref}: {e}')
+        selected += sum(len(index.select(s)) for s in promql.selectors(tree))
+        result = eval_labels(tree, index)
+        # Grafana 把指标名放在数据帧名上，告警实例标签中不含 __name__
+        nodes[ref] = {()} if result == SCALAR else {_drop(ls, [NAME]) for ls in result}
+
+    # 表达式节点可能引用后面定义的节点，按依赖反复求值直到全部完成
+    while pending:
+        progressed = False
+        for item in list(pending):
+            ref, model = item
+            kind = model.get('type')
+            if kind == 'classic_conditions':
+                nodes[ref] = {()}
+            elif kind == 'math':
+                refs = _SSE_REF_RE.findall(model.get('expression') or '')
+                if any(r not in nodes for r in refs):
+                    continue
+                result = None
+                for r in refs:
+                    result = set(nodes[r]) if result is None else _sse_union(result, nodes[r])
+                nodes[ref] = {()} if result is None else result
+            elif kind in ('reduce', 'threshold', 'resample'):
+                src = str(model.get('expression') or '').lstrip('$')
+                if src not in nodes:
+                    continue
+                nodes[ref] = set(nodes[src])
+            else:
+                raise EstimateError(f'unsupported expression type {kind!r} in {ref}')
+            pending.remove(item)
+            progressed = True
+        if not progressed:
+            raise EstimateError(f"unresolved expression references: {', '.join(r for r, _ in pending)}")
+
+    condition = rule.get('condition')
+    if condition not in nodes:
+        raise EstimateError(f'condition {condition!r} not found')
+    return nodes[condition], selected
+
+
+def instance_labels(ls: LabelSet, rule: Dict[str, Any], folder: str) -> Dict[str, str]:
+    # 查询标签 + 规则标签（同名时规则标签优先）+ Grafana 附加的 alertname / grafana_folder
+    labels = dict(ls)
+    labels.update({str(k): str(v) for k, v in (rule.get('labels') or {}).items()})
+    labels['alertname'] = rule.get('title') or rule.get('uid') or 'Unnamed'
+    labels['grafana_folder'] = folder
+    return labels
+
+
+def estimate(instance_dir: str, index: SeriesIndex, router: Optional[Router]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    rules_out: List[Dict[str, Any]] = []
+    groups_out: List[Dict[str, Any]] = []
+    for fname, doc in load_named_yaml_files(instance_dir):
+        for g in normalize_groups(doc):
+            folder = g.get('folder') or DEFAULT_FOLDER
+            interval = _parse_duration_seconds(g.get('interval') or '1m') or DEFAULT_EVAL_SECONDS
+            group_entry = {'file': fname, 'folder': folder, 'group': g.get('name'), 'interval_seconds': interval,
+                           'rules': 0, 'unknown_rules': 0, 'series_selected': 0, 'instances': 0, 'notification_groups': 0,
+                           'label_bytes': 0, 'state_updates_per_minute': 0.0}
+            for r in g.get('rules') or []:
+                entry = {'file': fname, 'group': g.get('name'), 'uid': r.get('uid'), 'title': r.get('title')}
+                try:
+                    sets, selected = rule_instances(r, index)
+                except EstimateError as e:
+                    entry.update(instances=None, error=str(e))
+                    rules_out.append(entry)
+                    group_entry['rules'] += 1
+                    group_entry['unknown_rules'] += 1
+                    continue
+                instances = [instance_labels(ls, r, folder) for ls in sets]
+                groups: Dict[str, Set[Any]] = defaultdict(set)
+                if router is not None:
+                    for labels in instances:
+                        for route in router.route(labels):
+                            groups[f'{route.route_id} {route.receiver}'].add(route.group_key(labels))
+                entry.update(
+                    series_selected=selected,
+                    instances=len(instances),
+                    notification_groups=sum(len(v) for v in groups.values()),
+                    receivers={k: len(v) for k, v in sorted(groups.items())},
+                    label_bytes=sum(len(k) + len(v) for labels in instances for k, v in labels.items()),
+                )
+                rules_out.append(entry)
+                group_entry['rules'] += 1
+                for key in ('series_selected', 'instances', 'notification_groups', 'label_bytes'):
+                    group_entry[key] += entry[key]
+            group_entry['state_updates_per_minute'] = round(group_entry['instances'] * 60.0 / interval, 2)
+            groups_out.append(group_entry)
+    rules_out.sort(key=lambda e: (-(e['instances'] if e['instances'] is not None else -1), e['uid'] or ''))
+    groups_out.sort(key=lambda e: (-e['instances'], e['group'] or ''))
+    return rules_out, groups_out
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Estimate alert instances and notification groups from a series dump.')
+    parser.add_argument('--series', nargs='+', required=True, help='Series dump files: Prometheus text exposition, series list, NDJSON or /api/v1/series JSON')
+    parser.add_argument('--instance-dir', default=INSTANCE_DIR, help='Directory of instance YAML files (default: alert/instance)')
+    parser.add_argument('--policies', default=POLICY_PATH, help="Notification policy YAML for group counts, '' to skip (default: alert/setting/supplier-notification-policies.yaml)")
+    parser.add_argument('--json', dest='json_path', default=REPORT_PATH, help='Machine-readable report output (default: out/alert_cardinality.json)')
+    parser.add_argument('--top', type=int, default=20, help='Rows per table in the console report (default: 20)')
+    args = parser.parse_args()
+
+    try:
+        index = load_series(args.series)
+        router = Router.from_file(args.policies) if args.policies else None
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(2)
+
+    rules, groups = estimate(args.instance_dir, index, router)
+    known = [r for r in rules if r['instances'] is not None]
+    totals = {
+        'series': len(index),
+        'rules': len(rules),
+        'unknown_rules': len(rules) - len(known),
+        'instances': sum(r['instances'] for r in known),
+        'notification_groups': sum(r['notification_groups'] for r in known),
+        'label_bytes': sum(r['label_bytes'] for r in known),
+        'state_updates_per_minute': round(sum(g['state_updates_per_minute'] for g in groups), 2),
+    }
+    report = {'totals': totals, 'rule_groups': groups, 'rules': rules}
+    os.makedirs(os.path.dirname(os.path.abspath(args.json_path)), exist_ok=True)
+    with open(args.json_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print_table('Rule groups by alert instances', [('instances', 9), ('notif.grp', 9), ('upd/min', 9), ('rules', 5), ('interval', 8), ('group', 40), ('file', 46)],
+                [[g['instances'], g['notification_groups'], g['state_updates_per_minute'], g['rules'], f"{g['interval_seconds']}s", g['group'], g['file']] for g in groups[:args.top]])
+    print_table('Rules by alert instances', [('instances', 9), ('notif.grp', 9), ('series', 8), ('uid', 42), ('title', 40)],
+                [[r['instances'] if r['instances'] is not None else '?', r.get('notification_groups', ''), r.get('series_selected', ''), r['uid'], r['title']] for r in rules[:args.top]])
+    for r in rules:
+        if r['instances'] is None:
+            print(f"Warning: {r['uid']}: cannot estimate ({r['error']})", file=sys.stderr)
+    print(f"\nSeries: {totals['series']}, alert instances: {totals['instances']}, notification groups: {totals['notification_groups']}, "
+          f"state updates/min: {totals['state_updates_per_minute']}, label bytes: {totals['label_bytes']}")
+    print(f"Wrote report to: {args.json_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,242 @@
+import os
+import re
+import sys
+import hashlib
+import argparse
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import yaml
+
+# 从告警实例的 PromQL 中提取重复的重计算子表达式，生成 Prometheus recording rules，
+# 并把告警 expr 改写为引用录制序列。
+# 输入: alert/instance/*.yaml
+# 输出: out/recording_rules.yaml（Prometheus rule file）
+#       out/instance-recorded/*.yaml（改写后的实例，可用 convert_yaml_to_grafana_json.py --instance-dir 转换）
+
+try:
+    from tools import promql
+    from tools.convert_yaml_to_grafana_json import INSTANCE_DIR, OUT_DIR, load_named_yaml_files, normalize_groups
+    from tools.render_alert_templates import _InstanceDumper
+except Exception:
+    # 兼容从工具目录直接执行
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    from tools import promql  # type: ignore
+    from tools.convert_yaml_to_grafana_json import INSTANCE_DIR, OUT_DIR, load_named_yaml_files, normalize_groups  # type: ignore
+    from tools.render_alert_templates import _InstanceDumper  # type: ignore
+
+RECORDING_RULES_PATH = os.path.join(OUT_DIR, 'recording_rules.yaml')
+RECORDED_INSTANCE_DIR = os.path.join(OUT_DIR, 'instance-recorded')
+RECORDING_GROUP_NAME = 'grafana-alert-recording-rules'
+EXPR_DATASOURCE = '__expr__'
+
+
+def _iter_queries(doc: Dict[str, Any]):
+    # 逐个产出 (rule, query) 中的 Prometheus 查询（排除 __expr__ 表达式节点）
+    for g in normalize_groups(doc):
+        for r in (g or {}).get('rules') or []:
+            for q in r.get('data') or []:
+                model = q.get('model') or {}
+                if q.get('datasourceUid') == EXPR_DATASOURCE or not isinstance(model.get('expr'), str):
+                    continue
+                yield r, q
+
+
+def is_recordable(node: Any) -> bool:
+    # 可录制：返回瞬时向量、至少包含一次区间函数计算、不含子查询/变量/@ 修饰
+    if not isinstance(node, (promql.AggregateExpr, promql.Call)):
+        return False
+    if isinstance(node, promql.Call) and node.func not in promql.RANGE_FUNCTIONS and node.func != 'histogram_quantile':
+        return False
+    has_range = False
+    for n in promql.walk(node):
+        if isinstance(n, promql.SubqueryExpr):
+            return False
+        if isinstance(n, promql.VectorSelector) and n.at:
+            return False
+        if isinstance(n, promql.MatrixSelector):
+            has_range = True
+    return has_range and not promql.has_variables(node)
+
+
+def split_offset(node: Any) -> Tuple[Any, Optional[str]]:
+    # 所有选择器 offset 相同时剥离 offset：X offset 1h 可复用 X 的录制序列（record offset 1h）
+    offsets = {s.offset for s in promql.selectors(node)}
+    if len(offsets) != 1:
+        return node, None
+    offset = offsets.pop()
+    if not offset:
+        return node, None
+
+    def strip(n: Any) -> Optional[Any]:
+        if isinstance(n, promql.VectorSelector):
+            return promql.VectorSelector(n.name, n.matchers, None, n.at)
+        if isinstance(n, promql.MatrixSelector):
+            return promql.MatrixSelector(promql.VectorSelector(n.vector.name, n.vector.matchers, None, n.vector.at), n.range)
+        return None
+    return promql.transform(node, strip), offset
+
+
+def _node_size(node: Any) -> int:
+    return sum(1 for _ in promql.walk(node))
+
+
+def _record_name(node: Any, used: Dict[str, str], key: str) -> str:
+    # 命名遵循 level:metric:operations 约定，如 name_appName:supplier_submit_total:rate1m
+    level = 'series'
+    ops: List[str] = []
+    n = node
+    while True:
+        if isinstance(n, promql.AggregateExpr):
+            if n.has_grouping:
+                level = ('without_' if n.without else '') + '_'.join(n.grouping)
+            if n.op != 'sum':
+                ops.append(n.op)
+            n = n.expr
+        elif isinstance(n, promql.Call) and n.args:
+            rng = next((a.range for a in n.args if isinstance(a, promql.MatrixSelector)), '')
+            ops.append(n.func + rng)
+            n = next((a for a in n.args if not isinstance(a, (promql.NumberLiteral, promql.StringLiteral))), n.args[-1])
+        else:
+            break
+    metrics = [s.name for s in promql.selectors(node) if s.name]
+    metric = metrics[0] if metrics else 'expr'
+    if len(set(metrics)) > 1:
+        metric += '_ratio' if isinstance(n, promql.BinaryExpr) and n.op == '/' else '_combined'
+    name = re.sub(r'[^A-Za-z0-9_:]', '_', f"{level}:{metric}:{'_'.join(ops) or 'expr'}")
+    if used.get(name, key) != key:
+        # 同形状但匹配器不同的表达式，以内容哈希区分
+        name += '_' + hashlib.sha1(key.encode('utf-8')).hexdigest()[:6]
+    used[name] = key
+    return name
+
+
+def find_candidates(exprs: List[Any], min_count: int = 2) -> Dict[str, Any]:
+    # 统计所有可录制子表达式的出现次数（含嵌套），按体积从大到小贪心选择：
+    # 某次出现若已被更大的已选表达式覆盖则不计数；出现次数 >= min_count 或出现在子查询内部即选中
+    occurrences: List[Tuple[str, Tuple[str, ...], bool]] = []
+    nodes: Dict[str, Any] = {}
+    for expr in exprs:
+        for node, parents in promql.walk_with_parents(expr):
+            if not is_recordable(node):
+                continue
+            node = split_offset(node)[0]
+            key = promql.canonical_key(node)
+            nodes[key] = node
+            ancestor_keys = tuple(promql.canonical_key(split_offset(p)[0]) for p in parents if is_recordable(p))
+            in_subquery = any(isinstance(p, promql.SubqueryExpr) for p in parents)
+            occurrences.append((key, ancestor_keys, in_subquery))
+
+    by_key: Dict[str, List[Tuple[Tuple[str, ...], bool]]] = defaultdict(list)
+    for key, ancestors, in_subquery in occurrences:
+        by_key[key].append((ancestors, in_subquery))
+
+    selected: Dict[str, Any] = {}
+    for key in sorted(by_key, key=lambda k: (-_node_size(nodes[k]), k)):
+        effective = [sq for ancestors, sq in by_key[key] if not any(a in selected for a in ancestors)]
+        if len(effective) >= min_count or any(effective):
+            selected[key] = nodes[key]
+    return selected
+
+
+def rewrite_expr(node: Any, recorded: Dict[str, str], interval_seconds: float) -> Any:
+    # 已录制的子表达式替换为录制序列；子查询步长与录制间隔一致时，
+    # avg_over_time(X[30m:1m]) 进一步改写为 avg_over_time(record[30m])，不再逐步重算
+    def fn(n: Any) -> Optional[Any]:
+        if isinstance(n, promql.SubqueryExpr) and not n.at:
+            inner, inner_offset = split_offset(n.expr)
+            key = promql.canonical_key(inner)
+            step = promql.duration_seconds(n.step) if n.step else None
+            if key in recorded and step == interval_seconds and not (inner_offset and n.offset):
+                return promql.MatrixSelector(promql.VectorSelector(recorded[key], (), inner_offset or n.offset), n.range)
+            return None
+        if is_recordable(n):
+            inner, offset = split_offset(n)
+            key = promql.canonical_key(inner)
+            if key in recorded:
+                return promql.VectorSelector(recorded[key], (), offset)
+        return None
+    return promql.transform(node, fn)
+
+
+def _reindent_expr(original: str, text: str) -> str:
+    # 保持块样式字符串以换行结尾的习惯
+    return text + '\n' if original.endswith('\n') else text
+
+
+def extract(instance_dir: str, min_count: int = 2, interval: str = '1m') -> Tuple[List[Dict[str, Any]], List[Tuple[str, Dict[str, Any]]], Dict[str, int]]:
+    docs = [(fname, doc or {}) for fname, doc in load_named_yaml_files(instance_dir)]
+    parsed: Dict[int, Any] = {}
+    exprs: List[Any] = []
+    errors = 0
+    for fname, doc in docs:
+        for r, q in _iter_queries(doc):
+            text = q['model']['expr']
+            if promql.has_variables(text):
+                continue
+            try:
+                node = promql.parse(text)
+            except promql.PromQLError as e:
+                errors += 1
+                print(f"Warning: cannot parse expr in {fname} rule {r.get('uid')} refId {q.get('refId')}: {e}", file=sys.stderr)
+                continue
+            parsed[id(q)] = node
+            exprs.append(node)
+
+    selected = find_candidates(exprs, min_count=min_count)
+    used: Dict[str, str] = {}
+    recorded: Dict[str, str] = {}
+    recording_rules: List[Dict[str, Any]] = []
+    for key in sorted(selected, key=lambda k: (_node_size(selected[k]), k)):
+        name = _record_name(selected[key], used, key)
+        recorded[key] = name
+        # 录制规则本身也可引用更小的已录制表达式
+        body = rewrite_expr(selected[key], {k: v for k, v in recorded.items() if k != key}, promql.duration_seconds(interval) or 60)
+        recording_rules.append({'record': name, 'expr': promql.format_expr(body)})
+
+    interval_seconds = promql.duration_seconds(interval) or 60
+    rewritten = 0
+    for fname, doc in docs:
+        for r, q in _iter_queries(doc):
+            node = parsed.get(id(q))
+            if node is None:
+                continue
+            new_node = rewrite_expr(node, recorded, interval_seconds)
+            if new_node != node:
+                q['model']['expr'] = _reindent_expr(q['model']['expr'], promql.format_expr(new_node))
+                rewritten += 1
+
+    stats = {'exprs': len(exprs), 'recorded': len(recording_rules), 'rewritten': rewritten, 'errors': errors}
+    return recording_rules, docs, stats
+
+
+def write_outputs(recording_rules: List[Dict[str, Any]], docs: List[Tuple[str, Dict[str, Any]]], rules_path: str,
+                  out_dir: str, interval: str) -> None:
+    os.makedirs(os.path.dirname(rules_path), exist_ok=True)
+    with open(rules_path, 'w', encoding='utf-8') as f:
+        yaml.dump({'groups': [{'name': RECORDING_GROUP_NAME, 'interval': interval, 'rules': recording_rules}]},
+                  f, Dumper=_InstanceDumper, allow_unicode=True, sort_keys=False, width=4096)
+    os.makedirs(out_dir, exist_ok=True)
+    for fname, doc in docs:
+        with open(os.path.join(out_dir, fname), 'w', encoding='utf-8') as f:
+            yaml.dump(doc, f, Dumper=_InstanceDumper, allow_unicode=True, sort_keys=False, width=4096)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Extract repeated PromQL sub-expressions into Prometheus recording rules.')
+    parser.add_argument('--instance-dir', default=INSTANCE_DIR, help='Directory of instance YAML files (default: alert/instance)')
+    parser.add_argument('--rules-out', default=RECORDING_RULES_PATH, help='Recording rules output (default: out/recording_rules.yaml)')
+    parser.add_argument('--out-dir', default=RECORDED_INSTANCE_DIR, help='Rewritten instance output dir (default: out/instance-recorded)')
+    parser.add_argument('--min-count', type=int, default=2, help='Minimum occurrences before a sub-expression is recorded (default: 2)')
+    parser.add_argument('--interval', default='1m', help='Evaluation interval of the recording rule group (default: 1m)')
+    args = parser.parse_args()
+
+    recording_rules, docs, stats = extract(args.instance_dir, min_count=args.min_count, interval=args.interval)
+    write_outputs(recording_rules, docs, args.rules_out, args.out_dir, args.interval)
+    print(f"Wrote recording rules to: {args.rules_out}")
+    print(f"Wrote rewritten instances to: {args.out_dir}")
+    print(f"Extract result: exprs={stats['exprs']}, recorded={stats['recorded']}, rewritten={stats['rewritten']}, errors={stats['errors']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,540 @@
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import threading
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote, unquote, urlparse
+
+import yaml
+import requests
+
+# 飞书 webhook 批量转发网关：告警风暴时联系点直接推送飞书机器人会触发限频（每个 webhook 5 次/秒、100 次/分钟）而丢消息。
+# 联系点的 webhook url 改为指向本服务的 /hook/<租户>/<接收器 uid>（租户为联系点文件所在目录名，如 pa / ponts），本服务：
+#   1) 接收 Grafana（Alertmanager 格式）通知，按接收器入队；同一告警（fingerprint + 状态）在队列中只保留最新一条；
+#   2) 每个接收器攒批 --window 秒（或攒满 --max-alerts 条）后合并为一条摘要消息，
+#      格式同 alert/setting/custom.alerts：告警数、每条告警的 Summary / Time（UTC+8）/ Description；
+#   3) 按目标 webhook 令牌桶限速（--rate / --burst）转发到联系点中原来的 url；被限频（HTTP 429 或飞书 code 11232/9499）
+#      或 5xx 时退避重试，批次放回队首；等待令牌期间新到的告警并入下一条消息；
+#   4) 背压：接收器排队告警数达到 --max-queue 时返回 429 + Retry-After，由 Grafana 稍后重试，不在本服务内无界堆积。
+# 端点：POST /hook/<租户>/<uid>；GET /metrics（Prometheus 文本格式）；GET /healthz
+
+try:
+    from tools.import_alert_settings import expand_setting_paths, collect_receivers, _load_yaml
+except Exception:
+    # 兼容从工具目录直接执行
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    from tools.import_alert_settings import expand_setting_paths, collect_receivers, _load_yaml  # type: ignore
+
+DEFAULT_PORT = 8095
+DEFAULT_WINDOW = 5.0
+# 飞书限频为每个 webhook 5 次/秒、100 次/分钟；默认 1 条/秒、突发 5 条，长期低于分钟上限
+DEFAULT_RATE = 1.0
+DEFAULT_BURST = 5
+DEFAULT_MAX_ALERTS = 20
+DEFAULT_MAX_QUEUE = 1000
+DEFAULT_MAX_RETRIES = 5
+# 飞书文本消息请求体上限约 20KB，摘要正文超过该长度时剩余告警留到下一条消息
+MAX_MESSAGE_CHARS = 15000
+MAX_BACKOFF_SECONDS = 30.0
+REQ_TIMEOUT = float(os.environ.get('FEISHU_TIMEOUT', '10'))
+RATE_LIMITED_CODES = (9499, 11232)
+UTC8 = timezone(timedelta(hours=8))
+METRIC_PREFIX = 'feishu_relay'
+
+
+# ==================== 消息渲染 ====================
+
+def parse_time(value: Any) -> Optional[datetime]:
+    # RFC3339（Grafana 为纳秒精度，如 2024-05-01T10:00:00.123456789Z）；零值 0001-01-01 视为空
+    if not isinstance(value, str) or not value or value.startswith('0001-01-01'):
+        return None
+    s = value.strip().replace('Z', '+00:00')
+    date, _, rest = s.partition('.')
+    if rest:
+        digits = len(rest) - len(rest.lstrip('0123456789'))
+        s = f"{date}.{rest[:min(digits, 6)]}{rest[digits:]}"
+    try:
+        dt = datetime.fromisoformat(s)
+    except ValueError:
+        return None
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def format_time(value: Any) -> str:
+    # 同 custom.alerts 的 (.StartsAt.Add 28800e9).Format "2006-01-02 15:04:05"
+    dt = parse_time(value)
+    return dt.astimezone(UTC8).strftime('%Y-%m-%d %H:%M:%S') if dt else str(value or '')
+
+
+def notification_title(payload: Dict[str, Any]) -> str:
+    # 同 custom.title：按键排序的 groupLabels 取值以空格连接
+    group_labels = payload.get('groupLabels') or {}
+    return ' '.join(str(group_labels[k]) for k in sorted(group_labels)) or str(payload.get('title') or '').strip()
+
+
+def alert_key(alert: Dict[str, Any]) -> str:
+    labels = alert.get('fingerprint') or json.dumps(alert.get('labels') or {}, sort_keys=True, ensure_ascii=False)
+    return f"{labels}|{alert.get('status') or 'firing'}"
+
+
+def render_alert(alert: Dict[str, Any]) -> List[str]:
+    annotations = alert.get('annotations') or {}
+    lines = ['',
+             f"  Summary: {annotations.get('summary', '')}",
+             f"  Time: {format_time(alert.get('startsAt'))}",
+             f"  Description: {annotations.get('description', '')}"]
+    if alert.get('status') == 'resolved':
+        lines.append(f"  Resolved: {format_time(alert.get('endsAt'))}")
+    return lines
+
+
+def render_digest(entries: List[Tuple[str, Dict[str, Any]]]) -> Tuple[str, str]:
+    # entries: [(通知标题, 告警)]；只有一个标题时正文与 custom.alerts 相同，多个标题时按标题分段
+    titles = list(OrderedDict.fromkeys(t for t, _ in entries))
+    lines = [f"{len(entries)} alert(s)"]
+    for title in titles:
+        if len(titles) > 1:
+            lines.append(f"[{title}]")
+        for t, alert in entries:
+            if t == title:
+                lines.extend(render_alert(alert))
+    title = titles[0] if len(titles) == 1 else f"{titles[0]} (+{len(titles) - 1} more)"
+    return title, '\n'.join(lines)
+
+
+def build_message(url: str, receiver: str, entries: List[Tuple[str, Dict[str, Any]]]) -> Dict[str, Any]:
+    # 机器人 webhook（open-apis/bot）发送文本消息；流程 webhook（flow/api/trigger-webhook）保持 Grafana webhook 的请求体结构，
+    # title / message 为合并后的摘要，流程中引用这两个字段的步骤无需修改
+    title, text = render_digest(entries)
+    if '/open-apis/bot/' in url:
+        return {'msg_type': 'text', 'content': {'text': f"{title}\n{text}"}}
+    alerts = [a for _, a in entries]
+    status = 'firing' if any(a.get('status', 'firing') == 'firing' for a in alerts) else 'resolved'
+    return {'receiver': receiver, 'status': status, 'state': 'alerting' if status == 'firing' else 'ok',
+            'title': title, 'message': text, 'alerts': alerts}
+
+
+def classify_response(resp: requests.Response) -> str:
+    # ok / retry（限频、5xx）/ fail（其他错误，重试无意义）；飞书限频时 HTTP 状态可能仍为 200，需检查 code
+    if resp.status_code == 429 or resp.status_code >= 500:
+        return 'retry'
+    try:
+        body = resp.json()
+    except ValueError:
+        body = {}
+    code = body.get('code', body.get('StatusCode', 0)) if isinstance(body, dict) else 0
+    if code in RATE_LIMITED_CODES:
+        return 'retry'
+    if resp.status_code >= 400 or code:
+        return 'fail'
+    return 'ok'
+
+
+# ==================== 路由（联系点 -> 真实 webhook） ====================
+
+def tenant_of(path: str) -> str:
+    # 租户 = 联系点文件所在目录名（alert/setting/pa/*.yaml -> pa）
+    return os.path.basename(os.path.dirname(os.path.abspath(path)))
+
+
+def route_key(tenant: str, uid: str) -> str:
+    return f"{tenant}/{uid}"
+
+
+def load_routes(paths: List[str], redirect: Optional[str] = None) -> Dict[str, Dict[str, str]]:
+    # <租户>/<接收器 uid> -> {url, name, tenant, uid}；只取 webhook 类型。
+    # 各租户的联系点复用同一批 uid、url 不同，按租户分别汇总，冲突只在同一租户内判断。
+    # redirect 把所有目标的 scheme://host 替换为本地替身（端到端测试用）
+    by_tenant: Dict[str, List[str]] = OrderedDict()
+    for path in expand_setting_paths(paths):
+        by_tenant.setdefault(tenant_of(path), []).append(path)
+    routes: Dict[str, Dict[str, str]] = {}
+    for tenant, files in by_tenant.items():
+        receivers, conflicts = collect_receivers(files)
+        for c in conflicts:
+            print(f"Warning: conflicting ContactPoint receiver definitions for {c}; skipped", file=sys.stderr)
+        for _, body in receivers:
+            url = (body.get('settings') or {}).get('url')
+            if body.get('type') != 'webhook' or not url or not body.get('uid'):
+                continue
+            if redirect:
+                u = urlparse(url)
+                url = redirect.rstrip('/') + u.path + (f"?{u.query}" if u.query else '')
+            routes[route_key(tenant, body['uid'])] = {'url': url, 'name': body['name'], 'tenant': tenant, 'uid': body['uid']}
+    return routes
+
+
+def export_contact_points(paths: List[str], relay_url: str, routes: Dict[str, Dict[str, str]], out_dir: str) -> List[str]:
+    # 按 <租户目录>/<原文件名> 写出联系点副本，webhook url 改为 <relay_url>/hook/<租户>/<uid>，可直接交给 import_alert_settings.py 导入
+    written = []
+    for path in expand_setting_paths(paths):
+        tenant = tenant_of(path)
+        data = _load_yaml(path)
+        for cp in data.get('contactPoints') or []:
+            for rc in cp.get('receivers') or []:
+                if rc.get('uid') and route_key(tenant, rc['uid']) in routes and isinstance(rc.get('settings'), dict):
+                    rc['settings']['url'] = f"{relay_url.rstrip('/')}/hook/{quote(tenant, safe='')}/{quote(rc['uid'], safe='')}"
+        out_path = os.path.join(out_dir, tenant, os.path.basename(path))
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        with open(out_path, 'w', encoding='utf-8') as f:
+            yaml.safe_dump(data, f, allow_unicode=True, sort_keys=False)
+        written.append(out_path)
+    return written
+
+
+# ==================== 队列与限速 ====================
+
+class TokenBucket:
+    # 每个目标 webhook 一个桶；reserve 预占一个令牌并返回需要等待的秒数（多个接收器共用同一 webhook 时按预占顺序排队）
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def penalize(self, seconds: float) -> None:
+        # 目标已限频：清空令牌并预扣 seconds 秒的补充量
+        with self.lock:
+            self.tokens = min(self.tokens, 0.0) - seconds * self.rate
+
+
+class ReceiverQueue:
+    def __init__(self, uid: str, url: str, name: str, tenant: str = '', receiver: str = ''):
+        # uid 为路由键 <租户>/<接收器 uid>；tenant / receiver 用于指标标签
+        self.uid = uid
+        self.url = url
+        self.name = name
+        self.tenant = tenant
+        self.receiver = receiver or uid
+        # 告警键 -> (通知标题, 告警)；同键新告警覆盖旧值并保持位置
+        self.items: 'OrderedDict[str, Tuple[str, Dict[str, Any]]]' = OrderedDict()
+        self.first_at = 0.0
+        self.in_flight = 0
+        self.failures = 0
+        self.counts: Dict[str, int] = defaultdict(int)
+
+
+class Relay:
+    def __init__(self, routes: Dict[str, Dict[str, str]], window: float = DEFAULT_WINDOW, rate: float = DEFAULT_RATE,
+                 burst: int = DEFAULT_BURST, max_alerts: int = DEFAULT_MAX_ALERTS, max_queue: int = DEFAULT_MAX_QUEUE,
+                 max_retries: int = DEFAULT_MAX_RETRIES, verbose: bool = False):
+        self.window = window
+        self.rate = rate
+        self.max_alerts = max(1, max_alerts)
+        self.max_queue = max(1, max_queue)
+        self.max_retries = max_retries
+        self.verbose = verbose
+        self.cond = threading.Condition()
+        self.closing = False
+        self.queues = {uid: ReceiverQueue(uid, r['url'], r['name'], r.get('tenant', ''), r.get('uid', '')) for uid, r in routes.items()}
+        self.buckets: Dict[str, TokenBucket] = {}
+        for q in self.queues.values():
+            self.buckets.setdefault(q.url, TokenBucket(rate, burst))
+        self.threads: Dict[str, threading.Thread] = {}
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=10, pool_maxsize=max(10, len(self.buckets)))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def log(self, msg: str) -> None:
+        if self.verbose:
+            print(msg, flush=True)
+
+    def enqueue(self, uid: str, payload: Any) -> Tuple[int, Dict[str, Any], Dict[str, str]]:
+        # 返回 (HTTP 状态, 响应体, 响应头)
+        q = self.queues.get(uid)
+        if q is None:
+            return 404, {'message': f'unknown receiver {uid}'}, {}
+        if not isinstance(payload, dict) or not isinstance(payload.get('alerts'), list):
+            return 400, {'message': 'expected an Alertmanager webhook payload with an alerts list'}, {}
+        title = notification_title(payload)
+        with self.cond:
+            if self.closing:
+                return 503, {'message': 'relay is shutting down'}, {'Retry-After': '5'}
+            new_keys = {alert_key(a) for a in payload['alerts'] if isinstance(a, dict)} - set(q.items)
+            if len(q.items) + len(new_keys) > self.max_queue:
+                q.counts['rejected'] += 1
+                # 预计排空所需时间：共用同一 webhook 的接收器分享 rate，每条消息最多 max_alerts 条告警
+                backlog = sum(math.ceil(len(x.items) / self.max_alerts) for x in self.queues.values() if x.url == q.url)
+                retry_after = max(1, math.ceil(backlog / self.rate))
+                return 429, {'message': f'queue for {uid} is full ({len(q.items)} alerts)'}, {'Retry-After': str(retry_after)}
+            if not q.items:
+                q.first_at = time.monotonic()
+            for a in payload['alerts']:
+                if not isinstance(a, dict):
+                    continue
+                key = alert_key(a)
+                q.counts['coalesced' if key in q.items else 'received'] += 1
+                q.items[key] = (title, a)
+            if uid not in self.threads:
+                t = threading.Thread(target=self._dispatch, args=(q,), name=f'relay-{uid}', daemon=True)
+                self.threads[uid] = t
+                t.start()
+            self.cond.notify_all()
+            return 202, {'queued': len(q.items)}, {}
+
+    def _take(self, q: ReceiverQueue) -> List[Tuple[str, Tuple[str, Dict[str, Any]]]]:
+        # 在锁内取出一批：最多 max_alerts 条且正文不超过 MAX_MESSAGE_CHARS（至少一条）
+        batch: List[Tuple[str, Tuple[str, Dict[str, Any]]]] = []
+        size = 0
+        while q.items and len(batch) < self.max_alerts:
+            key, entry = next(iter(q.items.items()))
+            n = sum(len(line) + 1 for line in render_alert(entry[1])) + len(entry[0])
+            if batch and size + n > MAX_MESSAGE_CHARS:
+                break
+            size += n
+            batch.append((key, entry))
+            del q.items[key]
+        # 剩余告警已等待过攒批窗口，令牌可用即发送
+        q.first_at = time.monotonic() - self.window
+        q.in_flight = len(batch)
+        return batch
+
+    def _requeue(self, q: ReceiverQueue, batch: List[Tuple[str, Tuple[str, Dict[str, Any]]]]) -> None:
+        # 失败的批次放回队首；排队期间同一告警有更新时保留新值
+        merged: 'OrderedDict[str, Tuple[str, Dict[str, Any]]]' = OrderedDict(batch)
+        merged.update(q.items)
+        q.items = merged
+
+    def _dispatch(self, q: ReceiverQueue) -> None:
+        bucket = self.buckets[q.url]
+        while True:
+            with self.cond:
+                while not q.items:
+                    self.cond.wait()
+                # 攒批：从第一条告警到达起等待 window 秒，攒满或关闭时立即发送
+                while not self.closing and len(q.items) < self.max_alerts:
+                    remaining = q.first_at + self.window - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.cond.wait(remaining)
+            wait = bucket.reserve()
+            if wait > 0:
+                q.counts['throttled_seconds_ms'] += int(wait * 1000)
+                time.sleep(wait)
+            with self.cond:
+                batch = self._take(q)
+            entries = [entry for _, entry in batch]
+            outcome, retry_after = 'retry', None
+            try:
+                resp = self.session.post(q.url, data=json.dumps(build_message(q.url, q.name, entries), ensure_ascii=False).encode('utf-8'),
+                                         headers={'Content-Type': 'application/json; charset=utf-8'}, timeout=REQ_TIMEOUT)
+                outcome = classify_response(resp)
+                detail = f"{resp.status_code} {resp.text[:200]}"
+                if resp.headers.get('Retry-After', '').isdigit():
+                    retry_after = float(resp.headers['Retry-After'])
+            except requests.RequestException as e:
+                detail = str(e)
+            with self.cond:
+                q.in_flight = 0
+                if outcome == 'ok':
+                    q.failures = 0
+                    q.counts['messages'] += 1
+                    q.counts['sent'] += len(batch)
+                    self.log(f"Sent {len(batch)} alert(s) to {q.uid}")
+                elif outcome == 'retry' and q.failures < self.max_retries:
+                    q.failures += 1
+                    q.counts['retries'] += 1
+                    self._requeue(q, batch)
+                else:
+                    q.failures = 0
+                    q.counts['dropped'] += len(batch)
+                    print(f"Error: dropped {len(batch)} alert(s) for {q.uid} after {outcome}: {detail}", file=sys.stderr)
+                self.cond.notify_all()
+            if outcome == 'retry' and q.failures:
+                backoff = retry_after if retry_after is not None else min(MAX_BACKOFF_SECONDS, 0.5 * 2 ** (q.failures - 1))
+                bucket.penalize(backoff)
+                self.log(f"Rate limited or failed on {q.uid} ({detail}); retry {q.failures}/{self.max_retries} in {backoff:.1f}s")
+
+    def pending(self) -> int:
+        with self.cond:
+            return sum(len(q.items) + q.in_flight for q in self.queues.values())
+
+    def close(self, timeout: float) -> int:
+        # 停止接收并立即发送剩余批次（忽略攒批窗口），最多等待 timeout 秒；返回未能发出的告警数
+        with self.cond:
+            self.closing = True
+            self.cond.notify_all()
+        deadline = time.monotonic() + timeout
+        while self.pending() and time.monotonic() < deadline:
+            time.sleep(0.1)
+        return self.pending()
+
+    def totals(self) -> Dict[str, int]:
+        out: Dict[str, int] = defaultdict(int)
+        with self.cond:
+            for q in self.queues.values():
+                for k, v in q.counts.items():
+                    out[k] += v
+        return dict(out)
+
+    def metrics_text(self) -> str:
+        names = (('received', 'alerts_received_total', 'Alerts accepted from Grafana'),
+                 ('coalesced', 'alerts_coalesced_total', 'Alerts that replaced an identical queued alert'),
+                 ('sent', 'alerts_sent_total', 'Alerts delivered in digest messages'),
+                 ('messages', 'messages_sent_total', 'Digest messages delivered'),
+                 ('retries', 'send_retries_total', 'Sends retried after rate limiting or server errors'),
+                 ('dropped', 'alerts_dropped_total', 'Alerts dropped after failed sends'),
+                 ('rejected', 'requests_rejected_total', 'Incoming requests rejected with 429 because the queue was full'),
+                 ('throttled_seconds_ms', 'throttled_milliseconds_total', 'Time spent waiting for the rate budget'))
+        lines: List[str] = []
+        with self.cond:
+            for key, metric, help_text in names:
+                lines.append(f"# HELP {METRIC_PREFIX}_{metric} {help_text}")
+                lines.append(f"# TYPE {METRIC_PREFIX}_{metric} counter")
+                lines.extend(f'{METRIC_PREFIX}_{metric}{{{_labels(q)}}} {q.counts.get(key, 0)}' for _, q in sorted(self.queues.items()))
+            lines.append(f"# HELP {METRIC_PREFIX}_queued_alerts Alerts waiting to be sent")
+            lines.append(f"# TYPE {METRIC_PREFIX}_queued_alerts gauge")
+            lines.extend(f'{METRIC_PREFIX}_queued_alerts{{{_labels(q)}}} {len(q.items) + q.in_flight}' for _, q in sorted(self.queues.items()))
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(q: ReceiverQueue) -> str:
+    return (f'tenant="{q.tenant}",' if q.tenant else '') + f'receiver="{q.receiver}"'
+
+
+# ==================== HTTP 服务 ====================
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = 'FeishuRelay/1.0'
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format: str, *args: Any) -> None:
+        if self.server.relay.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status: int, body: Any, headers: Optional[Dict[str, str]] = None, content_type: str = 'application/json') -> None:
+        data = body.encode('utf-8') if isinstance(body, str) else json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', f'{content_type}; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == '/metrics':
+            return self._send(200, self.server.relay.metrics_text(), content_type='text/plain; version=0.0.4')
+        if path == '/healthz':
+            return self._send(200, {'status': 'ok', 'queued': self.server.relay.pending()})
+        self._send(404, {'message': 'not found'})
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        if not path.startswith('/hook/'):
+            return self._send(404, {'message': 'not found'})
+        try:
+            payload = json.loads(raw.decode('utf-8'))
+        except ValueError:
+            return self._send(400, {'message': 'invalid JSON'})
+        status, body, headers = self.server.relay.enqueue(unquote(path[len('/hook/'):]), payload)
+        self._send(status, body, headers)
+
+
+class RelayServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address: Tuple[str, int], relay: Relay):
+        super().__init__(address, _Handler)
+        self.relay = relay
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_relay(relay: Relay, host: str = '127.0.0.1', port: int = 0) -> RelayServer:
+    # 在后台线程启动；port=0 时由系统分配端口，结束时先 relay.close() 再 server.shutdown()
+    server = RelayServer((host, port), relay)
+    threading.Thread(target=server.serve_forever, name='feishu-relay', daemon=True).start()
+    return server
+
+
+def print_totals(totals: Dict[str, int]) -> None:
+    print(f"Relay result: received={totals.get('received', 0)}, coalesced={totals.get('coalesced', 0)}, "
+          f"sent={totals.get('sent', 0)} in {totals.get('messages', 0)} message(s), retries={totals.get('retries', 0)}, "
+          f"dropped={totals.get('dropped', 0)}, rejected requests={totals.get('rejected', 0)}, "
+          f"throttled={totals.get('throttled_seconds_ms', 0) / 1000:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Relay Grafana webhook notifications to Feishu as rate-limited digest messages.')
+    parser.add_argument('--contact-points', dest='cp_paths', nargs='+', required=True, metavar='PATH',
+                        help='Contact-points YAML files or directories whose webhook receivers are relayed (e.g. alert/setting/pa)')
+    parser.add_argument('--host', default='127.0.0.1', help='Bind address (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'Listen port (default: {DEFAULT_PORT})')
+    parser.add_argument('--window', type=float, default=DEFAULT_WINDOW, help=f'Seconds to coalesce alerts per receiver (default: {DEFAULT_WINDOW})')
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help=f'Messages per second per target webhook (default: {DEFAULT_RATE})')
+    parser.add_argument('--burst', type=int, default=DEFAULT_BURST, help=f'Burst size per target webhook (default: {DEFAULT_BURST})')
+    parser.add_argument('--max-alerts', type=int, default=DEFAULT_MAX_ALERTS, help=f'Alerts per digest message (default: {DEFAULT_MAX_ALERTS})')
+    parser.add_argument('--max-queue', type=int, default=DEFAULT_MAX_QUEUE,
+                        help=f'Queued alerts per receiver before answering 429 (default: {DEFAULT_MAX_QUEUE})')
+    parser.add_argument('--max-retries', type=int, default=DEFAULT_MAX_RETRIES,
+                        help=f'Retries of a rate-limited or failed message before it is dropped (default: {DEFAULT_MAX_RETRIES})')
+    parser.add_argument('--drain-timeout', type=float, default=30.0, help='Seconds to keep sending queued alerts on shutdown (default: 30)')
+    parser.add_argument('--redirect', metavar='URL', help='Send to this scheme://host instead of the real webhook host (local stand-in testing)')
+    parser.add_argument('--export-contact-points', metavar='DIR',
+                        help='Write copies of the contact-point files pointing at --relay-url into DIR and exit')
+    parser.add_argument('--relay-url', help='Externally reachable relay URL used by --export-contact-points (default: http://HOST:PORT)')
+    parser.add_argument('--verbose', action='store_true', help='Log requests and every send')
+    args = parser.parse_args()
+
+    try:
+        routes = load_routes(args.cp_paths, redirect=args.redirect)
+    except (OSError, yaml.YAMLError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(2)
+    if not routes:
+        print("No webhook receivers found in the given contact points", file=sys.stderr)
+        sys.exit(2)
+
+    if args.export_contact_points:
+        relay_url = args.relay_url or f"http://{args.host}:{args.port}"
+        for path in export_contact_points(args.cp_paths, relay_url, routes, args.export_contact_points):
+            print(f"Exported: {path}")
+        return
+
+    relay = Relay(routes, window=args.window, rate=args.rate, burst=args.burst, max_alerts=args.max_alerts,
+                  max_queue=args.max_queue, max_retries=args.max_retries, verbose=args.verbose)
+    server = RelayServer((args.host, args.port), relay)
+    print(f"Feishu relay listening on {server.base_url}: receivers={len(routes)}, webhooks={len(relay.buckets)}, "
+          f"window={args.window:g}s, rate={args.rate:g}/s, burst={args.burst}")
+    threading.Thread(target=server.serve_forever, name='feishu-relay', daemon=True).start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    left = relay.close(args.drain_timeout)
+    server.shutdown()
+    server.server_close()
+    print_totals(relay.totals())
+    if left:
+        print(f"Warning: {left} queued alert(s) were not sent before shutdown", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
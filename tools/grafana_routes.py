@@ -0,0 +1,26 @@
+import re
+from typing import List, Optional, Tuple
+
+# 导入脚本使用的 Grafana API 路由表
+# mock_grafana 据此分发请求，http_metrics / benchmark_import 据此把 URL 归并为路由名（uid、组名等路径参数不进入统计标签）
+
+_ROUTES: List[Tuple[str, re.Pattern]] = [
+    ('folders', re.compile(r'^/api/folders$')),
+    ('alert-rules', re.compile(r'^/api/v1/provisioning/alert-rules$')),
+    ('alert-rule', re.compile(r'^/api/v1/provisioning/alert-rules/(?P<uid>[^/]+)$')),
+    ('rule-group', re.compile(r'^/api/v1/provisioning/folder/(?P<folder>[^/]+)/rule-groups/(?P<group>.+)$')),
+    ('contact-points', re.compile(r'^/api/v1/provisioning/contact-points$')),
+    ('contact-point', re.compile(r'^/api/v1/provisioning/contact-points/(?P<uid>[^/]+)$')),
+    ('policies', re.compile(r'^/api/v1/provisioning/policies$')),
+    ('dashboard-db', re.compile(r'^/api/dashboards/db$')),
+    ('dashboard', re.compile(r'^/api/dashboards/uid/(?P<uid>[^/]+)$')),
+]
+
+
+def match_route(path: str) -> Tuple[str, Optional[re.Match]]:
+    # 返回 (路由名, 匹配结果)；未知路径为 ('unknown', None)
+    for name, rx in _ROUTES:
+        m = rx.match(path)
+        if m:
+            return name, m
+    return 'unknown', None
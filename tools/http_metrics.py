@@ -0,0 +1,258 @@
+import os
+import sys
+import json
+import math
+import time
+import atexit
+import bisect
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+from urllib3.util.retry import Retry
+
+# 导入脚本的 HTTP 计时与统计
+# get_auth_session 创建的会话在启用后自动挂载响应钩子，按 “METHOD 路由” 记录：
+#   请求数与状态码、延迟直方图、发送/接收字节数、urllib3 Retry 的重试次数与退避耗时；
+# 另外记录脚本内主动等待的时间（规则组可见性轮询、限速）。
+# 运行结束时写出 JSON 报告与 Prometheus 文本格式（可交给 node_exporter textfile collector），并在 stderr 打印最慢的端点。
+
+try:
+    from tools.grafana_routes import match_route
+except Exception:
+    # 兼容从工具目录直接执行
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    from tools.grafana_routes import match_route  # type: ignore
+
+METRIC_PREFIX = 'grafana_provisioning'
+# 延迟直方图上界（秒），与 Prometheus 客户端库默认桶一致
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SUMMARY_TOP = 5
+
+
+def _endpoint(method: str, url: str) -> Tuple[str, str, str]:
+    # (host, method, route)；路由与 mock_grafana 共用 grafana_routes 中的路由表，uid/组名等路径参数不进入标签，未知路径保留原样
+    parsed = urlparse(url)
+    path = unquote(parsed.path)
+    route, _ = match_route(path)
+    return parsed.netloc, method, route if route != 'unknown' else path
+
+
+class _Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.values: List[float] = []
+
+    def observe(self, v: float) -> None:
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, v)] += 1
+        self.sum += v
+        self.values.append(v)
+
+    def quantile(self, q: float) -> float:
+        # nearest-rank：不小于 q 比例样本的最小值
+        if not self.values:
+            return 0.0
+        values = sorted(self.values)
+        return values[max(0, math.ceil(q * len(values)) - 1)]
+
+
+class HttpMetrics:
+    def __init__(self, job: str = ''):
+        self.job = job
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.latency: Dict[Tuple[str, str, str], _Histogram] = defaultdict(_Histogram)
+        self.statuses: Dict[Tuple[str, str, str, int], int] = defaultdict(int)
+        self.bytes_sent: Dict[Tuple[str, str, str], int] = defaultdict(int)
+        self.bytes_received: Dict[Tuple[str, str, str], int] = defaultdict(int)
+        self.retries: Dict[Tuple[str, str, str], int] = defaultdict(int)
+        self.backoff: Dict[Tuple[str, str, str], float] = defaultdict(float)
+        self.sleeps: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0])
+
+    def hook(self, resp, *args, **kwargs):
+        # requests 响应钩子：只看到重试后的最终响应；elapsed 为发送请求到解析完响应头
+        key = _endpoint(resp.request.method, resp.request.url)
+        body = resp.request.body
+        sent = len(body.encode('utf-8') if isinstance(body, str) else body or b'')
+        received = len(resp.content or b'')
+        # 同一线程内本次请求的重试与限速排队（钩子在 adapter.send 返回后于同一线程执行）；
+        # elapsed 包含两者，扣除后延迟只反映网络与服务端耗时
+        retries, backoff = getattr(_local, 'retries', 0), getattr(_local, 'backoff', 0.0)
+        queued = getattr(_local, 'queued', 0.0)
+        _local.retries, _local.backoff, _local.queued = 0, 0.0, 0.0
+        with self.lock:
+            self.latency[key].observe(max(0.0, resp.elapsed.total_seconds() - backoff - queued))
+            self.statuses[key + (resp.status_code,)] += 1
+            self.bytes_sent[key] += sent
+            self.bytes_received[key] += received
+            if retries:
+                self.retries[key] += retries
+                self.backoff[key] += backoff
+        return resp
+
+    def record_sleep(self, reason: str, seconds: float) -> None:
+        with self.lock:
+            entry = self.sleeps[reason]
+            entry[0] += 1
+            entry[1] += seconds
+
+    def report(self) -> Dict[str, Any]:
+        with self.lock:
+            endpoints = []
+            keys = set(self.latency) | set(self.retries)
+            for key in sorted(keys):
+                h = self.latency.get(key) or _Histogram()
+                endpoints.append({
+                    'host': key[0], 'method': key[1], 'route': key[2],
+                    'requests': len(h.values),
+                    'statuses': {str(s): n for (k0, k1, k2, s), n in sorted(self.statuses.items()) if (k0, k1, k2) == key},
+                    'seconds': round(h.sum, 6),
+                    'p50_ms': round(h.quantile(0.5) * 1000, 3),
+                    'p90_ms': round(h.quantile(0.9) * 1000, 3),
+                    'p99_ms': round(h.quantile(0.99) * 1000, 3),
+                    'max_ms': round(max(h.values, default=0.0) * 1000, 3),
+                    'buckets': {str(le): c for le, c in zip(LATENCY_BUCKETS + ('+Inf',), h.counts)},
+                    'bytes_sent': self.bytes_sent.get(key, 0),
+                    'bytes_received': self.bytes_received.get(key, 0),
+                    'retries': self.retries.get(key, 0),
+                    'backoff_seconds': round(self.backoff.get(key, 0.0), 6),
+                })
+            sleeps = {reason: {'count': int(c), 'seconds': round(s, 6)} for reason, (c, s) in sorted(self.sleeps.items())}
+        return {
+            'job': self.job,
+            'wall_seconds': round(time.monotonic() - self.started, 3),
+            'requests': sum(e['requests'] for e in endpoints),
+            'http_seconds': round(sum(e['seconds'] for e in endpoints), 6),
+            'retries': sum(e['retries'] for e in endpoints),
+            'backoff_seconds': round(sum(e['backoff_seconds'] for e in endpoints), 6),
+            'sleep_seconds': round(sum(s['seconds'] for s in sleeps.values()), 6),
+            'endpoints': endpoints,
+            'sleeps': sleeps,
+        }
+
+    def exposition(self, report: Optional[Dict[str, Any]] = None) -> str:
+        # Prometheus 文本格式（version 0.0.4）
+        report = report or self.report()
+        job = _escape(self.job)
+        lines: List[str] = []
+
+        def family(name: str, kind: str, help_text: str) -> str:
+            full = f'{METRIC_PREFIX}_{name}'
+            lines.append(f'# HELP {full} {help_text}')
+            lines.append(f'# TYPE {full} {kind}')
+            return full
+
+        def labels(e: Dict[str, Any], **extra: str) -> str:
+            pairs = [('job', job), ('host', _escape(e['host'])), ('method', e['method']), ('route', _escape(e['route']))]
+            pairs += [(k, _escape(v)) for k, v in extra.items()]
+            return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}'
+
+        name = family('http_request_duration_seconds', 'histogram', 'HTTP request latency (send to response headers).')
+        for e in report['endpoints']:
+            cumulative = 0
+            for le, c in e['buckets'].items():
+                cumulative += c
+                lines.append(f'{name}_bucket{labels(e, le=le)} {cumulative}')
+            lines.append(f'{name}_sum{labels(e)} {e["seconds"]}')
+            lines.append(f'{name}_count{labels(e)} {e["requests"]}')
+        name = family('http_requests_total', 'counter', 'HTTP requests by final status code.')
+        for e in report['endpoints']:
+            for status, n in e['statuses'].items():
+                lines.append(f'{name}{labels(e, status=status)} {n}')
+        name = family('http_request_bytes_total', 'counter', 'Request body bytes sent.')
+        for e in report['endpoints']:
+            lines.append(f'{name}{labels(e)} {e["bytes_sent"]}')
+        name = family('http_response_bytes_total', 'counter', 'Response body bytes received.')
+        for e in report['endpoints']:
+            lines.append(f'{name}{labels(e)} {e["bytes_received"]}')
+        name = family('http_retries_total', 'counter', 'Automatic urllib3 retries.')
+        for e in report['endpoints']:
+            lines.append(f'{name}{labels(e)} {e["retries"]}')
+        name = family('http_retry_backoff_seconds_total', 'counter', 'Time spent in urllib3 retry backoff and Retry-After waits.')
+        for e in report['endpoints']:
+            lines.append(f'{name}{labels(e)} {e["backoff_seconds"]}')
+        name = family('sleep_seconds_total', 'counter', 'Time spent in explicit waits by reason.')
+        for reason, s in report['sleeps'].items():
+            lines.append(f'{name}{{job="{job}",reason="{_escape(reason)}"}} {s["seconds"]}')
+        name = family('run_duration_seconds', 'gauge', 'Wall-clock duration of the run.')
+        lines.append(f'{name}{{job="{job}"}} {report["wall_seconds"]}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, prefix: str) -> Tuple[str, str]:
+        # 写出 <prefix>.json 与 <prefix>.prom
+        report = self.report()
+        os.makedirs(os.path.dirname(os.path.abspath(prefix)) or '.', exist_ok=True)
+        json_path, prom_path = prefix + '.json', prefix + '.prom'
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        with open(prom_path, 'w', encoding='utf-8') as f:
+            f.write(self.exposition(report))
+        return json_path, prom_path
+
+    def print_summary(self, stream: Any = None) -> None:
+        report = self.report()
+        stream = stream or sys.stderr
+        print(f"HTTP: requests={report['requests']}, http_s={report['http_seconds']:.3f}, retries={report['retries']}, "
+              f"backoff_s={report['backoff_seconds']:.3f}, sleep_s={report['sleep_seconds']:.3f}, wall_s={report['wall_seconds']:.3f}", file=stream)
+        for e in sorted(report['endpoints'], key=lambda e: -e['seconds'])[:SUMMARY_TOP]:
+            print(f"  {e['method']} {e['route']} ({e['host']}): n={e['requests']}, total_s={e['seconds']:.3f}, "
+                  f"p50={e['p50_ms']}ms, p99={e['p99_ms']}ms, retries={e['retries']}", file=stream)
+        for reason, s in report['sleeps'].items():
+            print(f"  sleep {reason}: n={s['count']}, total_s={s['seconds']:.3f}", file=stream)
+
+
+def _escape(v: Any) -> str:
+    return str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+_RECORDER: Optional[HttpMetrics] = None
+_local = threading.local()
+
+
+def enable(prefix: Optional[str] = None, job: str = '') -> HttpMetrics:
+    # 启用全局记录器：之后 get_auth_session 创建的会话都会被计时；prefix 非空时进程退出前写出报告
+    global _RECORDER
+    _RECORDER = HttpMetrics(job)
+    if prefix:
+        recorder = _RECORDER
+
+        def _write() -> None:
+            json_path, prom_path = recorder.write(prefix)
+            recorder.print_summary()
+            print(f"Wrote HTTP metrics to: {json_path}, {prom_path}", file=sys.stderr)
+        atexit.register(_write)
+    return _RECORDER
+
+
+def active() -> Optional[HttpMetrics]:
+    return _RECORDER
+
+
+def instrument(session: Any) -> Any:
+    if _RECORDER is not None:
+        session.hooks['response'].append(_RECORDER.hook)
+    return session
+
+
+def sleep(seconds: float, reason: str, in_request: bool = False) -> None:
+    # 替代 time.sleep：记录主动等待的原因与实际时长；in_request=True 表示在发送请求途中等待（如限速），从该请求的延迟中扣除
+    start = time.monotonic()
+    time.sleep(seconds)
+    if _RECORDER is not None:
+        waited = time.monotonic() - start
+        _RECORDER.record_sleep(reason, waited)
+        if in_request:
+            _local.queued = getattr(_local, 'queued', 0.0) + waited
+
+
+class InstrumentedRetry(Retry):
+    # urllib3 每次重试前调用 sleep（退避或遵循 Retry-After），在此累计当前线程的重试次数与等待时长，
+    # 由响应钩子归入最终响应的端点（重试耗尽而抛异常的请求不计入）；new() 按 type(self) 复制，子类在整个重试链上保持
+    def sleep(self, response: Any = None) -> None:
+        start = time.monotonic()
+        super().sleep(response)
+        if _RECORDER is not None:
+            _local.retries = getattr(_local, 'retries', 0) + 1
+            _local.backoff = getattr(_local, 'backoff', 0.0) + time.monotonic() - start
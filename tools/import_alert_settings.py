@@ -2,13 +2,13 @@ import os
 import sys
 import json
 import argparse
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 
 import yaml
 import requests
 
-# 自定义宽松Loader，忽略未知YAML标签（例如 !!value 等），按其基础节点类型构造
-class _PermissiveLoader(yaml.SafeLoader):
+# 自定义宽松Loader，忽略未知YAML标签（例如 !!value 等），按其基础节点类型构造；libyaml 可用时基于 C 实现
+class _PermissiveLoader(getattr(yaml, 'CSafeLoader', yaml.SafeLoader)):
     pass
 
 def _unknown_tag_constructor(loader: yaml.SafeLoader, tag_suffix: str, node: yaml.Node):
@@ -24,13 +24,17 @@ def _unknown_tag_constructor(loader: yaml.SafeLoader, tag_suffix: str, node: yam
 _PermissiveLoader.add_multi_constructor('tag:yaml.org,2002:', _unknown_tag_constructor)
 _PermissiveLoader.add_multi_constructor('!', _unknown_tag_constructor)
 
-# 复用已有的鉴权会话与URL构造
+# 复用已有的鉴权会话与URL构造、带缓存的 YAML 加载
 try:
-    from tools.import_rules_to_grafana import get_auth_session, _url
+    from tools.import_rules_to_grafana import get_auth_session, _url, _run_buckets
+    from tools.yaml_loader import load_yaml_file
+    from tools import http_metrics
 except Exception:
     # 兼容从工具目录直接执行
     sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-    from tools.import_rules_to_grafana import get_auth_session, _url  # type: ignore
+    from tools.import_rules_to_grafana import get_auth_session, _url, _run_buckets  # type: ignore
+    from tools.yaml_loader import load_yaml_file  # type: ignore
+    from tools import http_metrics  # type: ignore
 
 # 端点常量（Unified Alerting Provisioning HTTP API）
 CONTACT_POINTS_API = 'api/v1/provisioning/contact-points'
@@ -45,8 +49,7 @@ REQ_TIMEOUT = float(os.environ.get('GRAFANA_TIMEOUT', '60'))
 
 
 def _load_yaml(path: str) -> Dict[str, Any]:
-    with open(path, 'r', encoding='utf-8') as f:
-        return yaml.load(f, Loader=_PermissiveLoader) or {}
+    return load_yaml_file(path, loader=_PermissiveLoader) or {}
 
 
 def _get_existing_contact_points(session: requests.Session, base_url: str) -> List[Dict[str, Any]]:
@@ -128,7 +131,168 @@ def import_contact_points(session: requests.Session, base_url: str, yaml_path: s
     print(f"ContactPoints result: created={created}, updated={updated}")
 
 
-def import_notification_policies(session: requests.Session, base_url: str, yaml_path: str) -> None:
+# ==================== 联系点增量同步（diff-based sync） ====================
+
+# GET 返回的敏感字段占位值；无法与本地值比较，视为未变化（需强制写入时使用 --force）
+REDACTED_VALUE = '[REDACTED]'
+
+
+def expand_setting_paths(paths: List[str]) -> List[str]:
+    # 目录展开为其中的 *.yaml/*.yml（按文件名排序，不递归）；文件按给定顺序保留，去重
+    out: List[str] = []
+    for p in paths:
+        p = os.path.abspath(p)
+        if os.path.isdir(p):
+            out.extend(os.path.join(p, f) for f in sorted(os.listdir(p)) if f.endswith('.yaml') or f.endswith('.yml'))
+        else:
+            out.append(p)
+    seen = set()
+    return [p for p in out if not (p in seen or seen.add(p))]
+
+
+def _receiver_body(name: str, rc: Dict[str, Any]) -> Dict[str, Any]:
+    # 与 import_contact_points 构造的请求体一致
+    body = {
+        'name': name,
+        'type': rc.get('type'),
+        'settings': rc.get('settings', {}) or {},
+        'disableResolveMessage': bool(rc.get('disableResolveMessage', False))
+    }
+    if rc.get('uid'):
+        body['uid'] = rc['uid']
+    return body
+
+
+def canonical_receiver(body: Dict[str, Any], remote: Optional[Dict[str, Any]] = None) -> str:
+    # 规范化比较内容：name/type/disableResolveMessage/settings（去除 None，键排序）；
+    # 传入 remote 时，远端为 [REDACTED] 的 settings 键以远端值代替本地值参与比较
+    settings = {k: v for k, v in (body.get('settings') or {}).items() if v is not None}
+    if remote is not None:
+        for k, v in (remote.get('settings') or {}).items():
+            if v == REDACTED_VALUE and k in settings:
+                settings[k] = REDACTED_VALUE
+    return json.dumps({
+        'name': body.get('name'),
+        'type': body.get('type'),
+        'disableResolveMessage': bool(body.get('disableResolveMessage', False)),
+        'settings': settings,
+    }, sort_keys=True, ensure_ascii=False)
+
+
+def collect_receivers(paths: List[str]) -> Tuple[List[Tuple[str, Dict[str, Any]]], List[str]]:
+    # 汇总多个文件的接收器，返回 ([(来源文件, 请求体)], 冲突描述)；
+    # 同一 uid（无 uid 时同一 name+type）在不同文件中内容不同视为冲突，两处都不写入
+    receivers: List[Tuple[str, Dict[str, Any]]] = []
+    index: Dict[Tuple[str, ...], int] = {}
+    conflicts: List[str] = []
+    conflicted = set()
+    for path in paths:
+        data = _load_yaml(path)
+        cps = data.get('contactPoints', []) or []
+        if not cps:
+            print(f"No contactPoints found in: {path}")
+            continue
+        for cp in cps:
+            name = cp.get('name')
+            rcs: List[Dict[str, Any]] = cp.get('receivers', []) or []
+            if not name or not rcs:
+                continue
+            for rc in rcs:
+                body = _receiver_body(name, rc)
+                key = ('uid', body['uid']) if body.get('uid') else ('key', name, body['type'])
+                if key in index:
+                    prev_path, prev = receivers[index[key]]
+                    if canonical_receiver(prev) != canonical_receiver(body):
+                        conflicts.append(f"{key[-1]}: {os.path.relpath(prev_path)} vs {os.path.relpath(path)}")
+                        conflicted.add(key)
+                    continue
+                index[key] = len(receivers)
+                receivers.append((path, body))
+    kept = [(p, b) for p, b in receivers
+            if (('uid', b['uid']) if b.get('uid') else ('key', b['name'], b['type'])) not in conflicted]
+    return kept, conflicts
+
+
+def plan_contact_points(receivers: List[Tuple[str, Dict[str, Any]]], existing: List[Dict[str, Any]],
+                        force: bool = False) -> Tuple[List[Tuple[str, Optional[str], Dict[str, Any]]], int]:
+    # 匹配规则与 import_contact_points 一致：优先 uid，其次 (name, type)；
+    # 返回 ([(动作 create/update, 目标 uid, 请求体)], 未变化数)
+    by_uid: Dict[str, Dict[str, Any]] = {cp.get('uid'): cp for cp in existing if cp.get('uid')}
+    by_key: Dict[tuple, Dict[str, Any]] = {(cp.get('name'), cp.get('type')): cp for cp in existing if cp.get('name') and cp.get('type')}
+    writes: List[Tuple[str, Optional[str], Dict[str, Any]]] = []
+    unchanged = 0
+    for _, body in receivers:
+        remote = None
+        if body.get('uid') and body['uid'] in by_uid:
+            remote = by_uid[body['uid']]
+        elif (body['name'], body['type']) in by_key and by_key[(body['name'], body['type'])].get('uid'):
+            remote = by_key[(body['name'], body['type'])]
+        if remote is None:
+            writes.append(('create', None, body))
+        elif force or canonical_receiver(body, remote) != canonical_receiver(remote):
+            writes.append(('update', remote['uid'], body))
+        else:
+            unchanged += 1
+    return writes, unchanged
+
+
+def _write_receiver(session: requests.Session, base_url: str, action: str, target_uid: Optional[str],
+                    body: Dict[str, Any], emit) -> bool:
+    headers = {
+        'X-Disable-Provenance': 'true',
+        'Content-Type': 'application/json'
+    }
+    if action == 'update':
+        resp = session.put(_url(base_url, CONTACT_POINT_BY_UID_API.format(uid=target_uid)), headers=headers,
+                           data=json.dumps(body), timeout=REQ_TIMEOUT)
+    else:
+        resp = session.post(_url(base_url, CONTACT_POINTS_API), headers=headers, data=json.dumps(body), timeout=REQ_TIMEOUT)
+    verb = 'Updated' if action == 'update' else 'Created'
+    if resp.status_code in (200, 201, 202):
+        j = resp.json() if resp.headers.get('Content-Type', '').startswith('application/json') else {}
+        emit(f"{verb} ContactPoint receiver: name={body['name']}, type={body['type']} -> uid={j.get('uid', target_uid)}")
+        return True
+    try:
+        err = resp.json()
+    except Exception:
+        err = resp.text
+    emit(f"Error {'updating' if action == 'update' else 'creating'} ContactPoint receiver name={body['name']}, type={body['type']}: {resp.status_code} {err}")
+    return False
+
+
+def sync_contact_points(session: requests.Session, base_url: str, paths: List[str], workers: int = 1, force: bool = False) -> Dict[str, int]:
+    # 一次 GET 获取全部现有联系点，只写入新增或内容变化的接收器；
+    # 写请求按联系点 name 分桶：同名接收器在同一桶内顺序写入，不同 name 在有界线程池中并发
+    receivers, conflicts = collect_receivers(paths)
+    for c in conflicts:
+        print(f"Error: conflicting ContactPoint receiver definitions for {c}; skipped")
+
+    existing = _get_existing_contact_points(session, base_url)
+    writes, unchanged = plan_contact_points(receivers, existing, force=force)
+
+    buckets: Dict[Tuple[str, str], List[Tuple[str, Optional[str], Dict[str, Any]]]] = {}
+    for w in writes:
+        buckets.setdefault((w[2]['name'], ''), []).append(w)
+
+    def run(key: Tuple[str, str], items: List[Tuple[str, Optional[str], Dict[str, Any]]], emit) -> Dict[str, int]:
+        counts = {'created': 0, 'updated': 0, 'failed': 0}
+        for action, target_uid, body in items:
+            if _write_receiver(session, base_url, action, target_uid, body, emit):
+                counts['created' if action == 'create' else 'updated'] += 1
+            else:
+                counts['failed'] += 1
+        return counts
+
+    totals = {'created': 0, 'updated': 0, 'unchanged': unchanged, 'failed': 0, 'conflicts': len(conflicts)}
+    for _, counts in _run_buckets(buckets.items(), run, max(1, workers)):
+        for k, v in counts.items():
+            totals[k] += v
+    print(f"ContactPoints sync result: files={len(paths)}, created={totals['created']}, updated={totals['updated']}, "
+          f"unchanged={totals['unchanged']}, failed={totals['failed']}, conflicts={totals['conflicts']}")
+    return totals
+
+
+def import_notification_policies(session: requests.Session, base_url: str, yaml_path: str) -> bool:
     data = _load_yaml(yaml_path)
     raw = data.get('policies')
 
@@ -143,7 +307,7 @@ def import_notification_policies(session: requests.Session, base_url: str, yaml_
 
     if not policy:
         print(f"No policies object found in: {yaml_path}")
-        return
+        return False
 
     headers = {
         'X-Disable-Provenance': 'true',
@@ -154,36 +318,62 @@ def import_notification_policies(session: requests.Session, base_url: str, yaml_
     resp = session.put(url, headers=headers, data=json.dumps(policy), timeout=REQ_TIMEOUT)
     if resp.status_code in (200, 201, 202):
         print("Updated Notification Policies successfully")
-    else:
-        try:
-            err = resp.json()
-        except Exception:
-            err = resp.text
-        print(f"Error updating Notification Policies: {resp.status_code} {err}")
+        return True
+    try:
+        err = resp.json()
+    except Exception:
+        err = resp.text
+    print(f"Error updating Notification Policies: {resp.status_code} {err}")
+    return False
 
 
 def main():
     parser = argparse.ArgumentParser(description='Import Grafana Unified Alerting settings (contact points / notification policies).')
-    parser.add_argument('--contact-points', dest='cp_path', help='Path to contact-points YAML to import')
+    parser.add_argument('--contact-points', dest='cp_paths', nargs='+', metavar='PATH',
+                        help='Contact-points YAML files or directories (all *.yaml inside) to import')
     parser.add_argument('--notification-policies', dest='np_path', help='Path to notification-policies YAML to import')
+    parser.add_argument('--sync', action='store_true', help='Only write contact-point receivers that are new or whose settings changed')
+    parser.add_argument('--workers', type=int, default=1, help='With --sync, number of contact points written concurrently (default: 1)')
+    parser.add_argument('--force', action='store_true', help='With --sync, write every receiver even if it looks unchanged')
+    parser.add_argument('--metrics', metavar='PREFIX', help='Write HTTP timing metrics to PREFIX.json and PREFIX.prom (e.g. out/http_metrics)')
+    parser.add_argument('--skip-validation', action='store_true', help='Do not run the pre-flight validation before importing')
     args = parser.parse_args()
 
-    if not args.cp_path and not args.np_path:
+    if not args.cp_paths and not args.np_path:
         print('Nothing to do. Specify --contact-points and/or --notification-policies')
         sys.exit(0)
 
+    if not args.skip_validation:
+        # 发出任何请求前校验联系点与策略（含策略引用的接收器是否在本次联系点中定义）
+        from tools.validate_config import validate_paths, preflight
+        inputs = [p for p in expand_setting_paths(args.cp_paths or []) if os.path.exists(p)]
+        if args.np_path and os.path.exists(args.np_path):
+            inputs.append(os.path.abspath(args.np_path))
+        preflight(validate_paths(inputs), 'alert settings')
+
     base_url = os.environ.get('GRAFANA_URL', DEFAULT_BASE_URL)
     user = os.environ.get('GRAFANA_USER', DEFAULT_USER)
     password = os.environ.get('GRAFANA_PASSWORD', DEFAULT_PASSWORD)
 
-    sess = get_auth_session(base_url, user, password)
-
-    if args.cp_path:
-        path = os.path.abspath(args.cp_path)
-        if not os.path.exists(path):
-            print(f"Contact-points file not found: {path}", file=sys.stderr)
+    if args.metrics:
+        http_metrics.enable(args.metrics, job='import_alert_settings')
+    workers = max(1, args.workers)
+    sess = get_auth_session(base_url, user, password, pool_size=max(10, workers))
+
+    failed = False
+    if args.cp_paths:
+        paths = []
+        for path in expand_setting_paths(args.cp_paths):
+            if not os.path.exists(path):
+                print(f"Contact-points file not found: {path}", file=sys.stderr)
+            else:
+                paths.append(path)
+        if args.sync:
+            totals = sync_contact_points(sess, base_url, paths, workers=workers, force=args.force)
+            failed = bool(totals['failed'] or totals['conflicts'])
         else:
-            import_contact_points(sess, base_url, path)
+            for path in paths:
+                import_contact_points(sess, base_url, path)
 
     if args.np_path:
         path = os.path.abspath(args.np_path)
@@ -192,6 +382,9 @@ def main():
         else:
             import_notification_policies(sess, base_url, path)
 
+    if failed:
+        sys.exit(1)
+
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
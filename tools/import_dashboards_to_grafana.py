@@ -0,0 +1,151 @@
+import os
+import sys
+import json
+import argparse
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+# 仪表盘批量导入
+# 输入: 仪表盘 JSON 文件或目录（默认 out/dashboards，即 optimize_dashboards.py 的输出）；--optimize 时直接读取 grafana/*.json 并在内存中优化
+# 一次导入多个仪表盘：每个仪表盘先 GET 现有版本，内容相同则跳过，否则 POST api/dashboards/db 覆盖；
+# 不同仪表盘在有界线程池中并发，复用 get_auth_session 的连接池
+
+try:
+    from tools.import_rules_to_grafana import (get_auth_session, ensure_folder, _url, _run_buckets, _error_detail,
+                                               DEFAULT_BASE_URL, DEFAULT_USER, DEFAULT_PASSWORD, REQ_TIMEOUT)
+    from tools.optimize_dashboards import OPTIMIZED_DIR, optimize_dashboard
+    from tools.analyze_query_cost import DASHBOARD_DIR
+    from tools import http_metrics
+except Exception:
+    # 兼容从工具目录直接执行
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    from tools.import_rules_to_grafana import (get_auth_session, ensure_folder, _url, _run_buckets, _error_detail,  # type: ignore
+                                               DEFAULT_BASE_URL, DEFAULT_USER, DEFAULT_PASSWORD, REQ_TIMEOUT)
+    from tools.optimize_dashboards import OPTIMIZED_DIR, optimize_dashboard  # type: ignore
+    from tools.analyze_query_cost import DASHBOARD_DIR  # type: ignore
+    from tools import http_metrics  # type: ignore
+
+DASHBOARDS_DB_API = 'api/dashboards/db'
+DASHBOARD_BY_UID_API = 'api/dashboards/uid/{uid}'
+# 由 Grafana 维护的字段，不参与内容比较
+_VOLATILE_FIELDS = ('id', 'version')
+
+
+def expand_dashboard_paths(paths: List[str]) -> List[str]:
+    out: List[str] = []
+    for p in paths:
+        if os.path.isdir(p):
+            out.extend(os.path.join(p, f) for f in sorted(os.listdir(p)) if f.endswith('.json'))
+        else:
+            out.append(p)
+    return out
+
+
+def _canonical(dash: Dict[str, Any]) -> str:
+    return json.dumps({k: v for k, v in dash.items() if k not in _VOLATILE_FIELDS}, sort_keys=True, ensure_ascii=False)
+
+
+def _import_dashboard(session: requests.Session, base_url: str, dash: Dict[str, Any], folder_uid: Optional[str],
+                      force: bool, message: str, emit) -> str:
+    # 返回 imported / updated / unchanged / failed
+    uid = dash.get('uid')
+    title = dash.get('title')
+    existing = None
+    if uid:
+        r = session.get(_url(base_url, DASHBOARD_BY_UID_API.format(uid=uid)), timeout=REQ_TIMEOUT)
+        if r.status_code == 200:
+            existing = r.json() or {}
+        elif r.status_code != 404:
+            emit(f"Error reading dashboard {title} ({uid}): {r.status_code} {_error_detail(r)}")
+            return 'failed'
+    if existing and not force:
+        same_folder = folder_uid is None or (existing.get('meta') or {}).get('folderUid', '') == folder_uid
+        if same_folder and _canonical(existing.get('dashboard') or {}) == _canonical(dash):
+            return 'unchanged'
+
+    body = {'dashboard': {**dash, 'id': None}, 'overwrite': True, 'message': message}
+    if folder_uid is not None:
+        body['folderUid'] = folder_uid
+    elif existing:
+        # 未指定目录时保留现有仪表盘所在目录
+        body['folderUid'] = (existing.get('meta') or {}).get('folderUid', '')
+    r = session.post(_url(base_url, DASHBOARDS_DB_API), data=json.dumps(body), timeout=REQ_TIMEOUT)
+    if r.status_code in (200, 201):
+        emit(f"{'Updated' if existing else 'Imported'} dashboard: {title} ({(r.json() or {}).get('uid', uid)})")
+        return 'updated' if existing else 'imported'
+    emit(f"Error importing dashboard {title}: {r.status_code} {_error_detail(r)}")
+    return 'failed'
+
+
+def import_dashboards(session: requests.Session, base_url: str, dashboards: List[Tuple[str, Dict[str, Any]]],
+                      folder_uid: Optional[str] = None, workers: int = 1, force: bool = False, message: str = '') -> Dict[str, int]:
+    # 按 uid 分桶：同一 uid 的多个文件顺序写入（后者覆盖前者），不同仪表盘并发
+    buckets: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+    for fname, dash in dashboards:
+        buckets.setdefault((dash.get('uid') or fname, ''), []).append(dash)
+
+    def run(key: Tuple[str, str], items: List[Dict[str, Any]], emit) -> Dict[str, int]:
+        counts = {'imported': 0, 'updated': 0, 'unchanged': 0, 'failed': 0}
+        for dash in items:
+            try:
+                counts[_import_dashboard(session, base_url, dash, folder_uid, force, message, emit)] += 1
+            except requests.RequestException as e:
+                emit(f"Error importing dashboard {dash.get('title')}: {e}")
+                counts['failed'] += 1
+        return counts
+
+    totals = {'imported': 0, 'updated': 0, 'unchanged': 0, 'failed': 0}
+    for _, counts in _run_buckets(buckets.items(), run, max(1, workers)):
+        for k, v in counts.items():
+            totals[k] += v
+    print(f"Dashboards import result: dashboards={len(dashboards)}, imported={totals['imported']}, updated={totals['updated']}, "
+          f"unchanged={totals['unchanged']}, failed={totals['failed']}")
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import dashboards to Grafana (skips dashboards whose content is unchanged).')
+    parser.add_argument('--dashboards', nargs='+', metavar='PATH', help='Dashboard JSON files or directories (default: out/dashboards, or grafana with --optimize)')
+    parser.add_argument('--optimize', action='store_true', help='Run optimize_dashboards on the input dashboards before importing')
+    parser.add_argument('--folder', help='Target folder title (created if missing); default keeps the existing folder, or General')
+    parser.add_argument('--workers', type=int, default=4, help='Number of dashboards imported concurrently (default: 4)')
+    parser.add_argument('--force', action='store_true', help='Write every dashboard even if it looks unchanged')
+    parser.add_argument('--message', default='imported by import_dashboards_to_grafana.py', help='Dashboard version message')
+    parser.add_argument('--metrics', metavar='PREFIX', help='Write HTTP timing metrics to PREFIX.json and PREFIX.prom (e.g. out/http_metrics)')
+    args = parser.parse_args()
+
+    paths = expand_dashboard_paths(args.dashboards or [DASHBOARD_DIR if args.optimize else OPTIMIZED_DIR])
+    dashboards: List[Tuple[str, Dict[str, Any]]] = []
+    for path in paths:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                dash = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error: cannot read dashboard {path}: {e}", file=sys.stderr)
+            sys.exit(2)
+        if args.optimize:
+            dash, result = optimize_dashboard(dash)
+            print(f"Optimized {os.path.basename(path)}: {len(result['actions'])} actions, {len(result['flags'])} flagged matchers")
+        dashboards.append((os.path.basename(path), dash))
+    if not dashboards:
+        print('Nothing to do. No dashboard JSON found', file=sys.stderr)
+        sys.exit(0)
+
+    base_url = os.environ.get('GRAFANA_URL', DEFAULT_BASE_URL)
+    user = os.environ.get('GRAFANA_USER', DEFAULT_USER)
+    password = os.environ.get('GRAFANA_PASSWORD', DEFAULT_PASSWORD)
+
+    if args.metrics:
+        http_metrics.enable(args.metrics, job='import_dashboards')
+    workers = max(1, args.workers)
+    sess = get_auth_session(base_url, user, password, pool_size=max(10, workers))
+    folder_uid = ensure_folder(sess, base_url, args.folder) if args.folder else None
+
+    totals = import_dashboards(sess, base_url, dashboards, folder_uid=folder_uid, workers=workers, force=args.force, message=args.message)
+    if totals['failed']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,14 +2,26 @@ import os
 import sys
 import json
 import time
+import hashlib
 import getpass
-from typing import Dict, Any, List, Optional
+import threading
+import argparse
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, IO, Iterable, Iterator, List, Optional, Tuple
 
 import requests
 from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 from urllib.parse import quote
 
+# HTTP 计时与统计（--metrics 启用）
+try:
+    from tools import http_metrics
+except Exception:
+    # 兼容从工具目录直接执行
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    from tools import http_metrics  # type: ignore
+
 # 读取由 convert_yaml_to_grafana_json.py 生成的 API 规则文件
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 API_RULES_PATH = os.path.join(BASE_DIR, 'out', 'api_rules.json')
@@ -29,21 +41,49 @@ PROVISION_ALERT_RULES_API = 'api/v1/provisioning/alert-rules'
 PUT_RULE_GROUP_API = 'api/v1/provisioning/folder/{folderUid}/rule-groups/{group}'
 GET_RULE_GROUP_API = 'api/v1/provisioning/folder/{folderUid}/rule-groups/{group}'
 PUT_ALERT_RULE_API = 'api/v1/provisioning/alert-rules/{uid}'
+DELETE_ALERT_RULE_API = 'api/v1/provisioning/alert-rules/{uid}'
+
+# 增量同步：参与内容哈希的规则字段
+RULE_HASH_FIELDS = ('title', 'condition', 'data', 'labels', 'annotations', 'for', 'noDataState', 'execErrState')
 
 
 def _url(base: str, path: str) -> str:
     return base.rstrip('/') + '/' + path.lstrip('/')
 
 
-def get_auth_session(base_url: str, user: Optional[str], password: Optional[str]) -> requests.Session:
+class _RateLimitedAdapter(HTTPAdapter):
+    # 会话级限速：http/https 共用同一适配器，所有线程的请求按 1/rate 秒间隔放行（重试不另计）
+    def __init__(self, rate: float, *args: Any, **kwargs: Any):
+        self._interval = 1.0 / rate
+        self._lock = threading.Lock()
+        self._next = 0.0
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self._interval
+        if wait > 0:
+            http_metrics.sleep(wait, 'rate-limit', in_request=True)
+        return super().send(request, **kwargs)
+
+
+def get_auth_session(base_url: str, user: Optional[str], password: Optional[str], pool_size: int = 10,
+                     rate_limit: float = 0.0, api_token: Optional[str] = API_TOKEN,
+                     verify: Optional[Any] = None) -> requests.Session:
+    # rate_limit: 每秒请求数上限（0 不限）；api_token/verify 默认取环境变量，多目标部署时按目标传入
     sess = requests.Session()
     sess.headers.update({'Content-Type': 'application/json'})
 
     # TLS verify handling
-    if CA_CERT_PATH and os.path.exists(CA_CERT_PATH):
+    if verify is not None:
+        sess.verify = verify
+    elif CA_CERT_PATH and os.path.exists(CA_CERT_PATH):
         sess.verify = CA_CERT_PATH
     elif VERIFY_ENV in ('false', '0', 'no', 'off'):
         sess.verify = False
+    if sess.verify is False:
         try:
             import urllib3
             urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -51,17 +91,21 @@ def get_auth_session(base_url: str, user: Optional[str], password: Optional[str]
             pass
 
     # Auth: API token preferred, else basic auth
-    if API_TOKEN:
-        sess.headers.update({'Authorization': f'Bearer {API_TOKEN}'})
+    if api_token:
+        sess.headers.update({'Authorization': f'Bearer {api_token}'})
     elif user and password:
         sess.auth = (user, password)
 
     # Retries for idempotent methods and POST
-    retries = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504], allowed_methods=["HEAD","GET","PUT","DELETE","OPTIONS","TRACE","POST"]) 
-    adapter = HTTPAdapter(max_retries=retries)
+    retries = http_metrics.InstrumentedRetry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504], allowed_methods=["HEAD","GET","PUT","DELETE","OPTIONS","TRACE","POST"]) 
+    # pool_size 需不小于并发 worker 数，否则多余线程会等待/丢弃连接
+    if rate_limit and rate_limit > 0:
+        adapter = _RateLimitedAdapter(rate_limit, max_retries=retries, pool_connections=pool_size, pool_maxsize=pool_size)
+    else:
+        adapter = HTTPAdapter(max_retries=retries, pool_connections=pool_size, pool_maxsize=pool_size)
     sess.mount('http://', adapter)
     sess.mount('https://', adapter)
-    return sess
+    return http_metrics.instrument(sess)
 
 
 def ensure_folder(session: requests.Session, base_url: str, folder_title: str) -> str:
@@ -133,7 +177,7 @@ def update_rule_group_interval(session: requests.Session, base_url: str, folder_
         rules_payload = existing.get('rules', [])
         if not rules_payload:
             # 等待规则在组内可见
-            time.sleep(1)
+            http_metrics.sleep(1, 'rule-group-visibility')
             continue
 
         headers = {'X-Disable-Provenance': 'true'}
@@ -158,7 +202,7 @@ def update_rule_group_interval(session: requests.Session, base_url: str, folder_
 
         # 对于 400 错误，等待后重试（可能是规则尚未完全可见或调度步长对齐问题）
         if resp.status_code == 400:
-            time.sleep(1)
+            http_metrics.sleep(1, 'rule-group-interval-retry')
             continue
         else:
             # 其它错误不重试
@@ -173,89 +217,521 @@ def ensure_rule_group(session: requests.Session, base_url: str, folder_uid: str,
         update_rule_group_interval(session, base_url, folder_uid, group, interval)
 
 
-def import_rules(session: requests.Session, base_url: str, rules: List[Dict[str, Any]]):
-    # 按 folder 与 ruleGroup 分桶，先创建组（设置 interval）再导入单条规则
-    # interval 只能从 provisioning 文件推断；这里无法精准获知，所以使用 60s 默认
-    from collections import defaultdict
-    buckets = defaultdict(list)
+def _rule_body(rule: Dict[str, Any], folder_uid: str) -> Dict[str, Any]:
+    body = dict(rule)
+    body.pop('folder', None)
+    # 使用正确的字段名 folderUID
+    body['folderUID'] = folder_uid
+    # groupInterval 只用于组级 interval，不属于规则体
+    body.pop('groupInterval', None)
+    # 确保字段名大小写与API一致
+    body['orgId'] = body.get('orgId', 1)
+    return body
+
+
+def _error_detail(resp: requests.Response) -> Any:
+    try:
+        return resp.json()
+    except Exception:
+        return resp.text
+
+
+def _import_rule(session: requests.Session, base_url: str, folder_uid: str, rule: Dict[str, Any], emit: Callable[[str], None]) -> str:
+    # 导入单条规则，返回 imported / updated / failed
+    body = _rule_body(rule, folder_uid)
+    # POST 创建
+    url = _url(base_url, PROVISION_ALERT_RULES_API)
+    resp = session.post(url, data=json.dumps(body), timeout=REQ_TIMEOUT)
+    if resp.status_code in (200, 201):
+        j = resp.json()
+        emit(f"Imported: {rule.get('title')} -> uid={j.get('uid')}")
+        return 'imported'
+    if resp.status_code == 409 and body.get('uid'):
+        # 冲突：规则已存在，尝试改为更新
+        put_url = _url(base_url, PUT_ALERT_RULE_API.format(uid=body['uid']))
+        put_resp = session.put(put_url, data=json.dumps(body), timeout=REQ_TIMEOUT)
+        if put_resp.status_code in (200, 201):
+            j = put_resp.json()
+            emit(f"Updated: {rule.get('title')} -> uid={j.get('uid')}")
+            return 'updated'
+        emit(f"Error updating rule '{rule.get('title')}' uid={body['uid']}: {put_resp.status_code} {_error_detail(put_resp)}")
+        return 'failed'
+    emit(f"Error importing rule '{rule.get('title')}': {resp.status_code} {_error_detail(resp)}")
+    return 'failed'
+
+
+def _import_bucket(session: requests.Session, base_url: str, folder_uid: str, group_name: str,
+                   group_rules: List[Dict[str, Any]], emit: Callable[[str], None]) -> Dict[str, int]:
+    # 组内规则保持原有顺序逐条导入，完成后再设置组 interval
+    counts = {'imported': 0, 'updated': 0, 'failed': 0}
+    for rule in group_rules:
+        counts[_import_rule(session, base_url, folder_uid, rule, emit)] += 1
+
+    desired_interval = _group_interval(group_rules)
+    if desired_interval:
+        update_rule_group_interval(session, base_url, folder_uid, group_name, desired_interval)
+    return counts
+
+
+def _group_interval(group_rules: List[Dict[str, Any]]) -> Optional[str]:
+    # 从第一条携带 groupInterval 的规则中获取组 interval
+    for r in group_rules:
+        gi = r.get('groupInterval')
+        if gi:
+            return gi
+    return None
+
+
+def _bucket_rules(rules: List[Dict[str, Any]]) -> Dict[Tuple[str, str], List[Dict[str, Any]]]:
+    # 按 (folder, ruleGroup) 分桶，桶顺序与组内规则顺序均保持输入顺序
+    buckets: Dict[Tuple[str, str], List[Dict[str, Any]]] = defaultdict(list)
     for r in rules:
         buckets[(r.get('folder'), r.get('ruleGroup'))].append(r)
+    return buckets
+
 
+def _stream_buckets(rules: Iterable[Dict[str, Any]]) -> Iterator[Tuple[Tuple[str, str], List[Dict[str, Any]]]]:
+    # 流式分桶：相邻且 (folder, ruleGroup) 相同的规则构成一个桶，读到下一组的第一条即交出当前桶；
+    # 内存只保留当前组，转换端按组顺序输出时与 _bucket_rules 结果一致
+    key: Optional[Tuple[str, str]] = None
+    items: List[Dict[str, Any]] = []
+    for r in rules:
+        k = (r.get('folder'), r.get('ruleGroup'))
+        if items and k != key:
+            yield key, items
+            items = []
+        key = k
+        items.append(r)
+    if items:
+        yield key, items
+
+
+def iter_ndjson(f: IO[str]) -> Iterator[Dict[str, Any]]:
+    # 逐行读取 NDJSON，每行一条 API 规则；空行忽略
+    for lineno, line in enumerate(f, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"Invalid NDJSON record at line {lineno}: {e}")
+
+
+def _resolve_folders(session: requests.Session, base_url: str, folder_titles: List[str]) -> Dict[str, str]:
+    # 预先串行解析所有 folder UID，避免并发时重复创建同名文件夹
     folder_uid_cache: Dict[str, str] = {}
+    for title in folder_titles:
+        if title not in folder_uid_cache:
+            folder_uid_cache[title] = ensure_folder(session, base_url, title)
+    return folder_uid_cache
+
+
+def _run_buckets(buckets: Iterable[Tuple[Tuple[str, str], Any]], fn: Callable[[Tuple[str, str], Any, Callable[[str], None]], Dict[str, int]],
+                 workers: int = 1) -> List[Tuple[Tuple[str, str], Dict[str, int]]]:
+    # 逐桶执行 fn(key, items, emit)；workers > 1 时不同桶并发，输出按分桶顺序打印。
+    # buckets 可以是惰性迭代器：在途桶数不超过 2 * workers，生产端（如 NDJSON 读取）与 HTTP 上传重叠且内存有界
+    results: List[Tuple[Tuple[str, str], Dict[str, int]]] = []
+    if workers <= 1:
+        for key, items in buckets:
+            results.append((key, fn(key, items, print)))
+        return results
+
+    def run(key: Tuple[str, str], items: Any):
+        # 每组输出先缓存，避免多线程输出交错
+        lines: List[str] = []
+        counts = fn(key, items, lines.append)
+        return counts, lines
+
+    def drain(key: Tuple[str, str], fut) -> None:
+        counts, lines = fut.result()
+        for line in lines:
+            print(line)
+        results.append((key, counts))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending: deque = deque()
+        for key, items in buckets:
+            pending.append((key, pool.submit(run, key, items)))
+            if len(pending) >= 2 * workers:
+                drain(*pending.popleft())
+        while pending:
+            drain(*pending.popleft())
+    return results
+
+
+def _print_summary(results: List[Tuple[Tuple[str, str], Dict[str, int]]], fields: Tuple[str, ...] = ('imported', 'updated', 'failed')) -> None:
+    # 按分桶顺序输出，结果与并发完成顺序无关
+    totals = {k: 0 for k in fields}
+    print("Summary:")
+    for (folder_title, group_name), counts in results:
+        for k in fields:
+            totals[k] += counts.get(k, 0)
+        print(f"  {folder_title} / {group_name}: " + ", ".join(f"{k}={counts.get(k, 0)}" for k in fields))
+    print(f"Total: groups={len(results)}, " + ", ".join(f"{k}={totals[k]}" for k in fields))
+
+
+def _with_folders(session: requests.Session, base_url: str, buckets: Iterable[Tuple[Tuple[str, str], Any]]
+                  ) -> Iterator[Tuple[Tuple[str, str], Tuple[str, Any]]]:
+    # 在提交线程池前（主线程串行）解析 folder UID 并缓存，避免并发时重复创建同名文件夹
+    folder_uids: Dict[str, str] = {}
+    for key, items in buckets:
+        if key[0] not in folder_uids:
+            folder_uids[key[0]] = ensure_folder(session, base_url, key[0])
+        yield key, (folder_uids[key[0]], items)
+
+
+def _mark_repeated(buckets: Iterable[Tuple[Tuple[str, str], List[Dict[str, Any]]]]
+                   ) -> Iterator[Tuple[Tuple[str, str], Tuple[bool, List[Dict[str, Any]]]]]:
+    # 流式输入中同一组若不相邻会成为两个桶，并发时两桶各自整组写入、互相覆盖；在主线程提交前标记重复出现的组
+    seen = set()
+    for key, group_rules in buckets:
+        yield key, (key in seen, group_rules)
+        seen.add(key)
+
+
+def _repeated_group(key: Tuple[str, str], group_rules: List[Dict[str, Any]], emit: Callable[[str], None]) -> None:
+    emit(f"Error: group '{key[1]}' in folder '{key[0]}' is not contiguous in the input stream; skipped {len(group_rules)} rules")
+
+
+def import_rules(session: requests.Session, base_url: str, rules: Iterable[Dict[str, Any]], workers: int = 1, stream: bool = False):
+    # 按 folder 与 ruleGroup 分桶；workers > 1 时不同组在线程池中并发导入，组内仍保持顺序。
+    # stream=True 时 rules 可为惰性迭代器（NDJSON），相邻同组规则成桶后立即提交
+    buckets = _stream_buckets(rules) if stream else _bucket_rules(rules).items()
+
+    def run(key: Tuple[str, str], item: Tuple[str, Tuple[bool, List[Dict[str, Any]]]], emit: Callable[[str], None]) -> Dict[str, int]:
+        folder_uid, (repeated, group_rules) = item
+        if repeated:
+            # 每个桶最后以 GET + 整组 PUT 设置 interval，与前一个同组桶并发时会删除对方刚写入的规则
+            _repeated_group(key, group_rules, emit)
+            return {'imported': 0, 'updated': 0, 'failed': len(group_rules)}
+        return _import_bucket(session, base_url, folder_uid, key[1], group_rules, emit)
+
+    results = _run_buckets(_with_folders(session, base_url, _mark_repeated(buckets)), run, workers)
+    _print_summary(results)
+    return results
+
+
+# ==================== 整组写入（group upsert） ====================
+
+def build_rule_group_payload(folder_uid: str, group_name: str, group_rules: List[Dict[str, Any]]) -> Dict[str, Any]:
+    # 由转换产物在本地直接构造完整规则组（含规范化后的整数秒 interval），无需先 GET 远端组
+    _, interval_seconds = _normalize_interval(_group_interval(group_rules))
+    rules_payload = []
+    for r in group_rules:
+        body = _rule_body(r, folder_uid)
+        body['ruleGroup'] = group_name
+        rules_payload.append(body)
+    return {
+        'title': group_name,
+        'folderUid': folder_uid,
+        'interval': interval_seconds,
+        'rules': rules_payload,
+    }
+
+
+def put_rule_group(session: requests.Session, base_url: str, folder_uid: str, group_name: str, payload: Dict[str, Any]) -> requests.Response:
+    headers = {'X-Disable-Provenance': 'true'}
+    group_path = quote(group_name, safe='') if group_name else ''
+    url = _url(base_url, PUT_RULE_GROUP_API.format(folderUid=folder_uid, group=group_path))
+    return session.put(url, headers=headers, data=json.dumps(payload), timeout=REQ_TIMEOUT)
+
+
+def upsert_rule_groups(session: requests.Session, base_url: str, rules: Iterable[Dict[str, Any]], workers: int = 1, stream: bool = False):
+    # 每个 (folder, ruleGroup) 只发一次 PUT rule-groups/{group}，同时写入规则与 interval
+    # 注意：PUT 整组为替换语义，远端组内不在本地列表中的规则会被移除
+    buckets = _stream_buckets(rules) if stream else _bucket_rules(rules).items()
+
+    def run(key: Tuple[str, str], item: Tuple[str, Tuple[bool, List[Dict[str, Any]]]], emit: Callable[[str], None]) -> Dict[str, int]:
+        folder_uid, (repeated, group_rules) = item
+        if repeated:
+            # 第二次整组 PUT 会覆盖第一次写入的规则
+            _repeated_group(key, group_rules, emit)
+            return {'rules': 0, 'failed': len(group_rules)}
+        payload = build_rule_group_payload(folder_uid, key[1], group_rules)
+        resp = put_rule_group(session, base_url, folder_uid, key[1], payload)
+        if resp.status_code in (200, 201, 202):
+            emit(f"Upserted group: {key[0]} / {key[1]} -> rules={len(group_rules)}, interval={payload['interval']}s")
+            return {'rules': len(group_rules), 'failed': 0}
+        emit(f"Error upserting group '{key[1]}' in folder '{key[0]}': {resp.status_code} {_error_detail(resp)}")
+        return {'rules': 0, 'failed': len(group_rules)}
+
+    results = _run_buckets(_with_folders(session, base_url, _mark_repeated(buckets)), run, workers)
+    _print_summary(results, ('rules', 'failed'))
+    return results
+
+
+# ==================== 增量同步（diff-based sync） ====================
+
+def _strip_none(v: Any) -> Any:
+    # 递归去除 None 值，消除“字段缺省”与“显式 null”的差异
+    if isinstance(v, dict):
+        return {k: _strip_none(x) for k, x in v.items() if x is not None}
+    if isinstance(v, list):
+        return [_strip_none(x) for x in v]
+    return v
+
+
+def _canonical_query(q: Dict[str, Any]) -> Dict[str, Any]:
+    # 对齐 Grafana 回读时补齐的默认值（relativeTimeRange.from/to、queryType）
+    rtr = q.get('relativeTimeRange') or {}
+    return _strip_none({
+        'refId': q.get('refId'),
+        'queryType': q.get('queryType') or '',
+        'datasourceUid': q.get('datasourceUid'),
+        'relativeTimeRange': {'from': int(rtr.get('from') or 0), 'to': int(rtr.get('to') or 0)},
+        'model': q.get('model') or {},
+    })
+
+
+def canonical_rule(rule: Dict[str, Any], folder_title: Optional[str]) -> Dict[str, Any]:
+    # 规则的规范化形式：本地转换产物与 Grafana 回读结果在语义相同时应得到同一结构
+    canon: Dict[str, Any] = {
+        'folder': folder_title,
+        'ruleGroup': rule.get('ruleGroup'),
+    }
+    for k in RULE_HASH_FIELDS:
+        v = rule.get(k)
+        if k == 'for':
+            v = _parse_duration_seconds(v) or 0
+        elif k in ('labels', 'annotations'):
+            v = v or {}
+        elif k == 'data':
+            v = [_canonical_query(q) for q in (v or [])]
+        canon[k] = v
+    return _strip_none(canon)
+
+
+def rule_hash(rule: Dict[str, Any], folder_title: Optional[str]) -> str:
+    payload = json.dumps(canonical_rule(rule, folder_title), sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _load_sync_state(path: Optional[str]) -> Optional[Dict[str, Any]]:
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        state = json.load(f)
+    state.setdefault('rules', {})
+    state.setdefault('groups', {})
+    return state
 
-    for (folder_title, group_name), group_rules in buckets.items():
-        folder_uid = folder_uid_cache.get(folder_title)
-        if not folder_uid:
-            folder_uid = ensure_folder(session, base_url, folder_title)
-            folder_uid_cache[folder_title] = folder_uid
-        # 不再预创建空组，直接导入规则，随后再统一设置组 interval
-        for rule in group_rules:
-            body = dict(rule)
-            body.pop('folder', None)
-            # 使用正确的字段名 folderUID
-            body['folderUID'] = folder_uid
-            # 规则组 interval 优先使用规则里携带的 groupInterval
-            group_interval = body.pop('groupInterval', None)
-            # 确保字段名大小写与API一致
-            body['orgId'] = body.get('orgId', 1)
-            # POST 创建
-            url = _url(base_url, PROVISION_ALERT_RULES_API)
-            resp = session.post(url, data=json.dumps(body), timeout=60)
-            if resp.status_code not in (200, 201):
-                if resp.status_code == 409 and body.get('uid'):
-                    # 冲突：规则已存在，尝试改为更新
-                    put_url = _url(base_url, PUT_ALERT_RULE_API.format(uid=body['uid']))
-                    put_resp = session.put(put_url, data=json.dumps(body), timeout=60)
-                    if put_resp.status_code not in (200, 201):
-                        try:
-                            err = put_resp.json()
-                        except Exception:
-                            err = put_resp.text
-                        print(f"Error updating rule '{rule.get('title')}' uid={body['uid']}: {put_resp.status_code} {err}")
-                    else:
-                        j = put_resp.json()
-                        print(f"Updated: {rule.get('title')} -> uid={j.get('uid')}")
-                else:
-                    try:
-                        err = resp.json()
-                    except Exception:
-                        err = resp.text
-                    print(f"Error importing rule '{rule.get('title')}': {resp.status_code} {err}")
-            else:
-                j = resp.json()
-                print(f"Imported: {rule.get('title')} -> uid={j.get('uid')}")
 
-        # 组内规则创建/更新完成后，再设置组的 interval（若有）
-        # 从第一条规则中获取 groupInterval
-        desired_interval = None
+def _save_sync_state(path: str, state: Dict[str, Any]) -> None:
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def _get_existing_rules(session: requests.Session, base_url: str) -> List[Dict[str, Any]]:
+    r = session.get(_url(base_url, PROVISION_ALERT_RULES_API), timeout=REQ_TIMEOUT)
+    r.raise_for_status()
+    return r.json() or []
+
+
+def _get_folder_titles(session: requests.Session, base_url: str) -> Dict[str, str]:
+    r = session.get(_url(base_url, FOLDERS_API), timeout=REQ_TIMEOUT)
+    r.raise_for_status()
+    return {f.get('uid'): f.get('title') for f in r.json()}
+
+
+def _sync_bucket(session: requests.Session, base_url: str, folder_uid: str, group_name: str, plan: Dict[str, Any],
+                 emit: Callable[[str], None]) -> Dict[str, int]:
+    # plan: {'ops': [(op, rule)], 'interval': 组 interval 或 None, 'interval_changed': bool}
+    counts = {'created': 0, 'updated': 0, 'deleted': 0, 'unchanged': plan['unchanged'], 'failed': 0}
+    applied: List[str] = []
+    for op, rule in plan['ops']:
+        uid = rule.get('uid')
+        if op == 'delete':
+            resp = session.delete(_url(base_url, DELETE_ALERT_RULE_API.format(uid=uid)), timeout=REQ_TIMEOUT)
+            ok = resp.status_code in (200, 202, 204, 404)
+            verb = 'Deleted'
+        elif op == 'create':
+            resp = session.post(_url(base_url, PROVISION_ALERT_RULES_API), data=json.dumps(_rule_body(rule, folder_uid)), timeout=REQ_TIMEOUT)
+            ok = resp.status_code in (200, 201)
+            verb = 'Created'
+        else:
+            resp = session.put(_url(base_url, PUT_ALERT_RULE_API.format(uid=uid)), data=json.dumps(_rule_body(rule, folder_uid)), timeout=REQ_TIMEOUT)
+            ok = resp.status_code in (200, 201)
+            verb = 'Updated'
+        if ok:
+            counts[verb.lower()] += 1
+            applied.append(uid)
+            emit(f"{verb}: {rule.get('title')} -> uid={uid}")
+        else:
+            counts['failed'] += 1
+            emit(f"Error on {op} rule '{rule.get('title')}' uid={uid}: {resp.status_code} {_error_detail(resp)}")
+    plan['applied'] = applied
+
+    # 组内有写入（新组需要设置 interval）或 interval 相对状态文件发生变化时才更新组 interval
+    if plan['interval'] and (any(op != 'delete' for op, _ in plan['ops']) or plan['interval_changed']):
+        update_rule_group_interval(session, base_url, folder_uid, group_name, plan['interval'])
+    return counts
+
+
+def sync_rules(session: requests.Session, base_url: str, rules: List[Dict[str, Any]], state_path: Optional[str] = None,
+               prune: bool = False, workers: int = 1):
+    # 增量同步：只对内容哈希不同的 uid 执行创建/更新/删除
+    # 1) 有状态文件且本地哈希与状态一致的规则直接跳过；全部一致时不发任何 HTTP 请求
+    # 2) 其余规则与一次性批量拉取的远端规则比对哈希，决定 create / update / 跳过
+    # 3) prune=True 时删除本地已移除、且位于本地所管理组内的远端规则
+    state = _load_sync_state(state_path)
+    buckets = _bucket_rules([r for r in rules if r.get('uid')])
+    skipped_no_uid = [r for r in rules if not r.get('uid')]
+    for r in skipped_no_uid:
+        print(f"Warning: sync requires uid, skipped rule '{r.get('title')}'")
+
+    local_hash: Dict[str, str] = {}
+    for (folder_title, _), group_rules in buckets.items():
         for r in group_rules:
-            gi = r.get('groupInterval')
-            if gi:
-                desired_interval = gi
-                break
-        if desired_interval:
-            update_rule_group_interval(session, base_url, folder_uid, group_name, desired_interval)
+            local_hash[r['uid']] = rule_hash(r, folder_title)
+    local_intervals = {f"{k[0]}/{k[1]}": _normalize_interval(_group_interval(v))[0] for k, v in buckets.items() if _group_interval(v)}
+
+    if state is not None:
+        changed = {uid for uid, h in local_hash.items() if state['rules'].get(uid) != h}
+        interval_changed = {k for k, iv in local_intervals.items() if state['groups'].get(k) != iv}
+        removed = set(state['rules']) - set(local_hash) if prune else set()
+        if not changed and not interval_changed and not removed:
+            print(f"No changes: {len(local_hash)} rules match state file {state_path}")
+            return []
+    else:
+        # 远端规则列表不含组 interval；无状态文件时只在组内有写入时更新 interval
+        changed = set(local_hash)
+        interval_changed = set()
+
+    folder_titles = _get_folder_titles(session, base_url)
+    remote_hash: Dict[str, str] = {}
+    remote_by_group: Dict[Tuple[str, str], List[Dict[str, Any]]] = defaultdict(list)
+    for rr in _get_existing_rules(session, base_url):
+        title = folder_titles.get(rr.get('folderUID'))
+        remote_hash[rr.get('uid')] = rule_hash(rr, title)
+        remote_by_group[(title, rr.get('ruleGroup'))].append(rr)
+
+    plans: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for key, group_rules in buckets.items():
+        ops = []
+        unchanged = 0
+        for r in group_rules:
+            uid = r['uid']
+            if uid not in changed or remote_hash.get(uid) == local_hash[uid]:
+                unchanged += 1
+            elif uid in remote_hash:
+                ops.append(('update', r))
+            else:
+                ops.append(('create', r))
+        if prune:
+            for rr in remote_by_group.get(key, []):
+                if rr.get('uid') not in local_hash:
+                    ops.append(('delete', rr))
+        group_key = f"{key[0]}/{key[1]}"
+        if ops or group_key in interval_changed:
+            plans[key] = {'ops': ops, 'unchanged': unchanged, 'interval': _group_interval(group_rules),
+                          'interval_changed': group_key in interval_changed}
+    if prune and state is not None:
+        # 整组被移除的规则：只删除状态文件中记录过的 uid
+        for key, remote_rules in remote_by_group.items():
+            if key in buckets:
+                continue
+            ops = [('delete', rr) for rr in remote_rules if rr.get('uid') in state['rules']]
+            if ops:
+                plans[key] = {'ops': ops, 'unchanged': 0, 'interval': None, 'interval_changed': False}
+
+    # folder UID 直接复用已拉取的列表，仅缺失的 folder 才调用 ensure_folder 创建
+    folder_uids = {t: u for u, t in folder_titles.items()}
+    missing = [k[0] for k in plans if k[0] not in folder_uids]
+    folder_uids.update(_resolve_folders(session, base_url, missing))
+
+    def run(key: Tuple[str, str], plan: Dict[str, Any], emit: Callable[[str], None]) -> Dict[str, int]:
+        return _sync_bucket(session, base_url, folder_uids[key[0]], key[1], plan, emit)
+
+    results = _run_buckets(plans.items(), run, workers)
+    _print_summary(results, ('created', 'updated', 'deleted', 'unchanged', 'failed'))
+    skipped = [k for k in buckets if k not in plans]
+    print(f"Unchanged groups skipped: {len(skipped)} ({sum(len(buckets[k]) for k in skipped)} rules)")
+
+    if state_path:
+        # 成功写入或确认一致的规则记录当前哈希；失败的写入不记录（删除失败则保留旧记录），下次重试
+        failed = {r.get('uid') for plan in plans.values() for _, r in plan['ops'] if r.get('uid') not in plan.get('applied', [])}
+        new_state = {'rules': {uid: h for uid, h in local_hash.items() if uid not in failed}, 'groups': dict(local_intervals)}
+        if state is not None:
+            for uid in failed - set(local_hash):
+                if uid in state['rules']:
+                    new_state['rules'][uid] = state['rules'][uid]
+        _save_sync_state(state_path, new_state)
+    return results
 
 
 def main():
+    parser = argparse.ArgumentParser(description='Import Grafana alert rules from out/api_rules.json.')
+    parser.add_argument('--workers', type=int, default=1, help='Number of rule groups imported concurrently (default: 1, sequential)')
+    parser.add_argument('--group-upsert', dest='group_upsert', action='store_true', help='Write each rule group with a single PUT (rules + interval)')
+    parser.add_argument('--sync', action='store_true', help='Diff against live rules and only create/update/delete changed uids')
+    parser.add_argument('--state-file', dest='state_file', help='Local content-hash state for --sync; unchanged rules need no HTTP calls')
+    parser.add_argument('--prune', action='store_true', help='With --sync, delete live rules removed from managed groups')
+    parser.add_argument('--ndjson', metavar='PATH',
+                        help="Stream rules from an NDJSON file ('-' for stdin, e.g. piped from the converter) instead of out/api_rules.json")
+    parser.add_argument('--metrics', metavar='PREFIX', help='Write HTTP timing metrics to PREFIX.json and PREFIX.prom (e.g. out/http_metrics)')
+    parser.add_argument('--skip-validation', action='store_true', help='Do not run the pre-flight rule validation before importing')
+    args = parser.parse_args()
+    if args.group_upsert and args.sync:
+        # 整组写入与增量同步是两种写入方式，同时指定时拒绝，避免静默忽略 --sync（及其 --state-file / --prune）
+        parser.error('--group-upsert cannot be combined with --sync')
+    if args.ndjson and args.sync:
+        # 增量同步需要全量规则集计算差异与清理，不支持流式输入
+        parser.error('--ndjson cannot be combined with --sync')
+    for flag, value in (('--state-file', args.state_file), ('--prune', args.prune)):
+        if value and not args.sync:
+            # 只在增量同步中生效，单独指定时拒绝而不是静默忽略
+            parser.error(f'{flag} requires --sync')
+    if args.metrics:
+        http_metrics.enable(args.metrics, job='import_rules')
+
     base_url = os.environ.get('GRAFANA_URL', DEFAULT_BASE_URL)
     user = os.environ.get('GRAFANA_USER', DEFAULT_USER)
     password = os.environ.get('GRAFANA_PASSWORD', DEFAULT_PASSWORD)
 
-    if not os.path.exists(API_RULES_PATH):
+    stream = None
+    if args.ndjson == '-':
+        stream = sys.stdin
+    elif args.ndjson:
+        if not os.path.exists(args.ndjson):
+            print(f"Rules NDJSON not found: {args.ndjson}", file=sys.stderr)
+            sys.exit(1)
+        stream = open(args.ndjson, 'r', encoding='utf-8')
+    elif not os.path.exists(API_RULES_PATH):
         print(f"Rules JSON not found: {API_RULES_PATH}", file=sys.stderr)
         sys.exit(1)
 
-    with open(API_RULES_PATH, 'r', encoding='utf-8') as f:
-        rules = json.load(f)
+    if stream is None:
+        with open(API_RULES_PATH, 'r', encoding='utf-8') as f:
+            rules = json.load(f)
+        if not args.skip_validation:
+            # 发出任何请求前校验全部规则，一次报告所有错误（流式输入逐条读取，不做预校验）
+            from tools.validate_config import validate_api_rules, preflight
+            preflight(validate_api_rules(rules, API_RULES_PATH), 'rules')
+    else:
+        rules = iter_ndjson(stream)
 
-    sess = get_auth_session(base_url, user, password)
+    workers = max(1, args.workers)
+    sess = get_auth_session(base_url, user, password, pool_size=max(10, workers))
 
     try:
-        import_rules(sess, base_url, rules)
+        if args.group_upsert:
+            upsert_rule_groups(sess, base_url, rules, workers=workers, stream=stream is not None)
+        elif args.sync:
+            sync_rules(sess, base_url, rules, state_path=args.state_file, prune=args.prune, workers=workers)
+        else:
+            import_rules(sess, base_url, rules, workers=workers, stream=stream is not None)
     except requests.RequestException as e:
         print(f"HTTP error: {e}", file=sys.stderr)
         sys.exit(2)
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if stream is not None and stream is not sys.stdin:
+            stream.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,168 @@
+import sys
+import json
+import time
+import argparse
+import threading
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+# 本地飞书 webhook 替身（机器人 open-apis/bot/v2/hook/* 与流程 flow/api/trigger-webhook/*），用于端到端测试 feishu_relay.py
+# 任意路径的 POST 视为一个 webhook：按路径分别限频，超限时与飞书一致返回 HTTP 200 + {"code": 11232, "msg": "frequency limited"}
+# 控制端点：
+#   GET /_mock/messages  已接收的消息 [{path, at, body}]
+#   GET /_mock/stats     按路径统计 accepted / limited 与 1 秒窗口内的最大消息数
+#   POST /_mock/reset    清空消息与统计
+
+# 飞书自定义机器人的限频：每秒 5 次、每分钟 100 次（按 webhook 计）
+DEFAULT_LIMITS: Tuple[Tuple[int, float], ...] = ((5, 1.0), (100, 60.0))
+RATE_LIMITED_CODE = 11232
+
+
+class MockWebhookState:
+    def __init__(self, limits: Tuple[Tuple[int, float], ...] = DEFAULT_LIMITS):
+        self.lock = threading.Lock()
+        self.limits = limits
+        self.reset()
+
+    def reset(self) -> None:
+        self.messages: List[Dict[str, Any]] = []
+        self.accepted: Dict[str, Deque[float]] = defaultdict(deque)
+        self.stats: Dict[str, Dict[str, Any]] = defaultdict(lambda: {'accepted': 0, 'limited': 0, 'max_per_second': 0})
+
+    def admit(self, path: str, now: float) -> bool:
+        # 滑动窗口：任一窗口内已接受的消息数达到上限即拒绝
+        times = self.accepted[path]
+        horizon = max(w for _, w in self.limits)
+        while times and now - times[0] >= horizon:
+            times.popleft()
+        for limit, window in self.limits:
+            if sum(1 for t in times if now - t < window) >= limit:
+                self.stats[path]['limited'] += 1
+                return False
+        times.append(now)
+        s = self.stats[path]
+        s['accepted'] += 1
+        s['max_per_second'] = max(s['max_per_second'], sum(1 for t in times if now - t < 1.0))
+        return True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = 'MockFeishu/1.0'
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format: str, *args: Any) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status: int, body: Any) -> None:
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        state: MockWebhookState = self.server.state
+        path = urlparse(self.path).path
+        with state.lock:
+            if path == '/_mock/messages':
+                return self._send(200, state.messages)
+            if path == '/_mock/stats':
+                return self._send(200, dict(state.stats))
+        self._send(404, {'code': 404, 'msg': 'not found'})
+
+    def do_POST(self):
+        state: MockWebhookState = self.server.state
+        path = urlparse(self.path).path
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        if path == '/_mock/reset':
+            with state.lock:
+                state.reset()
+            return self._send(200, {'message': 'reset'})
+        try:
+            body = json.loads(raw.decode('utf-8')) if raw else None
+        except ValueError:
+            return self._send(400, {'code': 9499, 'msg': 'Bad Request'})
+        if self.server.latency_ms:
+            time.sleep(self.server.latency_ms / 1000.0)
+        with state.lock:
+            now = time.monotonic()
+            if not state.admit(path, now):
+                return self._send(200, {'code': RATE_LIMITED_CODE, 'msg': 'frequency limited'})
+            state.messages.append({'path': path, 'at': time.time(), 'body': body})
+        self._send(200, {'code': 0, 'msg': 'success', 'data': {}})
+
+
+class MockWebhookServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address: Tuple[str, int], limits: Tuple[Tuple[int, float], ...] = DEFAULT_LIMITS,
+                 latency_ms: float = 0.0, verbose: bool = False):
+        super().__init__(address, _Handler)
+        self.state = MockWebhookState(limits)
+        self.latency_ms = latency_ms
+        self.verbose = verbose
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_mock_webhook(host: str = '127.0.0.1', port: int = 0, limits: Tuple[Tuple[int, float], ...] = DEFAULT_LIMITS,
+                       latency_ms: float = 0.0) -> MockWebhookServer:
+    # 在后台线程启动；port=0 时由系统分配端口，结束时调用 server.shutdown()
+    server = MockWebhookServer((host, port), limits, latency_ms)
+    threading.Thread(target=server.serve_forever, name='mock-feishu', daemon=True).start()
+    return server
+
+
+def parse_limits(values: Optional[List[str]]) -> Tuple[Tuple[int, float], ...]:
+    # --limit 5/1 --limit 100/60：每 N 秒最多 M 条
+    if not values:
+        return DEFAULT_LIMITS
+    out = []
+    for v in values:
+        count, _, window = v.partition('/')
+        try:
+            out.append((int(count), float(window)))
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid --limit value '{v}', expected COUNT/SECONDS")
+    return tuple(out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a local stand-in for Feishu bot / flow webhooks with Feishu-like rate limits.')
+    parser.add_argument('--host', default='127.0.0.1', help='Bind address (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8096, help='Listen port (default: 8096)')
+    parser.add_argument('--limit', action='append', metavar='COUNT/SECONDS',
+                        help='Per-webhook rate limit, repeatable (default: 5/1 and 100/60)')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Fixed latency added to every message')
+    parser.add_argument('--verbose', action='store_true', help='Log every request to stderr')
+    args = parser.parse_args()
+
+    try:
+        limits = parse_limits(args.limit)
+    except argparse.ArgumentTypeError as e:
+        print(str(e), file=sys.stderr)
+        sys.exit(1)
+
+    server = MockWebhookServer((args.host, args.port), limits, args.latency_ms, verbose=args.verbose)
+    print(f"Mock Feishu webhook listening on {server.base_url} (limits: "
+          + ', '.join(f"{c}/{w:g}s" for c, w in limits) + ')')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,384 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+# 本地 Grafana Provisioning API 替身，用于在无真实 Grafana 时测量与回归测试导入脚本
+# 实现导入脚本使用的端点：
+#   api/folders（GET/POST）
+#   api/v1/provisioning/alert-rules（GET/POST）、alert-rules/{uid}（GET/PUT/DELETE）
+#   api/v1/provisioning/folder/{folderUid}/rule-groups/{group}（GET/PUT）
+#   api/v1/provisioning/contact-points（GET/POST）、contact-points/{uid}（PUT/DELETE）
+#   api/v1/provisioning/policies（GET/PUT）
+#   api/dashboards/db（POST）、api/dashboards/uid/{uid}（GET）
+# 控制端点（不计入统计、不受故障注入影响）：
+#   GET /_mock/stats   按路由统计的请求数与服务端耗时
+#   GET /_mock/calls   请求日志 [method, route, status]
+#   POST /_mock/reset  清空数据与统计
+
+try:
+    from tools.grafana_routes import match_route
+except Exception:
+    # 兼容从工具目录直接执行
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    from tools.grafana_routes import match_route  # type: ignore
+
+# 写请求（POST/PUT/DELETE）按概率注入的状态码；429 同时作用于 GET
+INJECTABLE_STATUSES = (400, 409, 429)
+
+
+class MockConfig:
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, inject: Optional[Dict[int, float]] = None,
+                 visibility_delay: float = 0.0, retry_after: int = 0, scheduler_step: int = 10, seed: Optional[int] = None):
+        # latency_ms/jitter_ms: 每个请求的固定延迟与均匀抖动；
+        # inject: {状态码: 概率}；visibility_delay: 新写入规则在列表/规则组 GET 中可见前的秒数（模拟最终一致）；
+        # scheduler_step: 规则组 interval 必须为其整数倍，否则 400（与 Grafana 一致）
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.inject = dict(inject or {})
+        self.visibility_delay = visibility_delay
+        self.retry_after = retry_after
+        self.scheduler_step = scheduler_step
+        self.random = random.Random(seed)
+
+
+class MockState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.folders: List[Dict[str, Any]] = []
+        self.rules: Dict[str, Dict[str, Any]] = {}
+        self.visible_at: Dict[str, float] = {}
+        self.intervals: Dict[Tuple[str, str], int] = {}
+        self.contact_points: Dict[str, Dict[str, Any]] = {}
+        self.policies: Dict[str, Any] = {}
+        self.dashboards: Dict[str, Dict[str, Any]] = {}
+        self.calls: List[Tuple[str, str, int]] = []
+        self.timings: Dict[str, List[float]] = {}
+        self._seq = 0
+
+    def next_id(self, prefix: str) -> str:
+        self._seq += 1
+        return f"{prefix}{self._seq:06d}"
+
+    def visible_rules(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        return [r for uid, r in self.rules.items() if self.visible_at.get(uid, 0) <= now]
+
+    def stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        for key, values in sorted(self.timings.items()):
+            out[key] = {'count': len(values), 'total_ms': round(sum(values) * 1000, 3)}
+        return {'requests': len(self.calls), 'routes': out, 'rules': len(self.rules),
+                'folders': len(self.folders), 'contactPoints': len(self.contact_points), 'dashboards': len(self.dashboards)}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = 'MockGrafana/1.0'
+    protocol_version = 'HTTP/1.1'
+    # keep-alive 下响应头与响应体分两次写出，Nagle + 延迟 ACK 会给每个请求增加约 40ms
+    disable_nagle_algorithm = True
+
+    def log_message(self, format: str, *args: Any) -> None:
+        # 默认不输出访问日志，基准测试时避免 stderr 成为瓶颈
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+    def _send(self, status: int, obj: Any = None, headers: Optional[Dict[str, str]] = None) -> int:
+        body = json.dumps(obj, ensure_ascii=False).encode('utf-8') if obj is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+        return status
+
+    def _read_body(self) -> Any:
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        return json.loads(raw) if raw else None
+
+    def _handle(self, method: str) -> None:
+        started = time.perf_counter()
+        path = unquote(urlparse(self.path).path)
+        try:
+            body = self._read_body() if method in ('POST', 'PUT') else None
+        except ValueError:
+            self._send(400, {'message': 'invalid JSON body'})
+            return
+
+        if path.startswith('/_mock/'):
+            self._control(method, path)
+            return
+
+        config: MockConfig = self.server.config
+        state: MockState = self.server.state
+        delay = config.latency_ms + (config.random.uniform(0, config.jitter_ms) if config.jitter_ms else 0)
+        if delay:
+            time.sleep(delay / 1000.0)
+
+        route, match = match_route(path)
+        status = self._inject(method, route)
+        if status is None:
+            with state.lock:
+                status = self._dispatch(method, route, match, body)
+        with state.lock:
+            state.calls.append((method, route, status))
+            state.timings.setdefault(f"{method} {route}", []).append(time.perf_counter() - started)
+
+    def _inject(self, method: str, route: str) -> Optional[int]:
+        config: MockConfig = self.server.config
+        if route in ('unknown', 'folders'):
+            return None
+        for status in INJECTABLE_STATUSES:
+            rate = config.inject.get(status, 0)
+            if not rate or (method == 'GET' and status != 429):
+                continue
+            with self.server.state.lock:
+                hit = config.random.random() < rate
+            if hit:
+                headers = {'Retry-After': str(config.retry_after)} if status == 429 else None
+                return self._send(status, {'message': f'injected {status}'}, headers)
+        return None
+
+    def _dispatch(self, method: str, route: str, match: Optional[re.Match], body: Any) -> int:
+        state: MockState = self.server.state
+        config: MockConfig = self.server.config
+
+        if route == 'folders':
+            if method == 'GET':
+                return self._send(200, state.folders)
+            if method == 'POST':
+                folder = {'uid': state.next_id('folder'), 'title': (body or {}).get('title')}
+                state.folders.append(folder)
+                return self._send(200, folder)
+
+        if route == 'alert-rules':
+            if method == 'GET':
+                return self._send(200, state.visible_rules())
+            if method == 'POST':
+                rule = dict(body or {})
+                uid = rule.get('uid') or state.next_id('rule')
+                if uid in state.rules:
+                    return self._send(409, {'message': 'a rule with this UID already exists'})
+                if not rule.get('folderUID') or not rule.get('ruleGroup'):
+                    return self._send(400, {'message': 'folderUID and ruleGroup are required'})
+                rule['uid'] = uid
+                state.rules[uid] = rule
+                state.visible_at[uid] = time.monotonic() + config.visibility_delay
+                return self._send(201, rule)
+
+        if route == 'alert-rule':
+            uid = match.group('uid')
+            if uid not in state.rules:
+                return self._send(404, {'message': 'rule not found'})
+            if method == 'GET':
+                return self._send(200, state.rules[uid])
+            if method == 'PUT':
+                rule = dict(body or {})
+                rule['uid'] = uid
+                state.rules[uid] = rule
+                return self._send(200, rule)
+            if method == 'DELETE':
+                del state.rules[uid]
+                state.visible_at.pop(uid, None)
+                return self._send(204)
+
+        if route == 'rule-group':
+            folder_uid, group = match.group('folder'), match.group('group')
+            if method == 'GET':
+                rules = [r for r in state.visible_rules() if r.get('folderUID') == folder_uid and r.get('ruleGroup') == group]
+                if not rules:
+                    return self._send(404, {'message': 'rule group does not exist'})
+                return self._send(200, {'title': group, 'folderUid': folder_uid,
+                                        'interval': state.intervals.get((folder_uid, group), 60), 'rules': rules})
+            if method == 'PUT':
+                payload = body or {}
+                interval = payload.get('interval')
+                if not isinstance(interval, int) or interval <= 0 or interval % config.scheduler_step:
+                    return self._send(400, {'message': f'interval must be a positive multiple of {config.scheduler_step}s'})
+                # 整组替换：组内不在请求中的规则被删除
+                keep = set()
+                for r in payload.get('rules') or []:
+                    rule = dict(r)
+                    rule['uid'] = rule.get('uid') or state.next_id('rule')
+                    rule['folderUID'] = folder_uid
+                    rule['ruleGroup'] = group
+                    state.rules[rule['uid']] = rule
+                    state.visible_at.setdefault(rule['uid'], time.monotonic() + config.visibility_delay)
+                    keep.add(rule['uid'])
+                for uid in [u for u, r in state.rules.items()
+                            if r.get('folderUID') == folder_uid and r.get('ruleGroup') == group and u not in keep]:
+                    del state.rules[uid]
+                state.intervals[(folder_uid, group)] = interval
+                return self._send(200, payload)
+
+        if route == 'contact-points':
+            if method == 'GET':
+                return self._send(200, list(state.contact_points.values()))
+            if method == 'POST':
+                cp = dict(body or {})
+                if not cp.get('name') or not cp.get('type'):
+                    return self._send(400, {'message': 'name and type are required'})
+                cp['uid'] = cp.get('uid') or state.next_id('cp')
+                if cp['uid'] in state.contact_points:
+                    return self._send(409, {'message': 'contact point with this UID already exists'})
+                state.contact_points[cp['uid']] = cp
+                return self._send(202, cp)
+
+        if route == 'contact-point':
+            uid = match.group('uid')
+            if uid not in state.contact_points:
+                return self._send(404, {'message': 'contact point not found'})
+            if method == 'PUT':
+                cp = dict(body or {})
+                cp['uid'] = uid
+                state.contact_points[uid] = cp
+                return self._send(202, cp)
+            if method == 'DELETE':
+                del state.contact_points[uid]
+                return self._send(202, {})
+
+        if route == 'policies':
+            if method == 'GET':
+                return self._send(200, state.policies)
+            if method == 'PUT':
+                if not isinstance(body, dict) or not body.get('receiver'):
+                    return self._send(400, {'message': 'root route must have a receiver'})
+                state.policies = body
+                return self._send(202, {'message': 'policies updated'})
+
+        if route == 'dashboard':
+            uid = match.group('uid')
+            if uid not in state.dashboards:
+                return self._send(404, {'message': 'Dashboard not found'})
+            if method == 'GET':
+                return self._send(200, state.dashboards[uid])
+
+        if route == 'dashboard-db':
+            if method == 'POST':
+                payload = body or {}
+                dash = dict(payload.get('dashboard') or {})
+                if not dash.get('title'):
+                    return self._send(400, {'message': 'Dashboard title cannot be empty'})
+                uid = dash.get('uid') or state.next_id('dash')
+                current = state.dashboards.get(uid)
+                if current and not payload.get('overwrite'):
+                    return self._send(412, {'status': 'name-exists', 'message': 'A dashboard with the same uid already exists'})
+                version = (current['dashboard']['version'] + 1) if current else 1
+                dash.update({'uid': uid, 'id': current['dashboard']['id'] if current else len(state.dashboards) + 1, 'version': version})
+                state.dashboards[uid] = {'dashboard': dash, 'meta': {'folderUid': payload.get('folderUid') or '', 'version': version}}
+                return self._send(200, {'id': dash['id'], 'uid': uid, 'status': 'success', 'version': version})
+
+        return self._send(404 if route == 'unknown' else 405, {'message': f'{method} {route} not supported'})
+
+    def _control(self, method: str, path: str) -> None:
+        state: MockState = self.server.state
+        with state.lock:
+            if path == '/_mock/stats' and method == 'GET':
+                self._send(200, state.stats())
+            elif path == '/_mock/calls' and method == 'GET':
+                self._send(200, state.calls)
+            elif path == '/_mock/reset' and method == 'POST':
+                state.reset()
+                self._send(200, {'message': 'reset'})
+            else:
+                self._send(404, {'message': 'unknown control endpoint'})
+
+
+class MockGrafanaServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # 并发导入时避免 listen 队列溢出
+    request_queue_size = 128
+
+    def __init__(self, address: Tuple[str, int], config: Optional[MockConfig] = None, verbose: bool = False):
+        super().__init__(address, _Handler)
+        self.config = config or MockConfig()
+        self.state = MockState()
+        self.verbose = verbose
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/"
+
+
+def start_mock_server(config: Optional[MockConfig] = None, host: str = '127.0.0.1', port: int = 0) -> MockGrafanaServer:
+    # 在后台线程启动；port=0 时由系统分配端口，通过 server.base_url 获取地址，结束时调用 server.shutdown()
+    server = MockGrafanaServer((host, port), config)
+    threading.Thread(target=server.serve_forever, name='mock-grafana', daemon=True).start()
+    return server
+
+
+def parse_inject(values: List[str]) -> Dict[int, float]:
+    # --inject 429=0.05 --inject 400=0.01
+    out: Dict[int, float] = {}
+    for v in values or []:
+        status, _, rate = v.partition('=')
+        try:
+            code, prob = int(status), float(rate)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid --inject value '{v}', expected STATUS=RATE")
+        if code not in INJECTABLE_STATUSES or not 0 <= prob <= 1:
+            raise argparse.ArgumentTypeError(f"invalid --inject value '{v}', status must be one of {INJECTABLE_STATUSES} and rate in [0, 1]")
+        out[code] = prob
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a local mock of the Grafana provisioning API used by the import tools.')
+    parser.add_argument('--host', default='127.0.0.1', help='Bind address (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=3300, help='Listen port (default: 3300)')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Fixed latency added to every request')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='Uniform random latency added on top of --latency-ms')
+    parser.add_argument('--inject', action='append', default=[], metavar='STATUS=RATE',
+                        help='Inject 400/409/429 responses into writes with the given probability (429 also hits GETs); repeatable')
+    parser.add_argument('--visibility-delay', type=float, default=0.0, help='Seconds before a newly written rule shows up in list/group GETs')
+    parser.add_argument('--retry-after', type=int, default=0, help='Retry-After header value sent with injected 429 (default: 0)')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed for latency jitter and fault injection')
+    parser.add_argument('--verbose', action='store_true', help='Log every request to stderr')
+    args = parser.parse_args()
+
+    try:
+        inject = parse_inject(args.inject)
+    except argparse.ArgumentTypeError as e:
+        print(str(e), file=sys.stderr)
+        sys.exit(1)
+
+    config = MockConfig(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, inject=inject,
+                        visibility_delay=args.visibility_delay, retry_after=args.retry_after, seed=args.seed)
+    server = MockGrafanaServer((args.host, args.port), config, verbose=args.verbose)
+    print(f"Mock Grafana listening on {server.base_url} (set GRAFANA_URL to use it)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
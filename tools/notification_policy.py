@@ -0,0 +1,260 @@
+import os
+import re
+import sys
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# 通知策略树模型：解析 Grafana/Alertmanager 路由树并编译为带索引的匹配结构，
+# 供离线路由模拟、策略优化等工具复用。路由语义与 Alertmanager 一致：
+#   - 子路由按顺序匹配；匹配的子路由递归求值，continue=false 时停止检查后续兄弟；
+#   - 没有子路由匹配时当前路由即为结果；根路由匹配所有告警；
+#   - receiver/group_by/group_wait/group_interval/repeat_interval 未设置时继承父路由；
+#   - 缺失标签按空字符串参与匹配；正则完整锚定。
+
+try:
+    from tools.import_alert_settings import _load_yaml
+except Exception:
+    # 兼容从工具目录直接执行
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    from tools.import_alert_settings import _load_yaml  # type: ignore
+
+# Grafana 默认值（根路由未设置时）
+DEFAULT_GROUP_BY = ('grafana_folder', 'alertname')
+DEFAULT_GROUP_WAIT = '30s'
+DEFAULT_GROUP_INTERVAL = '5m'
+DEFAULT_REPEAT_INTERVAL = '4h'
+MATCH_OPS = ('=', '!=', '=~', '!~')
+
+_MATCHER_STR_RE = re.compile(r'^\s*([A-Za-z_][A-Za-z0-9_]*)\s*(=~|!~|!=|=)\s*(.*?)\s*$')
+
+
+@dataclass(frozen=True)
+class Matcher:
+    label: str
+    op: str
+    value: str
+
+    def compile(self):
+        if self.op in ('=~', '!~'):
+            rx = re.compile(f'^(?:{self.value})$')
+            return (lambda v: rx.match(v) is not None) if self.op == '=~' else (lambda v: rx.match(v) is None)
+        value = self.value
+        return (lambda v: v == value) if self.op == '=' else (lambda v: v != value)
+
+    def __str__(self) -> str:
+        return f'{self.label}{self.op}"{self.value}"'
+
+
+@dataclass
+class Route:
+    # 已解析继承关系的路由节点；path 为从根开始的子路由下标，根为 ()
+    path: Tuple[int, ...]
+    receiver: Optional[str]
+    group_by: Tuple[str, ...]
+    group_wait: str
+    group_interval: str
+    repeat_interval: str
+    matchers: Tuple[Matcher, ...]
+    continue_: bool
+    mute_time_intervals: Tuple[str, ...] = ()
+    active_time_intervals: Tuple[str, ...] = ()
+    routes: List['Route'] = field(default_factory=list)
+    # 编译产物
+    _checks: Tuple[Tuple[str, Any], ...] = ()
+    _index_label: Optional[str] = None
+    _index: Dict[str, Tuple[int, ...]] = field(default_factory=dict)
+    _unindexed: Tuple[int, ...] = ()
+    _residual: List[Tuple[Tuple[str, Any], ...]] = field(default_factory=list)
+
+    @property
+    def route_id(self) -> str:
+        return '/'.join(str(i) for i in self.path) or 'root'
+
+    def group_key(self, labels: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+        # 分组标签中 '...' 表示按全部标签分组；缺失的分组标签不参与分组键（与 Alertmanager 一致）
+        if '...' in self.group_by:
+            return tuple(sorted(labels.items()))
+        return tuple((l, labels[l]) for l in self.group_by if l in labels)
+
+
+def parse_matchers(raw: Dict[str, Any]) -> Tuple[Matcher, ...]:
+    # 支持 object_matchers（[[label, op, value]]）、matchers（"label=value" 字符串）以及旧式 match/match_re
+    out: List[Matcher] = []
+    for m in raw.get('object_matchers') or []:
+        if not isinstance(m, (list, tuple)) or len(m) != 3 or m[1] not in MATCH_OPS:
+            raise ValueError(f"invalid object_matcher: {m!r}")
+        out.append(Matcher(str(m[0]), str(m[1]), '' if m[2] is None else str(m[2])))
+    for m in raw.get('matchers') or []:
+        hit = _MATCHER_STR_RE.match(str(m))
+        if not hit:
+            raise ValueError(f"invalid matcher: {m!r}")
+        value = hit.group(3)
+        if len(value) >= 2 and value[0] == value[-1] == '"':
+            value = value[1:-1]
+        out.append(Matcher(hit.group(1), hit.group(2), value))
+    for k, v in (raw.get('match') or {}).items():
+        out.append(Matcher(str(k), '=', str(v)))
+    for k, v in (raw.get('match_re') or {}).items():
+        out.append(Matcher(str(k), '=~', str(v)))
+    return tuple(out)
+
+
+def policy_root(data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    # 与 import_notification_policies 一致：policies 为列表时取第一项作为根策略，为字典时直接使用
+    raw = data.get('policies') if isinstance(data, dict) and 'policies' in data else data
+    if isinstance(raw, list):
+        return raw[0] if raw else None
+    return raw if isinstance(raw, dict) else None
+
+
+def load_policy(path: str) -> Dict[str, Any]:
+    root = policy_root(_load_yaml(path))
+    if not root:
+        raise ValueError(f"No policies object found in: {path}")
+    return root
+
+
+def build_tree(raw: Dict[str, Any], parent: Optional[Route] = None, path: Tuple[int, ...] = ()) -> Route:
+    # 解析单个路由并递归处理子路由，继承字段在此一次性展开
+    def inherit(key: str, default: Any) -> Any:
+        if raw.get(key) not in (None, '', []):
+            return raw[key]
+        return getattr(parent, key) if parent is not None else default
+
+    group_by = raw.get('group_by')
+    route = Route(
+        path=path,
+        receiver=inherit('receiver', None),
+        group_by=tuple(group_by) if group_by else (parent.group_by if parent is not None else DEFAULT_GROUP_BY),
+        group_wait=str(inherit('group_wait', DEFAULT_GROUP_WAIT)),
+        group_interval=str(inherit('group_interval', DEFAULT_GROUP_INTERVAL)),
+        repeat_interval=str(inherit('repeat_interval', DEFAULT_REPEAT_INTERVAL)),
+        matchers=parse_matchers(raw) if parent is not None else (),
+        continue_=bool(raw.get('continue', False)),
+        mute_time_intervals=tuple(raw.get('mute_time_intervals') or ()),
+        active_time_intervals=tuple(raw.get('active_time_intervals') or ()),
+    )
+    route.routes = [build_tree(child, route, path + (i,)) for i, child in enumerate(raw.get('routes') or [])]
+    return route
+
+
+def compile_tree(route: Route) -> Route:
+    # 为每个节点的子路由建立等值索引：选取子路由中最常用于 '=' 匹配的标签，
+    # 按标签值预先算好候选子路由下标（含无该等值匹配器的子路由，保持原顺序）；
+    # 命中索引的等值匹配器不再重复检查，其余匹配器编译为 (label, predicate)
+    route._checks = tuple((m.label, m.compile()) for m in route.matchers)
+    for child in route.routes:
+        compile_tree(child)
+    if not route.routes:
+        return route
+
+    counts = Counter(m.label for c in route.routes for m in c.matchers if m.op == '=')
+    label = counts.most_common(1)[0][0] if counts else None
+    indexed: Dict[str, List[int]] = {}
+    unindexed: List[int] = []
+    residual: List[Tuple[Tuple[str, Any], ...]] = []
+    for i, child in enumerate(route.routes):
+        eq = next((m for m in child.matchers if label is not None and m.label == label and m.op == '='), None)
+        if eq is None:
+            unindexed.append(i)
+            residual.append(child._checks)
+        else:
+            indexed.setdefault(eq.value, []).append(i)
+            rest = list(child.matchers)
+            rest.remove(eq)
+            residual.append(tuple((m.label, m.compile()) for m in rest))
+    route._index_label = label
+    route._unindexed = tuple(unindexed)
+    route._index = {v: tuple(sorted(idx + unindexed)) for v, idx in indexed.items()}
+    route._residual = residual
+    return route
+
+
+def match_routes(route: Route, labels: Dict[str, str], out: List[Route]) -> None:
+    # route 自身已判定匹配；收集其下的结果路由
+    if route.routes:
+        if route._index_label is not None:
+            candidates = route._index.get(labels.get(route._index_label, ''), route._unindexed)
+        else:
+            candidates = range(len(route.routes))
+        matched = False
+        for i in candidates:
+            if all(check(labels.get(label, '')) for label, check in route._residual[i]):
+                child = route.routes[i]
+                match_routes(child, labels, out)
+                matched = True
+                if not child.continue_:
+                    break
+        if matched:
+            return
+    out.append(route)
+
+
+def iter_routes(route: Route) -> Iterable[Route]:
+    yield route
+    for child in route.routes:
+        yield from iter_routes(child)
+
+
+def matcher_labels(route: Route) -> Tuple[str, ...]:
+    # 路由结果只取决于告警在这些标签上的取值
+    return tuple(sorted({m.label for r in iter_routes(route) for m in r.matchers}))
+
+
+class Router:
+    # 编译后的路由器：按“匹配器涉及标签”的取值投影缓存路由结果，
+    # 真实告警的投影种类通常远少于告警数量，批量路由时绝大多数只需一次字典查找
+    def __init__(self, root: Route, cache_size: int = 1 << 16):
+        self.root = compile_tree(root)
+        self.labels = matcher_labels(root)
+        self.cache_size = cache_size
+        self._cache: Dict[Tuple[str, ...], Tuple[Route, ...]] = {}
+
+    @classmethod
+    def from_file(cls, path: str) -> 'Router':
+        return cls(build_tree(load_policy(path)))
+
+    def route(self, labels: Dict[str, str]) -> Tuple[Route, ...]:
+        key = tuple(labels.get(l, '') for l in self.labels)
+        hit = self._cache.get(key)
+        if hit is None:
+            out: List[Route] = []
+            match_routes(self.root, labels, out)
+            hit = tuple(out)
+            if len(self._cache) >= self.cache_size:
+                self._cache.clear()
+            self._cache[key] = hit
+        return hit
+
+    def route_many(self, label_sets: Sequence[Dict[str, str]]) -> List[Tuple[Route, ...]]:
+        route = self.route
+        return [route(ls) for ls in label_sets]
+
+
+def reference_match(route: Route, labels: Dict[str, str]) -> List[Route]:
+    # 未编译的逐条匹配实现（直接按 Alertmanager 语义），用于校验索引与缓存的正确性
+    out: List[Route] = []
+
+    def visit(r: Route) -> bool:
+        if not all(_matches(m, labels.get(m.label, '')) for m in r.matchers):
+            return False
+        before = len(out)
+        for child in r.routes:
+            if visit(child) and not child.continue_:
+                break
+        if len(out) == before:
+            out.append(r)
+        return True
+
+    visit(route)
+    return out
+
+
+def _matches(m: Matcher, value: str) -> bool:
+    if m.op == '=':
+        return value == m.value
+    if m.op == '!=':
+        return value != m.value
+    hit = re.fullmatch(m.value, value) is not None
+    return hit if m.op == '=~' else not hit
@@ -0,0 +1,442 @@
+import os
+import re
+import sys
+import copy
+import json
+import argparse
+from typing import Any, Dict, List, Optional, Tuple
+
+# 仪表盘查询优化
+# 输入: grafana/*.json
+# 输出: out/dashboards/*.json（优化后的仪表盘）+ out/dashboard_optimization.json（改写明细与前后代价）+ 终端表格
+#
+# 改写（每项都不改变面板显示的数据）：
+#   1. 面板设置：时序类面板按宽度设置 maxDataPoints（未设置或过大时），未设置 Min interval 时设为抓取间隔；
+#   2. 去掉 =~".*" 这类匹配任意值的匹配器（文本级删除，保留原有换行与注释，删除前后规范化表达式需等价）；
+#   3. 查询复用（Dashboard 数据源，同一次加载只向 Prometheus 发一次）：
+#      - 面板的全部查询与另一个面板的查询相同（或为其子集）：改为引用该面板，必要时按 refId 过滤、覆盖显示名；
+#      - 面板唯一的查询 op(E) 可由另一个面板的 op by(...)(E) 逐时刻汇总得到（sum/max/min/count）：
+#        引用该面板并用 joinByField + calculateField(reduceRow) 计算；
+#      - 同一面板内 op(E) 与 op by(...)(E) 并存时，去掉前者，改由面板变换计算总数。
+#   另外标出无界的正则匹配器（.+、前导 .*、选择 All 时为 .* 的变量），只报告不改写。
+
+try:
+    from tools import promql
+    from tools.convert_yaml_to_grafana_json import OUT_DIR
+    from tools.analyze_query_cost import DASHBOARD_DIR, DEFAULT_SCRAPE_SECONDS, HIGH_MAX_DATA_POINTS, analyze_dashboard, iter_panels, print_table
+except Exception:
+    # 兼容从工具目录直接执行
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    from tools import promql  # type: ignore
+    from tools.convert_yaml_to_grafana_json import OUT_DIR  # type: ignore
+    from tools.analyze_query_cost import DASHBOARD_DIR, DEFAULT_SCRAPE_SECONDS, HIGH_MAX_DATA_POINTS, analyze_dashboard, iter_panels, print_table  # type: ignore
+
+OPTIMIZED_DIR = os.path.join(OUT_DIR, 'dashboards')
+REPORT_PATH = os.path.join(OUT_DIR, 'dashboard_optimization.json')
+
+DASHBOARD_DATASOURCE = {'type': 'datasource', 'uid': '-- Dashboard --'}
+# Grafana 栅格 24 列约 1920px，每 2px 一个点足够绘制
+POINTS_PER_GRID_UNIT = 40
+DEFAULT_MIN_INTERVAL = f'{DEFAULT_SCRAPE_SECONDS}s'
+SERIES_PANEL_TYPES = {'timeseries', 'graph', 'barchart', 'state-timeline', 'trend'}
+# op(E) 由 op by(...)(E) 各序列逐时刻汇总时使用的 reduceRow 聚合
+ROW_REDUCERS = {'sum': 'sum', 'max': 'max', 'min': 'min', 'count': 'sum'}
+# 与返回数据无关的查询字段（step/metric 为旧版 Grafana 遗留字段，不参与步长计算）
+_TARGET_IGNORED = {'refId', 'legendFormat', 'hide', 'editorMode', 'datasource', 'metric', 'step', 'expr',
+                   'disableTextWrap', 'fullMetaSearch', 'includeNullMetadata', 'useBackend'}
+_NOOP_MATCHER_RE = re.compile(r'^\s*[A-Za-z_][A-Za-z0-9_]*\s*=~\s*"(?:\.\*|\(\.\*\)|\^\.\*\$)"\s*$')
+_SELECTOR_BODY_RE = re.compile(r'([A-Za-z_:][A-Za-z0-9_:]*)?\s*\{([^{}]*)\}')
+_LEGEND_LABEL_RE = re.compile(r'\{\{\s*([A-Za-z_][A-Za-z0-9_]*)\s*\}\}')
+
+
+def _split_matchers(body: str) -> List[str]:
+    # 按引号外的逗号切分匹配器列表
+    parts, buf, quoted, escaped = [], [], False, False
+    for ch in body:
+        if escaped:
+            escaped = False
+        elif ch == '\\':
+            escaped = True
+        elif ch == '"':
+            quoted = not quoted
+        elif ch == ',' and not quoted:
+            parts.append(''.join(buf))
+            buf = []
+            continue
+        buf.append(ch)
+    parts.append(''.join(buf))
+    return parts
+
+
+def strip_noop_matchers(expr: str) -> Tuple[str, int]:
+    # 删除 label=~".*"；选择器没有指标名时至少保留一个匹配器。返回 (新表达式, 删除数)
+    removed = 0
+
+    def repl(m: re.Match) -> str:
+        nonlocal removed
+        name, body = m.group(1), m.group(2)
+        parts = _split_matchers(body)
+        kept = [p for p in parts if not _NOOP_MATCHER_RE.match(p)]
+        if len(kept) == len(parts):
+            return m.group(0)
+        if not name and not [p for p in kept if p.strip()]:
+            kept = [parts[0]]
+        removed += len(parts) - len(kept)
+        body = ', '.join(p.strip() for p in kept if p.strip())
+        return (name or '') + ('{' + body + '}' if body else '')
+
+    text = _SELECTOR_BODY_RE.sub(repl, expr)
+    if not removed:
+        return expr, 0
+    # 等价校验：原表达式去掉 no-op 匹配器后与新表达式规范化文本一致
+    def drop(n: Any) -> Optional[Any]:
+        if isinstance(n, promql.VectorSelector):
+            kept = tuple(mt for mt in n.matchers if not promql.is_noop_matcher(mt))
+            if kept or n.name:
+                return promql.VectorSelector(n.name, kept, n.offset, n.at)
+        return None
+    try:
+        if promql.canonical_key(promql.transform(promql.parse(expr), drop)) != promql.canonical_key(promql.parse(text)):
+            return expr, 0
+    except promql.PromQLError:
+        return expr, 0
+    return text, removed
+
+
+def regex_issues(expr: str, variables: Dict[str, Dict[str, Any]]) -> List[str]:
+    # 无界正则匹配器：.+、前导 .*、选择 All 时展开为 .* 的变量；选择器全部标签匹配器都无界时整体标出
+    try:
+        node = promql.parse(expr)
+    except promql.PromQLError:
+        return []
+    issues: List[str] = []
+    for sel in promql.selectors(node):
+        unbounded = 0
+        labels = [m for m in sel.matchers if m.name != '__name__']
+        for m in labels:
+            value = m.value
+            var = re.fullmatch(r'\$\{?([A-Za-z0-9_]+)(?::[a-z]+)?\}?', value)
+            if m.op in ('!=', '!~') or promql.is_noop_matcher(m):
+                unbounded += 1
+            elif m.op == '=~' and value in ('.+', '(.+)'):
+                issues.append(f'{m.name}=~"{value}" only requires the label to exist')
+                unbounded += 1
+            elif m.op == '=~' and value.startswith('.*') and len(value) > 2:
+                issues.append(f'{m.name}=~"{value}" has a leading wildcard (full label-value scan)')
+                unbounded += 1
+            elif m.op == '=~' and var and var.group(1) in variables:
+                v = variables[var.group(1)]
+                if v.get('includeAll') and (v.get('allValue') or '') in ('.*', ''):
+                    unbounded += 1
+        if labels and unbounded == len(labels):
+            issues.append(f'{sel.name or "selector"}: every label matcher is unbounded (scans all series when All is selected)')
+    return list(dict.fromkeys(issues))
+
+
+def _panel_data_key(panel: Dict[str, Any]) -> str:
+    # 面板级数据设置：决定查询步长与时间范围
+    ds = panel.get('datasource') or {}
+    return json.dumps({
+        'datasource': ds.get('uid') if isinstance(ds, dict) else ds,
+        'maxDataPoints': panel.get('maxDataPoints') or ('width', (panel.get('gridPos') or {}).get('w')),
+        'interval': panel.get('interval') or '',
+        'timeFrom': panel.get('timeFrom'),
+        'timeShift': panel.get('timeShift'),
+    }, sort_keys=True, ensure_ascii=False)
+
+
+def _target_settings(t: Dict[str, Any]) -> Dict[str, Any]:
+    s = {k: v for k, v in t.items() if k not in _TARGET_IGNORED}
+    instant = bool(s.pop('instant', False))
+    rng = s.pop('range', None)
+    s['range'] = bool(rng) if rng is not None else not instant
+    s['instant'] = instant
+    s['intervalFactor'] = s.get('intervalFactor') or 1
+    s['interval'] = s.get('interval') or ''
+    s['format'] = s.get('format') or 'time_series'
+    s['exemplar'] = bool(s.get('exemplar'))
+    return s
+
+
+def _query_key(panel: Dict[str, Any], t: Dict[str, Any], node: Any) -> str:
+    return _panel_data_key(panel) + '|' + json.dumps(_target_settings(t), sort_keys=True) + '|' + promql.canonical_key(node)
+
+
+def _legend_display(legend: Optional[str]) -> Optional[str]:
+    # legendFormat -> displayName（{{label}} 换成字段标签引用）；自动图例无法等价表达
+    if not legend or legend == '__auto':
+        return None
+    return _LEGEND_LABEL_RE.sub(lambda m: '${__field.labels.' + m.group(1) + '}', legend)
+
+
+def _derivable(total: Any, grouped: Any) -> Optional[str]:
+    # total = op(E)，grouped = op by/without(...)(E)：返回逐时刻汇总用的 reducer
+    if not (isinstance(total, promql.AggregateExpr) and isinstance(grouped, promql.AggregateExpr)):
+        return None
+    if total.op != grouped.op or total.op not in ROW_REDUCERS or total.param is not None or grouped.param is not None:
+        return None
+    if total.grouping or total.without or not (grouped.grouping or grouped.without):
+        return None
+    if promql.canonical_key(total.expr) != promql.canonical_key(grouped.expr):
+        return None
+    return ROW_REDUCERS[total.op]
+
+
+def _row_transforms(reducer: str, alias: str, replace: bool) -> List[Dict[str, Any]]:
+    return [
+        {'id': 'joinByField', 'options': {'byField': 'Time', 'mode': 'outer'}},
+        {'id': 'calculateField', 'options': {'mode': 'reduceRow', 'reduce': {'reducer': reducer}, 'alias': alias, 'replaceFields': replace}},
+    ]
+
+
+def _plain_alias(legend: Optional[str]) -> Optional[str]:
+    if not legend or legend == '__auto' or '{{' in legend:
+        return None
+    return legend
+
+
+class _PanelInfo:
+    def __init__(self, panel: Dict[str, Any], collapsed: bool):
+        self.panel = panel
+        self.collapsed = collapsed
+        self.targets: List[Tuple[Dict[str, Any], Any, str]] = []
+        self.ok = False
+        targets = panel.get('targets') or []
+        ds = panel.get('datasource') or {}
+        if not targets or (isinstance(ds, dict) and ds.get('uid') in ('-- Dashboard --', '-- Mixed --', '__expr__')):
+            return
+        for t in targets:
+            expr = t.get('expr')
+            if t.get('hide') or not isinstance(expr, str) or not expr.strip():
+                return
+            try:
+                node = promql.parse(expr)
+            except promql.PromQLError:
+                return
+            self.targets.append((t, node, _query_key(panel, t, node)))
+        self.ok = True
+
+
+def _iter_with_rows(dash: Dict[str, Any]):
+    # (面板, 是否位于折叠 row 内)；折叠 row 内的面板不会随仪表盘加载执行查询，不能作为复用来源
+    for p in dash.get('panels') or []:
+        yield p, False
+        for sub in p.get('panels') or []:
+            yield sub, bool(p.get('collapsed'))
+
+
+def normalize_settings(dash: Dict[str, Any], points_per_unit: int, min_interval: str) -> List[Dict[str, Any]]:
+    actions = []
+    for p in iter_panels(dash):
+        if p.get('type') not in SERIES_PANEL_TYPES or not p.get('targets'):
+            continue
+        width = (p.get('gridPos') or {}).get('w') or 24
+        points = min(width * points_per_unit, HIGH_MAX_DATA_POINTS)
+        current = p.get('maxDataPoints')
+        if not current or current >= HIGH_MAX_DATA_POINTS:
+            p['maxDataPoints'] = points
+            actions.append({'panel': p.get('id'), 'action': 'maxDataPoints', 'from': current, 'to': points})
+        if not p.get('interval') and not any(t.get('interval') for t in p.get('targets') or []):
+            p['interval'] = min_interval
+            actions.append({'panel': p.get('id'), 'action': 'min-interval', 'from': None, 'to': min_interval})
+    return actions
+
+
+def strip_panel_matchers(dash: Dict[str, Any]) -> List[Dict[str, Any]]:
+    actions = []
+    for p in iter_panels(dash):
+        for t in p.get('targets') or []:
+            if isinstance(t.get('expr'), str):
+                text, removed = strip_noop_matchers(t['expr'])
+                if removed:
+                    t['expr'] = text
+                    actions.append({'panel': p.get('id'), 'refId': t.get('refId'), 'action': 'strip-noop-matchers', 'removed': removed})
+    return actions
+
+
+def _derive_in_panel(p: Dict[str, Any], info: _PanelInfo) -> Optional[Dict[str, Any]]:
+    # 面板内 op(E) 与 op by(...)(E) 并存：去掉前者，由变换在分组结果上逐时刻汇总
+    if p.get('type') not in SERIES_PANEL_TYPES or len(info.targets) != 2 or p.get('transformations'):
+        return None
+    for (total_t, total, total_key), (grouped_t, grouped, grouped_key) in (info.targets, info.targets[::-1]):
+        reducer = _derivable(total, grouped)
+        alias = _plain_alias(total_t.get('legendFormat'))
+        if reducer and alias and total_key.split('|')[:-1] == grouped_key.split('|')[:-1]:
+            if _refid_overrides(p, {total_t.get('refId')}):
+                return None
+            p['targets'] = [grouped_t]
+            p['transformations'] = _row_transforms(reducer, alias, replace=False)
+            return {'panel': p.get('id'), 'action': 'derive-in-panel', 'removed': total_t.get('refId'),
+                    'from': grouped_t.get('refId'), 'reducer': reducer}
+    return None
+
+
+def _refid_overrides(p: Dict[str, Any], refs: set) -> bool:
+    for o in (p.get('fieldConfig') or {}).get('overrides') or []:
+        matcher = o.get('matcher') or {}
+        if matcher.get('id') == 'byFrameRefID' and matcher.get('options') in refs:
+            return True
+    return False
+
+
+def _reuse_plan(consumer: _PanelInfo, source: _PanelInfo) -> Optional[Dict[str, Any]]:
+    # 返回复用方案：'same'（全部相同/子集）或 'derive'（单查询逐时刻汇总）
+    by_key: Dict[str, Dict[str, Any]] = {}
+    for t, _, key in source.targets:
+        by_key.setdefault(key, t)
+    matched = []
+    for t, node, key in consumer.targets:
+        src = by_key.get(key)
+        if src is None:
+            break
+        matched.append((t, src))
+    else:
+        overrides = []
+        for t, src in matched:
+            if (t.get('legendFormat') or '') != (src.get('legendFormat') or ''):
+                display = _legend_display(t.get('legendFormat'))
+                if display is None:
+                    return None
+                overrides.append((src.get('refId'), display))
+        return {'kind': 'same', 'refs': [src.get('refId') for _, src in matched], 'overrides': overrides}
+    if len(consumer.targets) != 1 or consumer.panel.get('type') not in SERIES_PANEL_TYPES:
+        return None
+    t, node, key = consumer.targets[0]
+    alias = _plain_alias(t.get('legendFormat'))
+    if not alias:
+        return None
+    for src, src_node, src_key in source.targets:
+        reducer = _derivable(node, src_node)
+        if reducer and key.split('|')[:-1] == src_key.split('|')[:-1]:
+            return {'kind': 'derive', 'refs': [src.get('refId')], 'reducer': reducer, 'alias': alias}
+    return None
+
+
+def _rewire(p: Dict[str, Any], source: Dict[str, Any], plan: Dict[str, Any]) -> None:
+    p['datasource'] = dict(DASHBOARD_DATASOURCE)
+    p['targets'] = [{'datasource': dict(DASHBOARD_DATASOURCE), 'panelId': source.get('id'), 'refId': 'A', 'withTransforms': False}]
+    transforms: List[Dict[str, Any]] = []
+    if len(plan['refs']) < len(source.get('targets') or []):
+        include = plan['refs'][0] if len(plan['refs']) == 1 else '/^(' + '|'.join(re.escape(r) for r in plan['refs']) + ')$/'
+        transforms.append({'id': 'filterByRefId', 'options': {'include': include}})
+    if plan['kind'] == 'derive':
+        transforms.extend(_row_transforms(plan['reducer'], plan['alias'], replace=True))
+    if transforms:
+        p['transformations'] = transforms
+    overrides = (p.setdefault('fieldConfig', {})).setdefault('overrides', [])
+    for ref, display in plan.get('overrides') or []:
+        overrides.append({'matcher': {'id': 'byFrameRefID', 'options': ref}, 'properties': [{'id': 'displayName', 'value': display}]})
+
+
+def reuse_queries(dash: Dict[str, Any]) -> List[Dict[str, Any]]:
+    actions: List[Dict[str, Any]] = []
+    infos = [(p, _PanelInfo(p, collapsed)) for p, collapsed in _iter_with_rows(dash) if p.get('type') != 'row']
+    for p, info in infos:
+        if info.ok:
+            action = _derive_in_panel(p, info)
+            if action:
+                actions.append(action)
+    infos = [(p, _PanelInfo(p, collapsed)) for p, collapsed in _iter_with_rows(dash) if p.get('type') != 'row']
+    sources: set = set()
+    consumers: set = set()
+    for p, info in infos:
+        if not info.ok or p.get('transformations') or id(p) in sources:
+            continue
+        refs = {t.get('refId') for t, _, _ in info.targets}
+        if _refid_overrides(p, refs):
+            continue
+        best = None
+        for q, qinfo in infos:
+            if q is p or not qinfo.ok or qinfo.collapsed or id(q) in consumers or q.get('id') is None:
+                continue
+            plan = _reuse_plan(info, qinfo)
+            if plan and (best is None or (plan['kind'] == 'same', len(plan['refs'])) > (best[1]['kind'] == 'same', len(best[1]['refs']))):
+                best = (q, plan)
+        if best is None:
+            continue
+        q, plan = best
+        queries = len(info.targets)
+        _rewire(p, q, plan)
+        sources.add(id(q))
+        consumers.add(id(p))
+        actions.append({'panel': p.get('id'), 'action': f"reuse-{plan['kind']}", 'source_panel': q.get('id'),
+                        'refs': plan['refs'], 'queries_removed': queries})
+    return actions
+
+
+def optimize_dashboard(dash: Dict[str, Any], points_per_unit: int = POINTS_PER_GRID_UNIT, min_interval: str = DEFAULT_MIN_INTERVAL,
+                       reuse: bool = True) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    out = copy.deepcopy(dash)
+    variables = {v.get('name'): v for v in (out.get('templating') or {}).get('list') or []}
+    actions = normalize_settings(out, points_per_unit, min_interval)
+    actions += strip_panel_matchers(out)
+    if reuse:
+        actions += reuse_queries(out)
+    flags = []
+    for p in iter_panels(out):
+        for t in p.get('targets') or []:
+            if isinstance(t.get('expr'), str):
+                for issue in regex_issues(t['expr'], variables):
+                    flags.append({'panel': p.get('id'), 'title': p.get('title'), 'refId': t.get('refId'), 'issue': issue})
+    return out, {'actions': actions, 'flags': flags}
+
+
+def _load_summary(fname: str, dash: Dict[str, Any]) -> Dict[str, Any]:
+    panels = analyze_dashboard(fname, dash)
+    return {'queries': sum(len(p['queries']) for p in panels), 'cost': round(sum(p['cost_per_load'] for p in panels), 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Optimize Grafana dashboard queries (settings, no-op matchers, Dashboard-datasource reuse).')
+    parser.add_argument('--dashboard-dir', default=DASHBOARD_DIR, help='Directory of dashboard JSON files (default: grafana)')
+    parser.add_argument('--out-dir', default=OPTIMIZED_DIR, help='Where optimized dashboards are written (default: out/dashboards)')
+    parser.add_argument('--report', default=REPORT_PATH, help='JSON report path (default: out/dashboard_optimization.json)')
+    parser.add_argument('--points-per-unit', type=int, default=POINTS_PER_GRID_UNIT, help=f'maxDataPoints per grid column of panel width (default: {POINTS_PER_GRID_UNIT})')
+    parser.add_argument('--min-interval', default=DEFAULT_MIN_INTERVAL, help=f'Min interval for panels without one (default: {DEFAULT_MIN_INTERVAL}, the scrape interval)')
+    parser.add_argument('--no-reuse', action='store_true', help='Do not rewire panels through the Dashboard datasource')
+    parser.add_argument('--verbose', action='store_true', help='Print every action and flagged matcher')
+    args = parser.parse_args()
+
+    if promql.duration_seconds(args.min_interval) is None:
+        print(f"Error: invalid --min-interval {args.min_interval}", file=sys.stderr)
+        sys.exit(2)
+    try:
+        names = sorted(f for f in os.listdir(args.dashboard_dir) if f.endswith('.json'))
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(2)
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    report = []
+    rows = []
+    for fname in names:
+        with open(os.path.join(args.dashboard_dir, fname), 'r', encoding='utf-8') as f:
+            dash = json.load(f)
+        out, result = optimize_dashboard(dash, args.points_per_unit, args.min_interval, reuse=not args.no_reuse)
+        before, after = _load_summary(fname, dash), _load_summary(fname, out)
+        with open(os.path.join(args.out_dir, fname), 'w', encoding='utf-8') as f:
+            json.dump(out, f, ensure_ascii=False, indent=2)
+        entry = {'dashboard': fname, 'uid': dash.get('uid'), 'before': before, 'after': after, **result}
+        report.append(entry)
+        kinds: Dict[str, int] = {}
+        for a in result['actions']:
+            kinds[a['action']] = kinds.get(a['action'], 0) + 1
+        rows.append([fname, before['queries'], after['queries'], before['cost'], after['cost'],
+                     ', '.join(f'{k}={v}' for k, v in sorted(kinds.items())), len(result['flags'])])
+        if args.verbose:
+            for a in result['actions']:
+                print(f"  {fname} panel {a['panel']}: " + ', '.join(f'{k}={v}' for k, v in a.items() if k != 'panel'))
+            for fl in result['flags']:
+                print(f"  {fname} panel {fl['panel']} {fl['refId']}: {fl['issue']}")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.report)), exist_ok=True)
+    with open(args.report, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print_table('Dashboard optimization (Prometheus queries / estimated samples per load)',
+                [('dashboard', 24), ('queries', 7), ('->', 4), ('cost', 10), ('->', 10), ('actions', 60), ('flags', 5)], rows)
+    print(f"\nWrote optimized dashboards to: {args.out_dir}")
+    print(f"Wrote report to: {args.report}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,592 @@
+import os
+import re
+import sys
+import copy
+import json
+import argparse
+import itertools
+from collections import Counter
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import yaml
+
+# 通知策略树优化器：查找不可达 / 被遮蔽 / 可合并的路由与冗余匹配器，输出语义等价且匹配器求值更少的策略树，
+# 并在“匹配器空间”上给出等价证明。
+#
+# 匹配器空间：对每个被匹配的标签，取策略中出现的全部字面量（= / != 的值、字面量多选正则 a|b|c 的各项）、
+# 空串（缺失标签）与一个不等于任何字面量的新值作为代表值。只含 =、!=、字面量多选正则、.*、.+ 时，
+# 任一标签取值在所有匹配器上的真值都与某个代表值相同，因此对代表值笛卡尔积逐点比较两棵树的投递结果即为完整证明；
+# 出现其他正则时代表值只是抽样，证明标记为不完整，默认不输出优化结果。
+#
+# 投递结果按 (receiver, group_by 集合, group_wait, group_interval, repeat_interval, 静默时间段) 的多重集合比较，
+# 与路由位置无关；每一步改写都必须通过全局证明才会保留。该比较不区分告警落在哪条路由上，
+# 因此合并兄弟路由只在合并标签属于生效的 group_by 时进行，保证合并前后的通知分组一致。
+
+try:
+    from tools.notification_policy import DEFAULT_GROUP_BY, Matcher, Route, build_tree, iter_routes, load_policy, parse_matchers, _matches
+    from tools.import_alert_settings import _load_yaml
+    from tools.simulate_notification_routing import POLICY_PATH, read_label_sets, rule_label_sets
+    from tools.convert_yaml_to_grafana_json import INSTANCE_DIR, OUT_DIR
+    from tools import promql
+except Exception:
+    # 兼容从工具目录直接执行
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    from tools.notification_policy import DEFAULT_GROUP_BY, Matcher, Route, build_tree, iter_routes, load_policy, parse_matchers, _matches  # type: ignore
+    from tools.import_alert_settings import _load_yaml  # type: ignore
+    from tools.simulate_notification_routing import POLICY_PATH, read_label_sets, rule_label_sets  # type: ignore
+    from tools.convert_yaml_to_grafana_json import INSTANCE_DIR, OUT_DIR  # type: ignore
+    from tools import promql  # type: ignore
+
+OPTIMIZED_PATH = os.path.join(OUT_DIR, 'optimized-notification-policies.yaml')
+PROOF_PATH = os.path.join(OUT_DIR, 'notification_policy_proof.json')
+
+# 笛卡尔积规模上限，超过时无法穷举证明
+MAX_POINTS = 200000
+REORDER_PASSES = 5
+
+MATCHER_KEYS = ('object_matchers', 'matchers', 'match', 'match_re')
+
+_LITERAL_PIECE = r'(?:[^\\.^$*+?()\[\]{}|]|\\[^A-Za-z0-9])*'
+_LITERAL_ALT_RE = re.compile(rf'^{_LITERAL_PIECE}(?:\|{_LITERAL_PIECE})*$')
+_ANY_RE = ('.*', '.+')
+
+
+def literal_values(m: Matcher) -> Optional[FrozenSet[str]]:
+    # '=' 与字面量多选正则（a|b|c）对应的取值集合；其他匹配器返回 None
+    if m.op == '=':
+        return frozenset([m.value])
+    if m.op == '=~' and _LITERAL_ALT_RE.match(m.value):
+        return frozenset(re.sub(r'\\(.)', r'\1', piece) for piece in m.value.split('|'))
+    return None
+
+
+def _literal_regex(values: Iterable[str]) -> str:
+    return '|'.join(re.escape(v) for v in sorted(values))
+
+
+class MatcherSpace:
+    # 每个标签的代表值与匹配器在代表值上的真值集合（代表值下标集合）
+    def __init__(self, routes: Iterable[Route]):
+        constants: Dict[str, set] = {}
+        self.complete = True
+        self.incomplete_reasons: List[str] = []
+        for r in routes:
+            for m in r.matchers:
+                values = constants.setdefault(m.label, set())
+                lit = literal_values(m)
+                if lit is not None:
+                    values.update(lit)
+                elif m.op in ('!=',):
+                    values.add(m.value)
+                elif m.value not in _ANY_RE:
+                    self.complete = False
+                    self.incomplete_reasons.append(f'{m} is not a literal alternation')
+        self.reps: Dict[str, List[str]] = {}
+        for label, values in constants.items():
+            other = '__other__'
+            while other in values:
+                other += '_'
+            self.reps[label] = sorted(values | {''}) + [other]
+        self._accepts: Dict[Matcher, FrozenSet[int]] = {}
+
+    def accepts(self, m: Matcher) -> FrozenSet[int]:
+        hit = self._accepts.get(m)
+        if hit is None:
+            hit = frozenset(i for i, v in enumerate(self.reps[m.label]) if _matches(m, v))
+            self._accepts[m] = hit
+        return hit
+
+    def sets(self, matchers: Iterable[Matcher]) -> Dict[str, FrozenSet[int]]:
+        out: Dict[str, FrozenSet[int]] = {}
+        for m in matchers:
+            s = self.accepts(m)
+            out[m.label] = out[m.label] & s if m.label in out else s
+        return out
+
+    def satisfiable(self, matchers: Iterable[Matcher]) -> bool:
+        return all(self.sets(matchers).values())
+
+    def implies(self, a: Sequence[Matcher], b: Sequence[Matcher]) -> bool:
+        # a ⇒ b：各标签相互独立，逐标签比较真值集合即可
+        sa = self.sets(a)
+        if not all(sa.values()):
+            return True
+        for label, sb in self.sets(b).items():
+            if not sa.get(label, frozenset(range(len(self.reps[label])))) <= sb:
+                return False
+        return True
+
+    def disjoint(self, a: Sequence[Matcher], b: Sequence[Matcher]) -> bool:
+        return not self.satisfiable(list(a) + list(b))
+
+    def size(self) -> int:
+        n = 1
+        for values in self.reps.values():
+            n *= len(values)
+        return n
+
+    def points(self) -> Iterator[Dict[str, str]]:
+        # 代表值笛卡尔积；空串表示标签缺失
+        labels = sorted(self.reps)
+        for combo in itertools.product(*(self.reps[l] for l in labels)):
+            yield {l: v for l, v in zip(labels, combo) if v != ''}
+
+
+def evaluate(root: Route, labels: Dict[str, str]) -> Tuple[List[Route], int]:
+    # Alertmanager 的逐条匹配（匹配器短路求值），同时统计匹配器求值次数
+    out: List[Route] = []
+    evals = 0
+
+    def visit(r: Route) -> bool:
+        nonlocal evals
+        for m in r.matchers:
+            evals += 1
+            if not _matches(m, labels.get(m.label, '')):
+                return False
+        before = len(out)
+        for child in r.routes:
+            if visit(child) and not child.continue_:
+                break
+        if len(out) == before:
+            out.append(r)
+        return True
+
+    visit(root)
+    return out, evals
+
+
+def delivery_key(r: Route) -> Tuple[Any, ...]:
+    def seconds(d: str) -> Any:
+        s = promql.duration_seconds(d)
+        return d if s is None else s
+    return (r.receiver, tuple(sorted(r.group_by)), seconds(r.group_wait), seconds(r.group_interval),
+            seconds(r.repeat_interval), tuple(sorted(r.mute_time_intervals)), tuple(sorted(r.active_time_intervals)))
+
+
+def deliveries(root: Route, points: Sequence[Dict[str, str]]) -> List[Counter]:
+    return [Counter(delivery_key(r) for r in evaluate(root, p)[0]) for p in points]
+
+
+def route_cost(root: Route, label_sets: Sequence[Dict[str, str]]) -> Optional[float]:
+    # 平均每个告警的匹配器求值次数
+    if not label_sets:
+        return None
+    return sum(evaluate(root, ls)[1] for ls in label_sets) / len(label_sets)
+
+
+def count_routes(raw: Dict[str, Any]) -> Tuple[int, int]:
+    routes = matchers = 0
+    stack = list(raw.get('routes') or [])
+    while stack:
+        r = stack.pop()
+        routes += 1
+        matchers += len(_raw_matchers(r))
+        stack.extend(r.get('routes') or [])
+    return routes, matchers
+
+
+def describe(raw: Dict[str, Any]) -> str:
+    ms = ', '.join(str(m) for m in _raw_matchers(raw)) or '*'
+    return f"{raw.get('receiver') or '(inherit)'} {{{ms}}}"
+
+
+def _raw_matchers(raw: Dict[str, Any]) -> List[Matcher]:
+    return list(parse_matchers(raw))
+
+
+def _set_matchers(raw: Dict[str, Any], matchers: Sequence[Matcher]) -> None:
+    # 改写后的匹配器统一写为 object_matchers，并保持在原匹配器字段的位置
+    items = list(raw.items())
+    pos = next((i for i, (k, _) in enumerate(items) if k in MATCHER_KEYS), len(items))
+    rest = [(k, v) for k, v in items if k not in MATCHER_KEYS]
+    new = [('object_matchers', [[m.label, m.op, m.value] for m in matchers])] if matchers else []
+    raw.clear()
+    raw.update(rest[:pos] + new + rest[pos:])
+
+
+def _settings(raw: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in raw.items() if k not in MATCHER_KEYS}
+
+
+class Rewrite:
+    # 一处候选改写：apply 在副本上原地修改父路由的 routes
+    def __init__(self, kind: str, detail: str, parent: Dict[str, Any], targets: Sequence[Dict[str, Any]],
+                 apply: Callable[[Dict[str, Any], List[Dict[str, Any]]], None]):
+        self.kind = kind
+        self.detail = detail
+        self.parent = parent
+        self.targets = list(targets)
+        self.apply = apply
+
+
+def _walk_raw(raw: Dict[str, Any], ctx: List[Matcher]) -> Iterator[Tuple[Dict[str, Any], List[Matcher]]]:
+    # 产出 (父路由, 父路由及其祖先的匹配器)
+    yield raw, ctx
+    for child in raw.get('routes') or []:
+        yield from _walk_raw(child, ctx + _raw_matchers(child))
+
+
+def _walk_group_by(raw: Dict[str, Any], inherited: Sequence[str]) -> Iterator[Tuple[Dict[str, Any], Tuple[str, ...]]]:
+    # 产出 (路由, 生效的 group_by)：未设置时继承父路由，根路由默认 DEFAULT_GROUP_BY
+    group_by = tuple(raw.get('group_by') or inherited)
+    yield raw, group_by
+    for child in raw.get('routes') or []:
+        yield from _walk_group_by(child, group_by)
+
+
+def _index(parent: Dict[str, Any], target: Dict[str, Any]) -> int:
+    return next(i for i, r in enumerate(parent['routes']) if r is target)
+
+
+def find_unsatisfiable(root: Dict[str, Any], space: MatcherSpace) -> List[Rewrite]:
+    out = []
+    for parent, ctx in _walk_raw(root, []):
+        for child in parent.get('routes') or []:
+            if not space.satisfiable(ctx + _raw_matchers(child)):
+                out.append(Rewrite('unreachable', f'matchers can never all hold: {describe(child)}', parent, [child],
+                                   lambda p, t: p['routes'].pop(_index(p, t[0]))))
+    return out
+
+
+def find_shadowed(root: Dict[str, Any], space: MatcherSpace) -> List[Rewrite]:
+    # 前面有 continue=false 的兄弟路由匹配它能匹配的全部告警时，该路由永远不会被检查
+    out = []
+    for parent, ctx in _walk_raw(root, []):
+        routes = parent.get('routes') or []
+        for j, child in enumerate(routes):
+            scope = ctx + _raw_matchers(child)
+            shadow = next((s for s in routes[:j] if not s.get('continue') and space.implies(scope, _raw_matchers(s))), None)
+            if shadow is not None:
+                out.append(Rewrite('shadowed', f'{describe(child)} is shadowed by {describe(shadow)}', parent, [child],
+                                   lambda p, t: p['routes'].pop(_index(p, t[0]))))
+    return out
+
+
+def find_redundant_matchers(root: Dict[str, Any], space: MatcherSpace) -> List[Rewrite]:
+    # 被祖先与自身其他匹配器蕴含的匹配器可以删除
+    out = []
+    for parent, ctx in _walk_raw(root, []):
+        for child in parent.get('routes') or []:
+            kept = _raw_matchers(child)
+            dropped = []
+            for m in list(kept):
+                rest = [x for x in kept if x is not m]
+                if space.implies(ctx + rest, [m]):
+                    kept = rest
+                    dropped.append(m)
+            if dropped:
+                out.append(Rewrite('redundant-matcher', f"drop {', '.join(map(str, dropped))} from {describe(child)}", parent, [child],
+                                   lambda p, t, kept=kept: _set_matchers(t[0], kept)))
+    return out
+
+
+def find_needless_continue(root: Dict[str, Any], space: MatcherSpace) -> List[Rewrite]:
+    # continue=true 的路由若与之后所有兄弟路由互斥，改为 false 结果不变，但命中后不再检查后续兄弟
+    out = []
+    for parent, ctx in _walk_raw(root, []):
+        routes = parent.get('routes') or []
+        for j, child in enumerate(routes[:-1]):
+            if not child.get('continue'):
+                continue
+            scope = ctx + _raw_matchers(child)
+            if all(space.disjoint(scope, _raw_matchers(later)) for later in routes[j + 1:]):
+                out.append(Rewrite('needless-continue', f'{describe(child)} is disjoint from all later siblings', parent, [child],
+                                   lambda p, t: t[0].__setitem__('continue', False)))
+    return out
+
+
+def find_mergeable(root: Dict[str, Any], space: MatcherSpace) -> List[Rewrite]:
+    # 设置完全相同、无子路由、匹配器仅在同一标签的字面量取值上不同的兄弟路由合并为一条 =~ "v1|v2" 路由；
+    # 合并后的路由位于第一条的位置，continue=false 时要求被移动的路由与中间的兄弟互斥。
+    # 合并标签必须在生效的 group_by 中（或 group_by 含 '...'）：否则原来各自分组的告警会并入同一通知，改变分组
+    out = []
+    group_bys = {id(r): g for r, g in _walk_group_by(root, DEFAULT_GROUP_BY)}
+    for parent, ctx in _walk_raw(root, []):
+        routes = parent.get('routes') or []
+        used = set()
+        for i, first in enumerate(routes):
+            if i in used or first.get('routes'):
+                continue
+            base = _raw_matchers(first)
+            group = [i]
+            for j in range(i + 1, len(routes)):
+                other = routes[j]
+                if j in used or other.get('routes') or _settings(other) != _settings(first):
+                    continue
+                label = _merge_label(base, _raw_matchers(other))
+                if label is None or not _grouped_on(label, group_bys[id(other)]) or any(_merge_label(_raw_matchers(routes[k]), _raw_matchers(other)) != label for k in group):
+                    continue
+                scope = ctx + _raw_matchers(other)
+                if any(not space.disjoint(scope, _raw_matchers(routes[k])) for k in group):
+                    continue
+                if not first.get('continue') and any(not space.disjoint(scope, _raw_matchers(routes[k]))
+                                                     for k in range(i + 1, j) if k not in group):
+                    continue
+                group.append(j)
+            if len(group) < 2:
+                continue
+            used.update(group)
+            members = [routes[k] for k in group]
+            label = _merge_label(base, _raw_matchers(members[1]))
+            values = set()
+            for r in members:
+                values |= literal_values(next(m for m in _raw_matchers(r) if m.label == label))
+            merged = [m for m in base if m.label != label] + [Matcher(label, '=~', _literal_regex(values))]
+            out.append(Rewrite('merge', f"merge {len(members)} routes on {label}: {', '.join(describe(r) for r in members)}",
+                               parent, members, lambda p, t, merged=merged: _apply_merge(p, t, merged)))
+    return out
+
+
+def _grouped_on(label: str, group_by: Sequence[str]) -> bool:
+    return '...' in group_by or label in group_by
+
+
+def _merge_label(a: List[Matcher], b: List[Matcher]) -> Optional[str]:
+    # 两组匹配器仅在一个标签的字面量匹配器上不同时返回该标签
+    if len(a) != len(b):
+        return None
+    diff_a = [m for m in a if m not in b]
+    diff_b = [m for m in b if m not in a]
+    if len(diff_a) != 1 or len(diff_b) != 1 or diff_a[0].label != diff_b[0].label:
+        return None
+    if literal_values(diff_a[0]) is None or literal_values(diff_b[0]) is None:
+        return None
+    return diff_a[0].label
+
+
+def _apply_merge(parent: Dict[str, Any], targets: List[Dict[str, Any]], merged: List[Matcher]) -> None:
+    _set_matchers(targets[0], merged)
+    for t in targets[1:]:
+        parent['routes'].pop(_index(parent, t))
+
+
+def find_collapsible(root: Dict[str, Any], space: MatcherSpace) -> List[Rewrite]:
+    # 唯一子路由无匹配器时父路由的兜底投递永远不会发生，把子路由折叠进父路由（展平一层）
+    out = []
+    for parent, ctx in _walk_raw(root, []):
+        for child in parent.get('routes') or []:
+            kids = child.get('routes') or []
+            if len(kids) == 1 and not _raw_matchers(kids[0]):
+                out.append(Rewrite('flatten', f'collapse single catch-all child of {describe(child)}', parent, [child],
+                                   lambda p, t: _apply_collapse(t[0])))
+    return out
+
+
+def _apply_collapse(route: Dict[str, Any]) -> None:
+    kid = route.pop('routes')[0]
+    for k, v in _settings(kid).items():
+        if k != 'continue':
+            route[k] = v
+    if not kid.get('routes'):
+        route.pop('routes', None)
+
+
+def find_reorder(root: Dict[str, Any], space: MatcherSpace, sample: Sequence[Dict[str, str]]) -> List[Rewrite]:
+    # 两两互斥的连续兄弟路由至多命中一条，按样本命中次数从高到低排序可让热点告警更早停止
+    if not sample:
+        return []
+    out = []
+    for parent, ctx in _walk_raw(root, []):
+        routes = parent.get('routes') or []
+        start = 0
+        while start < len(routes):
+            end = start + 1
+            while end < len(routes) and all(space.disjoint(_raw_matchers(routes[end]), _raw_matchers(routes[k])) for k in range(start, end)):
+                end += 1
+            run = routes[start:end]
+            if len(run) > 1:
+                hits = [sum(1 for ls in sample if all(_matches(m, ls.get(m.label, '')) for m in _raw_matchers(r))) for r in run]
+                order = sorted(range(len(run)), key=lambda k: -hits[k])
+                if order != sorted(order):
+                    out.append(Rewrite('reorder', f'reorder {len(run)} mutually exclusive routes by sample hits', parent, run,
+                                       lambda p, t, order=order: _apply_reorder(p, t, order)))
+            start = end
+    return out
+
+
+def _apply_reorder(parent: Dict[str, Any], targets: List[Dict[str, Any]], order: List[int]) -> None:
+    start = _index(parent, targets[0])
+    parent['routes'][start:start + len(targets)] = [targets[k] for k in order]
+
+
+class Prover:
+    # 以原策略树在全部代表点上的投递结果为基准，判断候选树是否等价
+    def __init__(self, original: Dict[str, Any], space: MatcherSpace):
+        self.space = space
+        self.points = list(space.points())
+        self.reference = deliveries(build_tree(original), self.points)
+
+    def counterexample(self, candidate: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        tree = build_tree(candidate)
+        for point, expected in zip(self.points, self.reference):
+            got = Counter(delivery_key(r) for r in evaluate(tree, point)[0])
+            if got != expected:
+                return {'labels': point, 'expected': _show(expected), 'got': _show(got)}
+        return None
+
+
+def _show(c: Counter) -> List[Dict[str, Any]]:
+    return [{'receiver': k[0], 'group_by': list(k[1]), 'count': n} for k, n in sorted(c.items(), key=str)]
+
+
+FINDERS = (find_unsatisfiable, find_shadowed, find_redundant_matchers, find_mergeable,
+           find_needless_continue, find_collapsible)
+
+
+def optimize(original: Dict[str, Any], prover: Prover, sample: Sequence[Dict[str, str]]) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    # 按类型批量应用改写并做全局证明；批量失败时逐条重试，只保留通过证明的改写；直到没有新的改写。
+    # 重排会改变互斥区间的划分，放在最后单独迭代，只保留使样本求值次数下降的重排，最多 REORDER_PASSES 轮
+    tree = copy.deepcopy(original)
+    log: List[Dict[str, Any]] = []
+    changed = True
+    while changed:
+        changed = False
+        for finder in FINDERS:
+            tree, changed = _apply_proven(tree, finder(tree, prover.space), prover, log)
+            if changed:
+                break
+    for _ in range(REORDER_PASSES):
+        rewrites = find_reorder(tree, prover.space, sample)
+        if not rewrites:
+            break
+        candidate = _apply(tree, rewrites)
+        if route_cost(build_tree(candidate), sample) >= route_cost(build_tree(tree), sample):
+            break
+        tree, changed = _apply_proven(tree, rewrites, prover, log)
+        if not changed:
+            break
+    return tree, log
+
+
+def _apply_proven(tree: Dict[str, Any], rewrites: List[Rewrite], prover: Prover,
+                  log: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], bool]:
+    if not rewrites:
+        return tree, False
+    candidate = _apply(tree, rewrites)
+    if prover.counterexample(candidate) is None:
+        log.extend({'kind': rw.kind, 'detail': rw.detail, 'applied': True} for rw in rewrites)
+        return candidate, True
+    for rw in rewrites:
+        # 候选基于同一棵树计算，一旦有改写生效就停止，其余候选在下一轮基于新树重新计算
+        single = _apply(tree, [rw])
+        cex = prover.counterexample(single)
+        log.append({'kind': rw.kind, 'detail': rw.detail, 'applied': cex is None, **({'counterexample': cex} if cex else {})})
+        if cex is None:
+            return single, True
+    return tree, False
+
+
+def _apply(tree: Dict[str, Any], rewrites: Sequence[Rewrite]) -> Dict[str, Any]:
+    memo: Dict[int, Any] = {}
+    new = copy.deepcopy(tree, memo)
+    for rw in rewrites:
+        rw.apply(memo[id(rw.parent)], [memo[id(t)] for t in rw.targets])
+    return new
+
+
+def duplicate_deliveries(prover: Prover) -> List[Dict[str, Any]]:
+    # 同一告警以相同设置投递到同一 receiver 多次（重复通知），只报告不自动修改（去掉会改变语义）
+    out = []
+    for point, delivered in zip(prover.points, prover.reference):
+        dups = [k[0] for k, n in delivered.items() if n > 1]
+        if dups:
+            out.append({'labels': point, 'receivers': dups})
+    return out
+
+
+def write_policy(path: str, source: str, root: Dict[str, Any]) -> None:
+    doc = _load_yaml(source)
+    if isinstance(doc, dict) and isinstance(doc.get('policies'), list):
+        doc['policies'][0] = root
+    elif isinstance(doc, dict) and 'policies' in doc:
+        doc['policies'] = root
+    else:
+        doc = root
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f'# Generated by tools/optimize_notification_policy.py from {os.path.basename(source)}\n')
+        yaml.safe_dump(doc, f, allow_unicode=True, sort_keys=False, width=4096)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Optimize a notification policy tree and prove the result equivalent.')
+    parser.add_argument('--policies', default=POLICY_PATH, help='Notification policy YAML (default: alert/setting/supplier-notification-policies.yaml)')
+    parser.add_argument('--out', default=OPTIMIZED_PATH, help='Optimized policy YAML (default: out/optimized-notification-policies.yaml)')
+    parser.add_argument('--proof', default=PROOF_PATH, help='Equivalence proof JSON (default: out/notification_policy_proof.json)')
+    parser.add_argument('--against', help='Only prove equivalence between --policies and this policy file (no optimization)')
+    parser.add_argument('--labels', help='Sample label sets (JSON/NDJSON) for cost and route ordering (default: derived from alert/instance)')
+    parser.add_argument('--max-points', type=int, default=MAX_POINTS, help=f'Upper bound on matcher-space points (default: {MAX_POINTS})')
+    parser.add_argument('--allow-incomplete', action='store_true', help='Write the result even when the proof only samples some regex matchers')
+    args = parser.parse_args()
+
+    try:
+        original = load_policy(args.policies)
+        other = load_policy(args.against) if args.against else None
+        if args.labels:
+            sample = read_label_sets(args.labels)
+        else:
+            sample = rule_label_sets(INSTANCE_DIR) if os.path.isdir(INSTANCE_DIR) else []
+    except (OSError, ValueError, yaml.YAMLError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(2)
+
+    trees = [build_tree(original)] + ([build_tree(other)] if other else [])
+    space = MatcherSpace(r for t in trees for r in iter_routes(t))
+    if space.size() > args.max_points:
+        print(f"Error: matcher space has {space.size()} points (> --max-points {args.max_points}); cannot prove equivalence", file=sys.stderr)
+        sys.exit(2)
+    prover = Prover(original, space)
+
+    if other is not None:
+        cex = prover.counterexample(other)
+        print(f"Checked {len(prover.points)} points over labels {sorted(space.reps)}: "
+              f"{'EQUIVALENT' if cex is None else 'NOT EQUIVALENT'}{'' if space.complete else ' (incomplete: sampled regex matchers)'}")
+        if cex:
+            print(json.dumps(cex, ensure_ascii=False, indent=2))
+        sys.exit(0 if cex is None and space.complete else 1)
+
+    optimized, log = optimize(original, prover, sample)
+    cex = prover.counterexample(optimized)
+    before, after = build_tree(original), build_tree(optimized)
+    points = prover.points
+    stats = {
+        'routes': [count_routes(original)[0], count_routes(optimized)[0]],
+        'matchers': [count_routes(original)[1], count_routes(optimized)[1]],
+        'evals_per_point': [route_cost(before, points), route_cost(after, points)],
+        'evals_per_sample': [route_cost(before, sample), route_cost(after, sample)],
+    }
+    proof = {
+        'policies': os.path.relpath(args.policies),
+        'complete': space.complete,
+        'incomplete_reasons': space.incomplete_reasons,
+        'labels': space.reps,
+        'points': len(points),
+        'equivalent': cex is None,
+        'counterexample': cex,
+        'duplicate_deliveries': duplicate_deliveries(prover),
+        'rewrites': log,
+        'stats': stats,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.proof)), exist_ok=True)
+    with open(args.proof, 'w', encoding='utf-8') as f:
+        json.dump(proof, f, ensure_ascii=False, indent=2)
+
+    for entry in log:
+        print(f"[{'applied' if entry['applied'] else 'rejected'}] {entry['kind']}: {entry['detail']}")
+    if proof['duplicate_deliveries']:
+        print(f"Warning: {len(proof['duplicate_deliveries'])} label combinations notify the same receiver more than once (not changed)")
+    fmt = lambda v: '-' if v is None else (f'{v:.2f}' if isinstance(v, float) else str(v))
+    for key, (a, b) in stats.items():
+        print(f"{key:<18} {fmt(a):>8} -> {fmt(b)}")
+    print(f"Proof: {len(points)} points over labels {sorted(space.reps)}, "
+          f"{'equivalent' if cex is None else 'NOT equivalent'}, {'complete' if space.complete else 'incomplete'}; wrote {args.proof}")
+
+    if cex is not None or (not space.complete and not args.allow_incomplete):
+        print('Optimized policy not written.', file=sys.stderr)
+        sys.exit(1)
+    write_policy(args.out, args.policies, optimized)
+    print(f"Wrote optimized policy to: {args.out}")
+
+
+if __name__ == '__main__':
+    main()
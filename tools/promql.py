@@ -0,0 +1,590 @@
+import re
+from dataclasses import dataclass, field, replace
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# 轻量 PromQL 解析器：词法 -> 语法树 -> 规范化输出
+# 覆盖告警规则与仪表盘中用到的语法：选择器/匹配器、区间与子查询、offset/@、函数、
+# 聚合（by/without 前置或后置）、二元运算（bool、on/ignoring、group_left/right）、一元运算。
+# 语法树节点为不可变 dataclass，可直接作为 dict 键用于公共子表达式统计。
+
+
+class PromQLError(ValueError):
+    pass
+
+
+AGGREGATORS = {
+    'sum', 'min', 'max', 'avg', 'group', 'stddev', 'stdvar', 'count',
+    'count_values', 'bottomk', 'topk', 'quantile', 'limitk', 'limit_ratio',
+}
+# 需要额外参数的聚合：topk(5, x)、quantile(0.9, x)、count_values("v", x)
+PARAM_AGGREGATORS = {'count_values', 'bottomk', 'topk', 'quantile', 'limitk', 'limit_ratio'}
+
+# 以区间向量为参数、返回瞬时向量的函数
+RANGE_FUNCTIONS = {
+    'rate', 'irate', 'increase', 'delta', 'idelta', 'deriv', 'predict_linear', 'resets', 'changes',
+    'avg_over_time', 'min_over_time', 'max_over_time', 'sum_over_time', 'count_over_time',
+    'quantile_over_time', 'stddev_over_time', 'stdvar_over_time', 'last_over_time', 'present_over_time',
+    'absent_over_time', 'holt_winters', 'double_exponential_smoothing', 'mad_over_time',
+}
+
+# 运算符优先级（数值越大越先结合），^ 为右结合
+BINARY_PRECEDENCE = {
+    'or': 1,
+    'and': 2, 'unless': 2,
+    '==': 3, '!=': 3, '<=': 3, '<': 3, '>=': 3, '>': 3,
+    '+': 4, '-': 4,
+    '*': 5, '/': 5, '%': 5, 'atan2': 5,
+    '^': 6,
+}
+COMPARISON_OPS = {'==', '!=', '<=', '<', '>=', '>'}
+SET_OPS = {'and', 'or', 'unless'}
+UNARY_PRECEDENCE = 5.5  # 介于 * 与 ^ 之间：-2^2 == -(2^2)
+
+_DURATION_RE = re.compile(r'^(?:(\d+(?:\.\d+)?)(ms|s|m|h|d|w|y))+$')
+_DURATION_PART_RE = re.compile(r'(\d+(?:\.\d+)?)(ms|s|m|h|d|w|y)')
+_DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800, 'y': 31536000}
+
+
+# ==================== 语法树 ====================
+
+@dataclass(frozen=True)
+class Matcher:
+    name: str
+    op: str  # = != =~ !~
+    value: str
+
+
+@dataclass(frozen=True)
+class NumberLiteral:
+    value: float
+    text: str = field(default='', compare=False)
+
+
+@dataclass(frozen=True)
+class StringLiteral:
+    value: str
+
+
+@dataclass(frozen=True)
+class VectorSelector:
+    name: Optional[str]
+    matchers: Tuple[Matcher, ...] = ()
+    offset: Optional[str] = None
+    at: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class MatrixSelector:
+    vector: VectorSelector
+    range: str
+
+
+@dataclass(frozen=True)
+class SubqueryExpr:
+    expr: Any
+    range: str
+    step: str = ''
+    offset: Optional[str] = None
+    at: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class Call:
+    func: str
+    args: Tuple[Any, ...] = ()
+
+
+@dataclass(frozen=True)
+class AggregateExpr:
+    op: str
+    expr: Any
+    param: Any = None
+    grouping: Tuple[str, ...] = ()
+    without: bool = False
+    has_grouping: bool = False
+
+
+@dataclass(frozen=True)
+class VectorMatching:
+    on: bool = False
+    labels: Tuple[str, ...] = ()
+    card: str = ''  # '' / group_left / group_right
+    include: Tuple[str, ...] = ()
+
+
+@dataclass(frozen=True)
+class BinaryExpr:
+    op: str
+    lhs: Any
+    rhs: Any
+    bool: bool = False
+    matching: Optional[VectorMatching] = None
+
+
+@dataclass(frozen=True)
+class UnaryExpr:
+    op: str
+    expr: Any
+
+
+# ==================== 词法 ====================
+
+_TOKEN_SPEC = [
+    ('WS', r'[ \t\r\n]+'),
+    ('COMMENT', r'#[^\n]*'),
+    ('NUMBER', r'(?:0[xX][0-9a-fA-F]+|(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)(?![A-Za-z_])'),
+    ('DURATION', r'\d+(?:ms|s|m|h|d|w|y)(?:\d+(?:ms|s|m|h|d|w|y))*'),
+    ('STRING', r'"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\'|`[^`]*`'),
+    ('RANGE', r'\[[^\]]*\]'),
+    ('IDENT', r'[A-Za-z_:][A-Za-z0-9_:]*'),
+    ('OP', r'==|!=|<=|>=|=~|!~|[-+*/%^<>=(){},@]'),
+]
+_TOKEN_RE = re.compile('|'.join(f'(?P<{name}>{pat})' for name, pat in _TOKEN_SPEC))
+_KEYWORDS = {'by', 'without', 'on', 'ignoring', 'group_left', 'group_right', 'bool', 'offset', 'and', 'or', 'unless', 'atan2'}
+
+
+def tokenize(text: str) -> List[Tuple[str, str]]:
+    tokens: List[Tuple[str, str]] = []
+    pos = 0
+    while pos < len(text):
+        m = _TOKEN_RE.match(text, pos)
+        if not m:
+            raise PromQLError(f"unexpected character {text[pos]!r} at offset {pos}")
+        kind = m.lastgroup
+        value = m.group()
+        pos = m.end()
+        if kind in ('WS', 'COMMENT'):
+            continue
+        if kind == 'IDENT' and value.lower() in _KEYWORDS:
+            kind = 'KEYWORD'
+            value = value.lower()
+        tokens.append((kind, value))
+    tokens.append(('EOF', ''))
+    return tokens
+
+
+def _unquote(s: str) -> str:
+    if s.startswith('`'):
+        return s[1:-1]
+    body = s[1:-1]
+    return re.sub(r'\\(.)', lambda m: {'n': '\n', 't': '\t', 'r': '\r'}.get(m.group(1), m.group(1)), body)
+
+
+def _split_range(raw: str) -> Tuple[str, Optional[str]]:
+    # '[5m]' -> ('5m', None)；'[30m:1m]' -> ('30m', '1m')；'[30m:]' -> ('30m', '')
+    inner = raw[1:-1].strip()
+    if ':' in inner:
+        rng, step = inner.split(':', 1)
+        return rng.strip(), step.strip()
+    return inner, None
+
+
+# ==================== 语法分析 ====================
+
+class _Parser:
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens = tokenize(text)
+        self.pos = 0
+
+    def peek(self, offset: int = 0) -> Tuple[str, str]:
+        return self.tokens[min(self.pos + offset, len(self.tokens) - 1)]
+
+    def next(self) -> Tuple[str, str]:
+        tok = self.tokens[self.pos]
+        self.pos += 1
+        return tok
+
+    def expect(self, value: str) -> None:
+        tok = self.next()
+        if tok[1] != value:
+            raise PromQLError(f"expected {value!r}, got {tok[1]!r}")
+
+    def parse(self) -> Any:
+        node = self.parse_binary(0)
+        if self.peek()[0] != 'EOF':
+            raise PromQLError(f"unexpected token {self.peek()[1]!r}")
+        return node
+
+    def _binary_op(self) -> Optional[str]:
+        kind, value = self.peek()
+        if kind in ('OP', 'KEYWORD') and value in BINARY_PRECEDENCE:
+            return value
+        return None
+
+    def parse_binary(self, min_prec: int) -> Any:
+        lhs = self.parse_unary()
+        while True:
+            op = self._binary_op()
+            if op is None or BINARY_PRECEDENCE[op] < min_prec:
+                return lhs
+            self.next()
+            is_bool = False
+            if self.peek() == ('KEYWORD', 'bool'):
+                self.next()
+                is_bool = True
+            matching = self.parse_matching()
+            next_min = BINARY_PRECEDENCE[op] if op == '^' else BINARY_PRECEDENCE[op] + 1
+            rhs = self.parse_binary(next_min)
+            lhs = BinaryExpr(op, lhs, rhs, is_bool, matching)
+
+    def parse_matching(self) -> Optional[VectorMatching]:
+        kind, value = self.peek()
+        if not (kind == 'KEYWORD' and value in ('on', 'ignoring')):
+            return None
+        self.next()
+        on = value == 'on'
+        labels = self.parse_label_list()
+        card, include = '', ()
+        kind, value = self.peek()
+        if kind == 'KEYWORD' and value in ('group_left', 'group_right'):
+            self.next()
+            card = value
+            if self.peek()[1] == '(':
+                include = self.parse_label_list()
+        return VectorMatching(on, labels, card, include)
+
+    def parse_label_list(self) -> Tuple[str, ...]:
+        self.expect('(')
+        labels: List[str] = []
+        while self.peek()[1] != ')':
+            kind, value = self.next()
+            if kind not in ('IDENT', 'KEYWORD', 'STRING'):
+                raise PromQLError(f"expected label name, got {value!r}")
+            labels.append(_unquote(value) if kind == 'STRING' else value)
+            if self.peek()[1] == ',':
+                self.next()
+        self.expect(')')
+        return tuple(labels)
+
+    def parse_unary(self) -> Any:
+        kind, value = self.peek()
+        if kind == 'OP' and value in ('-', '+'):
+            self.next()
+            # 一元运算的优先级高于 * /，低于 ^
+            operand = self.parse_binary(BINARY_PRECEDENCE['^'])
+            if value == '+':
+                return operand
+            if isinstance(operand, NumberLiteral):
+                return NumberLiteral(-operand.value, '-' + (operand.text or _format_number(operand.value)))
+            return UnaryExpr('-', operand)
+        return self.parse_postfix(self.parse_primary())
+
+    def parse_postfix(self, node: Any) -> Any:
+        while True:
+            kind, value = self.peek()
+            if kind == 'RANGE':
+                self.next()
+                rng, step = _split_range(value)
+                if step is None:
+                    if not isinstance(node, VectorSelector):
+                        raise PromQLError('range selector requires a vector selector')
+                    node = MatrixSelector(node, rng)
+                else:
+                    node = SubqueryExpr(node, rng, step)
+            elif kind == 'KEYWORD' and value == 'offset':
+                self.next()
+                offset = self.parse_duration_token()
+                node = self._with_modifier(node, 'offset', offset)
+            elif kind == 'OP' and value == '@':
+                self.next()
+                at = self.next()[1]
+                if self.peek()[1] == '(':
+                    self.next()
+                    self.expect(')')
+                    at += '()'
+                node = self._with_modifier(node, 'at', at)
+            else:
+                return node
+
+    def parse_duration_token(self) -> str:
+        sign = ''
+        if self.peek()[1] == '-':
+            self.next()
+            sign = '-'
+        kind, value = self.next()
+        if kind not in ('DURATION', 'NUMBER', 'IDENT'):
+            raise PromQLError(f"expected duration, got {value!r}")
+        return sign + value
+
+    @staticmethod
+    def _with_modifier(node: Any, attr: str, value: str) -> Any:
+        if isinstance(node, VectorSelector):
+            return replace(node, **{attr: value})
+        if isinstance(node, MatrixSelector):
+            return replace(node, vector=replace(node.vector, **{attr: value}))
+        if isinstance(node, SubqueryExpr):
+            return replace(node, **{attr: value})
+        raise PromQLError(f"{attr} modifier must follow a selector or subquery")
+
+    def parse_primary(self) -> Any:
+        kind, value = self.next()
+        if kind == 'NUMBER':
+            return NumberLiteral(float(int(value, 16)) if value.lower().startswith('0x') else float(value), value)
+        if kind == 'STRING':
+            return StringLiteral(_unquote(value))
+        if kind == 'OP' and value == '(':
+            node = self.parse_binary(0)
+            self.expect(')')
+            return node
+        if kind == 'OP' and value == '{':
+            return VectorSelector(None, self.parse_matchers())
+        if kind in ('IDENT', 'KEYWORD'):
+            lower = value.lower()
+            if lower in ('inf', 'nan'):
+                return NumberLiteral(float(lower), value)
+            if lower in AGGREGATORS and self.peek()[1] in ('(', 'by', 'without'):
+                return self.parse_aggregate(lower)
+            if self.peek()[1] == '(':
+                return self.parse_call(value)
+            matchers: Tuple[Matcher, ...] = ()
+            if self.peek()[1] == '{':
+                self.next()
+                matchers = self.parse_matchers()
+            return VectorSelector(value, matchers)
+        raise PromQLError(f"unexpected token {value!r}")
+
+    def parse_matchers(self) -> Tuple[Matcher, ...]:
+        matchers: List[Matcher] = []
+        while self.peek()[1] != '}':
+            kind, name = self.next()
+            if kind not in ('IDENT', 'KEYWORD', 'STRING'):
+                raise PromQLError(f"expected label name, got {name!r}")
+            if kind == 'STRING':
+                name = _unquote(name)
+            op = self.next()[1]
+            if op not in ('=', '!=', '=~', '!~'):
+                raise PromQLError(f"expected label matcher operator, got {op!r}")
+            kind, value = self.next()
+            if kind != 'STRING':
+                raise PromQLError(f"expected label value string, got {value!r}")
+            matchers.append(Matcher(name, op, _unquote(value)))
+            if self.peek()[1] == ',':
+                self.next()
+        self.expect('}')
+        return tuple(matchers)
+
+    def parse_call(self, func: str) -> Call:
+        self.expect('(')
+        args: List[Any] = []
+        while self.peek()[1] != ')':
+            args.append(self.parse_binary(0))
+            if self.peek()[1] == ',':
+                self.next()
+        self.expect(')')
+        return Call(func, tuple(args))
+
+    def parse_aggregate(self, op: str) -> AggregateExpr:
+        grouping: Tuple[str, ...] = ()
+        without = False
+        has_grouping = False
+        if self.peek()[0] == 'KEYWORD' and self.peek()[1] in ('by', 'without'):
+            without = self.next()[1] == 'without'
+            grouping = self.parse_label_list()
+            has_grouping = True
+        self.expect('(')
+        param = None
+        if op in PARAM_AGGREGATORS:
+            param = self.parse_binary(0)
+            self.expect(',')
+        expr = self.parse_binary(0)
+        self.expect(')')
+        if not has_grouping and self.peek()[0] == 'KEYWORD' and self.peek()[1] in ('by', 'without'):
+            without = self.next()[1] == 'without'
+            grouping = self.parse_label_list()
+            has_grouping = True
+        return AggregateExpr(op, expr, param, grouping, without, has_grouping)
+
+
+def parse(text: str) -> Any:
+    return _Parser(text).parse()
+
+
+# ==================== 输出 ====================
+
+def _format_number(v: float) -> str:
+    if v != v:
+        return 'NaN'
+    if v in (float('inf'), float('-inf')):
+        return 'Inf' if v > 0 else '-Inf'
+    if v == int(v) and abs(v) < 1e15:
+        return str(int(v))
+    return repr(v)
+
+
+def _quote(s: str) -> str:
+    return '"' + s.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+
+
+def _node_precedence(node: Any) -> float:
+    if isinstance(node, BinaryExpr):
+        return BINARY_PRECEDENCE[node.op]
+    if isinstance(node, UnaryExpr) or (isinstance(node, NumberLiteral) and node.value < 0):
+        return UNARY_PRECEDENCE
+    return 99
+
+
+def format_expr(node: Any, canonical: bool = False) -> str:
+    # 输出 PromQL 文本；canonical=True 时对匹配器与分组标签排序，语义相同的表达式得到同一文本
+    def labels(ls: Tuple[str, ...]) -> str:
+        return '(' + ', '.join(sorted(ls) if canonical else ls) + ')'
+
+    def modifiers(offset: Optional[str], at: Optional[str]) -> str:
+        out = ''
+        if at:
+            out += ' @ ' + at
+        if offset:
+            out += ' offset ' + offset
+        return out
+
+    def fmt(n: Any) -> str:
+        if isinstance(n, NumberLiteral):
+            return n.text if (n.text and not canonical) else _format_number(n.value)
+        if isinstance(n, StringLiteral):
+            return _quote(n.value)
+        if isinstance(n, VectorSelector):
+            ms = sorted(n.matchers, key=lambda m: (m.name, m.op, m.value)) if canonical else n.matchers
+            body = ', '.join(f"{m.name}{m.op}{_quote(m.value)}" for m in ms)
+            if n.name and not body:
+                text = n.name
+            else:
+                text = (n.name or '') + '{' + body + '}'
+            return text + modifiers(n.offset, n.at)
+        if isinstance(n, MatrixSelector):
+            v = n.vector
+            base = fmt(replace(v, offset=None, at=None))
+            return f"{base}[{n.range}]" + modifiers(v.offset, v.at)
+        if isinstance(n, SubqueryExpr):
+            inner = fmt(n.expr)
+            if isinstance(n.expr, (BinaryExpr, UnaryExpr)):
+                inner = '(' + inner + ')'
+            return f"{inner}[{n.range}:{n.step}]" + modifiers(n.offset, n.at)
+        if isinstance(n, Call):
+            return f"{n.func}(" + ', '.join(fmt(a) for a in n.args) + ')'
+        if isinstance(n, AggregateExpr):
+            grouping = ''
+            if n.has_grouping:
+                grouping = (' without ' if n.without else ' by ') + labels(n.grouping) + ' '
+            args = (fmt(n.param) + ', ' if n.param is not None else '') + fmt(n.expr)
+            return f"{n.op}{grouping}({args})"
+        if isinstance(n, UnaryExpr):
+            inner = fmt(n.expr)
+            if _node_precedence(n.expr) < 99:
+                inner = '(' + inner + ')'
+            return '-' + inner
+        if isinstance(n, BinaryExpr):
+            prec = BINARY_PRECEDENCE[n.op]
+            lhs, rhs = fmt(n.lhs), fmt(n.rhs)
+            lp, rp = _node_precedence(n.lhs), _node_precedence(n.rhs)
+            if lp < prec or (n.op == '^' and lp == prec):
+                lhs = '(' + lhs + ')'
+            if rp < prec or (n.op != '^' and rp == prec):
+                rhs = '(' + rhs + ')'
+            op = n.op
+            if n.bool:
+                op += ' bool'
+            if n.matching:
+                m = n.matching
+                op += (' on' if m.on else ' ignoring') + labels(m.labels)
+                if m.card:
+                    op += ' ' + m.card + (labels(m.include) if m.include else '')
+            return f"{lhs} {op} {rhs}"
+        raise PromQLError(f"cannot format node {n!r}")
+
+    return fmt(node)
+
+
+def canonical_key(node: Any) -> str:
+    return format_expr(node, canonical=True)
+
+
+# ==================== 遍历与工具函数 ====================
+
+def children(node: Any) -> Tuple[Any, ...]:
+    if isinstance(node, MatrixSelector):
+        return (node.vector,)
+    if isinstance(node, SubqueryExpr):
+        return (node.expr,)
+    if isinstance(node, Call):
+        return node.args
+    if isinstance(node, AggregateExpr):
+        return (node.param, node.expr) if node.param is not None else (node.expr,)
+    if isinstance(node, BinaryExpr):
+        return (node.lhs, node.rhs)
+    if isinstance(node, UnaryExpr):
+        return (node.expr,)
+    return ()
+
+
+def walk(node: Any) -> Iterator[Any]:
+    # 先序遍历所有节点
+    stack = [node]
+    while stack:
+        n = stack.pop()
+        yield n
+        stack.extend(reversed(children(n)))
+
+
+def walk_with_parents(node: Any, parents: Tuple[Any, ...] = ()) -> Iterator[Tuple[Any, Tuple[Any, ...]]]:
+    # 先序遍历，同时给出祖先链（由外到内）
+    yield node, parents
+    for c in children(node):
+        yield from walk_with_parents(c, parents + (node,))
+
+
+def transform(node: Any, fn: Callable[[Any], Optional[Any]]) -> Any:
+    # 自顶向下重写：fn 返回非 None 时替换该节点且不再深入
+    out = fn(node)
+    if out is not None:
+        return out
+    if isinstance(node, MatrixSelector):
+        return node
+    if isinstance(node, SubqueryExpr):
+        return replace(node, expr=transform(node.expr, fn))
+    if isinstance(node, Call):
+        return replace(node, args=tuple(transform(a, fn) for a in node.args))
+    if isinstance(node, AggregateExpr):
+        param = transform(node.param, fn) if node.param is not None else None
+        return replace(node, expr=transform(node.expr, fn), param=param)
+    if isinstance(node, BinaryExpr):
+        return replace(node, lhs=transform(node.lhs, fn), rhs=transform(node.rhs, fn))
+    if isinstance(node, UnaryExpr):
+        return replace(node, expr=transform(node.expr, fn))
+    return node
+
+
+def selectors(node: Any) -> List[VectorSelector]:
+    return [n for n in walk(node) if isinstance(n, VectorSelector)]
+
+
+def has_variables(text_or_node: Any) -> bool:
+    # 仪表盘/模板变量（$var、${var}、$__rate_interval）
+    text = text_or_node if isinstance(text_or_node, str) else format_expr(text_or_node)
+    return '$' in text
+
+
+def duration_seconds(text: Optional[str], variables: Optional[Dict[str, str]] = None) -> Optional[float]:
+    # '1h30m' -> 5400；变量按 variables 解析，未知变量返回 None
+    if text is None:
+        return None
+    s = text.strip()
+    if variables and s.startswith('$'):
+        s = variables.get(s.strip('${}'), variables.get(s, s))
+    if re.fullmatch(r'\d+(?:\.\d+)?', s):
+        return float(s)
+    if not _DURATION_RE.match(s):
+        return None
+    return sum(float(num) * _DURATION_UNITS[unit] for num, unit in _DURATION_PART_RE.findall(s))
+
+
+def format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    for unit, size in (('d', 86400), ('h', 3600), ('m', 60)):
+        if seconds and seconds % size == 0:
+            return f"{seconds // size}{unit}"
+    return f"{seconds}s"
+
+
+def is_noop_matcher(m: Matcher) -> bool:
+    # =~".*" 匹配任意值（包括标签缺失），等价于不写该匹配器
+    return m.op == '=~' and m.value in ('.*', '(.*)', '^.*$')
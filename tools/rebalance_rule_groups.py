@@ -0,0 +1,247 @@
+import os
+import sys
+import math
+import json
+import argparse
+from typing import Any, Dict, List, Optional, Tuple
+
+import yaml
+
+# 规则组按评估代价重新分组
+# Grafana 对同一规则组内的规则按组 interval 顺序评估，不同组并发评估；单组代价过高时评估可能超过 interval 而错过 tick。
+# 本工具用 analyze_query_cost 的代价模型估计每条规则单次评估代价，把超出预算的组拆成若干个组：
+#   - 分组：按代价从大到小依次放入当前代价最小的分组（LPT），分组数取满足预算与规则数上限的最小值；
+#     组内保持原规则顺序，第 1 个分组沿用原组名（其中的规则不迁移），其余命名为 “原组名-2”、“原组名-3”…
+#   - 延长 interval（--increase-intervals，可选）：第 i 个拆分组的 interval 增加 (i-1)×10s（调度步长），上限 --max-interval-increase；
+#     仅当新 interval 不超过组内所有规则的 for（待定时长）时才延长，for 为 0 的组保持原 interval。
+#     这会降低这些组的评估频率（检测变慢），不是调度相位的错开，因此调度负载对比一律按原 interval 计算；
+#   - 单条规则的代价超过预算时独占一组，无法再拆分（报告中标记 over_budget）。
+# 输出的组结构与 instance YAML 的 groups 相同，可直接交给 to_file_provisioning / to_api_rules；
+# 转换时使用：convert_yaml_to_grafana_json.py --rebalance-groups [BUDGET]
+
+try:
+    from tools import promql
+    from tools.analyze_query_cost import analyze_rule_queries, print_table, DEFAULT_SCRAPE_SECONDS, DEFAULT_EVAL_SECONDS
+    from tools.convert_yaml_to_grafana_json import INSTANCE_DIR, OUT_DIR, load_named_yaml_files, normalize_groups, DEFAULT_FOLDER
+    from tools.import_rules_to_grafana import _parse_duration_seconds
+except Exception:
+    # 兼容从工具目录直接执行
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    from tools import promql  # type: ignore
+    from tools.analyze_query_cost import analyze_rule_queries, print_table, DEFAULT_SCRAPE_SECONDS, DEFAULT_EVAL_SECONDS  # type: ignore
+    from tools.convert_yaml_to_grafana_json import INSTANCE_DIR, OUT_DIR, load_named_yaml_files, normalize_groups, DEFAULT_FOLDER  # type: ignore
+    from tools.import_rules_to_grafana import _parse_duration_seconds  # type: ignore
+
+REPORT_PATH = os.path.join(OUT_DIR, 'rebalance_report.json')
+SCHEDULER_STEP_SECONDS = 10
+DEFAULT_MAX_INTERVAL_INCREASE_SECONDS = 30
+# 调度负载模拟窗口（秒）：统计每个调度 tick 上到期组的代价之和
+SIMULATION_SECONDS = 3600
+
+
+def rule_cost(rule: Dict[str, Any], interval: float, scrape_seconds: float = DEFAULT_SCRAPE_SECONDS) -> float:
+    return round(sum(q['cost'] for q in analyze_rule_queries(rule, interval, scrape_seconds)), 2)
+
+
+def _group_interval_seconds(g: Dict[str, Any]) -> int:
+    return _parse_duration_seconds(g.get('interval') or '1m') or DEFAULT_EVAL_SECONDS
+
+
+def auto_budget(groups: List[Dict[str, Any]], scrape_seconds: float = DEFAULT_SCRAPE_SECONDS) -> float:
+    # 默认预算取单条规则的最大代价：任何分组都不可能低于它，拆分后各组代价不超过最重的那条规则
+    costs = [rule_cost(r, _group_interval_seconds(g), scrape_seconds) for g in groups if g for r in g.get('rules') or []]
+    return max(costs) if costs else 0.0
+
+
+def partition(costs: List[float], budget: float, max_rules: Optional[int] = None) -> List[List[int]]:
+    # 返回按原顺序排列的下标分组；分组数从下界开始，LPT 放不下时加一重试
+    n = len(costs)
+    if n == 0:
+        return []
+    # 超出预算的规则各自独占一组，其余规则按总代价 / 预算估计分组数下界
+    oversized = sum(1 for c in costs if budget > 0 and c > budget)
+    rest = sum(c for c in costs if not (budget > 0 and c > budget))
+    bins = max(1, oversized + (math.ceil(rest / budget) if budget > 0 else 0), math.ceil(n / max_rules) if max_rules else 1)
+    order = sorted(range(n), key=lambda i: (-costs[i], i))
+    while True:
+        loads = [0.0] * bins
+        members: List[List[int]] = [[] for _ in range(bins)]
+        fits = True
+        for i in order:
+            open_bins = [b for b in range(bins) if not max_rules or len(members[b]) < max_rules]
+            b = min(open_bins, key=lambda x: (loads[x], x))
+            if members[b] and budget > 0 and loads[b] + costs[i] > budget:
+                fits = False
+                break
+            loads[b] += costs[i]
+            members[b].append(i)
+        if fits or bins >= n:
+            break
+        bins += 1
+    parts = [sorted(m) for m in members if m]
+    parts.sort(key=lambda m: m[0])
+    return parts
+
+
+def _min_for_seconds(rules: List[Dict[str, Any]]) -> int:
+    return min((_parse_duration_seconds(r.get('for')) or 0 for r in rules), default=0)
+
+
+def rebalance_groups(groups: List[Dict[str, Any]], budget: Optional[float] = None, max_rules: Optional[int] = None,
+                     increase_intervals: bool = False, max_increase: int = DEFAULT_MAX_INTERVAL_INCREASE_SECONDS,
+                     scrape_seconds: float = DEFAULT_SCRAPE_SECONDS) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    # 返回新组列表与逐组报告；未超出预算（及规则数上限）的组原样保留
+    if budget is None:
+        budget = auto_budget(groups, scrape_seconds)
+    taken = {(g.get('folder') or DEFAULT_FOLDER, g.get('name') or 'default') for g in groups if g}
+    out_groups: List[Dict[str, Any]] = []
+    reports: List[Dict[str, Any]] = []
+    for g in groups:
+        if not g:
+            out_groups.append(g)
+            continue
+        rules = g.get('rules') or []
+        interval = _group_interval_seconds(g)
+        costs = [rule_cost(r, interval, scrape_seconds) for r in rules]
+        folder = g.get('folder') or DEFAULT_FOLDER
+        name = g.get('name') or 'default'
+        report = {'folder': folder, 'group': name, 'interval_seconds': interval, 'rules': len(rules),
+                  'cost_per_eval': round(sum(costs), 2), 'parts': []}
+        reports.append(report)
+        if (budget <= 0 or sum(costs) <= budget) and (not max_rules or len(rules) <= max_rules):
+            out_groups.append(g)
+            report['parts'].append({'group': name, 'interval_seconds': interval, 'rules': len(rules),
+                                    'cost_per_eval': report['cost_per_eval'], 'over_budget': False})
+            continue
+
+        for n, idx in enumerate(partition(costs, budget, max_rules)):
+            part_name = name
+            if n:
+                suffix = n + 1
+                while (folder, f'{name}-{suffix}') in taken:
+                    suffix += 1
+                part_name = f'{name}-{suffix}'
+                taken.add((folder, part_name))
+            part_rules = [rules[i] for i in idx]
+            part_interval = interval
+            if increase_intervals and n:
+                delta = min(n * SCHEDULER_STEP_SECONDS, max_increase // SCHEDULER_STEP_SECONDS * SCHEDULER_STEP_SECONDS)
+                if delta and interval + delta <= _min_for_seconds(part_rules):
+                    part_interval = interval + delta
+            ng = dict(g)
+            ng['name'] = part_name
+            ng['rules'] = part_rules
+            if part_interval != interval:
+                ng['interval'] = promql.format_duration(part_interval)
+            out_groups.append(ng)
+            part_cost = round(sum(costs[i] for i in idx), 2)
+            report['parts'].append({'group': part_name, 'interval_seconds': part_interval, 'rules': len(idx),
+                                    'cost_per_eval': part_cost, 'over_budget': budget > 0 and part_cost > budget,
+                                    'uids': [r.get('uid') for r in part_rules]})
+    return out_groups, reports
+
+
+def scheduler_load(reports: List[Dict[str, Any]], after: bool = True, window: int = SIMULATION_SECONDS) -> Dict[str, float]:
+    # 不启用 jitter 时，interval 为 k 个调度步长的组在 tick % k == 0 时评估；统计窗口内每个 tick 的到期代价。
+    # 拆分后的组一律按原组 interval 计算：--increase-intervals 减少的评估次数不计入拆分带来的改善
+    entries = ([(r['interval_seconds'], p['cost_per_eval']) for r in reports for p in r['parts']] if after
+               else [(r['interval_seconds'], r['cost_per_eval']) for r in reports])
+    ticks = [0.0] * max(1, window // SCHEDULER_STEP_SECONDS)
+    for interval, cost in entries:
+        k = max(1, interval // SCHEDULER_STEP_SECONDS)
+        for t in range(0, len(ticks), k):
+            ticks[t] += cost
+    ranked = sorted(ticks)
+    return {'peak_tick_cost': round(ranked[-1], 2), 'p95_tick_cost': round(ranked[int(len(ranked) * 0.95) - 1], 2),
+            'busy_ticks': sum(1 for t in ticks if t > 0), 'ticks': len(ticks),
+            'max_group_cost': round(max((c for _, c in entries), default=0.0), 2)}
+
+
+def summarize(reports: List[Dict[str, Any]]) -> str:
+    split = [r for r in reports if len(r['parts']) > 1]
+    increased = sum(1 for r in reports for p in r['parts'] if p['interval_seconds'] != r['interval_seconds'])
+    before = scheduler_load(reports, after=False)
+    after = scheduler_load(reports)
+    return (f"Rebalance result: groups={len(reports)}, split={len(split)}, groups after={sum(len(r['parts']) for r in reports)}, "
+            f"max group cost/eval {before['max_group_cost']} -> {after['max_group_cost']}, "
+            f"p95 scheduler tick cost {before['p95_tick_cost']} -> {after['p95_tick_cost']} (at original intervals)"
+            + (f", intervals increased={increased}" if increased else ''))
+
+
+class _GroupsDumper(yaml.SafeDumper):
+    pass
+
+
+def _str_representer(dumper: yaml.SafeDumper, value: str):
+    if '\n' in value:
+        return dumper.represent_scalar('tag:yaml.org,2002:str', value, style='|')
+    return dumper.represent_scalar('tag:yaml.org,2002:str', value)
+
+
+_GroupsDumper.add_representer(str, _str_representer)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Split alert rule groups whose estimated evaluation cost exceeds a budget.')
+    parser.add_argument('--instance-dir', default=INSTANCE_DIR, help='Directory of instance YAML files (default: alert/instance)')
+    parser.add_argument('--budget', type=float, default=None,
+                        help='Max estimated cost per group evaluation (default: cost of the most expensive single rule)')
+    parser.add_argument('--max-rules', type=int, default=None, help='Max rules per group (default: unlimited)')
+    parser.add_argument('--increase-intervals', action='store_true',
+                        help="Lengthen split groups' intervals by 10s steps (fewer evaluations) where every rule's 'for' still covers the new interval")
+    parser.add_argument('--max-interval-increase', default=f'{DEFAULT_MAX_INTERVAL_INCREASE_SECONDS}s',
+                        help='Largest interval increase (default: 30s)')
+    parser.add_argument('--scrape-interval', default='15s', help='Assumed Prometheus scrape interval (default: 15s)')
+    parser.add_argument('--write-dir', metavar='DIR', help='Write rebalanced instance YAML files (same file names) into DIR')
+    parser.add_argument('--json', dest='json_path', default=REPORT_PATH, help='Report output (default: out/rebalance_report.json)')
+    args = parser.parse_args()
+
+    scrape_seconds = promql.duration_seconds(args.scrape_interval) or DEFAULT_SCRAPE_SECONDS
+    max_increase = int(promql.duration_seconds(args.max_interval_increase) or 0)
+    files = [(fname, normalize_groups(doc)) for fname, doc in load_named_yaml_files(args.instance_dir)]
+    all_groups = [g for _, gs in files for g in gs]
+    budget = args.budget if args.budget is not None else auto_budget(all_groups, scrape_seconds)
+
+    # 一次处理全部组（新组名需在整个文件夹内不重名），再按来源文件拆回
+    new_groups, reports = rebalance_groups(all_groups, budget, args.max_rules, args.increase_intervals, max_increase, scrape_seconds)
+    rebalanced: List[Tuple[str, List[Dict[str, Any]]]] = []
+    pos, rep = 0, iter(reports)
+    for fname, gs in files:
+        file_groups: List[Dict[str, Any]] = []
+        for g in gs:
+            count = 1
+            if g:
+                r = next(rep)
+                r['file'] = fname
+                count = len(r['parts'])
+            file_groups.extend(new_groups[pos:pos + count])
+            pos += count
+        rebalanced.append((fname, file_groups))
+
+    rows = []
+    for r in sorted(reports, key=lambda e: -e['cost_per_eval']):
+        if len(r['parts']) < 2 and r['cost_per_eval'] <= budget:
+            continue
+        for p in r['parts']:
+            rows.append([p['cost_per_eval'], p['rules'], f"{p['interval_seconds']}s", p['group'] + (' (over budget)' if p['over_budget'] else ''), r['file']])
+    print_table(f'Rebalanced groups (budget {budget}/eval)', [('cost/eval', 12), ('rules', 5), ('interval', 8), ('group', 44), ('file', 50)], rows)
+    print(summarize(reports))
+
+    report = {'budget': budget, 'max_rules': args.max_rules, 'increase_intervals': args.increase_intervals, 'scrape_interval_seconds': scrape_seconds,
+              'scheduler_before': scheduler_load(reports, after=False), 'scheduler_after': scheduler_load(reports), 'groups': reports}
+    os.makedirs(os.path.dirname(os.path.abspath(args.json_path)), exist_ok=True)
+    with open(args.json_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Wrote report to: {args.json_path}")
+
+    if args.write_dir:
+        os.makedirs(args.write_dir, exist_ok=True)
+        for fname, gs in rebalanced:
+            path = os.path.join(args.write_dir, fname)
+            with open(path, 'w', encoding='utf-8') as f:
+                yaml.dump({'apiVersion': 1, 'groups': gs}, f, Dumper=_GroupsDumper, allow_unicode=True, sort_keys=False, width=4096)
+        print(f"Wrote {len(rebalanced)} instance files to: {args.write_dir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,305 @@
+import os
+import re
+import sys
+import json
+import fnmatch
+import hashlib
+import argparse
+import itertools
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import yaml
+
+# 将 alert/template/*.yaml 按参数矩阵渲染为告警实例 YAML
+# 输入: alert/template/*.yaml（含 ${VAR} / ${VAR:-default} 占位符）+ 参数矩阵 YAML
+# 输出: out/instance/<variant>/<name>-instance.yaml，以及增量渲染状态 .render-state.json
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+TEMPLATE_DIR = os.path.join(BASE_DIR, 'alert', 'template')
+DEFAULT_MATRIX_PATH = os.path.join(TEMPLATE_DIR, 'render-matrix.yaml')
+DEFAULT_OUT_DIR = os.path.join(BASE_DIR, 'out', 'instance')
+STATE_FILE_NAME = '.render-state.json'
+
+# 渲染逻辑变化时递增，使旧状态文件中的所有输出失效
+RENDER_VERSION = 3
+
+# Grafana 规则 uid 上限 40 个字符；uid 格式串加后缀超长时缩短模板 uid 并追加短哈希
+MAX_UID_LENGTH = 40
+UID_HASH_LENGTH = 6
+
+# 与 envsubst 一致：${NAME} 或 ${NAME:-default}
+_PLACEHOLDER_RE = re.compile(r'\$\{([A-Za-z_][A-Za-z0-9_]*)(?::-([^}]*))?\}')
+
+_SafeLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+class _InstanceDumper(yaml.SafeDumper):
+    pass
+
+
+def _str_representer(dumper: yaml.SafeDumper, value: str):
+    # 多行字符串（PromQL、description）使用块样式，便于阅读与 diff；
+    # 行尾空白会使 PyYAML 退回引号样式，输出前去除（对 PromQL 与告警文本无语义影响）
+    if '\n' in value:
+        value = '\n'.join(line.rstrip() for line in value.split('\n'))
+        return dumper.represent_scalar('tag:yaml.org,2002:str', value, style='|')
+    return dumper.represent_scalar('tag:yaml.org,2002:str', value)
+
+
+_InstanceDumper.add_representer(str, _str_representer)
+
+
+class CompiledTemplate:
+    # 模板的解析形式：字面量与占位符交替的片段列表，渲染时只做一次线性拼接
+    def __init__(self, path: str, text: str):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        self.segments: List[Tuple[str, Optional[str], Optional[str]]] = []
+        pos = 0
+        for m in _PLACEHOLDER_RE.finditer(text):
+            self.segments.append((text[pos:m.start()], m.group(1), m.group(2)))
+            pos = m.end()
+        self.segments.append((text[pos:], None, None))
+        self.variables = sorted({var for _, var, _ in self.segments if var})
+
+    def render(self, params: Dict[str, Any]) -> str:
+        out: List[str] = []
+        missing: List[str] = []
+        for literal, var, default in self.segments:
+            out.append(literal)
+            if var is None:
+                continue
+            if var in params and params[var] is not None:
+                out.append(str(params[var]))
+            elif default is not None:
+                out.append(default)
+            else:
+                missing.append(var)
+        if missing:
+            raise ValueError(f"Missing parameters for {self.name}: {', '.join(sorted(set(missing)))}")
+        return ''.join(out)
+
+
+_TEMPLATE_CACHE: Dict[Tuple[str, str], CompiledTemplate] = {}
+
+
+def _file_digest(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def load_template(path: str) -> CompiledTemplate:
+    # 按 (路径, 内容哈希) 缓存解析结果；同一模板在所有变体间只解析一次
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    key = (os.path.abspath(path), hashlib.sha256(text.encode('utf-8')).hexdigest())
+    compiled = _TEMPLATE_CACHE.get(key)
+    if compiled is None:
+        compiled = CompiledTemplate(path, text)
+        _TEMPLATE_CACHE[key] = compiled
+    return compiled
+
+
+def load_matrix(path: str) -> Dict[str, Any]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return yaml.safe_load(f) or {}
+
+
+def expand_variants(matrix: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    # axes 中每个维度是一组取值，变体为各维度的笛卡尔积；
+    # params/labels/uid_map 按维度顺序合并，folder/group/uid/templates 以后出现的维度为准
+    axes: Dict[str, List[Dict[str, Any]]] = matrix.get('axes') or {}
+    defaults = matrix.get('defaults') or {}
+    axis_values = [axes[k] or [{}] for k in axes] or [[{}]]
+    for combo in itertools.product(*axis_values):
+        variant: Dict[str, Any] = {'params': dict(defaults), 'labels': {}, 'template_params': {},
+                                   'uid_map': dict(matrix.get('uid_map') or {})}
+        names = []
+        for part in combo:
+            if part.get('name'):
+                names.append(str(part['name']))
+            variant['params'].update(part.get('params') or {})
+            variant['labels'].update(part.get('labels') or {})
+            variant['uid_map'].update(part.get('uid_map') or {})
+            for tpl, tp in (part.get('template_params') or {}).items():
+                variant['template_params'].setdefault(tpl, {}).update(tp or {})
+            for k in ('folder', 'group', 'uid', 'templates'):
+                if part.get(k):
+                    variant[k] = part[k]
+        variant['name'] = '-'.join(names) or 'default'
+        yield variant
+
+
+def _output_name(template_name: str) -> str:
+    stem = os.path.splitext(template_name)[0]
+    if stem.endswith('-template'):
+        stem = stem[:-len('-template')]
+    return f"{stem}-instance.yaml"
+
+
+def _variant_key(template_digest: str, params: Dict[str, Any], variant: Dict[str, Any]) -> str:
+    # 输出是否需要重渲染只取决于：模板内容、生效参数与结构覆盖
+    payload = {
+        'v': RENDER_VERSION,
+        'template': template_digest,
+        'params': {k: str(v) for k, v in params.items()},
+        'overrides': {k: variant.get(k) for k in ('folder', 'group', 'uid', 'labels', 'uid_map')},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def _has_overrides(variant: Dict[str, Any]) -> bool:
+    return bool(variant.get('folder') or variant.get('group') or variant.get('uid') or variant.get('labels')
+                or variant.get('uid_map'))
+
+
+def format_uid(fmt: str, uid: str, ctx: Dict[str, str]) -> str:
+    # 格式串加上的前后缀保持不变；超过 MAX_UID_LENGTH 时截短模板 uid 并追加其短哈希，结果确定且不同 uid 不会截成同一个
+    out = fmt.format(uid=uid, **ctx)
+    if len(out) <= MAX_UID_LENGTH or fmt.count('{uid}') != 1:
+        return out
+    prefix, suffix = fmt.split('{uid}')
+    budget = MAX_UID_LENGTH - len(prefix.format(**ctx)) - len(suffix.format(**ctx)) - UID_HASH_LENGTH - 1
+    if budget < 1:
+        return out
+    digest = hashlib.sha1(uid.encode('utf-8')).hexdigest()[:UID_HASH_LENGTH]
+    return fmt.format(uid=f"{uid[:budget].rstrip('_-')}_{digest}", **ctx)
+
+
+def check_uids(doc: Dict[str, Any]) -> None:
+    long_uids = [r['uid'] for g in doc.get('groups') or [] for r in g.get('rules') or []
+                 if len(str(r.get('uid') or '')) > MAX_UID_LENGTH]
+    if long_uids:
+        raise ValueError(f"uid longer than {MAX_UID_LENGTH} characters: {', '.join(long_uids)}")
+
+
+def apply_overrides(doc: Dict[str, Any], variant: Dict[str, Any]) -> Dict[str, Any]:
+    # folder/group/uid 为格式串，可引用模板原值 {folder}/{group}/{uid} 与变体名 {variant}；
+    # uid_map 先把模板 uid 换成已有实例的 uid，再应用 uid 格式串
+    for g in doc.get('groups') or []:
+        ctx = {'folder': g.get('folder', ''), 'group': g.get('name', ''), 'variant': variant['name']}
+        if variant.get('folder'):
+            g['folder'] = variant['folder'].format(**ctx)
+        if variant.get('group'):
+            g['name'] = variant['group'].format(**ctx)
+        for r in g.get('rules') or []:
+            if variant.get('uid_map') and r.get('uid') in variant['uid_map']:
+                r['uid'] = variant['uid_map'][r['uid']]
+            if variant.get('uid') and r.get('uid'):
+                r['uid'] = format_uid(variant['uid'], r['uid'], ctx)
+            if variant.get('labels'):
+                labels = dict(r.get('labels') or {})
+                labels.update(variant['labels'])
+                r['labels'] = labels
+    return doc
+
+
+def render_instance(template: CompiledTemplate, params: Dict[str, Any], variant: Dict[str, Any]) -> str:
+    text = template.render(params)
+    # 无论是否有结构覆盖都解析一次，保证输出是合法 YAML 且 uid 不超长
+    doc = yaml.load(text, Loader=_SafeLoader) or {}
+    if not _has_overrides(variant):
+        # 无结构覆盖时直接输出替换后的文本，保留模板中的注释
+        check_uids(doc)
+        return text
+    apply_overrides(doc, variant)
+    check_uids(doc)
+    return yaml.dump(doc, Dumper=_InstanceDumper, allow_unicode=True, sort_keys=False, default_flow_style=False, width=4096)
+
+
+def _template_paths(template_dir: str) -> List[str]:
+    return [os.path.join(template_dir, f) for f in sorted(os.listdir(template_dir))
+            if f.endswith('-template.yaml') or f.endswith('-template.yml')]
+
+
+def _load_state(path: str) -> Dict[str, str]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f).get('outputs', {})
+
+
+def _save_state(path: str, outputs: Dict[str, str]) -> None:
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'version': RENDER_VERSION, 'outputs': outputs}, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def render_all(template_dir: str, matrix: Dict[str, Any], out_dir: str, force: bool = False) -> Dict[str, int]:
+    # 逐个输出流式渲染并落盘，内存占用与变体数量无关；
+    # 输出键未变化且文件存在时跳过，模板仅在需要渲染时才解析
+    os.makedirs(out_dir, exist_ok=True)
+    state_path = os.path.join(out_dir, STATE_FILE_NAME)
+    old_state = {} if force else _load_state(state_path)
+    new_state: Dict[str, str] = {}
+    counts = {'rendered': 0, 'unchanged': 0, 'removed': 0, 'failed': 0}
+
+    templates = _template_paths(template_dir)
+    digests = {p: _file_digest(p) for p in templates}
+
+    for variant in expand_variants(matrix):
+        patterns = variant.get('templates') or ['*']
+        for path in templates:
+            name = os.path.basename(path)
+            if not any(fnmatch.fnmatch(name, pat) for pat in patterns):
+                continue
+            params = dict(variant['params'])
+            params.update(variant['template_params'].get(name) or {})
+            rel = os.path.join(variant['name'], _output_name(name))
+            key = _variant_key(digests[path], params, variant)
+            out_path = os.path.join(out_dir, rel)
+            if old_state.get(rel) == key and os.path.exists(out_path):
+                new_state[rel] = key
+                counts['unchanged'] += 1
+                continue
+            try:
+                text = render_instance(load_template(path), params, variant)
+            except (ValueError, yaml.YAMLError) as e:
+                counts['failed'] += 1
+                print(f"Error rendering {name} for variant {variant['name']}: {e}", file=sys.stderr)
+                # 保留上一次成功的输出与状态，避免下方把它当作已移除的变体删除（watch_apply 会据此清空线上组）
+                if rel in old_state:
+                    new_state[rel] = old_state[rel]
+                continue
+            os.makedirs(os.path.dirname(out_path), exist_ok=True)
+            with open(out_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            new_state[rel] = key
+            counts['rendered'] += 1
+            print(f"Rendered: {rel}")
+
+    # 矩阵中已不存在的输出：仅删除由本工具生成（记录在状态文件中）的文件
+    for rel in sorted(set(old_state) - set(new_state)):
+        stale = os.path.join(out_dir, rel)
+        if os.path.exists(stale):
+            os.remove(stale)
+            counts['removed'] += 1
+            print(f"Removed stale: {rel}")
+
+    _save_state(state_path, new_state)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render alert/template/*.yaml into instance YAML files over a parameter matrix.')
+    parser.add_argument('--matrix', default=DEFAULT_MATRIX_PATH, help='Parameter matrix YAML (default: alert/template/render-matrix.yaml)')
+    parser.add_argument('--template-dir', default=TEMPLATE_DIR, help='Directory containing *-template.yaml files')
+    parser.add_argument('--out-dir', default=DEFAULT_OUT_DIR, help='Output directory (default: out/instance)')
+    parser.add_argument('--force', action='store_true', help='Ignore render state and regenerate every output')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.matrix):
+        print(f"Matrix file not found: {args.matrix}", file=sys.stderr)
+        sys.exit(1)
+
+    counts = render_all(args.template_dir, load_matrix(args.matrix), args.out_dir, force=args.force)
+    print(f"Render result: rendered={counts['rendered']}, unchanged={counts['unchanged']}, "
+          f"removed={counts['removed']}, failed={counts['failed']}")
+    if counts['failed']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,280 @@
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# 通知策略离线路由模拟
+# 输入: 通知策略树（默认 alert/setting/supplier-notification-policies.yaml）+ 一批告警标签集
+# 输出: 每个标签集命中的 receiver、分组键与 group_wait/group_interval/repeat_interval，
+#       以及扇出分布、各 receiver 的告警数与分组数、落到根路由（未命中任何子路由）的标签集
+#
+# 策略树先编译为带等值索引的匹配结构（tools/notification_policy.py），路由结果按匹配器涉及标签的取值缓存；
+# 标签集来源：--labels（JSON 数组或 NDJSON，每项为标签字典）或 --from-rules（由告警规则静态标签推导）
+
+try:
+    from tools import promql
+    from tools.convert_yaml_to_grafana_json import INSTANCE_DIR, OUT_DIR, DEFAULT_FOLDER, iter_instance_groups
+    from tools.notification_policy import Route, Router, reference_match
+except Exception:
+    # 兼容从工具目录直接执行
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    from tools import promql  # type: ignore
+    from tools.convert_yaml_to_grafana_json import INSTANCE_DIR, OUT_DIR, DEFAULT_FOLDER, iter_instance_groups  # type: ignore
+    from tools.notification_policy import Route, Router, reference_match  # type: ignore
+
+POLICY_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'alert', 'setting', 'supplier-notification-policies.yaml'))
+REPORT_PATH = os.path.join(OUT_DIR, 'routing_simulation.json')
+
+
+def read_label_sets(path: str) -> List[Dict[str, str]]:
+    # JSON 数组（或 {"labels": [...]}）与 NDJSON 均可；'-' 表示标准输入
+    f = sys.stdin if path == '-' else open(path, 'r', encoding='utf-8')
+    try:
+        text = f.read()
+    finally:
+        if f is not sys.stdin:
+            f.close()
+    stripped = text.lstrip()
+    if stripped.startswith('['):
+        items = json.loads(text)
+    elif stripped.startswith('{') and '\n' not in stripped.strip():
+        data = json.loads(text)
+        items = data.get('labels', [data]) if isinstance(data, dict) else data
+    else:
+        items = []
+        for lineno, line in enumerate(text.splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{lineno}: invalid JSON: {e}")
+    out = []
+    for i, item in enumerate(items):
+        # 兼容直接传入规则对象或告警实例（取其 labels 字段）
+        labels = item.get('labels', item) if isinstance(item, dict) and isinstance(item.get('labels'), dict) else item
+        if not isinstance(labels, dict):
+            raise ValueError(f"{path}: item {i} is not a label object")
+        out.append({str(k): '' if v is None else str(v) for k, v in labels.items()})
+    return out
+
+
+def rule_label_sets(instance_dir: str) -> List[Dict[str, str]]:
+    # 每条规则一个标签集：静态 labels + Grafana 自动附加的 alertname / grafana_folder
+    out = []
+    for g in iter_instance_groups(instance_dir):
+        folder = g.get('folder') or DEFAULT_FOLDER
+        for r in g.get('rules') or []:
+            labels = {str(k): str(v) for k, v in (r.get('labels') or {}).items()}
+            labels['alertname'] = r.get('title') or r.get('uid') or 'Unnamed'
+            labels['grafana_folder'] = folder
+            out.append(labels)
+    return out
+
+
+def parse_expand(specs: Sequence[str]) -> List[Tuple[str, List[str]]]:
+    # LABEL=N 生成 N 个合成取值（LABEL-0..N-1），LABEL=a,b,c 使用给定取值
+    out = []
+    for spec in specs:
+        label, sep, values = spec.partition('=')
+        if not sep or not label:
+            raise ValueError(f"invalid --expand (expect LABEL=N or LABEL=v1,v2): {spec}")
+        if values.isdigit():
+            out.append((label, [f'{label}-{i}' for i in range(int(values))]))
+        else:
+            out.append((label, [v for v in values.split(',') if v]))
+    return out
+
+
+def expand_label_sets(label_sets: Iterable[Dict[str, str]], expand: Sequence[Tuple[str, List[str]]]) -> Iterator[Dict[str, str]]:
+    # 对每个标签集按 expand 的笛卡尔积展开，模拟告警规则按动态标签（客户/应用/供应商）产生的多个实例
+    if not expand:
+        yield from label_sets
+        return
+    names = [label for label, _ in expand]
+    combos = list(itertools.product(*(values for _, values in expand)))
+    for base in label_sets:
+        for combo in combos:
+            labels = dict(base)
+            labels.update(zip(names, combo))
+            yield labels
+
+
+def _seconds(duration: str) -> Optional[float]:
+    return promql.duration_seconds(duration)
+
+
+def route_info(route: Route) -> Dict[str, Any]:
+    return {
+        'route': route.route_id,
+        'receiver': route.receiver,
+        'group_by': list(route.group_by),
+        'matchers': [str(m) for m in route.matchers],
+        'group_wait': route.group_wait,
+        'group_interval': route.group_interval,
+        'repeat_interval': route.repeat_interval,
+        'continue': route.continue_,
+        'mute_time_intervals': list(route.mute_time_intervals),
+        'active_time_intervals': list(route.active_time_intervals),
+    }
+
+
+def format_group_key(route: Route, key: Tuple[Tuple[str, str], ...]) -> str:
+    # 与 Alertmanager 的分组键形式一致：{路由}:{label="value", ...}
+    return f"{route.route_id}:{{{', '.join(f'{l}={json.dumps(v, ensure_ascii=False)}' for l, v in key)}}}"
+
+
+def simulate(router: Router, label_sets: Sequence[Dict[str, str]], window_seconds: float = 0,
+             detail: bool = False) -> Dict[str, Any]:
+    # 批量路由并汇总；detail=True 时附带逐条结果（大批量时体积较大）
+    start = time.perf_counter()
+    results = router.route_many(label_sets)
+    routing_seconds = time.perf_counter() - start
+
+    root = router.root
+    fanout = Counter()
+    alerts_per_route = Counter()
+    groups: Dict[Tuple[int, ...], set] = defaultdict(set)
+    routes_by_path: Dict[Tuple[int, ...], Route] = {}
+    unmatched = 0
+    rows = [] if detail else None
+    for labels, routes in zip(label_sets, results):
+        fanout[len(routes)] += 1
+        if routes[0] is root:
+            unmatched += 1
+        for r in routes:
+            alerts_per_route[r.path] += 1
+            groups[r.path].add(r.group_key(labels))
+            routes_by_path[r.path] = r
+        if rows is not None:
+            rows.append({'labels': labels, 'routes': [
+                {'route': r.route_id, 'receiver': r.receiver, 'group_key': format_group_key(r, r.group_key(labels)),
+                 'group_wait': r.group_wait, 'group_interval': r.group_interval, 'repeat_interval': r.repeat_interval}
+                for r in routes]})
+    total_seconds = time.perf_counter() - start
+
+    by_route = []
+    for path, keys in sorted(groups.items()):
+        r = routes_by_path[path]
+        entry = dict(route_info(r), alerts=alerts_per_route[path], groups=len(keys))
+        if window_seconds:
+            # 告警持续触发时每个分组在窗口内的通知次数：group_wait 后首发，之后每 repeat_interval 重发一次
+            wait, repeat = _seconds(r.group_wait) or 0, _seconds(r.repeat_interval) or 0
+            per_group = 0 if window_seconds < wait else 1 + (int((window_seconds - wait) // repeat) if repeat else 0)
+            entry['notifications_per_window'] = per_group * len(keys)
+        by_route.append(entry)
+
+    receivers: Dict[str, Dict[str, int]] = {}
+    for entry in by_route:
+        rec = receivers.setdefault(entry['receiver'], {'alerts': 0, 'groups': 0, 'notifications_per_window': 0})
+        rec['alerts'] += entry['alerts']
+        rec['groups'] += entry['groups']
+        rec['notifications_per_window'] += entry.get('notifications_per_window', 0)
+    if not window_seconds:
+        for rec in receivers.values():
+            del rec['notifications_per_window']
+
+    n = len(label_sets)
+    report = {
+        'label_sets': n,
+        'routing_seconds': round(routing_seconds, 6),
+        'label_sets_per_second': round(n / routing_seconds) if routing_seconds > 0 else None,
+        'total_seconds': round(total_seconds, 6),
+        'distinct_projections': len(router._cache),
+        'deliveries': sum(k * v for k, v in fanout.items()),
+        'fanout': {str(k): v for k, v in sorted(fanout.items())},
+        'unmatched': unmatched,
+        'groups': sum(len(keys) for keys in groups.values()),
+        'window_seconds': window_seconds or None,
+        'receivers': receivers,
+        'routes': by_route,
+    }
+    if rows is not None:
+        report['results'] = rows
+    return report
+
+
+def verify(router: Router, label_sets: Sequence[Dict[str, str]], limit: int = 10000) -> int:
+    # 用未编译的逐条匹配实现复核索引/缓存结果，返回不一致的数量
+    mismatches = 0
+    for labels in label_sets[:limit]:
+        fast = [r.path for r in router.route(labels)]
+        slow = [r.path for r in reference_match(router.root, labels)]
+        if fast != slow:
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"Mismatch for {labels}: compiled={fast} reference={slow}", file=sys.stderr)
+    return mismatches
+
+
+def print_report(report: Dict[str, Any], top: int) -> None:
+    rate = report['label_sets_per_second']
+    print(f"Routed {report['label_sets']} label sets in {report['routing_seconds']:.3f}s"
+          f" ({rate if rate is not None else '-'} /s, {report['distinct_projections']} distinct projections)")
+    print(f"Deliveries: {report['deliveries']}, groups: {report['groups']}, unmatched (root): {report['unmatched']}")
+    print("Fan-out: " + ', '.join(f"{k} receiver(s)={v}" for k, v in report['fanout'].items()))
+    window = report['window_seconds']
+    header = f"{'route':<8}  {'receiver':<36}  {'alerts':>8}  {'groups':>7}  {'wait':>5}  {'interval':>8}  {'repeat':>6}"
+    if window:
+        header += f"  {'notif/window':>12}"
+    print('\n' + header)
+    print('-' * len(header))
+    for entry in sorted(report['routes'], key=lambda e: -e['alerts'])[:top]:
+        line = (f"{entry['route']:<8}  {str(entry['receiver']):<36}  {entry['alerts']:>8}  {entry['groups']:>7}  "
+                f"{entry['group_wait']:>5}  {entry['group_interval']:>8}  {entry['repeat_interval']:>6}")
+        if window:
+            line += f"  {entry['notifications_per_window']:>12}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate notification-policy routing for a batch of alert label sets.')
+    parser.add_argument('--policy', default=POLICY_PATH, help='Notification policy YAML (default: alert/setting/supplier-notification-policies.yaml)')
+    src = parser.add_mutually_exclusive_group()
+    src.add_argument('--labels', help="Label sets as JSON array or NDJSON ('-' for stdin)")
+    src.add_argument('--from-rules', nargs='?', const=INSTANCE_DIR, metavar='DIR', help='Derive one label set per rule from instance YAML (default dir: alert/instance)')
+    parser.add_argument('--expand', action='append', default=[], metavar='LABEL=N|v1,v2', help='Expand each label set over synthetic label values (repeatable, cartesian product)')
+    parser.add_argument('--window', default='24h', help="Window for notification-count estimate, '0' disables (default: 24h)")
+    parser.add_argument('--out', default=REPORT_PATH, help='JSON report path (default: out/routing_simulation.json)')
+    parser.add_argument('--detail', action='store_true', help='Include per-label-set results in the JSON report')
+    parser.add_argument('--verify', action='store_true', help='Cross-check compiled routing against the reference matcher')
+    parser.add_argument('--top', type=int, default=30, help='Rows in the console route table (default: 30)')
+    args = parser.parse_args()
+
+    try:
+        router = Router.from_file(args.policy)
+        if args.labels:
+            base = read_label_sets(args.labels)
+        else:
+            base = rule_label_sets(args.from_rules or INSTANCE_DIR)
+        label_sets = list(expand_label_sets(base, parse_expand(args.expand)))
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(2)
+    if not label_sets:
+        print('No label sets to route.', file=sys.stderr)
+        sys.exit(2)
+
+    window_seconds = _seconds(args.window) or 0
+    report = simulate(router, label_sets, window_seconds, detail=args.detail)
+    print_report(report, args.top)
+
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\nWrote report to: {args.out}")
+
+    if args.verify:
+        mismatches = verify(router, label_sets)
+        print(f"Verify: {min(len(label_sets), 10000)} label sets checked, {mismatches} mismatches")
+        if mismatches:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,606 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import functools
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import yaml
+
+# 部署前校验（不发任何 HTTP 请求）：instance 规则、联系点、通知策略、通知模板
+# 目的：在调用 Grafana API 之前一次性报告全部错误，避免导入到一半才遇到 400。
+#   - 结构校验：声明式 schema（类型、必填、枚举、时长、uid 格式）预先编译为校验函数，逐文件执行；
+#   - 引用校验：condition / 表达式节点引用的 refId 存在、未渲染的 ${VAR} 占位符、PromQL 可解析、
+#     时长能被导入脚本正确换算、联系点必填 settings、策略引用的接收器与模板名存在；
+#   - 跨文件校验：规则 uid 全局唯一、同名规则组 interval 一致、同一租户目录内联系点 uid 定义不冲突。
+# 文件按内容识别（groups / contactPoints / policies / {{ define }}），多文件时并行校验（多进程，阈值同 yaml_loader）。
+
+try:
+    from tools import promql
+    from tools.yaml_loader import load_yaml_file, PARALLEL_MIN_BYTES
+    from tools.convert_yaml_to_grafana_json import INSTANCE_DIR
+    from tools.import_rules_to_grafana import _parse_duration_seconds
+    from tools.notification_policy import policy_root, parse_matchers
+    from tools.import_alert_settings import _PermissiveLoader
+except Exception:
+    # 兼容从工具目录直接执行
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    from tools import promql  # type: ignore
+    from tools.yaml_loader import load_yaml_file, PARALLEL_MIN_BYTES  # type: ignore
+    from tools.convert_yaml_to_grafana_json import INSTANCE_DIR  # type: ignore
+    from tools.import_rules_to_grafana import _parse_duration_seconds  # type: ignore
+    from tools.notification_policy import policy_root, parse_matchers  # type: ignore
+    from tools.import_alert_settings import _PermissiveLoader  # type: ignore
+
+SETTING_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'alert', 'setting'))
+EXPR_DATASOURCE = '__expr__'
+SCHEDULER_STEP_SECONDS = 10
+
+Issue = namedtuple('Issue', ['level', 'file', 'path', 'message'])
+
+# ==================== schema ====================
+# 节点写法：{'type': 'object', 'fields': {...}, 'required': [...]}、{'type': 'list', 'items': ..., 'min': 1}、
+# {'type': 'map', 'values': ...}、{'type': 'enum', 'values': [...]}，以及标量 'str' / 'int' / 'bool' / 'number' / 'duration' / 'uid' / 'any'
+
+UID_RE = re.compile(r'^[A-Za-z0-9_-]{1,40}$')
+PLACEHOLDER_RE = re.compile(r'\$\{([A-Za-z_][A-Za-z0-9_]*)(?::-[^}]*)?\}')
+MATH_REF_RE = re.compile(r'\$\{?([A-Za-z_][A-Za-z0-9_]*)\}?')
+TEMPLATE_REF_RE = re.compile(r'\{\{-?\s*template\s+"([^"]+)"')
+TEMPLATE_DEFINE_RE = re.compile(r'\{\{-?\s*define\s+"([^"]+)"')
+
+QUERY_SCHEMA = {
+    'type': 'object',
+    'required': ['refId', 'datasourceUid', 'model'],
+    'fields': {
+        'refId': 'str',
+        'queryType': 'any',
+        'relativeTimeRange': {'type': 'object', 'fields': {'from': 'int', 'to': 'int'}},
+        'datasourceUid': 'str',
+        'model': {'type': 'map', 'values': 'any'},
+    },
+}
+RULE_SCHEMA = {
+    'type': 'object',
+    'required': ['uid', 'title', 'condition', 'data'],
+    'fields': {
+        'uid': 'uid',
+        'title': 'str',
+        'condition': 'str',
+        'data': {'type': 'list', 'items': QUERY_SCHEMA, 'min': 1},
+        'noDataState': {'type': 'enum', 'values': ['NoData', 'Alerting', 'OK', 'KeepLast']},
+        'execErrState': {'type': 'enum', 'values': ['Error', 'Alerting', 'OK', 'KeepLast']},
+        'for': 'duration',
+        'annotations': {'type': 'map', 'values': 'str'},
+        'labels': {'type': 'map', 'values': 'str'},
+        'isPaused': 'bool',
+        'notification_settings': 'any',
+        # API 规则（out/api_rules.json）额外字段
+        'folder': 'str',
+        'ruleGroup': 'str',
+        'groupInterval': 'duration',
+        'orgId': 'int',
+    },
+}
+INSTANCE_SCHEMA = {
+    'type': 'object',
+    'required': ['groups'],
+    'fields': {
+        'apiVersion': {'type': 'enum', 'values': [1]},
+        'groups': {'type': 'list', 'min': 1, 'items': {
+            'type': 'object',
+            'required': ['name', 'rules'],
+            'fields': {'orgId': 'int', 'name': 'str', 'folder': 'str', 'interval': 'duration',
+                       'rules': {'type': 'list', 'items': RULE_SCHEMA}},
+        }},
+        'deleteRules': 'any',
+    },
+}
+RECEIVER_SCHEMA = {
+    'type': 'object',
+    'required': ['type'],
+    'fields': {'uid': 'uid', 'type': 'str', 'settings': {'type': 'map', 'values': 'any'}, 'disableResolveMessage': 'bool'},
+}
+CONTACT_POINTS_SCHEMA = {
+    'type': 'object',
+    'required': ['contactPoints'],
+    'fields': {
+        'apiVersion': {'type': 'enum', 'values': [1]},
+        'contactPoints': {'type': 'list', 'items': {
+            'type': 'object',
+            'required': ['name', 'receivers'],
+            'fields': {'orgId': 'int', 'name': 'str', 'receivers': {'type': 'list', 'items': RECEIVER_SCHEMA, 'min': 1}},
+        }},
+        'deleteContactPoints': 'any',
+    },
+}
+# Grafana 接收器类型与必填 settings（未列出的类型只给出警告）
+RECEIVER_REQUIRED_SETTINGS = {
+    'webhook': ('url',), 'email': ('addresses',), 'dingding': ('url',), 'discord': ('url',), 'googlechat': ('url',),
+    'teams': ('url',), 'telegram': ('bottoken', 'chatid'), 'slack': (), 'wecom': (), 'pagerduty': ('integrationKey',),
+    'opsgenie': ('apiKey',), 'alertmanager': ('url',), 'line': ('token',), 'pushover': ('userKey', 'apiToken'),
+    'sensugo': ('url', 'apikey'), 'threema': ('gateway_id', 'recipient_id', 'api_secret'), 'victorops': ('url',),
+    'webex': ('room_id',), 'kafka': ('kafkaRestProxy', 'kafkaTopic'), 'oncall': ('url',), 'sns': ('topic_arn',), 'mqtt': ('brokerUrl', 'topic'),
+}
+POLICY_DURATION_FIELDS = ('group_wait', 'group_interval', 'repeat_interval')
+
+
+def _scalar_check(kind: str) -> Callable[[Any], Optional[str]]:
+    # 返回 None 表示通过，否则返回错误描述
+    def check_str(v: Any) -> Optional[str]:
+        if not isinstance(v, str):
+            return f"must be a string, got {type(v).__name__} {v!r}"
+        return None if v.strip() else 'must not be empty'
+
+    def check_int(v: Any) -> Optional[str]:
+        return None if isinstance(v, int) and not isinstance(v, bool) else f"must be an integer, got {v!r}"
+
+    def check_number(v: Any) -> Optional[str]:
+        return None if isinstance(v, (int, float)) and not isinstance(v, bool) else f"must be a number, got {v!r}"
+
+    def check_bool(v: Any) -> Optional[str]:
+        return None if isinstance(v, bool) else f"must be true/false, got {v!r}"
+
+    def check_duration(v: Any) -> Optional[str]:
+        # 导入脚本用 _parse_duration_seconds 换算，只接受单一单位；复合写法（1h30m）会被静默当作未设置
+        if not isinstance(v, str) or not v.strip():
+            return f"must be a duration string like '5m', got {v!r}"
+        exact = promql.duration_seconds(v.strip())
+        if exact is None:
+            return f"invalid duration {v!r}"
+        if _parse_duration_seconds(v) != int(exact):
+            return f"duration {v!r} is not understood by the importer; use a single unit (e.g. {promql.format_duration(exact)})"
+        return None
+
+    def check_uid(v: Any) -> Optional[str]:
+        if not isinstance(v, str) or not UID_RE.match(v):
+            return f"uid {v!r} must be 1-40 characters of letters, digits, '-' or '_'"
+        return None
+
+    return {'str': check_str, 'int': check_int, 'number': check_number, 'bool': check_bool,
+            'duration': check_duration, 'uid': check_uid, 'any': lambda v: None}[kind]
+
+
+def _item_key(x: Any, i: int) -> Any:
+    # 列表元素在报告路径中按 uid / refId / name 标识，没有时用下标
+    if isinstance(x, dict):
+        for k in ('uid', 'refId', 'name'):
+            if isinstance(x.get(k), (str, int)) and x.get(k) != '':
+                return x[k]
+    return i
+
+
+def compile_schema(spec: Any) -> Callable[[Any, str, Callable[..., None]], None]:
+    # 把 schema 编译为 check(value, path, report) 闭包；report(path, message[, level])
+    if isinstance(spec, str):
+        scalar = _scalar_check(spec)
+
+        def check_scalar(v: Any, path: str, report: Callable[..., None]) -> None:
+            msg = scalar(v)
+            if msg:
+                report(path, msg)
+        return check_scalar
+
+    kind = spec['type']
+    if kind == 'enum':
+        allowed = list(spec['values'])
+
+        def check_enum(v: Any, path: str, report: Callable[..., None]) -> None:
+            if v not in allowed:
+                report(path, f"must be one of {', '.join(map(str, allowed))}, got {v!r}")
+        return check_enum
+
+    if kind == 'list':
+        item = compile_schema(spec['items'])
+        min_items = spec.get('min', 0)
+
+        def check_list(v: Any, path: str, report: Callable[..., None]) -> None:
+            if not isinstance(v, list):
+                report(path, f"must be a list, got {type(v).__name__}")
+                return
+            if len(v) < min_items:
+                report(path, f"must contain at least {min_items} item(s)")
+            for i, x in enumerate(v):
+                item(x, f"{path}[{_item_key(x, i)}]", report)
+        return check_list
+
+    if kind == 'map':
+        value = compile_schema(spec['values'])
+
+        def check_map(v: Any, path: str, report: Callable[..., None]) -> None:
+            if not isinstance(v, dict):
+                report(path, f"must be a mapping, got {type(v).__name__}")
+                return
+            for k, x in v.items():
+                value(x, f"{path}.{k}", report)
+        return check_map
+
+    fields = {k: compile_schema(s) for k, s in spec['fields'].items()}
+    required = tuple(spec.get('required', ()))
+
+    def check_object(v: Any, path: str, report: Callable[..., None]) -> None:
+        if not isinstance(v, dict):
+            report(path, f"must be a mapping, got {type(v).__name__}")
+            return
+        for k in required:
+            if v.get(k) is None:
+                report(f"{path}.{k}" if path else k, 'is required')
+        for k, x in v.items():
+            sub = f"{path}.{k}" if path else str(k)
+            if k not in fields:
+                # Grafana 忽略未知字段（常见于把 model 内的设置写到了外层），只给出警告
+                report(sub, 'unknown field (ignored by Grafana)', 'warning')
+            elif x is not None or k in required:
+                fields[k](x, sub, report)
+    return check_object
+
+
+CHECK_RULE = compile_schema(RULE_SCHEMA)
+CHECK_INSTANCE = compile_schema(INSTANCE_SCHEMA)
+CHECK_CONTACT_POINTS = compile_schema(CONTACT_POINTS_SCHEMA)
+
+
+# ==================== 引用校验 ====================
+
+def _placeholders(v: Any) -> List[str]:
+    # 未渲染的模板占位符；Grafana 内置变量（${__interval} 等）不算
+    if isinstance(v, str):
+        return [m for m in PLACEHOLDER_RE.findall(v) if not m.startswith('__')]
+    if isinstance(v, dict):
+        return [p for x in v.values() for p in _placeholders(x)]
+    if isinstance(v, list):
+        return [p for x in v for p in _placeholders(x)]
+    return []
+
+
+def _expression_refs(model: Dict[str, Any]) -> List[str]:
+    # __expr__ 节点引用的 refId
+    kind = model.get('type')
+    expression = model.get('expression')
+    if kind == 'math':
+        return MATH_REF_RE.findall(expression or '')
+    if kind in ('reduce', 'resample', 'threshold'):
+        return [expression] if expression else []
+    if kind == 'classic_conditions':
+        return [((c.get('query') or {}).get('params') or [None])[0] for c in model.get('conditions') or []
+                if ((c.get('query') or {}).get('params') or [None])[0]]
+    return []
+
+
+@functools.lru_cache(maxsize=4096)
+def _promql_error(expr: str) -> Optional[str]:
+    # 模板渲染出的多个实例常共用同一表达式，解析结果按文本缓存
+    try:
+        promql.parse(expr)
+    except promql.PromQLError as e:
+        return str(e)
+    return None
+
+
+def check_rule_refs(rule: Dict[str, Any], path: str, report: Callable[..., None]) -> None:
+    queries = [q for q in rule.get('data') or [] if isinstance(q, dict)]
+    ref_ids = [q.get('refId') for q in queries]
+    seen = set()
+    for i, ref in enumerate(ref_ids):
+        if ref in seen:
+            report(f"{path}.data[{i}].refId", f"duplicate refId {ref!r}")
+        seen.add(ref)
+    if rule.get('condition') and rule['condition'] not in seen:
+        report(f"{path}.condition", f"refers to missing refId {rule['condition']!r} (have {', '.join(map(str, ref_ids))})")
+    for name in _placeholders({k: rule.get(k) for k in ('uid', 'title', 'condition', 'labels', 'for')}):
+        report(path, f"unrendered placeholder ${{{name}}}")
+
+    for i, q in enumerate(queries):
+        qpath = f"{path}.data[{_item_key(q, i)}]"
+        for name in _placeholders(q.get('datasourceUid')):
+            report(f"{qpath}.datasourceUid", f"unrendered placeholder ${{{name}}}")
+        rtr = q.get('relativeTimeRange')
+        if isinstance(rtr, dict) and isinstance(rtr.get('from'), int) and isinstance(rtr.get('to') or 0, int):
+            if rtr['from'] < (rtr.get('to') or 0):
+                report(f"{qpath}.relativeTimeRange", "'from' must be >= 'to'")
+        model = q.get('model') if isinstance(q.get('model'), dict) else {}
+        if q.get('datasourceUid') == EXPR_DATASOURCE:
+            if not model.get('type'):
+                report(f"{qpath}.model.type", 'expression node needs a type (math/reduce/threshold/...)')
+            for ref in _expression_refs(model):
+                if ref == q.get('refId'):
+                    report(f"{qpath}.model.expression", f"refers to itself ({ref!r})")
+                elif ref not in seen:
+                    report(f"{qpath}.model.expression", f"refers to missing refId {ref!r}")
+            continue
+        expr = model.get('expr')
+        for name in _placeholders(expr):
+            report(f"{qpath}.model.expr", f"unrendered placeholder ${{{name}}}")
+        ds_type = (model.get('datasource') or {}).get('type', 'prometheus') if isinstance(model.get('datasource'), dict) else 'prometheus'
+        if ds_type == 'prometheus':
+            if not isinstance(expr, str) or not expr.strip():
+                report(f"{qpath}.model.expr", 'is required for a Prometheus query')
+            elif not _placeholders(expr):
+                error = _promql_error(expr)
+                if error:
+                    report(f"{qpath}.model.expr", f"PromQL parse error: {error}")
+
+
+def validate_rule(rule: Dict[str, Any], path: str, report: Callable[..., None]) -> None:
+    CHECK_RULE(rule, path, report)
+    if isinstance(rule, dict):
+        check_rule_refs(rule, path, report)
+
+
+def _interval_seconds(v: Any) -> Optional[int]:
+    return _parse_duration_seconds(v) if isinstance(v, str) else None
+
+
+# ==================== 单文件校验（可在子进程中执行） ====================
+
+def classify(doc: Any, path: str) -> Optional[str]:
+    if not path.endswith(('.yaml', '.yml')):
+        return 'template'
+    if isinstance(doc, dict):
+        if 'groups' in doc:
+            return 'instance'
+        if 'contactPoints' in doc:
+            return 'contact-points'
+        if 'policies' in doc:
+            return 'policies'
+    return None
+
+
+def validate_file(path: str, use_cache: bool = True) -> Tuple[List[Issue], Dict[str, Any]]:
+    # 返回 (问题列表, 供跨文件校验的事实)
+    issues: List[Issue] = []
+    facts: Dict[str, Any] = {'kind': None, 'rules': [], 'groups': [], 'receivers': [], 'contact_points': [],
+                             'template_refs': [], 'templates': [], 'policy_receivers': []}
+
+    def report(p: str, msg: str, level: str = 'error') -> None:
+        issues.append(Issue(level, path, p, msg))
+
+    if not path.endswith(('.yaml', '.yml')):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+        except (OSError, UnicodeDecodeError) as e:
+            report('', f"cannot read: {e}")
+            return issues, facts
+        facts['kind'] = 'template'
+        facts['templates'] = TEMPLATE_DEFINE_RE.findall(text)
+        facts['template_refs'] = [(name, '') for name in TEMPLATE_REF_RE.findall(text)]
+        return issues, facts
+
+    try:
+        # 与导入脚本相同的宽松加载器（策略文件中的 `=` 匹配运算符）
+        doc = load_yaml_file(path, loader=_PermissiveLoader) if use_cache else load_yaml_file(path, loader=_PermissiveLoader, cache_dir=None)
+    except (OSError, yaml.YAMLError) as e:
+        report('', f"YAML error: {e}")
+        return issues, facts
+    kind = classify(doc, path)
+    facts['kind'] = kind
+    if kind is None:
+        report('', 'not an instance, contact-points or notification-policies file (no groups / contactPoints / policies key)')
+    elif kind == 'instance':
+        CHECK_INSTANCE(doc, '', report)
+        for gi, g in enumerate(doc.get('groups') or [] if isinstance(doc.get('groups'), list) else []):
+            if not isinstance(g, dict):
+                continue
+            gpath = f"groups[{_item_key(g, gi)}]"
+            seconds = _interval_seconds(g.get('interval') or '1m')
+            if seconds and seconds % SCHEDULER_STEP_SECONDS:
+                report(f"{gpath}.interval", f"not a multiple of {SCHEDULER_STEP_SECONDS}s; the importer rounds it up", 'warning')
+            facts['groups'].append((g.get('folder'), g.get('name'), seconds, gpath))
+            for ri, r in enumerate(g.get('rules') or [] if isinstance(g.get('rules'), list) else []):
+                rpath = f"{gpath}.rules[{_item_key(r, ri)}]"
+                if isinstance(r, dict):
+                    check_rule_refs(r, rpath, report)
+                    if r.get('uid'):
+                        facts['rules'].append((r['uid'], rpath))
+    elif kind == 'contact-points':
+        CHECK_CONTACT_POINTS(doc, '', report)
+        for ci, cp in enumerate(doc.get('contactPoints') or [] if isinstance(doc.get('contactPoints'), list) else []):
+            if not isinstance(cp, dict):
+                continue
+            cpath = f"contactPoints[{_item_key(cp, ci)}]"
+            facts['contact_points'].append(cp.get('name'))
+            for ri, rc in enumerate(cp.get('receivers') or [] if isinstance(cp.get('receivers'), list) else []):
+                if not isinstance(rc, dict):
+                    continue
+                rpath = f"{cpath}.receivers[{_item_key(rc, ri)}]"
+                settings = rc.get('settings') if isinstance(rc.get('settings'), dict) else {}
+                rtype = rc.get('type')
+                if isinstance(rtype, str) and rtype:
+                    if rtype not in RECEIVER_REQUIRED_SETTINGS:
+                        report(f"{rpath}.type", f"unknown receiver type {rtype!r}", 'warning')
+                    for k in RECEIVER_REQUIRED_SETTINGS.get(rtype, ()):
+                        if settings.get(k) in (None, ''):
+                            report(f"{rpath}.settings.{k}", f"is required for type {rtype}")
+                    url = settings.get('url')
+                    if isinstance(url, str) and url and not re.match(r'^https?://', url):
+                        report(f"{rpath}.settings.url", f"must be an http(s) URL, got {url!r}")
+                for name in _placeholders(settings):
+                    report(f"{rpath}.settings", f"unrendered placeholder ${{{name}}}")
+                for k, v in settings.items():
+                    if isinstance(v, str):
+                        facts['template_refs'].extend((name, f"{rpath}.settings.{k}") for name in TEMPLATE_REF_RE.findall(v))
+                facts['receivers'].append((rc.get('uid'), cp.get('name'), rtype,
+                                           json.dumps({'name': cp.get('name'), **rc}, sort_keys=True, ensure_ascii=False, default=str), rpath))
+    elif kind == 'policies':
+        root = policy_root(doc)
+        if not isinstance(root, dict):
+            report('policies', 'no root policy found')
+        else:
+            _check_policy(root, 'policies[0]', True, report, facts)
+    return issues, facts
+
+
+def _check_policy(node: Dict[str, Any], path: str, root: bool, report: Callable[..., None], facts: Dict[str, Any]) -> None:
+    if root and not node.get('receiver'):
+        report(f"{path}.receiver", 'root policy needs a receiver')
+    if node.get('receiver'):
+        facts['policy_receivers'].append((node['receiver'], f"{path}.receiver"))
+    for k in POLICY_DURATION_FIELDS:
+        if node.get(k) is not None and promql.duration_seconds(str(node[k])) is None:
+            report(f"{path}.{k}", f"invalid duration {node[k]!r}")
+    try:
+        parse_matchers(node)
+    except ValueError as e:
+        report(path, str(e))
+    routes = node.get('routes') or []
+    if not isinstance(routes, list):
+        report(f"{path}.routes", 'must be a list')
+        return
+    for i, r in enumerate(routes):
+        if isinstance(r, dict):
+            _check_policy(r, f"{path}.routes[{i}]", False, report, facts)
+        else:
+            report(f"{path}.routes[{i}]", 'must be a mapping')
+
+
+def _validate_job(args: Tuple[str, bool]) -> Tuple[List[Issue], Dict[str, Any]]:
+    return validate_file(*args)
+
+
+# ==================== 跨文件校验 ====================
+
+def cross_check(results: List[Tuple[str, Tuple[List[Issue], Dict[str, Any]]]]) -> List[Issue]:
+    issues: List[Issue] = []
+    uids: Dict[str, Tuple[str, str]] = {}
+    groups: Dict[Tuple[Any, Any], Tuple[Any, str, str]] = {}
+    templates = {name for _, (_, f) in results for name in f['templates']}
+    has_templates = any(f['kind'] == 'template' for _, (_, f) in results)
+    tenants: Dict[str, Dict[str, Any]] = {}
+    for path, (_, f) in results:
+        for uid, loc in f['rules']:
+            if uid in uids:
+                issues.append(Issue('error', path, loc, f"duplicate rule uid {uid!r} (also at {os.path.basename(uids[uid][0])}: {uids[uid][1]})"))
+            else:
+                uids[uid] = (path, loc)
+        for folder, name, seconds, loc in f['groups']:
+            key = (folder, name)
+            if key in groups and groups[key][0] != seconds:
+                other = groups[key]
+                issues.append(Issue('error', path, f"{loc}.interval",
+                                    f"group {name!r} in folder {folder!r} also defined at {os.path.basename(other[1])}: {other[2]} with a different interval"))
+            groups.setdefault(key, (seconds, path, loc))
+        if f['kind'] == 'contact-points':
+            # 联系点按租户目录（alert/setting/pa、ponts）分别部署，冲突检查限定在同一目录内
+            t = tenants.setdefault(os.path.dirname(path), {'uids': {}, 'names': set()})
+            t['names'].update(n for n in f['contact_points'] if n)
+            for uid, name, rtype, body, loc in f['receivers']:
+                key = uid or f"{name}/{rtype}"
+                if key in t['uids'] and t['uids'][key][0] != body:
+                    other = t['uids'][key]
+                    issues.append(Issue('error', path, loc, f"receiver {key!r} defined differently at {os.path.basename(other[1])}: {other[2]}"))
+                t['uids'].setdefault(key, (body, path, loc))
+        if has_templates:
+            for name, loc in f['template_refs']:
+                if name not in templates:
+                    issues.append(Issue('error', path, loc, f"template {name!r} is not defined in any template file"))
+    for path, (_, f) in results:
+        for receiver, loc in f['policy_receivers']:
+            for tenant, t in sorted(tenants.items()):
+                if receiver not in t['names']:
+                    issues.append(Issue('error', path, loc, f"receiver {receiver!r} is not a contact point in {os.path.relpath(tenant)}"))
+    return issues
+
+
+# ==================== 入口函数 ====================
+
+def expand_paths(paths: Sequence[str]) -> List[str]:
+    # 目录递归展开（跳过隐藏文件与 .md 说明）；文件按给定顺序保留
+    out: List[str] = []
+    for p in paths:
+        p = os.path.abspath(p)
+        if os.path.isdir(p):
+            for root, dirs, files in os.walk(p):
+                dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+                out.extend(os.path.join(root, f) for f in sorted(files) if not f.startswith('.') and not f.endswith('.md'))
+        else:
+            out.append(p)
+    seen = set()
+    return [p for p in out if not (p in seen or seen.add(p))]
+
+
+def validate_paths(paths: Sequence[str], workers: Optional[int] = None, use_cache: bool = True) -> List[Issue]:
+    files = expand_paths(paths)
+    issues: List[Issue] = [Issue('error', p, '', 'file not found') for p in files if not os.path.exists(p)]
+    files = [p for p in files if os.path.exists(p)]
+    workers = workers or os.cpu_count() or 1
+    total_bytes = sum(os.path.getsize(p) for p in files)
+    jobs = [(p, use_cache) for p in files]
+    if workers > 1 and len(files) > 1 and total_bytes >= PARALLEL_MIN_BYTES:
+        with ProcessPoolExecutor(max_workers=min(workers, len(files))) as pool:
+            results = list(zip(files, pool.map(_validate_job, jobs)))
+    else:
+        results = [(p, _validate_job(job)) for p, job in zip(files, jobs)]
+    for _, (file_issues, _) in results:
+        issues.extend(file_issues)
+    issues.extend(cross_check(results))
+    return issues
+
+
+def validate_api_rules(rules: List[Dict[str, Any]], source: str) -> List[Issue]:
+    # 校验转换产物（out/api_rules.json）；导入脚本在发出请求前调用
+    issues: List[Issue] = []
+    uids: Dict[str, int] = {}
+    for i, r in enumerate(rules):
+        path = f"rules[{_item_key(r, i)}]"
+
+        def report(p: str, msg: str, level: str = 'error') -> None:
+            issues.append(Issue(level, source, p, msg))
+        validate_rule(r, path, report)
+        uid = r.get('uid') if isinstance(r, dict) else None
+        if uid in uids:
+            report(path, f"duplicate rule uid {uid!r} (also rules[{uids[uid]}])")
+        elif uid:
+            uids[uid] = i
+    return issues
+
+
+def print_issues(issues: List[Issue], stream: Any = sys.stderr) -> None:
+    for it in issues:
+        name = os.path.relpath(it.file) if os.path.isabs(it.file) and not os.path.relpath(it.file).startswith('..') else it.file
+        print(f"{it.level.upper()}: {name}: {it.path + ': ' if it.path else ''}{it.message}", file=stream)
+
+
+def preflight(issues: List[Issue], what: str) -> None:
+    # 导入脚本共用：有错误时打印全部错误并以 2 退出，不发出任何请求；警告只计数（详见 validate_config.py）
+    errors = [i for i in issues if i.level == 'error']
+    print_issues(errors)
+    if len(issues) > len(errors):
+        print(f"Pre-flight validation of {what}: {len(issues) - len(errors)} warning(s), run tools/validate_config.py for details", file=sys.stderr)
+    if errors:
+        print(f"Pre-flight validation failed for {what}: {len(errors)} error(s); nothing was sent to Grafana "
+              f"(--skip-validation to bypass)", file=sys.stderr)
+        sys.exit(2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Validate alert instance / contact-point / policy / template files before deploying.')
+    parser.add_argument('paths', nargs='*', help='Files or directories (default: alert/instance alert/setting)')
+    parser.add_argument('--api-rules', metavar='PATH', help='Also validate converter output JSON (e.g. out/api_rules.json)')
+    parser.add_argument('--workers', type=int, default=None, help='Validator processes for large inputs (default: CPU count)')
+    parser.add_argument('--no-cache', action='store_true', help='Parse every file without the YAML parse cache')
+    parser.add_argument('--strict', action='store_true', help='Treat warnings as errors')
+    args = parser.parse_args()
+
+    start = time.monotonic()
+    paths = args.paths or [INSTANCE_DIR, SETTING_DIR]
+    issues = validate_paths(paths, workers=args.workers, use_cache=not args.no_cache)
+    if args.api_rules:
+        try:
+            with open(args.api_rules, 'r', encoding='utf-8') as f:
+                issues.extend(validate_api_rules(json.load(f), args.api_rules))
+        except (OSError, ValueError) as e:
+            issues.append(Issue('error', args.api_rules, '', f"cannot read: {e}"))
+    print_issues(issues, sys.stdout)
+    errors = sum(1 for i in issues if i.level == 'error')
+    warnings = len(issues) - errors
+    print(f"Validated {len(expand_paths(paths))} files in {time.monotonic() - start:.2f}s: errors={errors}, warnings={warnings}")
+    if errors or (args.strict and warnings):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,438 @@
+import os
+import sys
+import time
+import hashlib
+import argparse
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import yaml
+import requests
+
+# 监听模式：编辑 alert/instance、alert/template、alert/setting 后自动增量推送到 Grafana
+# 轮询文件 (mtime, size) 快照并去抖（编辑器保存往往连写多次），静默期过后：
+#   1) 模板或渲染矩阵变化：增量渲染到 out/instance（render_all 只重渲染输出键变化的文件）；
+#   2) 只重新转换变化的 instance 文件，按规则组指纹（组 interval + 组内规则 rule_hash）找出受影响的组，
+#      每组一次 PUT rule-groups/{group} 整组写入，未受影响的组不发请求；
+#   3) 联系点文件变化：只同步该文件中的接收器（sync_contact_points 仅写入内容变化的接收器）；
+#      通知策略文件内容变化：重新 PUT 策略树。
+# 推送前对变化的文件做预检（validate_config.py 同一套规则），有错误的文件保持上一次的已推送状态，修正后自动重试。
+# 每次推送打印 编辑到生效 的延迟（最早一次未推送的修改时刻到推送完成）。
+
+try:
+    from tools.import_rules_to_grafana import (get_auth_session, ensure_folder, build_rule_group_payload, put_rule_group,
+                                               rule_hash, _run_buckets, _normalize_interval, _group_interval, _error_detail,
+                                               DEFAULT_BASE_URL, DEFAULT_USER, DEFAULT_PASSWORD)
+    from tools.import_alert_settings import sync_contact_points, import_notification_policies
+    from tools.convert_yaml_to_grafana_json import INSTANCE_DIR, normalize_groups, iter_api_rules
+    from tools.render_alert_templates import TEMPLATE_DIR, DEFAULT_MATRIX_PATH, DEFAULT_OUT_DIR, load_matrix, render_all
+    from tools.validate_config import validate_file, print_issues
+    from tools.yaml_loader import load_yaml_file
+    from tools import http_metrics
+except Exception:
+    # 兼容从工具目录直接执行
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    from tools.import_rules_to_grafana import (get_auth_session, ensure_folder, build_rule_group_payload, put_rule_group,  # type: ignore
+                                               rule_hash, _run_buckets, _normalize_interval, _group_interval, _error_detail,
+                                               DEFAULT_BASE_URL, DEFAULT_USER, DEFAULT_PASSWORD)
+    from tools.import_alert_settings import sync_contact_points, import_notification_policies  # type: ignore
+    from tools.convert_yaml_to_grafana_json import INSTANCE_DIR, normalize_groups, iter_api_rules  # type: ignore
+    from tools.render_alert_templates import TEMPLATE_DIR, DEFAULT_MATRIX_PATH, DEFAULT_OUT_DIR, load_matrix, render_all  # type: ignore
+    from tools.validate_config import validate_file, print_issues  # type: ignore
+    from tools.yaml_loader import load_yaml_file  # type: ignore
+    from tools import http_metrics  # type: ignore
+
+DEFAULT_POLICIES_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'alert', 'setting', 'supplier-notification-policies.yaml'))
+# 轮询间隔与静默期（秒）：编辑到生效延迟约为 轮询/2 + 静默期 + 推送耗时
+POLL_SECONDS = 0.2
+DEBOUNCE_SECONDS = 0.3
+YAML_EXTS = ('.yaml', '.yml')
+
+GroupKey = Tuple[str, str]
+Snapshot = Dict[str, Tuple[int, int]]
+
+
+# ==================== 文件快照 ====================
+
+def snapshot(paths: Iterable[str]) -> Snapshot:
+    # 路径 -> (mtime_ns, size)；目录递归扫描 YAML 文件（跳过隐藏文件，如渲染状态文件），文件直接记录
+    snap: Snapshot = {}
+    stack = [os.path.abspath(p) for p in paths]
+    while stack:
+        p = stack.pop()
+        try:
+            if os.path.isdir(p):
+                for e in os.scandir(p):
+                    if e.name.startswith('.'):
+                        continue
+                    if e.is_dir():
+                        stack.append(e.path)
+                    elif e.name.endswith(YAML_EXTS):
+                        st = e.stat()
+                        snap[e.path] = (st.st_mtime_ns, st.st_size)
+            elif os.path.isfile(p):
+                st = os.stat(p)
+                snap[p] = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            # 扫描途中被删除（编辑器原子保存时的临时重命名）；下一轮轮询再看
+            continue
+    return snap
+
+
+def diff_snapshots(old: Snapshot, new: Snapshot) -> List[str]:
+    return sorted(p for p in set(old) | set(new) if old.get(p) != new.get(p))
+
+
+def _under(path: str, roots: Sequence[str]) -> bool:
+    return any(path == r or path.startswith(r.rstrip(os.sep) + os.sep) for r in roots)
+
+
+def _display(path: str) -> str:
+    rel = os.path.relpath(path)
+    return path if rel.startswith('..') else rel
+
+
+def _uid_list(uids: List[str], limit: int = 5) -> str:
+    return ','.join(uids[:limit]) + (f",...(+{len(uids) - limit})" if len(uids) > limit else '')
+
+
+def _file_sha(path: str) -> Optional[str]:
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+# ==================== 规则索引 ====================
+
+def load_file_rules(path: str) -> List[Dict[str, Any]]:
+    # 与转换脚本相同的流程（normalize_groups + iter_api_rules），只处理单个文件
+    return list(iter_api_rules(normalize_groups(load_yaml_file(path))))
+
+
+def group_fingerprint(group_rules: List[Dict[str, Any]]) -> str:
+    # 组指纹：导入时的 interval（对齐 10s 调度步长）+ 组内规则顺序与 rule_hash；任何会改变整组 PUT 请求体的修改都会改变指纹
+    _, seconds = _normalize_interval(_group_interval(group_rules))
+    h = hashlib.sha256(str(seconds).encode('utf-8'))
+    for r in group_rules:
+        h.update(rule_hash(r, r.get('folder')).encode('utf-8'))
+    return h.hexdigest()
+
+
+class RuleIndex:
+    # 按文件保存转换后的规则；组视图按文件名顺序拼接（与转换脚本输出顺序一致），只在受影响的组上重算指纹
+    def __init__(self) -> None:
+        self.files: Dict[str, List[Dict[str, Any]]] = {}
+        self.group_files: Dict[GroupKey, Set[str]] = {}
+        self.fingerprints: Dict[GroupKey, str] = {}
+
+    @staticmethod
+    def _keys(rules: List[Dict[str, Any]]) -> Set[GroupKey]:
+        return {(r['folder'], r['ruleGroup']) for r in rules}
+
+    def group_rules(self, key: GroupKey) -> List[Dict[str, Any]]:
+        return [r for path in sorted(self.group_files.get(key, ()))
+                for r in self.files[path] if (r['folder'], r['ruleGroup']) == key]
+
+    def uids(self, key: GroupKey) -> Set[str]:
+        return {r['uid'] for r in self.group_rules(key) if r.get('uid')}
+
+    def all_uids(self) -> Set[str]:
+        return {r['uid'] for rules in self.files.values() for r in rules if r.get('uid')}
+
+    def update(self, path: str, rules: Optional[List[Dict[str, Any]]]) -> Set[GroupKey]:
+        # rules 为 None 表示文件被删除；返回指纹发生变化的组
+        old_keys = self._keys(self.files.get(path, []))
+        if rules is None:
+            self.files.pop(path, None)
+            new_keys: Set[GroupKey] = set()
+        else:
+            self.files[path] = rules
+            new_keys = self._keys(rules)
+        for key in old_keys - new_keys:
+            self.group_files[key].discard(path)
+            if not self.group_files[key]:
+                del self.group_files[key]
+        for key in new_keys:
+            self.group_files.setdefault(key, set()).add(path)
+        changed: Set[GroupKey] = set()
+        for key in old_keys | new_keys:
+            fp = group_fingerprint(self.group_rules(key)) if key in self.group_files else None
+            if fp != self.fingerprints.get(key):
+                changed.add(key)
+                if fp is None:
+                    self.fingerprints.pop(key, None)
+                else:
+                    self.fingerprints[key] = fp
+        return changed
+
+
+# ==================== 推送 ====================
+
+class Watcher:
+    def __init__(self, sess: requests.Session, base_url: str, instance_dirs: List[str], variants: List[str],
+                 template_dir: str, matrix_path: str, render_dir: str, cp_paths: List[str], np_path: Optional[str],
+                 workers: int = 4, prune: bool = False, validate: bool = True) -> None:
+        self.sess = sess
+        self.base_url = base_url
+        self.instance_roots = [os.path.abspath(d) for d in instance_dirs] + \
+                              [os.path.join(os.path.abspath(render_dir), v) for v in variants]
+        # 未指定 --variant 时不监听模板（渲染产物不会被推送）
+        self.template_roots = [os.path.abspath(template_dir), os.path.abspath(matrix_path)] if variants else []
+        self.template_dir = template_dir
+        self.matrix_path = matrix_path
+        self.render_dir = render_dir
+        self.cp_roots = [os.path.abspath(p) for p in cp_paths]
+        self.np_path = os.path.abspath(np_path) if np_path else None
+        self.workers = max(1, workers)
+        self.prune = prune
+        self.validate = validate
+        self.index = RuleIndex()
+        # 线上状态：最近一次成功推送（或启动基线）的组指纹、组内 uid -> rule_hash、组 interval；
+        # 与 index.fingerprints 不一致的组即待推送，推送失败的组下一轮自动重试
+        self.live: Dict[GroupKey, str] = {}
+        self.live_rules: Dict[GroupKey, Dict[str, str]] = {}
+        self.live_interval: Dict[GroupKey, int] = {}
+        self.folder_uids: Dict[str, str] = {}
+        self.policy_sha = _file_sha(self.np_path) if self.np_path else None
+        self.rejected: Set[str] = set()
+        self.snap: Snapshot = {}
+        self.first_edit_ns: Optional[int] = None
+        # 启动时需整体推送一次的设置文件（--full）
+        self.initial: List[str] = []
+
+    def roots(self) -> List[str]:
+        return self.template_roots + self.instance_roots + self.cp_roots + ([self.np_path] if self.np_path else [])
+
+    def load_baseline(self, full: bool = False) -> None:
+        # 启动时转换全部 instance 文件；默认视为线上已与之一致，full=True 时全部组视为待推送
+        if self.template_roots:
+            self.render()
+        self.snap = snapshot(self.roots())
+        for path in sorted(p for p in self.snap if _under(p, self.instance_roots)):
+            self.index.update(path, load_file_rules(path))
+        if full:
+            self.initial = sorted(p for p in self.snap if _under(p, self.cp_roots))
+            if self.np_path:
+                self.initial.append(self.np_path)
+                self.policy_sha = None
+        else:
+            for key in self.index.fingerprints:
+                self._mark_live(key)
+        print(f"Watching {len(self.snap)} files: rules={sum(len(r) for r in self.index.files.values())}, "
+              f"groups={len(self.index.fingerprints)}" + (', pushing all groups' if full else ''))
+
+    def render(self) -> None:
+        try:
+            counts = render_all(self.template_dir, load_matrix(self.matrix_path), self.render_dir)
+        except (OSError, ValueError, yaml.YAMLError) as e:
+            print(f"Error rendering templates: {e}", file=sys.stderr)
+            return
+        if counts['rendered'] or counts['removed'] or counts['failed']:
+            print(f"Render result: rendered={counts['rendered']}, removed={counts['removed']}, failed={counts['failed']}")
+
+    def _valid(self, path: str) -> bool:
+        if not self.validate:
+            return True
+        errors = [i for i in validate_file(path)[0] if i.level == 'error']
+        if errors:
+            print_issues(errors)
+            print(f"Not applied: {_display(path)} has {len(errors)} error(s); keeping the last applied state", file=sys.stderr)
+        return not errors
+
+    def reload_rules(self, paths: List[str]) -> None:
+        for path in paths:
+            if not os.path.exists(path):
+                self.rejected.discard(path)
+                self.index.update(path, None)
+                continue
+            if not self._valid(path):
+                self.rejected.add(path)
+                continue
+            try:
+                rules = load_file_rules(path)
+            except (OSError, yaml.YAMLError) as e:
+                print(f"Not applied: {_display(path)}: {e}", file=sys.stderr)
+                self.rejected.add(path)
+                continue
+            self.rejected.discard(path)
+            self.index.update(path, rules)
+
+    def _folder_uid(self, title: str) -> str:
+        if title not in self.folder_uids:
+            self.folder_uids[title] = ensure_folder(self.sess, self.base_url, title)
+        return self.folder_uids[title]
+
+    def _mark_live(self, key: GroupKey) -> None:
+        rules = self.index.group_rules(key)
+        if not rules:
+            for d in (self.live, self.live_rules, self.live_interval):
+                d.pop(key, None)
+            return
+        self.live[key] = self.index.fingerprints[key]
+        self.live_rules[key] = {r['uid']: rule_hash(r, key[0]) for r in rules if r.get('uid')}
+        self.live_interval[key] = _normalize_interval(_group_interval(rules))[1]
+
+    def push_rules(self) -> Dict[str, int]:
+        # 只推送指纹与线上不一致的组；每组一次整组 PUT（替换语义：组内删除的规则随之删除）
+        counts = {'groups': 0, 'created': 0, 'moved in': 0, 'updated': 0, 'removed': 0, 'failed': 0}
+        fps = self.index.fingerprints
+        dirty = sorted(k for k in set(fps) | set(self.live) if fps.get(k) != self.live.get(k))
+        local_uids = self.index.all_uids()
+        live_uids = {u for rules in self.live_rules.values() for u in rules}
+        writes: List[Tuple[GroupKey, List[Dict[str, Any]]]] = []
+        for key in dirty:
+            if key in fps:
+                writes.append((key, self.index.group_rules(key)))
+                continue
+            # 本地已没有该组：规则全部迁到其他组时由迁入组的 PUT 完成迁移；否则需 --prune 才清空线上组
+            orphans = set(self.live_rules.get(key, {})) - local_uids
+            if orphans and self.prune:
+                writes.append((key, []))
+                continue
+            if orphans:
+                print(f"Warning: group '{key[1]}' in folder '{key[0]}' no longer exists locally; "
+                      f"{len(orphans)} rule(s) left in Grafana (use --prune to delete)")
+            self._mark_live(key)
+
+        def run(key: GroupKey, item: Tuple[str, List[Dict[str, Any]]], emit) -> Dict[str, int]:
+            folder_uid, group_rules = item
+            payload = build_rule_group_payload(folder_uid, key[1], group_rules)
+            if not group_rules:
+                payload['interval'] = self.live_interval.get(key, payload['interval'])
+            resp = put_rule_group(self.sess, self.base_url, folder_uid, key[1], payload)
+            if resp.status_code not in (200, 201, 202):
+                emit(f"Error applying group '{key[1]}' in folder '{key[0]}': {resp.status_code} {_error_detail(resp)}")
+                return {'failed': 1}
+            old = self.live_rules.get(key, {})
+            new = {r['uid']: rule_hash(r, key[0]) for r in group_rules if r.get('uid')}
+            added = set(new) - set(old)
+            changes = (('created', sorted(added - live_uids)),
+                       ('moved in', sorted(added & live_uids)),
+                       ('updated', sorted(u for u in set(new) & set(old) if new[u] != old[u])),
+                       ('removed', sorted(set(old) - set(new))))
+            emit(f"Applied group: {key[0]} / {key[1]} -> rules={len(group_rules)}, interval={payload['interval']}s"
+                 + ''.join(f", {name}={_uid_list(uids)}" for name, uids in changes if uids))
+            return {name: len(uids) for name, uids in changes}
+
+        # 迁入规则的组先写（Grafana 按 uid 把规则移到该组），再写只减少规则的组，避免迁移中的规则被先删后建
+        def gaining(w: Tuple[GroupKey, List[Dict[str, Any]]]) -> bool:
+            return bool({r['uid'] for r in w[1] if r.get('uid')} - set(self.live_rules.get(w[0], {})))
+        for phase in ([w for w in writes if gaining(w)], [w for w in writes if not gaining(w)]):
+            items = [(key, (self._folder_uid(key[0]), rules)) for key, rules in phase]
+            for key, c in _run_buckets(items, run, self.workers):
+                counts['groups'] += 1
+                for k, v in c.items():
+                    counts[k] += v
+                if not c.get('failed'):
+                    self._mark_live(key)
+        return counts
+
+    def apply(self, changed: List[str]) -> None:
+        started = time.monotonic()
+        if any(_under(p, self.template_roots) for p in changed):
+            self.render()
+            # 渲染产物的变化并入本轮
+            new = snapshot(self.roots())
+            changed = sorted(set(changed) | set(diff_snapshots(self.snap, new)))
+            self.snap = new
+
+        # 上次校验失败的文件一并重试（如与之重复的 uid 已在其他文件中移除）
+        self.reload_rules(sorted(set(p for p in changed if _under(p, self.instance_roots)) | self.rejected))
+        cp_files = [p for p in changed if _under(p, self.cp_roots) and os.path.exists(p) and self._valid(p)]
+        policy_changed = bool(self.np_path and self.np_path in changed and os.path.exists(self.np_path)
+                              and _file_sha(self.np_path) != self.policy_sha and self._valid(self.np_path))
+        try:
+            counts = self.push_rules()
+            if cp_files:
+                sync_contact_points(self.sess, self.base_url, cp_files, workers=self.workers)
+            if policy_changed:
+                sha = _file_sha(self.np_path)
+                if import_notification_policies(self.sess, self.base_url, self.np_path):
+                    self.policy_sha = sha
+        except (requests.RequestException, OSError, ValueError) as e:
+            print(f"Error: {e}; will retry on the next change", file=sys.stderr)
+            return
+        if not (counts['groups'] or cp_files or policy_changed):
+            print(f"No effective change in {len(changed)} file(s)")
+            return
+        edit_to_live = time.time() - self.first_edit_ns / 1e9 if self.first_edit_ns else 0.0
+        print(f"Applied {len(changed)} changed file(s) in {time.monotonic() - started:.2f}s: groups={counts['groups']}, "
+              f"created={counts['created']}, moved={counts['moved in']}, updated={counts['updated']}, removed={counts['removed']}, failed={counts['failed']}, "
+              f"contact point files={len(cp_files)}, policies={'yes' if policy_changed else 'no'} (edit-to-live {edit_to_live:.2f}s)")
+
+    def run(self, poll: float = POLL_SECONDS, debounce: float = DEBOUNCE_SECONDS) -> None:
+        # 轮询快照；有变化后等到连续 debounce 秒无新变化再推送一批
+        pending: Set[str] = set()
+        last_change = 0.0
+        if self.initial or any(fp != self.live.get(k) for k, fp in self.index.fingerprints.items()):
+            self.apply(self.initial)
+            self.initial = []
+        while True:
+            time.sleep(poll)
+            new = snapshot(self.roots())
+            changed = diff_snapshots(self.snap, new)
+            if changed:
+                now_ns = time.time_ns()
+                mtimes = [new[p][0] if p in new else now_ns for p in changed]
+                # 编辑到生效延迟从本批中最早的一次修改算起
+                self.first_edit_ns = min([self.first_edit_ns or now_ns] + mtimes)
+                pending.update(changed)
+                self.snap = new
+                last_change = time.monotonic()
+                continue
+            if pending and time.monotonic() - last_change >= debounce:
+                batch = sorted(pending)
+                pending.clear()
+                self.apply(batch)
+                self.first_edit_ns = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Watch alert instance / template / setting files and push only the changed groups, contact points and policies.')
+    parser.add_argument('--instance-dir', dest='instance_dirs', nargs='+', default=[INSTANCE_DIR],
+                        help='Instance YAML directories to watch (default: alert/instance)')
+    parser.add_argument('--variant', dest='variants', action='append', default=[],
+                        help='Also watch alert/template and the render matrix, render into out/instance and apply out/instance/VARIANT (repeatable)')
+    parser.add_argument('--matrix', default=DEFAULT_MATRIX_PATH, help='Render matrix (default: alert/template/render-matrix.yaml)')
+    parser.add_argument('--template-dir', default=TEMPLATE_DIR, help='Template directory (default: alert/template)')
+    parser.add_argument('--render-dir', default=DEFAULT_OUT_DIR, help='Render output directory (default: out/instance)')
+    parser.add_argument('--contact-points', dest='cp_paths', nargs='+', default=[], metavar='PATH',
+                        help='Contact-points YAML files or directories to watch (e.g. alert/setting/pa); not watched if omitted')
+    parser.add_argument('--notification-policies', dest='np_path', default=DEFAULT_POLICIES_PATH,
+                        help='Notification-policies YAML to watch ("" to skip)')
+    parser.add_argument('--full', action='store_true',
+                        help='Push every rule group, watched contact point and the policy tree once at startup instead of assuming Grafana is in sync')
+    parser.add_argument('--prune', action='store_true', help='Delete rule groups whose rules were all removed locally')
+    parser.add_argument('--poll', type=float, default=POLL_SECONDS, help=f'Poll interval in seconds (default: {POLL_SECONDS})')
+    parser.add_argument('--debounce', type=float, default=DEBOUNCE_SECONDS,
+                        help=f'Quiet period after the last change before applying, in seconds (default: {DEBOUNCE_SECONDS})')
+    parser.add_argument('--workers', type=int, default=4, help='Concurrent group writes (default: 4)')
+    parser.add_argument('--skip-validation', action='store_true', help='Push changed files without pre-flight validation')
+    parser.add_argument('--metrics', metavar='PREFIX', help='Write HTTP timing metrics to PREFIX.json and PREFIX.prom on exit')
+    args = parser.parse_args()
+
+    base_url = os.environ.get('GRAFANA_URL', DEFAULT_BASE_URL)
+    user = os.environ.get('GRAFANA_USER', DEFAULT_USER)
+    password = os.environ.get('GRAFANA_PASSWORD', DEFAULT_PASSWORD)
+    if args.metrics:
+        http_metrics.enable(args.metrics, job='watch_apply')
+    sess = get_auth_session(base_url, user, password, pool_size=max(10, args.workers))
+
+    watcher = Watcher(sess, base_url, args.instance_dirs, args.variants, args.template_dir, args.matrix, args.render_dir,
+                      args.cp_paths, args.np_path or None, workers=args.workers, prune=args.prune,
+                      validate=not args.skip_validation)
+    try:
+        watcher.load_baseline(full=args.full)
+    except (OSError, yaml.YAMLError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(2)
+    print(f"Applying changes to {base_url} (Ctrl+C to stop)")
+    try:
+        watcher.run(poll=args.poll, debounce=args.debounce)
+    except KeyboardInterrupt:
+        print("Stopped")
+
+
+if __name__ == '__main__':
+    main()
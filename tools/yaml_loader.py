@@ -0,0 +1,117 @@
+import os
+import sys
+import pickle
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+import yaml
+
+# YAML 加载层：C 加速解析 + 多进程并行 + 磁盘解析缓存
+# 缓存键: (绝对路径, Loader) -> 条目记录 mtime_ns/size/sha256；
+#   mtime 与大小未变直接命中（不读文件）；变化时按内容哈希复核，内容相同仍命中，仅内容变化才重新解析。
+# 缓存内容为解析后的 Python 对象（pickle），与直接解析结果完全一致，下游 JSON 输出逐字节不变。
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DEFAULT_CACHE_DIR = os.path.join(BASE_DIR, 'out', '.yaml-cache')
+
+# libyaml 可用时使用 C 实现，否则退回纯 Python
+FastSafeLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+# 缓存格式或解析语义变化时递增，使旧缓存全部失效
+CACHE_VERSION = 1
+
+# 待解析文件总字节数低于该值时串行解析，避免进程启动开销（Windows 上尤为明显）
+PARALLEL_MIN_BYTES = 512 * 1024
+
+
+def _loader_id(loader: type) -> str:
+    return f"{loader.__module__}.{loader.__qualname__}/{yaml.__version__}/{CACHE_VERSION}"
+
+
+def _cache_path(cache_dir: str, path: str, loader: type) -> str:
+    key = hashlib.sha1(f"{os.path.abspath(path)}|{_loader_id(loader)}".encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, key + '.pickle')
+
+
+def _read_entry(cache_file: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(cache_file, 'rb') as f:
+            return pickle.load(f)
+    except Exception:
+        # 缓存损坏或不存在时按未命中处理
+        return None
+
+
+def _write_entry(cache_file: str, entry: Dict[str, Any]) -> None:
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        tmp = f"{cache_file}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, cache_file)
+    except OSError as e:
+        # 缓存只是加速手段，写失败不影响结果
+        print(f"Warning: cannot write YAML cache {cache_file}: {e}", file=sys.stderr)
+
+
+def _parse(text: str, loader: type) -> Any:
+    return yaml.load(text, Loader=loader)
+
+
+def _parse_job(args):
+    # 进程池任务：返回 (文档, None) 或 (None, 错误文本)，异常对象未必可序列化
+    text, loader = args
+    try:
+        return _parse(text, loader), None
+    except yaml.YAMLError as e:
+        return None, str(e)
+
+
+def load_yaml_paths(paths: Sequence[str], loader: type = FastSafeLoader, cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+                    workers: Optional[int] = None) -> List[Any]:
+    # 按输入顺序返回解析结果；cache_dir=None 时不读写缓存；解析失败抛出 yaml.YAMLError
+    docs: List[Any] = [None] * len(paths)
+    pending: List[Dict[str, Any]] = []
+    for i, path in enumerate(paths):
+        st = os.stat(path)
+        cache_file = _cache_path(cache_dir, path, loader) if cache_dir else None
+        entry = _read_entry(cache_file) if cache_file else None
+        if entry and entry['mtime_ns'] == st.st_mtime_ns and entry['size'] == st.st_size:
+            docs[i] = entry['doc']
+            continue
+        with open(path, 'rb') as f:
+            raw = f.read()
+        digest = hashlib.sha256(raw).hexdigest()
+        if entry and entry['sha256'] == digest:
+            # 仅时间戳变化（checkout/touch）：复用结果并刷新 mtime
+            entry.update(mtime_ns=st.st_mtime_ns, size=st.st_size)
+            _write_entry(cache_file, entry)
+            docs[i] = entry['doc']
+            continue
+        pending.append({'index': i, 'path': path, 'text': raw.decode('utf-8'), 'sha256': digest,
+                        'mtime_ns': st.st_mtime_ns, 'size': st.st_size, 'cache_file': cache_file})
+
+    if not pending:
+        return docs
+
+    workers = workers or os.cpu_count() or 1
+    total_bytes = sum(p['size'] for p in pending)
+    jobs = [(p['text'], loader) for p in pending]
+    if workers > 1 and len(pending) > 1 and total_bytes >= PARALLEL_MIN_BYTES:
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as pool:
+            results = list(pool.map(_parse_job, jobs))
+    else:
+        results = [_parse_job(job) for job in jobs]
+
+    for p, (doc, error) in zip(pending, results):
+        if error is not None:
+            raise yaml.YAMLError(f"{os.path.basename(p['path'])}: {error}")
+        docs[p['index']] = doc
+        if p['cache_file']:
+            _write_entry(p['cache_file'], {'mtime_ns': p['mtime_ns'], 'size': p['size'], 'sha256': p['sha256'], 'doc': doc})
+    return docs
+
+
+def load_yaml_file(path: str, loader: type = FastSafeLoader, cache_dir: Optional[str] = DEFAULT_CACHE_DIR) -> Any:
+    return load_yaml_paths([path], loader=loader, cache_dir=cache_dir)[0]